@@ -67,11 +67,11 @@ def readXML(casedir, env_file_list):
       raise TypeError(err_msg)
 
   # expand nested environment variables
-  for k,v in output.iteritems():
+  for k,v in output.items():
     output[k] = expand(v, output)
 
   # remove () in output dictionary values
-  for k,v in output.iteritems():
+  for k,v in output.items():
     output[k] = re.sub('[()]', '', v)
     
   return output
@@ -50,7 +50,7 @@ setup(
     author_email="aliceb@ucar.edu",
     packages=['timeseries'],
     version=get_version(),
-    scripts=['timeseries/cesm_tseries_generator.py'],
+    scripts=['timeseries/cesm_tseries_generator.py', 'timeseries/cesm_tseries_benchmark.py'],
     #install_requires=get_requires(),
     #dependency_links=get_dependencies(),
     include_package_data=True,
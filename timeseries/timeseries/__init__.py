@@ -0,0 +1,21 @@
+from . import tseriesUtilsLib
+from . import manifestLib
+from . import journalLib
+from . import archiveIndexLib
+from . import ncHeaderLib
+from . import decompressLib
+from . import validateLib
+from . import scheduleLib
+from . import planLib
+from . import tuneLib
+from . import metricsLib
+from . import benchmarkLib
+from . import requiredVarsLib
+from . import climoLib
+from . import verifyLib
+from . import memoryLib
+from . import zarrStoreLib
+from . import stageLib
+from . import sidecarLib
+from . import quantizeLib
+from . import nodeLib
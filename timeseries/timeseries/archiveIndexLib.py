@@ -0,0 +1,232 @@
+#!/usr/bin/env python2
+"""
+This module provides a cached index of the short term archive history
+directories used to build the time-series specifiers. Each history
+directory is listed once with scandir and every file name is classified
+by component, instance, stream and date with precompiled regular
+expressions. The index is saved to a JSON cache file keyed on the
+directory modification time so that subsequent runs only rescan the
+directories that have changed.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import os
+import re
+
+from timeseries import tseriesUtilsLib
+
+#
+# scandir is in the standard library for python >= 3.5 and available as
+# a separate package for python 2.7, otherwise fall back to listdir/stat
+#
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+INDEX_VERSION = 2
+
+# history file name following the case name, e.g.
+#   cam.h0.0001-01.nc, clm2_0001.h1.0001-01-01.nc, pop.h.nday1.0001-01-01.nc,
+#   pop.h.ecosys.nyear1.0001.nc, pop.h.0001-01.nc.gz
+re_hist = re.compile(r'^(?P<comp>[A-Za-z]+[0-9]*?)(?:_(?P<instance>[0-9]{4}))?\.'
+                     r'(?P<stream>[A-Za-z][A-Za-z0-9]*(?:\.[A-Za-z]+[0-9]*)*)\.'
+                     r'(?P<date>[0-9]{4}(?:-[0-9]{2}(?:-[0-9]{2}(?:-[0-9]{5})?)?)?)'
+                     r'\.nc(?:\.gz)?$')
+
+#=====================================================================
+# classify - split a history file name into comp/instance/stream/date
+#=====================================================================
+def classify(filename, casename):
+    """classify - classify a short term archive history file name
+
+    Arguments:
+    filename (string) - file basename
+    casename (string) - casename prefix of the history files
+
+    Return:
+    (comp, instance, stream, date) tuple of strings, instance is an empty
+    string for single instance files. Returns None if filename is not a
+    history file for casename.
+    """
+    if not filename.startswith(casename + '.'):
+        return None
+
+    match = re_hist.match(filename[len(casename)+1:])
+    if match is None:
+        return None
+
+    return (match.group('comp'), match.group('instance') or '',
+            match.group('stream'), match.group('date'))
+
+#============================================
+# ArchiveIndex - cached history file index
+#============================================
+class ArchiveIndex(object):
+    """ArchiveIndex - cache of classified history file listings keyed on
+    directory path and modification time.
+
+    Each directory is represented as a list of records, a record is a
+    dictionary with keys name, size, comp, instance, stream and date.
+    The comp, instance, stream and date values are None for files that
+    do not follow the CESM history file naming convention.
+    """
+    def __init__(self, cache_file, casename):
+        """
+        Arguments:
+        cache_file (string) - full path to the JSON cache file, None to disable caching
+        casename (string) - casename prefix of the history files
+        """
+        self._cache_file = cache_file
+        self._casename = casename
+        self._dirs = dict()
+        self._scanned = set()
+        self._dirty = False
+
+        if cache_file is not None:
+            try:
+                cache = tseriesUtilsLib.read_json(cache_file)
+            except ValueError:
+                print('archiveIndexLib WARNING: ignoring unreadable archive index cache {0}'.format(cache_file))
+                cache = None
+            if (cache is not None and cache.get('version') == INDEX_VERSION and
+                cache.get('casename') == casename):
+                self._dirs = cache['dirs']
+
+    def cached_dir(self, dirname):
+        """cached_dir - return the cached entry for dirname, a dictionary with
+        keys mtime and files, or None if dirname is not in the cache. The
+        entry is not checked against the directory modification time.
+        """
+        return self._dirs.get(os.path.normpath(dirname))
+
+    def set_dir(self, dirname, entry, rescanned):
+        """set_dir - store an entry returned by refresh_dir for dirname, used to
+        merge directories scanned on other tasks into this index.
+
+        Arguments:
+        dirname (string) - history directory path
+        entry (dictionary) - directory entry with keys mtime and files
+        rescanned (boolean) - True if the directory was listed rather than
+                              read from the cache
+        """
+        dirname = os.path.normpath(dirname)
+        self._dirs[dirname] = entry
+        self._scanned.add(dirname)
+        if rescanned:
+            self._dirty = True
+
+    def scan(self, dirname):
+        """scan - return the list of records for dirname, listing the directory
+        only if it is not cached or has been modified since it was cached.
+
+        Arguments:
+        dirname (string) - history directory path
+
+        Return:
+        records (list) - list of record dictionaries sorted by file name
+        """
+        dirname = os.path.normpath(dirname)
+        if dirname not in self._scanned:
+            entry, rescanned = refresh_dir(dirname, self._dirs.get(dirname), self._casename)
+            self.set_dir(dirname, entry, rescanned)
+
+        records = list()
+        for name, size, comp, instance, stream, date in self._dirs[dirname]['files']:
+            records.append({'name' : name, 'size' : size, 'comp' : comp,
+                            'instance' : instance, 'stream' : stream, 'date' : date})
+        return records
+
+    def save(self):
+        """save - write the index to the cache file if any directory was rescanned
+        """
+        if self._cache_file is not None and self._dirty:
+            tseriesUtilsLib.write_json_atomic(self._cache_file, {'version' : INDEX_VERSION,
+                                                                 'casename' : self._casename,
+                                                                 'dirs' : self._dirs})
+            self._dirty = False
+
+#=========================================================================
+# refresh_dir - validate a cached directory entry, listing it if changed
+#=========================================================================
+def refresh_dir(dirname, entry, casename):
+    """refresh_dir - return an up to date entry for dirname. The directory is
+    only listed if entry is None or its mtime differs from the directory.
+    This does not need an ArchiveIndex so it can run on any task.
+
+    Arguments:
+    dirname (string) - history directory path
+    entry (dictionary) - cached entry with keys mtime and files, or None
+    casename (string) - casename prefix of the history files
+
+    Return:
+    (entry, rescanned) - the current entry and True if dirname was listed
+    """
+    mtime = os.stat(dirname).st_mtime
+    if entry is not None and entry['mtime'] == mtime:
+        return (entry, False)
+
+    return ({'mtime' : mtime, 'files' : list_dir(dirname, casename)}, True)
+
+#===================================================================
+# list_dir - list and classify the regular files in a directory
+#===================================================================
+def list_dir(dirname, casename):
+    """list_dir - list and classify the regular files in dirname
+
+    Return:
+    files (list) - sorted list of [name, size, comp, instance, stream, date]
+    """
+    files = list()
+    if scandir is not None:
+        entries = [(entry.name, entry.stat().st_size) for entry in scandir(dirname)
+                   if entry.is_file()]
+    else:
+        entries = list()
+        for name in os.listdir(dirname):
+            path = os.path.join(dirname, name)
+            if os.path.isfile(path):
+                entries.append((name, os.path.getsize(path)))
+
+    for name, size in entries:
+        fields = classify(name, casename)
+        if fields is None:
+            fields = (None, None, None, None)
+        files.append([name, size] + list(fields))
+
+    files.sort()
+    return files
+
+#===================================================================
+# group_instances - group the history files of a stream by instance
+#===================================================================
+def group_instances(records, multi_instance=True):
+    """group_instances - group the records of the history files of a stream
+    by the instance number of a multi-instance component, e.g. the 0001
+    and 0002 of clm2_0001 and clm2_0002
+
+    Arguments:
+    records (list) - record dictionaries returned by ArchiveIndex.scan
+    multi_instance (boolean) - the multi_instance setting of the component,
+                               all the files are one group if False
+
+    Return:
+    instances (dictionary) - instance number, or an empty string for single
+                             instance files, to the sorted file names
+    """
+    instances = dict()
+    for record in records:
+        instance = (record['instance'] or '') if multi_instance else ''
+        instances.setdefault(instance, list()).append(record['name'])
+
+    for names in instances.values():
+        names.sort()
+    return instances
@@ -0,0 +1,344 @@
+#!/usr/bin/env python2
+"""
+This module provides the synthetic short term archive and the scaling
+report used by cesm_tseries_benchmark.py. The archive follows the stream
+layout of Config/config_timeseries.xml with history files on a noleap
+calendar, a configurable grid, number of variables and years. Each
+variable is filled with random data so the output compression is not
+unrealistically fast.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import os
+import xml.etree.ElementTree as ET
+
+#
+# installed dependencies, only needed to write the synthetic history files
+#
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+DAYS_PER_MONTH = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+# length in days of one record of the sub-daily streams, one file per day
+SUBDAILY_RECORD_DAYS = {'hourly6' : 6.0 / 24.0,
+                        'hourly3' : 3.0 / 24.0,
+                        'hourly1' : 1.0 / 24.0,
+                        'min30' : 1.0 / 48.0}
+
+# history file component names of the comp_archive_spec names that are patterns
+FILE_COMP_NAMES = {'clm[0-9]+' : 'clm2'}
+
+#==================================================================
+# get_stream_name - derive the history stream from a suffix pattern
+#==================================================================
+def get_stream_name(suffix):
+    """get_stream_name - return the history stream name matched by an
+    env_timeseries.xml file_extension suffix pattern, e.g. h0 for
+    .h0\\.+ and h.nday1 for .h.nday1\\.+
+    """
+    stream = suffix.lstrip('.').split('\\')[0]
+    return stream.rstrip('.*')
+
+#==================================================================
+# read_layout - read the stream layout of config_timeseries.xml
+#==================================================================
+def read_layout(config_xml):
+    """read_layout - read the history streams defined in config_timeseries.xml
+
+    Return:
+    streams (list) - dictionaries with keys key (comp.stream), comp, file_comp,
+                     rootdir, subdir, suffix, stream, tseries_tper and
+                     time_variant_variables, in file order
+    """
+    xml_tree = ET.ElementTree()
+    xml_tree.parse(config_xml)
+
+    streams = list()
+    for comp_archive_spec in xml_tree.findall("components/comp_archive_spec"):
+        comp = comp_archive_spec.get("name")
+        file_comp = FILE_COMP_NAMES.get(comp, comp)
+        variables = [v.text for v in comp_archive_spec.findall("tseries_time_variant_variables/variable")]
+        for file_spec in comp_archive_spec.findall("files/file_extension"):
+            if file_spec.find("tseries_tper") is None:
+                continue
+            stream = get_stream_name(file_spec.get("suffix"))
+            streams.append({'key' : '{0}.{1}'.format(file_comp, stream),
+                            'comp' : comp,
+                            'file_comp' : file_comp,
+                            'rootdir' : comp_archive_spec.find("rootdir").text,
+                            'subdir' : file_spec.find("subdir").text,
+                            'suffix' : file_spec.get("suffix"),
+                            'stream' : stream,
+                            'tseries_tper' : file_spec.find("tseries_tper").text,
+                            'time_variant_variables' : variables})
+
+    return streams
+
+#==================================================================
+# select_streams - pick streams from the layout by key
+#==================================================================
+def select_streams(layout, keys):
+    """select_streams - return the first stream of the layout with each key,
+    e.g. cam.h0 or pop.h.nday1
+
+    Raises ValueError for a key that is not in the layout.
+    """
+    selected = list()
+    for key in keys:
+        matches = [stream for stream in layout if stream['key'] == key]
+        if len(matches) == 0:
+            err_msg = 'benchmarkLib.select_streams ERROR: stream {0} is not in the layout, valid streams are {1}'.format(
+                key, ', '.join(sorted(set(stream['key'] for stream in layout))))
+            raise ValueError(err_msg)
+        selected.append(matches[0])
+
+    return selected
+
+#==================================================================
+# history_files - return the dates and time bounds of a stream
+#==================================================================
+def history_files(tseries_tper, years, start_year=1):
+    """history_files - return the history file dates and record time bounds of
+    a stream, in days since 0001-01-01 on the noleap calendar. There is one
+    file per year for annual, per month for monthly and daily and per day
+    for the sub-daily streams.
+
+    Arguments:
+    tseries_tper (string) - time period of the history stream
+    years (integer) - number of model years
+    start_year (integer) - first model year
+
+    Return:
+    files (list) - (date string, list of (lower, upper) record bounds) tuples
+    """
+    files = list()
+    for year in range(start_year, start_year + years):
+        year_start = 365.0 * (year - 1)
+        if tseries_tper in ['annual', 'yearly']:
+            files.append(('{0:04d}'.format(year), [(year_start, year_start + 365.0)]))
+            continue
+
+        month_start = year_start
+        for month, ndays in enumerate(DAYS_PER_MONTH, 1):
+            if tseries_tper == 'monthly':
+                files.append(('{0:04d}-{1:02d}'.format(year, month), [(month_start, month_start + ndays)]))
+            elif tseries_tper == 'daily':
+                files.append(('{0:04d}-{1:02d}-01-00000'.format(year, month),
+                              [(month_start + d, month_start + d + 1.0) for d in range(ndays)]))
+            elif tseries_tper in SUBDAILY_RECORD_DAYS:
+                step = SUBDAILY_RECORD_DAYS[tseries_tper]
+                nrecords = int(round(1.0 / step))
+                for day in range(ndays):
+                    day_start = month_start + day
+                    files.append(('{0:04d}-{1:02d}-{2:02d}-00000'.format(year, month, day + 1),
+                                  [(day_start + r * step, day_start + (r + 1) * step) for r in range(nrecords)]))
+            else:
+                err_msg = 'benchmarkLib.history_files ERROR: tseries_tper {0} is not supported'.format(tseries_tper)
+                raise ValueError(err_msg)
+            month_start += ndays
+
+    return files
+
+#==================================================================
+# write_history_file - write one synthetic history file
+#==================================================================
+def write_history_file(filename, bounds, nlat, nlon, nlev, nvars, metadata, seed=0):
+    """write_history_file - write a synthetic netCDF history file with nvars
+    time series variables, alternating 2d (time, lat, lon) and 3d
+    (time, lev, lat, lon), and the time dependent metadata variables.
+
+    Arguments:
+    filename (string) - output file name
+    bounds (list) - (lower, upper) time bounds of each record
+    nlat, nlon, nlev (integer) - grid size
+    nvars (integer) - number of time series variables
+    metadata (list) - names of the time dependent metadata variables
+    seed (integer) - random number seed
+    """
+    if netCDF4 is None or np is None:
+        err_msg = 'benchmarkLib.write_history_file ERROR: writing history files requires netCDF4 and numpy'
+        raise ImportError(err_msg)
+
+    rng = np.random.RandomState(seed)
+    ntime = len(bounds)
+    f = netCDF4.Dataset(filename, 'w', format='NETCDF3_64BIT')
+    try:
+        f.createDimension('time', None)
+        f.createDimension('nbnd', 2)
+        f.createDimension('lev', nlev)
+        f.createDimension('lat', nlat)
+        f.createDimension('lon', nlon)
+
+        bounds_name = 'time_bnds'
+        for name in ['time_bnds', 'time_bounds', 'time_bound']:
+            if name in metadata:
+                bounds_name = name
+
+        time = f.createVariable('time', 'f8', ('time',))
+        time.units = 'days since 0001-01-01 00:00:00'
+        time.calendar = 'noleap'
+        time.bounds = bounds_name
+        time[:] = [upper for lower, upper in bounds]
+        f.createVariable(bounds_name, 'f8', ('time', 'nbnd'))[:] = bounds
+
+        f.createVariable('lat', 'f8', ('lat',))[:] = np.linspace(-90.0, 90.0, nlat)
+        f.createVariable('lon', 'f8', ('lon',))[:] = np.linspace(0.0, 360.0, nlon, endpoint=False)
+        f.createVariable('lev', 'f8', ('lev',))[:] = np.arange(nlev)
+
+        for name in metadata:
+            if name not in ['time', bounds_name]:
+                f.createVariable(name, 'i4', ('time',))[:] = np.arange(ntime)
+
+        for n in range(nvars):
+            if n % 2 == 0:
+                var = f.createVariable('VAR2D_{0:03d}'.format(n), 'f4', ('time', 'lat', 'lon'))
+                var[:] = rng.standard_normal((ntime, nlat, nlon)).astype('f4')
+            else:
+                var = f.createVariable('VAR3D_{0:03d}'.format(n), 'f4', ('time', 'lev', 'lat', 'lon'))
+                var[:] = rng.standard_normal((ntime, nlev, nlat, nlon)).astype('f4')
+    finally:
+        f.close()
+
+#==================================================================
+# write_env_files - write a standalone postprocess caseroot
+#==================================================================
+def write_env_files(caseroot, config_xml, casename, dout_s_root, streams):
+    """write_env_files - write the env_postprocess.xml and env_timeseries.xml
+    of a standalone postprocess caseroot. The env_timeseries.xml is the
+    config_timeseries.xml with tseries_create TRUE only for streams.
+    """
+    if not os.path.isdir(caseroot):
+        os.makedirs(caseroot)
+
+    root = ET.Element('config_definition')
+    for name, value in [('CASE', casename), ('DOUT_S_ROOT', dout_s_root)]:
+        ET.SubElement(root, 'entry', {'id' : name, 'value' : value})
+    ET.ElementTree(root).write(os.path.join(caseroot, 'env_postprocess.xml'))
+
+    selected = set((stream['comp'], stream['suffix']) for stream in streams)
+    xml_tree = ET.ElementTree()
+    xml_tree.parse(config_xml)
+    for comp_archive_spec in xml_tree.findall("components/comp_archive_spec"):
+        for file_spec in comp_archive_spec.findall("files/file_extension"):
+            tseries_create = file_spec.find("tseries_create")
+            if tseries_create is not None:
+                create = (comp_archive_spec.get("name"), file_spec.get("suffix")) in selected
+                tseries_create.text = 'TRUE' if create else 'FALSE'
+    xml_tree.write(os.path.join(caseroot, 'env_timeseries.xml'))
+
+#==================================================================
+# create_archive - write the synthetic short term archive
+#==================================================================
+def create_archive(dout_s_root, casename, streams, years, nlat, nlon, nlev, nvars):
+    """create_archive - write the history files of streams for years model
+    years under dout_s_root. Existing files are kept so an archive can be
+    reused by several benchmarks.
+
+    Return:
+    nbytes (integer) - total size of the history files
+    """
+    nbytes = 0
+    for stream in streams:
+        hist_dir = os.path.join(dout_s_root, stream['rootdir'], stream['subdir'])
+        if not os.path.isdir(hist_dir):
+            os.makedirs(hist_dir)
+        for n, (date, bounds) in enumerate(history_files(stream['tseries_tper'], years)):
+            filename = os.path.join(hist_dir, '{0}.{1}.{2}.{3}.nc'.format(casename, stream['file_comp'], stream['stream'], date))
+            if not os.path.isfile(filename):
+                write_history_file(filename, bounds, nlat, nlon, nlev, nvars, stream['time_variant_variables'], seed=n)
+            nbytes += os.path.getsize(filename)
+
+    return nbytes
+
+#==================================================================
+# summarize_metrics - summarize a cesm_tseries_generator metrics file
+#==================================================================
+def summarize_metrics(metrics):
+    """summarize_metrics - total the stream records of a --metrics JSON file
+
+    Return:
+    summary (dictionary) - with keys bytes_read, bytes_written, the phase
+                           seconds summed over the tasks and the read and
+                           write MB per second of the read and write phases
+    """
+    summary = {'bytes_read' : 0, 'bytes_written' : 0, 'open_seconds' : 0.0, 'read_seconds' : 0.0,
+               'write_seconds' : 0.0, 'close_seconds' : 0.0}
+    for record in metrics.get('records', list()):
+        if record.get('record') != 'stream':
+            continue
+        for key in summary:
+            summary[key] += record.get(key) or 0
+
+    summary['read_mb_per_second'] = None
+    summary['write_mb_per_second'] = None
+    if summary['read_seconds'] > 0:
+        summary['read_mb_per_second'] = summary['bytes_read'] / 1.0e6 / summary['read_seconds']
+    if summary['write_seconds'] > 0:
+        summary['write_mb_per_second'] = summary['bytes_written'] / 1.0e6 / summary['write_seconds']
+
+    return summary
+
+#==================================================================
+# scaling - compute the strong or weak scaling curve
+#==================================================================
+def scaling(runs, weak=False):
+    """scaling - add the speedup and parallel efficiency to benchmark runs
+    relative to the run with the fewest ranks. For strong scaling the
+    problem size is fixed, for weak scaling it grows with the ranks and
+    the ideal wall time is constant.
+
+    Arguments:
+    runs (list) - dictionaries with keys ranks and wall_seconds
+    weak (boolean) - weak scaling
+
+    Return:
+    runs (list) - sorted by ranks with speedup and efficiency keys added
+    """
+    runs = sorted(runs, key=lambda run: run['ranks'])
+    if len(runs) == 0:
+        return runs
+
+    base = runs[0]
+    for run in runs:
+        ratio = base['wall_seconds'] / run['wall_seconds'] if run['wall_seconds'] > 0 else 0.0
+        if weak:
+            run['speedup'] = ratio * run['ranks'] / base['ranks']
+            run['efficiency'] = ratio
+        else:
+            run['speedup'] = ratio
+            run['efficiency'] = ratio * base['ranks'] / run['ranks']
+
+    return runs
+
+#==================================================================
+# print_scaling - print a scaling table
+#==================================================================
+def print_scaling(title, runs):
+    """print_scaling - print the ranks, wall time, speedup, efficiency and
+    phase throughput of the runs returned by scaling
+    """
+    print(title)
+    print('    {0:>6} {1:>8} {2:>10} {3:>8} {4:>10} {5:>10} {6:>10}'.format(
+        'ranks', 'years', 'wall (s)', 'speedup', 'efficiency', 'read MB/s', 'write MB/s'))
+    for run in runs:
+        print('    {0:>6} {1:>8} {2:>10.1f} {3:>8.2f} {4:>10.2f} {5:>10} {6:>10}'.format(
+            run['ranks'], run['years'], run['wall_seconds'], run['speedup'], run['efficiency'],
+            _format_rate(run.get('read_mb_per_second')), _format_rate(run.get('write_mb_per_second'))))
+
+def _format_rate(rate):
+    if rate is None:
+        return '-'
+    return '{0:.1f}'.format(rate)
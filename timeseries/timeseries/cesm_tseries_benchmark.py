@@ -0,0 +1,183 @@
+#!/usr/bin/env python2
+"""Benchmark the scaling of the CESM time-series generation
+
+This script writes a synthetic short term archive on local disk following
+the Config/config_timeseries.xml stream layout, runs cesm_tseries_generator.py
+with mpirun at several rank counts and reports the strong and weak scaling
+and the per phase throughput recorded with the generator --metrics option.
+
+Strong scaling converts the same archive at every rank count. Weak scaling
+converts an archive with --years model years per --ranks[0] ranks, so the
+work grows with the number of ranks.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+import sys
+
+# check the system python version and require 2.7.x or greater
+if sys.hexversion < 0x02070000:
+    print(70 * '*')
+    print('ERROR: {0} requires python >= 2.7.x. '.format(sys.argv[0]))
+    print('It appears that you are running python {0}'.format(
+        '.'.join(str(x) for x in sys.version_info[0:3])))
+    print(70 * '*')
+    sys.exit(1)
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import time
+import traceback
+
+from timeseries import benchmarkLib, tseriesUtilsLib
+
+#=====================================================
+# commandline_options - parse any command line options
+#=====================================================
+def commandline_options():
+    """Process the command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description='cesm_tseries_benchmark: create a synthetic short term archive and measure the scaling of cesm_tseries_generator.')
+
+    parser.add_argument('--backtrace', action='store_true',
+                        help='show exception backtraces as extra debugging output')
+
+    parser.add_argument('--workdir', nargs=1, required=True,
+                        help='local directory for the synthetic archives, caseroots and results')
+
+    parser.add_argument('--config', nargs=1, required=False,
+                        default=[os.path.join(os.environ.get('POSTPROCESS_PATH', '.'), 'Config', 'config_timeseries.xml')],
+                        help='config_timeseries.xml stream layout, default is $POSTPROCESS_PATH/Config/config_timeseries.xml')
+
+    parser.add_argument('--streams', nargs=1, required=False, default=['cam.h0'],
+                        help='comma separated streams to generate, e.g. cam.h0,clm2.h0,pop.h.nday1. Default is cam.h0')
+
+    parser.add_argument('--ranks', nargs=1, required=False, default=['1,2,4'],
+                        help='comma separated mpirun rank counts. Default is 1,2,4')
+
+    parser.add_argument('--years', nargs=1, required=False, type=int, default=[2],
+                        help='model years of the strong scaling archive and per ranks[0] ranks of the weak scaling archives. Default is 2')
+
+    parser.add_argument('--nlat', nargs=1, required=False, type=int, default=[96], help='grid latitudes. Default is 96')
+    parser.add_argument('--nlon', nargs=1, required=False, type=int, default=[144], help='grid longitudes. Default is 144')
+    parser.add_argument('--nlev', nargs=1, required=False, type=int, default=[8], help='grid levels of the 3d variables. Default is 8')
+    parser.add_argument('--nvars', nargs=1, required=False, type=int, default=[20],
+                        help='time series variables per history file, alternating 2d and 3d. Default is 20')
+
+    parser.add_argument('--scaling', nargs=1, required=False, default=['strong,weak'],
+                        help='comma separated scaling studies to run, strong and/or weak. Default is strong,weak')
+
+    parser.add_argument('--mpirun', nargs=1, required=False, default=['mpirun'],
+                        help='MPI launcher, called as MPIRUN -n RANKS. Default is mpirun')
+
+    parser.add_argument('--generator', nargs=1, required=False,
+                        default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cesm_tseries_generator.py')],
+                        help='path to cesm_tseries_generator.py')
+
+    options = parser.parse_args()
+    return options
+
+#==============================================================================
+# run_generator - convert a synthetic archive on a number of ranks
+#==============================================================================
+def run_generator(options, caseroot, dout_s_root, ranks, years):
+    """ removes the output and the state of any earlier run, runs the generator
+         with mpirun and returns the benchmark run dictionary
+    """
+    for tseries_dir in glob.glob(os.path.join(dout_s_root, '*', 'proc')):
+        shutil.rmtree(tseries_dir)
+    for state_file in glob.glob(os.path.join(caseroot, '.tseries_*')):
+        os.remove(state_file)
+
+    metrics_file = os.path.join(caseroot, 'metrics.{0}.json'.format(ranks))
+    cmd = [options.mpirun[0], '-n', str(ranks), sys.executable, options.generator[0],
+           '--caseroot', caseroot, '--standalone', '--metrics', metrics_file]
+    print('cesm_tseries_benchmark: {0}'.format(' '.join(cmd)))
+
+    start = time.time()
+    with open(os.path.join(caseroot, 'generator.{0}.log'.format(ranks)), 'w') as log:
+        subprocess.check_call(cmd, stdout=log, stderr=subprocess.STDOUT)
+    run = {'ranks' : ranks, 'years' : years, 'wall_seconds' : time.time() - start}
+
+    run.update(benchmarkLib.summarize_metrics(tseriesUtilsLib.read_json(metrics_file, default=dict())))
+    return run
+
+#==============================================================================
+# prepare_case - write a synthetic archive and its standalone caseroot
+#==============================================================================
+def prepare_case(options, streams, casename, years):
+    """ writes the synthetic archive and the standalone postprocess caseroot of
+         casename and returns the caseroot and archive paths
+    """
+    workdir = os.path.abspath(options.workdir[0])
+    caseroot = os.path.join(workdir, casename, 'postprocess')
+    dout_s_root = os.path.join(workdir, casename, 'archive')
+
+    start = time.time()
+    nbytes = benchmarkLib.create_archive(dout_s_root, casename, streams, years, options.nlat[0], options.nlon[0],
+                                         options.nlev[0], options.nvars[0])
+    print('cesm_tseries_benchmark: {0} archive of {1} years, {2:.1f} MB ready in {3:.1f} seconds'.format(
+        casename, years, nbytes / 1.0e6, time.time() - start))
+
+    benchmarkLib.write_env_files(caseroot, options.config[0], casename, dout_s_root, streams)
+    return (caseroot, dout_s_root)
+
+#======
+# main
+#======
+
+def main(options):
+    """ runs the strong and weak scaling studies and writes the results to
+         $WORKDIR/scaling.json
+    """
+    streams = benchmarkLib.select_streams(benchmarkLib.read_layout(options.config[0]),
+                                          [key.strip() for key in options.streams[0].split(',')])
+    ranks_list = sorted(int(ranks) for ranks in options.ranks[0].split(','))
+    studies = [study.strip() for study in options.scaling[0].split(',')]
+    years = options.years[0]
+    results = dict()
+
+    if 'strong' in studies:
+        caseroot, dout_s_root = prepare_case(options, streams, 'tseries_bench_strong', years)
+        runs = [run_generator(options, caseroot, dout_s_root, ranks, years) for ranks in ranks_list]
+        results['strong'] = benchmarkLib.scaling(runs)
+        benchmarkLib.print_scaling('cesm_tseries_benchmark: strong scaling, {0} years'.format(years), results['strong'])
+
+    if 'weak' in studies:
+        runs = list()
+        for ranks in ranks_list:
+            weak_years = max(1, years * ranks // ranks_list[0])
+            caseroot, dout_s_root = prepare_case(options, streams, 'tseries_bench_weak_{0}'.format(ranks), weak_years)
+            runs.append(run_generator(options, caseroot, dout_s_root, ranks, weak_years))
+        results['weak'] = benchmarkLib.scaling(runs, weak=True)
+        benchmarkLib.print_scaling('cesm_tseries_benchmark: weak scaling, {0} years per {1} ranks'.format(years, ranks_list[0]),
+                                   results['weak'])
+
+    results_file = os.path.join(os.path.abspath(options.workdir[0]), 'scaling.json')
+    tseriesUtilsLib.write_json_atomic(results_file, {'streams' : [stream['key'] for stream in streams],
+                                                     'nlat' : options.nlat[0], 'nlon' : options.nlon[0],
+                                                     'nlev' : options.nlev[0], 'nvars' : options.nvars[0],
+                                                     'results' : results})
+    print('cesm_tseries_benchmark: wrote {0}'.format(results_file))
+
+    return 0
+
+#===================================
+
+if __name__ == "__main__":
+    options = commandline_options()
+    try:
+        status = main(options)
+        sys.exit(status)
+    except Exception as error:
+        print(str(error))
+        if options.backtrace:
+            traceback.print_exc()
+        sys.exit(1)
@@ -24,16 +24,21 @@ if sys.hexversion < 0x02070000:
     sys.exit(1)
 
 import argparse
+import copy
 import glob
 import os
 import pprint
+import shutil
 import re
 import string
+import tempfile
 import sys
+import time
 import traceback
 import xml.etree.ElementTree as ET
 
 from cesm_utils import cesmEnvLib
+from timeseries import archiveIndexLib, climoLib, decompressLib, journalLib, manifestLib, memoryLib, metricsLib, ncHeaderLib, planLib, nodeLib, quantizeLib, requiredVarsLib, scheduleLib, sidecarLib, stageLib, tseriesUtilsLib, tuneLib, validateLib, verifyLib, zarrStoreLib
 
 # import the MPI related module
 from asaptools import partition, simplecomm
@@ -41,6 +46,12 @@ from asaptools import partition, simplecomm
 # load the pyreshaper modules
 from pyreshaper import specification, reshaper
 
+# name of the short term archive index cache in the postprocess caseroot
+ARCHIVE_INDEX_CACHE = '.tseries_archive_index.json'
+
+# name of the validated history file time summaries cache in the postprocess caseroot
+VALIDATE_CACHE = '.tseries_validate_cache.json'
+
 #=====================================================
 # commandline_options - parse any command line options
 #=====================================================
@@ -56,37 +67,95 @@ def commandline_options():
     parser.add_argument('--debug', nargs=1, required=False, type=int, default=0,
                         help='debugging verbosity level output: 0 = none, 1 = minimum, 2 = maximum. 0 is default')
 
-    parser.add_argument('--caseroot', nargs=1, required=True, 
-                        help='fully quailfied path to case root directory')
+    parser.add_argument('--caseroot', nargs='+', required=False, default=list(),
+                        help='fully quailfied path to case root directory, or several case root directories converted in one job with a shared rank scheduler')
+
+    parser.add_argument('--ensemble', nargs=1, required=False, default=None,
+                        help='glob pattern of case root directories added to the --caseroot list, e.g. "/glade/scratch/b.e11.B20TRC5CNBDRD.f09_g16.0[0-9][0-9]/postprocess"')
 
     parser.add_argument('--standalone', action='store_true',
                         help='switch to indicate stand-alone post processing caseroot')
 
+    parser.add_argument('--incremental', action='store_true',
+                        help='only convert history files that are not yet recorded in the tseries_output_dir manifest, writing them as a new time series file segment')
+
+    parser.add_argument('--metrics', nargs=1, required=False, default=None,
+                        help='write per stream and per output variable throughput metrics to this file, as CSV if the name ends in .csv otherwise as JSON. The per variable phase seconds are the stream seconds apportioned by bytes read and the per variable wall_seconds is not measured.')
+
+    parser.add_argument('--scratch-dir', nargs=1, required=False, default=None,
+                        help='directory for the decompressed copies of gzipped (.nc.gz) history files, default is $DOUT_S_ROOT/tseries_scratch')
+
+    parser.add_argument('--scratch-budget', nargs=1, required=False, type=int, default=[decompressLib.SCRATCH_BUDGET_MB],
+                        help='total MB of decompressed history files held in the scratch directory by all the tasks, default is {0}'.format(decompressLib.SCRATCH_BUDGET_MB))
+
+    parser.add_argument('--stage-dir', nargs=1, required=False, default=None,
+                        help='node-local directory, e.g. $TMPDIR or a local SSD, where the history files of each specifier are staged ahead of their conversion, default is to read the archive directly')
+
+    parser.add_argument('--stage-budget', nargs=1, required=False, type=int, default=[stageLib.STAGE_BUDGET_MB],
+                        help='MB of staged history files held in the --stage-dir of each node, divided between the rank groups on the node, default is {0}'.format(stageLib.STAGE_BUDGET_MB))
+
+    parser.add_argument('--stage-threads', nargs=1, required=False, type=int, default=[stageLib.STAGE_THREADS],
+                        help='concurrent history file copies to the --stage-dir of each node, default is {0}'.format(stageLib.STAGE_THREADS))
+
+    parser.add_argument('--write-behind', nargs=1, required=False, default=None,
+                        help='node-local directory, e.g. $TMPDIR or a local SSD, where the netCDF output variable files are written and then moved to the tseries_output_dir in the background, default is to write the tseries_output_dir directly')
+
+    parser.add_argument('--write-behind-threads', nargs=1, required=False, type=int, default=[stageLib.FLUSH_THREADS],
+                        help='concurrent output file moves from the --write-behind directory of each node, default is {0}'.format(stageLib.FLUSH_THREADS))
+
+    parser.add_argument('--io-aggregators', nargs=1, required=False, type=int, default=None,
+                        help='I/O aggregator tasks per node and rank group that read all the history slices of the zarr stores and pass the records to the other tasks of their node, default is to read on every task. The pyReshaper specifiers are read by the one --stage-dir task of each node.')
+
+    parser.add_argument('--simulate-nodes', nargs=1, required=False, type=int, default=None,
+                        help='test the node-local staging, write-behind and I/O aggregation on one machine as nodes of this many consecutive ranks')
+
+    parser.add_argument('--climo', nargs=1, required=False, default=None,
+                        help='compute the comma separated climatology means ann, seasonal and/or monthly of each converted time series variable into a climo subdirectory of the tseries_output_dir. The netCDF time series files are read back in a post-pass after each specifier, the zarr stores accumulate the means from the history slices as they are read. The monthly sums are held in memory for the whole variable and are not bounded by --memory-budget')
+
+    parser.add_argument('--verify', action='store_true',
+                        help='check the record counts, time bounds and sampled record checksums of the converted time series files against the history files and write a tseries_verify.json pass/fail manifest in each tseries_output_dir')
+
+    parser.add_argument('--verify-samples', nargs=1, required=False, type=int, default=[verifyLib.SAMPLE_RECORDS],
+                        help='records per output file compared with the history files by --verify, default is {0}'.format(verifyLib.SAMPLE_RECORDS))
+
+    parser.add_argument('--memory-budget', nargs=1, required=False, type=int, default=None,
+                        help='per task memory budget in MB, the history variables are read in time or level sub-blocks that fit in the budget')
+
+    parser.add_argument('--skip-validation', action='store_true',
+                        help='skip the pre-flight check of the history file time records for missing, duplicate or truncated slices')
+
+    parser.add_argument('--tune', action='store_true',
+                        help='benchmark chunk shapes and deflate levels on a sample of each variable class of the netcdf4c streams and record the best settings in env_timeseries.xml without converting any files')
+
+    parser.add_argument('--plan', action='store_true',
+                        help='dry-run: report the output files, estimated bytes and wall time of each stream and recommend timeseries_pes without converting any files')
+
     options = parser.parse_args()
 
-    # check to make sure CASEROOT is a valid, readable directory
-    if not os.path.isdir(options.caseroot[0]):
-        err_msg = 'cesm_tseries_generator.py ERROR: invalid option --caseroot {0}'.format(options.caseroot[0])
+    # add the ensemble member case roots, a case given twice is only converted once
+    options.caseroot = tseriesUtilsLib.get_caseroots(options.caseroot, options.ensemble[0] if options.ensemble else None)
+    if len(options.caseroot) == 0:
+        err_msg = 'cesm_tseries_generator.py ERROR: no case root directories given with --caseroot or --ensemble'
         raise OSError(err_msg)
 
+    # check to make sure each CASEROOT is a valid, readable directory
+    for caseroot in options.caseroot:
+        if not os.path.isdir(caseroot):
+            err_msg = 'cesm_tseries_generator.py ERROR: invalid option --caseroot {0}'.format(caseroot)
+            raise OSError(err_msg)
+
     return options
 
-#==============================================================================================
-# readArchiveXML - read the $CASEROOT/env_timeseries.xml file and build the pyReshaper classes
-#==============================================================================================
-def readArchiveXML(caseroot, dout_s_root, casename, standalone, debug):
-    """ reads the $CASEROOT/env_timeseries.xml file and builds a fully defined list of 
-         reshaper specifications to be passed to the pyReshaper tool.
+#==============================================================================
+# get_env_timeseries - return the path to the $CASEROOT/env_timeseries.xml file
+#==============================================================================
+def get_env_timeseries(caseroot, standalone):
+    """ returns the path to the env_timeseries.xml file and checks that it exists
 
     Arguments:
     caseroot (string) - case root path
-    dout_s_root (string) - short term archive root path
-    casename (string) - casename
     standalone (boolean) - logical to indicate if postprocessing case is stand-alone or not
     """
-    specifiers = list()
-    xml_tree = ET.ElementTree()
-
     # get path to env_timeseries.xml file
     env_timeseries = '{0}/postprocess/env_timeseries.xml'.format(caseroot)
     if standalone:
@@ -96,99 +165,224 @@ def readArchiveXML(caseroot, dout_s_root, casename, standalone, debug):
     if ( not os.path.isfile(env_timeseries) ):
         err_msg = "cesm_tseries_generator.py ERROR: {0} does not exist.".format(env_timeseries)
         raise OSError(err_msg)
-    else:
-        # parse the xml
+
+    return env_timeseries
+
+#==============================================================================
+# scan_archive - list the short term archive history directories on all tasks
+#==============================================================================
+def scan_archive(caseroot, dout_s_root, casename, standalone, scomm):
+    """ lists the short term archive history directories of the env_timeseries.xml
+         streams that have tseries_create set. The directories are divided across
+         all the tasks and the listings are gathered into the archive index on the
+         manager task. Must be called on all tasks.
+
+    Arguments:
+    caseroot (string) - case root path
+    dout_s_root (string) - short term archive root path
+    casename (string) - casename
+    standalone (boolean) - logical to indicate if postprocessing case is stand-alone or not
+    scomm (object) - simplecomm object
+
+    Return:
+    archive_index (object) - archiveIndexLib.ArchiveIndex on the manager, None on other tasks
+    """
+    archive_index = None
+    work = list()
+
+    if scomm.is_manager():
+        env_timeseries = get_env_timeseries(caseroot, standalone)
+        xml_tree = ET.ElementTree()
         xml_tree.parse(env_timeseries)
 
-        # loop through all the comp_archive_spec elements to find the tseries related elements
+        # each history directory is listed once and cached alongside the env_timeseries.xml
+        archive_index = archiveIndexLib.ArchiveIndex(os.path.join(os.path.dirname(env_timeseries), ARCHIVE_INDEX_CACHE), casename)
+
+        hist_dirs = set()
         for comp_archive_spec in xml_tree.findall("components/comp_archive_spec"):
-            comp = comp_archive_spec.get("name")
             rootdir = comp_archive_spec.find("rootdir").text
-            multi_instance = comp_archive_spec.find("multi_instance").text
+            for file_spec in comp_archive_spec.findall("files/file_extension"):
+                tseries_create = file_spec.find("tseries_create")
+                if tseries_create is not None and tseries_create.text.upper() in ["T","TRUE"]:
+                    hist_dirs.add(os.path.normpath('/'.join( [dout_s_root,rootdir,file_spec.find("subdir").text] )))
 
-            # for now, set instance value to empty string implying only 1 instance
-            instance = ""
+        # send the cached entry along with each directory so the other tasks
+        # only list the directories that changed
+        work = [(hist_dir, archive_index.cached_dir(hist_dir)) for hist_dir in sorted(hist_dirs)]
 
-            # loop through all the files/file_spec elements
-            for file_spec in comp_archive_spec.findall("files/file_extension"):
-                file_extension = file_spec.get("suffix")
-                subdir = file_spec.find("subdir").text
-
-                # check if tseries_create is an element for this file_spec
-                if file_spec.find("tseries_create") is not None:
-                    tseries_create = file_spec.find("tseries_create").text
-
-                    # check if the tseries_create element is set to TRUE            
-                    if tseries_create.upper() in ["T","TRUE"]:
-
-                        # check if tseries_format is an element for this file_spec and if it is valid
-                        if file_spec.find("tseries_output_format") is not None:
-                            tseries_output_format = file_spec.find("tseries_output_format").text
-                            if tseries_output_format not in ["netcdf","netcdf4","netcdf4c"]:
-                                err_msg = "cesm_tseries_generator.py error: tseries_output_format invalid for data stream {0}.*.{1}".format(comp,file_extension)
-                                raise TypeError(err_msg)
-                        else:
-                            err_msg = "cesm_tseries_generator.py error: tseries_output_format undefined for data stream {0}.*.{1}".format(comp,file_extension)
-                            raise TypeError(err_msg)
+    local_work = scomm.partition(work, func=partition.EqualStride(), involved=True)
+    local_dirs = list()
+    for hist_dir, entry in local_work:
+        entry, rescanned = archiveIndexLib.refresh_dir(hist_dir, entry, casename)
+        local_dirs.append((hist_dir, entry, rescanned))
 
+    all_dirs = tseriesUtilsLib.gather(scomm, local_dirs)
+    if scomm.is_manager():
+        for task_dirs in all_dirs:
+            for hist_dir, entry, rescanned in task_dirs:
+                archive_index.set_dir(hist_dir, entry, rescanned)
 
-                        # check if the tseries_output_subdir is specified and create the tseries_output_dir
-                        if file_spec.find("tseries_output_subdir") is not None:
-                            tseries_output_subdir = file_spec.find("tseries_output_subdir").text
-                            tseries_output_dir = '/'.join( [dout_s_root, rootdir,tseries_output_subdir] )
-                            if not os.path.exists(tseries_output_dir):
-                                os.makedirs(tseries_output_dir)
-                        else:
-                            err_msg = "cesm_tseries_generator.py error: tseries_output_subdir undefined for data stream {0}.*.{1}".format(comp,file_extension)
-                            raise TypeError(err_msg)
+        # save any rescanned history directories for the next run
+        archive_index.save()
 
-                        # check if tseries_tper is specified and is valid 
-                        if file_spec.find("tseries_tper") is not None:
-                            tseries_tper = file_spec.find("tseries_tper").text
-                            if tseries_tper not in ["annual","yearly","monthly","weekly","daily","hourly6","hourly3","hourly1","min30"]:
-                                err_msg = "cesm_tseries_generator.py error: tseries_tper invalid for data stream {0}.*.{1}".format(comp,file_extension)
-                                raise TypeError(err_msg)
-                        else:
-                            err_msg = "cesm_tseries_generator.py error: tseries_tper undefined for data stream {0}.*.{1}".format(comp,file_extension)
-                            raise TypeError(err_msg)
+    return archive_index
 
-                        # load the tseries_time_variant_variables into a list
-                        if comp_archive_spec.find("tseries_time_variant_variables") is not None:
-                            variable_list = list()
-                            for variable in comp_archive_spec.findall("tseries_time_variant_variables/variable"):
-                                variable_list.append(variable.text)
-
-                        # get a list of all the input files for this stream from the archive location
-                        history_files = list()
-                        in_file_path = '/'.join( [dout_s_root,rootdir,subdir] )                        
-                        all_in_files = os.listdir(in_file_path)
-
-                        # check that there are actually a list of history files to work with
-                        for in_file in all_in_files:
-                            if re.search(file_extension, in_file):
-                                # check to make sure this file ends in .nc and not something else
-                                if in_file.endswith('.nc'):
-                                    history_files.append(in_file_path+"/"+in_file)
-                                else:
-                                    print('cesm_tseries_generator.py WARNING - unable to operate on file {0}/{1}'.format(in_file_path,in_file))
+#==============================================================================================
+# readArchiveXML - read the $CASEROOT/env_timeseries.xml file and build the pyReshaper classes
+#==============================================================================================
+def readArchiveXML(caseroot, dout_s_root, casename, standalone, debug, archive_index, incremental=False, dry_run=False, pp_env=None):
+    """ reads the $CASEROOT/env_timeseries.xml file and builds a fully defined list of 
+         reshaper specifications to be passed to the pyReshaper tool.
+
+    Arguments:
+    caseroot (string) - case root path
+    dout_s_root (string) - short term archive root path
+    casename (string) - casename
+    standalone (boolean) - logical to indicate if postprocessing case is stand-alone or not
+    archive_index (object) - archiveIndexLib.ArchiveIndex returned by scan_archive
+    incremental (boolean) - only include history files not yet recorded in the tseries manifest
+    dry_run (boolean) - do not create the tseries_output_dir directories
+    pp_env (dictionary) - env_postprocess.xml entries enabling the required variables consumers
+
+    Return:
+    tseries_streams (list) - list of dictionaries, one per tseries_filecat_years chunk of
+                             each history stream, with keys
+                             spec (the pyReshaper specification object), stream_key, comp,
+                             instance, file_extension, tseries_output_dir, tseries_tper, output_format,
+                             metadata_sidecar, tuning, quantize,
+                             required_variables, header_file and input_bytes
+    """
+    tseries_streams = list()
+    if pp_env is None:
+        pp_env = dict()
+    postprocess_path = pp_env.get('POSTPROCESS_PATH', os.environ.get('POSTPROCESS_PATH', ''))
+    xml_tree = ET.ElementTree()
+
+    # get path to env_timeseries.xml file
+    env_timeseries = get_env_timeseries(caseroot, standalone)
+
+    # parse the xml
+    xml_tree.parse(env_timeseries)
+
+    # loop through all the comp_archive_spec elements to find the tseries related elements
+    for comp_archive_spec in xml_tree.findall("components/comp_archive_spec"):
+        comp = comp_archive_spec.get("name")
+        rootdir = comp_archive_spec.find("rootdir").text
+
+        # the history files of each instance of a multi-instance component are separate streams
+        multi_instance = False
+        if comp_archive_spec.find("multi_instance") is not None:
+            multi_instance = comp_archive_spec.find("multi_instance").text.strip().upper() in ["Y","YES","T","TRUE"]
+
+        # only convert the variables needed by the enabled downstream consumers if the
+        # required variables mode is set for this component
+        required_variables, consumers = requiredVarsLib.read_required(comp_archive_spec, pp_env, postprocess_path)
+        if required_variables is not None:
+            print('cesm_tseries_generator.py: converting {0} required variables of {1} for consumers {2}'.format(
+                len(required_variables), comp, ', '.join(consumers) or 'none'))
+
+        # loop through all the files/file_spec elements
+        for file_spec in comp_archive_spec.findall("files/file_extension"):
+            file_extension = file_spec.get("suffix")
+            subdir = file_spec.find("subdir").text
+
+            # check if tseries_create is an element for this file_spec
+            if file_spec.find("tseries_create") is not None:
+                tseries_create = file_spec.find("tseries_create").text
+
+                # check if the tseries_create element is set to TRUE            
+                if tseries_create.upper() in ["T","TRUE"]:
+
+                    # check if tseries_format is an element for this file_spec and if it is valid
+                    if file_spec.find("tseries_output_format") is not None:
+                        tseries_output_format = file_spec.find("tseries_output_format").text
+                        if tseries_output_format not in ["netcdf","netcdf4","netcdf4c","zarr"]:
+                            err_msg = "cesm_tseries_generator.py error: tseries_output_format invalid for data stream {0}.*.{1}".format(comp,file_extension)
+                            raise TypeError(err_msg)
+                    else:
+                        err_msg = "cesm_tseries_generator.py error: tseries_output_format undefined for data stream {0}.*.{1}".format(comp,file_extension)
+                        raise TypeError(err_msg)
+
+
+                    # check if the tseries_output_subdir is specified and create the tseries_output_dir
+                    if file_spec.find("tseries_output_subdir") is not None:
+                        tseries_output_subdir = file_spec.find("tseries_output_subdir").text
+                        tseries_output_dir = '/'.join( [dout_s_root, rootdir,tseries_output_subdir] )
+                        if not dry_run and not os.path.exists(tseries_output_dir):
+                            os.makedirs(tseries_output_dir)
+                    else:
+                        err_msg = "cesm_tseries_generator.py error: tseries_output_subdir undefined for data stream {0}.*.{1}".format(comp,file_extension)
+                        raise TypeError(err_msg)
+
+                    # check if tseries_tper is specified and is valid 
+                    if file_spec.find("tseries_tper") is not None:
+                        tseries_tper = file_spec.find("tseries_tper").text
+                        if tseries_tper not in ["annual","yearly","monthly","weekly","daily","hourly6","hourly3","hourly1","min30"]:
+                            err_msg = "cesm_tseries_generator.py error: tseries_tper invalid for data stream {0}.*.{1}".format(comp,file_extension)
+                            raise TypeError(err_msg)
+                    else:
+                        err_msg = "cesm_tseries_generator.py error: tseries_tper undefined for data stream {0}.*.{1}".format(comp,file_extension)
+                        raise TypeError(err_msg)
+
+                    # restrict the stream to a window of model years, the stream settings
+                    # override the env_postprocess.xml TIMESERIES_START_YEAR and TIMESERIES_STOP_YEAR
+                    start_year = tseriesUtilsLib.parse_year(pp_env.get('TIMESERIES_START_YEAR'))
+                    stop_year = tseriesUtilsLib.parse_year(pp_env.get('TIMESERIES_STOP_YEAR'))
+                    if file_spec.find("tseries_start_year") is not None:
+                        start_year = tseriesUtilsLib.parse_year(file_spec.find("tseries_start_year").text)
+                    if file_spec.find("tseries_stop_year") is not None:
+                        stop_year = tseriesUtilsLib.parse_year(file_spec.find("tseries_stop_year").text)
+                    if start_year is not None and stop_year is not None and start_year > stop_year:
+                        err_msg = "cesm_tseries_generator.py error: tseries_start_year {0} is after tseries_stop_year {1} for data stream {2}.*.{3}".format(start_year,stop_year,comp,file_extension)
+                        raise TypeError(err_msg)
+
+                    # write the time-invariant metadata once per specifier to a sidecar file
+                    metadata_sidecar = False
+                    if file_spec.find("tseries_metadata_sidecar") is not None:
+                        metadata_sidecar = file_spec.find("tseries_metadata_sidecar").text.upper() in ["T","TRUE"]
+
+                    # load the tseries_time_variant_variables into a list
+                    if comp_archive_spec.find("tseries_time_variant_variables") is not None:
+                        variable_list = list()
+                        for variable in comp_archive_spec.findall("tseries_time_variant_variables/variable"):
+                            variable_list.append(variable.text)
+
+                    # get a list of all the input files for this stream from the cached archive index
+                    # grouped by the instance number of multi-instance components, e.g. clm2_0001
+                    history_records = list()
+                    in_file_path = '/'.join( [dout_s_root,rootdir,subdir] )                        
+                    suffix_re = re.compile(file_extension)
+
+                    # check that there are actually a list of history files to work with
+                    file_sizes = dict()
+                    for record in archive_index.scan(in_file_path):
+                        in_file = record['name']
+                        if suffix_re.search(in_file):
+                            # check to make sure this file ends in .nc or .nc.gz and not something else
+                            if in_file.endswith(('.nc', '.nc.gz')):
+                                history_records.append(record)
+                                file_sizes[in_file_path+"/"+in_file] = record['size']
+                            else:
+                                print('cesm_tseries_generator.py WARNING - unable to operate on file {0}/{1}'.format(in_file_path,in_file))
+
+                    # each instance of a multi-instance component is converted as a separate stream
+                    instance_files = archiveIndexLib.group_instances(history_records, multi_instance)
+                    for instance in sorted(instance_files):
+                        history_files = tseriesUtilsLib.filter_years([in_file_path+"/"+in_file for in_file in instance_files[instance]],
+                                                                     start_year, stop_year)
+                        if len(history_files) == 0:
+                            print('cesm_tseries_generator.py: no history files of {0}.*.{1} {2} in model years {3} to {4}'.format(
+                                comp, file_extension, instance, start_year, stop_year))
 
                         # sort the list of input history files in order to get the output suffix 
                         # from the first and last file
                         if len(history_files) > 0:
                             history_files.sort()
 
-                            start_file = history_files[0]
-                            start_file_parts = list()
-                            start_file_parts = start_file.split( "." )
-                            start_file_time = start_file_parts[-2]
-
-                            last_file = history_files[-1]
                             last_file_parts = list()
-                            last_file_parts = last_file.split( "." )
-                            last_file_time = last_file_parts[-2]
+                            last_file_parts = decompressLib.uncompressed_name(history_files[-1]).split( "." )
 
-                            # get the actual component name from the history file 
-                            # will also need to deal with the instance numbers based on the comp_name
+                            # get the actual component name, including any instance number, from the history file
                             comp_name = last_file_parts[-4]
                             stream = last_file_parts[-3]
 
@@ -198,66 +392,1152 @@ def readArchiveXML(caseroot, dout_s_root, casename, standalone, debug):
                                 stream = last_file_parts[-4]+"."+last_file_parts[-3]
 
                             # create the tseries output prefix needs to end with a "."
-                            tseries_output_prefix = tseries_output_dir+"/"+casename+"."+comp_name+"."+stream+"."
-
-                            # format the time series variable output suffix based on the 
-                            # tseries_tper setting suffix needs to start with a "."
-                            if tseries_tper == "yearly":
-                                tseries_output_suffix = "."+start_file_time+"-"+last_file_time+".nc"
-                            elif tseries_tper == "monthly":
-                                start_time_parts = start_file_time.split( "-" )
-                                last_time_parts = last_file_time.split( "-" )
-                                tseries_output_suffix = "."+start_time_parts[0]+start_time_parts[1]+"-"+last_time_parts[0]+last_time_parts[1]+".nc"
-                            elif tseries_tper in ["weekly","daily","hourly6","hourly3","hourly1","min30"]:
-                                start_time_parts = start_file_time.split( "-" )
-                                last_time_parts = last_file_time.split( "-" )
-                                tseries_output_suffix = "."+start_time_parts[0]+start_time_parts[1]+start_time_parts[2]+"-"+last_time_parts[0]+last_time_parts[1]+last_time_parts[2]+".nc"
-
-                            # get a reshpaer specification object
-                            spec = specification.create_specifier()
-
-                            # populate the spec object with data for this history stream
-                            spec.input_file_list = history_files
-                            spec.netcdf_format = tseries_output_format
-                            spec.output_file_prefix = tseries_output_prefix
-                            spec.output_file_suffix = tseries_output_suffix
-                            spec.time_variant_metadata = variable_list
-
-                            # print the specifier
-                            if debug:
-                                dbg = list()
-                                pp = pprint.PrettyPrinter(indent=5)
-                                dbg = [comp_name, spec.input_file_list, spec.netcdf_format, spec.output_file_prefix, spec.output_file_suffix, spec.time_variant_metadata]
-                                pp.pprint(dbg)
-                            
-                            # append this spec to the list of specifiers
-                            specifiers.append(spec)
-
-    return specifiers
+                            stream_key = casename+"."+comp_name+"."+stream
+                            tseries_output_prefix = tseries_output_dir+"/"+stream_key+"."
+
+                            # chunk boundaries are aligned on the first year of the stream or of the year window
+                            first_year = tseriesUtilsLib.get_file_year(history_files[0])
+                            if start_year is not None:
+                                first_year = start_year
+
+                            # in incremental mode only convert the history files that are not
+                            # already recorded in the tseries_output_dir manifest
+                            if incremental:
+                                manifest = manifestLib.read_manifest(tseries_output_dir)
+                                done_files = manifestLib.converted_files(manifest, stream_key)
+                                if len(done_files) > 0 and start_year is None:
+                                    first_year = min(first_year, min(tseriesUtilsLib.get_file_year(f) for f in done_files))
+                                history_files = [f for f in history_files if os.path.basename(f) not in done_files]
+                                if len(history_files) == 0:
+                                    print('cesm_tseries_generator.py: no new history files for {0}'.format(stream_key))
+                                    continue
+
+                            # probe an uncompressed history file header when there is one
+                            header_file = history_files[0]
+                            uncompressed_files = [f for f in history_files if not decompressLib.is_compressed(f)]
+                            if len(uncompressed_files) > 0:
+                                header_file = uncompressed_files[0]
+
+                            # split the stream into tseries_filecat_years chunks, one specifier per chunk
+                            filecat_years = 0
+                            if file_spec.find("tseries_filecat_years") is not None:
+                                filecat_years = int(file_spec.find("tseries_filecat_years").text)
+
+                            for chunk_files in tseriesUtilsLib.chunk_history_files(history_files, filecat_years, first_year):
+
+                                # format the time series variable output suffix based on the 
+                                # tseries_tper setting suffix needs to start with a "."
+                                tseries_output_suffix = tseriesUtilsLib.get_tseries_suffix(tseries_tper,
+                                                                                           tseriesUtilsLib.get_file_time(chunk_files[0]),
+                                                                                           tseriesUtilsLib.get_file_time(chunk_files[-1]))
+
+                                # get a reshpaer specification object
+                                spec = specification.create_specifier()
+
+                                # populate the spec object with data for this history stream chunk
+                                spec.input_file_list = chunk_files
+                                spec.netcdf_format = tseries_output_format
+                                if tseries_output_format == "zarr":
+                                    # the chunked directory stores are not written by pyReshaper
+                                    spec.netcdf_format = "netcdf4"
+                                spec.output_file_prefix = tseries_output_prefix
+                                spec.output_file_suffix = tseries_output_suffix
+                                spec.time_variant_metadata = variable_list
+
+                                # print the specifier
+                                if debug:
+                                    dbg = list()
+                                    pp = pprint.PrettyPrinter(indent=5)
+                                    dbg = [comp_name, spec.input_file_list, spec.netcdf_format, spec.output_file_prefix, spec.output_file_suffix, spec.time_variant_metadata]
+                                    pp.pprint(dbg)
+
+                                # append this spec to the list of streams, the header_file is
+                                # probed later to estimate the conversion cost
+                                tseries_streams.append({'spec' : spec,
+                                                        'stream_key' : stream_key,
+                                                        'comp' : comp,
+                                                        'instance' : instance,
+                                                        'file_extension' : file_extension,
+                                                        'tseries_output_dir' : tseries_output_dir,
+                                                        'tseries_tper' : tseries_tper,
+                                                        'output_format' : tseries_output_format,
+                                                        'metadata_sidecar' : metadata_sidecar,
+                                                        'tuning' : tuneLib.read_tuning(file_spec),
+                                                        'quantize' : quantizeLib.read_quantize(file_spec),
+                                                        'required_variables' : required_variables,
+                                                        'header_file' : header_file,
+                                                        'input_bytes' : sum(file_sizes[f] for f in chunk_files)})
+
+    return tseries_streams
+
+#==========================================================================
+# refresh_time_entries - read the time summaries of history files
+#==========================================================================
+def validate_decompressed(tseries_stream, spec, group_comm):
+    """ reads the time coordinate of the decompressed gzipped history files of a
+         specifier, divided across the group tasks, and checks the specifier with
+         them and the time_entries of the pre-flight validation, from the end of the
+         previous_segment of an incremental stream. Must be called on all the group
+         tasks once the decompression of the specifier has finished.
 
-#======
-# main
-#======
+    Arguments:
+    tseries_stream (dictionary) - stream dictionary after validate_streams
+    spec (object) - pyReshaper specifier reading the decompressed files
+    group_comm (object) - simplecomm object of the rank group
 
-def main(options, scomm, rank, size):
+    Return:
+    problems (list) - problem descriptions of the specifier, on all the group tasks
+    """
+    history_files = tseries_stream['spec'].input_file_list
+    compressed = [(history_file, input_file) for history_file, input_file in zip(history_files, spec.input_file_list)
+                  if decompressLib.is_compressed(history_file)]
+    local_entries = [(history_file, validateLib.refresh_file(input_file, None)[0])
+                     for history_file, input_file in compressed[group_comm.get_rank()::group_comm.get_size()]]
+    all_entries = tseriesUtilsLib.gather(group_comm, local_entries)
+
+    problems = list()
+    if group_comm.is_manager():
+        entries = dict(tseries_stream['time_entries'])
+        for task_entries in all_entries:
+            entries.update(task_entries)
+        for problem in validateLib.check_stream(tseries_stream['tseries_tper'], history_files, entries,
+                                                tseries_stream.get('previous_segment')):
+            problems.append('{0}: {1}'.format(get_stream_name(tseries_stream), problem))
+    return group_comm.partition(problems, func=partition.Duplicate(), involved=True)
+
+#==========================================================================
+def refresh_time_entries(caseroot, standalone, history_files, scomm):
+    """ reads the time coordinate summary of the history files, divided across all
+         the tasks, reusing the entries cached alongside the env_timeseries.xml for
+         the files that did not change. Must be called on all tasks.
+
+    Arguments:
+    caseroot (string) - case root path
+    standalone (boolean) - logical to indicate if postprocessing case is stand-alone or not
+    history_files (list) - history file names on the manager
+    scomm (object) - simplecomm object
+
+    Return:
+    entries (dictionary) - history file name to validateLib.refresh_file entry on the
+                           manager, None on the other tasks
+    """
+    cache = None
+    work = list()
+    if scomm.is_manager():
+        env_timeseries = get_env_timeseries(caseroot, standalone)
+        cache = validateLib.ValidationCache(os.path.join(os.path.dirname(env_timeseries), VALIDATE_CACHE))
+        work = [(history_file, cache.cached_file(history_file)) for history_file in sorted(set(history_files))]
+
+    local_work = scomm.partition(work, func=partition.EqualStride(), involved=True)
+    local_entries = list()
+    for history_file, entry in local_work:
+        entry, reread = validateLib.refresh_file(history_file, entry)
+        local_entries.append((history_file, entry, reread))
+
+    all_entries = tseriesUtilsLib.gather(scomm, local_entries)
+    entries = None
+    if scomm.is_manager():
+        entries = dict()
+        for task_entries in all_entries:
+            for history_file, entry, reread in task_entries:
+                cache.set_file(history_file, entry, reread)
+                entries[history_file] = entry
+        cache.save()
+
+    return entries
+
+#==========================================================================
+# validate_streams - check the history file time records of every stream
+#==========================================================================
+def validate_streams(caseroot, standalone, tseries_streams, scomm, incremental=False):
+    """ reads the time coordinate of every history file of the streams, divided
+         across all the tasks, and checks each stream for unreadable or truncated
+         files and for missing or duplicate time slices. In incremental runs the
+         first new file of a stream must continue the last segment of the manifest.
+         The time summaries are cached alongside the env_timeseries.xml and kept in
+         the time_entries of the stream dictionaries, with the previous_segment of the
+         first specifier of an incremental stream, for validate_decompressed. Must be
+         called on all tasks.
+
+    Arguments:
+    caseroot (string) - case root path
+    standalone (boolean) - logical to indicate if postprocessing case is stand-alone or not
+    tseries_streams (list) - stream dictionaries returned by readArchiveXML on the manager
+    scomm (object) - simplecomm object
+    incremental (boolean) - True if only the history files not in the manifests are converted
+
+    Return:
+    problems (list) - problem descriptions from all the streams, on all tasks
+    """
+    history_files = [f for tseries_stream in tseries_streams for f in tseries_stream['spec'].input_file_list]
+    entries = refresh_time_entries(caseroot, standalone, history_files, scomm)
+    problems = list()
+    if scomm.is_manager():
+        # the chunks of a stream are checked together so the chunk boundaries are covered
+        stream_files = dict()
+        stream_tper = dict()
+        stream_dir = dict()
+        for tseries_stream in tseries_streams:
+            stream_files.setdefault(tseries_stream['stream_key'], list()).extend(tseries_stream['spec'].input_file_list)
+            stream_tper[tseries_stream['stream_key']] = tseries_stream['tseries_tper']
+            stream_dir[tseries_stream['stream_key']] = tseries_stream['tseries_output_dir']
+            tseries_stream['time_entries'] = dict((f, entries[f]) for f in tseries_stream['spec'].input_file_list)
+
+        manifests = dict()
+        for stream_key in sorted(stream_files):
+            # an incremental stream continues from the end of its last converted segment
+            previous = None
+            if incremental and len(stream_files[stream_key]) > 0:
+                if stream_dir[stream_key] not in manifests:
+                    manifests[stream_dir[stream_key]] = manifestLib.read_manifest(stream_dir[stream_key])
+                end = manifestLib.segment_end(manifests[stream_dir[stream_key]], stream_key)
+                if end is not None:
+                    previous = ('the converted segment {0}'.format(end[0]), end[1])
+                    for tseries_stream in tseries_streams:
+                        if stream_files[stream_key][0] in tseries_stream['spec'].input_file_list:
+                            tseries_stream['previous_segment'] = previous
+
+            for problem in validateLib.check_stream(stream_tper[stream_key], stream_files[stream_key], entries, previous):
+                problems.append('{0}: {1}'.format(stream_key, problem))
+
+    # every task needs the result to stop together
+    problems = scomm.partition(problems, func=partition.Duplicate(), involved=True)
+    return problems
+
+#==========================================================================
+# probe_streams - read history file headers to estimate the stream costs
+#==========================================================================
+def probe_streams(tseries_streams, scratch_dir, scomm):
+    """ reads the header of one history file per stream and sets the variables, var_classes,
+         var_dims, dimensions, time_dim, nvars, nslices and cost keys of each stream dictionary
+         used by the rank scheduler. variables maps each time series variable name to its record
+         size in bytes, var_classes to its tuneLib variable class and var_dims to its dimension names. In the required variables mode the variables
+         are restricted to the required ones and streams without any are removed from the list.
+         The header reads are divided across all the tasks and gathered on the manager.
+         Must be called on all tasks.
+
+    Arguments:
+    tseries_streams (list) - stream dictionaries returned by readArchiveXML on the manager
+    scratch_dir (string) - directory for decompressing gzipped header files
+    scomm (object) - simplecomm object
+    """
+    work = list()
+    if scomm.is_manager():
+        work = sorted(set((tseries_stream['header_file'], tuple(tseries_stream['spec'].time_variant_metadata))
+                          for tseries_stream in tseries_streams))
+
+    local_work = scomm.partition(work, func=partition.EqualStride(), involved=True)
+    local_headers = dict()
+    for header_file, exclude in local_work:
+        try:
+            with decompressLib.decompressed(header_file, scratch_dir) as filename:
+                header = ncHeaderLib.read_header(filename)
+            names = ncHeaderLib.time_variant_variables(header, exclude)
+            variables = dict((name, ncHeaderLib.record_bytes(header, name)) for name in names)
+            var_classes = dict((name, tuneLib.get_var_class(header['variables'][name]['dimensions'], header['unlimited']))
+                               for name in names)
+            var_dims = dict((name, header['variables'][name]['dimensions']) for name in names)
+            local_headers[(header_file, exclude)] = (variables, var_classes, header['dimensions'].get(header['unlimited'], 1),
+                                                     var_dims, header['dimensions'], header['unlimited'])
+        except Exception as error:
+            print('cesm_tseries_generator.py WARNING - unable to read header of {0}: {1}'.format(header_file, error))
+            local_headers[(header_file, exclude)] = (dict(), dict(), 1, dict(), dict(), None)
+
+    all_headers = tseriesUtilsLib.gather(scomm, local_headers)
+    if scomm.is_manager():
+        headers = dict()
+        for task_headers in all_headers:
+            headers.update(task_headers)
+
+        reported = set()
+        probed_streams = list()
+        for tseries_stream in tseries_streams:
+            spec = tseries_stream['spec']
+            variables, var_classes, ntime, var_dims, dimensions, time_dim = headers[(tseries_stream['header_file'],
+                                                                                      tuple(spec.time_variant_metadata))]
+
+            # restrict the specifier to the required variables found in the stream
+            required = tseries_stream.get('required_variables')
+            if required is not None and len(variables) > 0:
+                selected, missing = requiredVarsLib.subset_variables(variables, required)
+                stream_key = tseries_stream['stream_key']
+                if stream_key not in reported:
+                    reported.add(stream_key)
+                    print('cesm_tseries_generator.py: {0} converting {1} of {2} variables, {3} required variables not in the stream'.format(
+                        stream_key, len(selected), len(variables), len(missing)))
+                if len(selected) == 0:
+                    continue
+                if requiredVarsLib.set_time_series(spec, selected):
+                    variables = selected
+                else:
+                    print('cesm_tseries_generator.py WARNING - the installed pyReshaper cannot subset variables, converting all of {0}'.format(stream_key))
+            probed_streams.append(tseries_stream)
+
+            tseries_stream['variables'] = variables
+            tseries_stream['var_classes'] = var_classes
+            tseries_stream['var_dims'] = var_dims
+            tseries_stream['dimensions'] = dimensions
+            tseries_stream['time_dim'] = time_dim
+            tseries_stream['nvars'] = len(variables)
+            tseries_stream['nslices'] = ntime * len(spec.input_file_list)
+            tseries_stream['cost'] = scheduleLib.estimate_cost(tseries_stream['input_bytes'], tseries_stream['nvars'], tseries_stream['nslices'])
+
+        # streams with none of the required variables are not converted
+        tseries_streams[:] = probed_streams
+
+#==========================================================================
+# tune_streams - benchmark the chunking and deflate settings of the streams
+#==========================================================================
+def tune_streams(caseroot, standalone, tseries_streams, scratch_dir, scomm):
+    """ benchmarks the candidate chunk shapes and deflate levels on a sample of each
+         variable class of every netcdf4c stream and records the best settings in the
+         env_timeseries.xml. The streams are divided across all the tasks. Must be
+         called on all tasks.
+
+    Arguments:
+    caseroot (string) - case root path
+    standalone (boolean) - logical to indicate if postprocessing case is stand-alone or not
+    tseries_streams (list) - stream dictionaries returned by readArchiveXML on the manager
+    scratch_dir (string) - directory for the benchmark files
+    scomm (object) - simplecomm object
+    """
+    work = list()
+    if scomm.is_manager():
+        # tune each stream once on the files of its first chunk
+        seen = set()
+        for tseries_stream in tseries_streams:
+            key = (tseries_stream['comp'], tseries_stream['file_extension'])
+            if tseries_stream['spec'].netcdf_format == 'netcdf4c' and key not in seen:
+                seen.add(key)
+                work.append((key, tseries_stream['stream_key'], tseries_stream['spec'].input_file_list,
+                             tseries_stream['spec'].time_variant_metadata))
+
+    local_work = scomm.partition(work, func=partition.EqualStride(), involved=True)
+    local_tuning = list()
+    for key, stream_key, history_files, exclude in local_work:
+        try:
+            decompressLib.make_scratch_dir(scratch_dir)
+            tmpdir = tempfile.mkdtemp(dir=scratch_dir)
+            try:
+                with decompressLib.decompressed(history_files[0], scratch_dir) as filename:
+                    files = [filename] + [f for f in history_files[1:] if not decompressLib.is_compressed(f)]
+                    local_tuning.append((key, stream_key, tuneLib.tune_stream(files, exclude, tmpdir)))
+            finally:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+        except Exception as error:
+            print('cesm_tseries_generator.py WARNING - unable to tune {0}: {1}'.format(stream_key, error))
+
+    all_tuning = tseriesUtilsLib.gather(scomm, local_tuning)
+    if scomm.is_manager():
+        tuning = dict()
+        for task_tuning in all_tuning:
+            for key, stream_key, stream_tuning in task_tuning:
+                tuning[key] = stream_tuning
+                for cls in sorted(stream_tuning):
+                    best = stream_tuning[cls]
+                    print('cesm_tseries_generator: {0} {1} ({2}): chunking {3} deflate {4}, write {5:.3f}s, read {6:.3f}s, '
+                          'compression ratio {7:.2f}'.format(stream_key, cls, best['variable'], best['chunking'], best['deflate'],
+                                                             best['write_seconds'], best['read_seconds'],
+                                                             float(best['sample_bytes']) / max(best['bytes'], 1)))
+
+        if len(tuning) > 0:
+            env_timeseries = get_env_timeseries(caseroot, standalone)
+            tuneLib.write_tuning(env_timeseries, tuning)
+            print('cesm_tseries_generator: recorded tuned settings for {0} streams in {1}'.format(len(tuning), env_timeseries))
+
+#==========================================================================
+# apply_tuning - set the tuned compression of each stream specifier
+#==========================================================================
+def apply_tuning(tseries_streams):
+    """ sets the deflate level and output chunk sizes recorded by --tune on the netcdf4c
+         stream specifiers. pyReshaper applies one setting to every variable of a specifier
+         so the setting of the variable class with the most bytes per record is used. The
+         chunk sizes are kept in the wchunks key of the stream dictionary.
+
+    Arguments:
+    tseries_streams (list) - stream dictionaries after probe_streams
+    """
+    for tseries_stream in tseries_streams:
+        spec = tseries_stream['spec']
+        tuning = tseries_stream['tuning']
+        if spec.netcdf_format != 'netcdf4c' or len(tuning) == 0:
+            continue
+
+        settings = tuning.get(tuneLib.dominant_class(tseries_stream['variables'], tseries_stream['var_classes']))
+        if settings is not None:
+            if hasattr(spec, 'compression_level'):
+                spec.compression_level = settings['deflate']
+            tseries_stream['wchunks'] = settings['chunks']
+
+#==========================================================================
+# apply_quantization - set the precision trimming of each stream specifier
+#==========================================================================
+def apply_quantization(tseries_streams):
+    """ sets the least_significant_digit of the stream specifiers from their tseries_quantize
+         settings. pyReshaper applies one setting per specifier so a specifier whose variables
+         have different settings is split into one specifier per setting converting a subset
+         of the variables, with the input bytes divided by the variable bytes. Every split
+         reads all the history slices, so its estimated cost also counts the bytes of the
+         other variables read again. The splits are named with a quantizeLib.split_name suffix. Only the first split writes the
+         metadata sidecar, the files of the others repeat the time-invariant metadata.
+         Runs on the manager task.
+
+    Arguments:
+    tseries_streams (list) - stream dictionaries after probe_streams
+    """
+    quantized = list()
+    for tseries_stream in tseries_streams:
+        quantize = tseries_stream.get('quantize')
+        variables = tseries_stream['variables']
+        spec = tseries_stream['spec']
+        if not quantize or len(variables) == 0:
+            quantized.append(tseries_stream)
+            continue
+
+        groups = quantizeLib.group_variables(quantize, variables)
+        if len(groups) > 1 and not hasattr(spec, 'time_series'):
+            print('cesm_tseries_generator.py WARNING - the installed pyReshaper cannot subset variables, {0} uses the stream least_significant_digit for every variable'.format(
+                get_stream_name(tseries_stream)))
+            groups = [(quantize['default'], sorted(variables))]
+        if len(groups) > 1 and tseries_stream.get('metadata_sidecar'):
+            print('cesm_tseries_generator.py WARNING - {0} is split by least_significant_digit, only the {1} variable files reference the metadata sidecar'.format(
+                get_stream_name(tseries_stream), quantizeLib.split_name(groups[0][0])))
+
+        total_bytes = max(1, sum(variables.values()))
+        for n, (digits, names) in enumerate(groups):
+            split = tseries_stream
+            if len(groups) > 1:
+                split = dict(tseries_stream)
+                split['spec'] = copy.copy(spec)
+                requiredVarsLib.set_time_series(split['spec'], names)
+                split['variables'] = dict((name, variables[name]) for name in names)
+                split['nvars'] = len(names)
+                split['input_bytes'] = tseries_stream['input_bytes'] * sum(split['variables'].values()) // total_bytes
+                split['split_bytes'] = tseries_stream['input_bytes'] - split['input_bytes']
+                split['cost'] = scheduleLib.estimate_cost(split['input_bytes'], split['nvars'], split['nslices'],
+                                                          split['split_bytes'])
+                split['metadata_sidecar'] = tseries_stream.get('metadata_sidecar', False) and n == 0
+                split['split_name'] = quantizeLib.split_name(digits)
+
+            split['least_significant_digit'] = digits
+            if (digits is not None and split.get('output_format') != 'zarr' and
+                not quantizeLib.set_digits(split['spec'], digits)):
+                print('cesm_tseries_generator.py WARNING - the installed pyReshaper cannot trim the precision, {0} is written at full precision'.format(
+                    get_stream_name(split)))
+            quantized.append(split)
+
+    tseries_streams[:] = quantized
+
+#==========================================================================
+# report_compression - print the compression ratio of the streams
+#==========================================================================
+def report_compression(tseries_streams):
+    """ prints the uncompressed bytes of the time series variables, the bytes of their
+         output files and the compression ratio of each stream and least_significant_digit
+         setting and of all the streams. Runs on the manager task.
+    """
+    totals = dict()
+    for tseries_stream in tseries_streams:
+        raw_bytes, output_bytes = quantizeLib.compression_ratio(get_output_files(tseries_stream), tseries_stream['variables'],
+                                                                tseries_stream['nslices'])
+        key = (tseries_stream['stream_key'], tseries_stream.get('least_significant_digit'))
+        total = totals.setdefault(key, [0, 0])
+        total[0] += raw_bytes
+        total[1] += output_bytes
+
+    all_raw = 0
+    all_output = 0
+    for stream_key, digits in sorted(totals, key=lambda key: (key[0], key[1] is not None, key[1])):
+        raw_bytes, output_bytes = totals[(stream_key, digits)]
+        if output_bytes == 0:
+            continue
+        all_raw += raw_bytes
+        all_output += output_bytes
+        print('cesm_tseries_generator: {0} least_significant_digit {1}: {2:.1f} MB written for {3:.1f} MB of data, compression ratio {4:.2f}'.format(
+            stream_key, 'none' if digits is None else digits, output_bytes / 1.0e6, raw_bytes / 1.0e6, float(raw_bytes) / output_bytes))
+
+    if all_output > 0:
+        print('cesm_tseries_generator: {0:.1f} MB written for {1:.1f} MB of data, compression ratio {2:.2f}'.format(
+            all_output / 1.0e6, all_raw / 1.0e6, float(all_raw) / all_output))
+
+#==========================================================================
+# apply_memory_budget - bound the read chunks of the streams
+#==========================================================================
+def apply_memory_budget(tseries_streams, budget_bytes, debug):
+    """ sets the rchunks key of each stream to the pyReshaper read chunk sizes that keep
+         the largest variable read chunk within the per rank memory budget. Runs on the
+         manager task.
+    """
+    for tseries_stream in tseries_streams:
+        if tseries_stream['time_dim'] is None:
+            continue
+        rchunks = memoryLib.read_chunks(tseries_stream['variables'], tseries_stream['var_dims'],
+                                        tseries_stream['dimensions'], tseries_stream['time_dim'], budget_bytes)
+        tseries_stream['rchunks'] = rchunks
+        if debug:
+            print('cesm_tseries_generator: {0} read chunks {1}, largest chunk {2:.1f} MB'.format(
+                get_stream_name(tseries_stream), tuneLib.format_chunks(rchunks),
+                memoryLib.chunk_bytes(tseries_stream['variables'], tseries_stream['var_dims'],
+                                      tseries_stream['dimensions'], tseries_stream['time_dim'], rchunks) / 1.0e6))
+
+#==================================================================
+# get_output_files - return the output files of a stream specifier
+#==================================================================
+def get_output_files(tseries_stream):
+    """ returns the time series variable output file names of a specifier, the
+         directory store names for the zarr output format
     """
+    spec = tseries_stream['spec']
+    output_files = [spec.output_file_prefix + name + spec.output_file_suffix for name in sorted(tseries_stream['variables'])]
+    if tseries_stream.get('output_format') == 'zarr':
+        output_files = [zarrStoreLib.store_path(output_file) for output_file in output_files]
+    return output_files
+
+#==================================================================
+# get_sidecar_file - return the metadata sidecar of a specifier
+#==================================================================
+def get_sidecar_file(tseries_stream):
+    """ returns the time-invariant metadata sidecar file name of a specifier
     """
-    # initialize the CASEROOT environment dictionary
-    cesmEnv = dict()
+    spec = tseries_stream['spec']
+    return sidecarLib.sidecar_file(spec.output_file_prefix, spec.output_file_suffix)
+
+#==========================================================================
+# convert_store - convert a specifier to chunked directory stores
+#==========================================================================
+def convert_store(tseries_stream, spec, group_comm, agg_comm=None, node=None, climo_periods=None):
+    """ converts a zarr output format specifier to one directory store per time series
+         variable. The group manager creates the stores, the time chunks of all the
+         stores are divided across the group tasks, which write disjoint chunk files
+         without locks, and the group manager consolidates the store metadata once all
+         the chunks are written. With I/O aggregation the time chunks are divided across
+         the aggregator tasks, which read the history slices and ration the records to
+         the other tasks of their node to quantize, compress and write. With climatology
+         periods whole stores are divided instead of time chunks and the task reading the
+         slices of a store accumulates its climatology from the records as they are read,
+         holding the monthly sums of one variable at a time. Must be called on all the
+         group tasks.
 
-    # CASEROOT is given on the command line as required option --caseroot
-    caseroot = options.caseroot[0]
+    Arguments:
+    tseries_stream (dictionary) - stream dictionary of the specifier
+    spec (object) - pyReshaper specifier with the input files to read
+    group_comm (object) - simplecomm object of the rank group
+    agg_comm (object) - simplecomm object of the aggregator and its node tasks, None to read on every task
+    node (dictionary) - nodeLib.node_layout entry of this task
+    climo_periods (list) - climatology periods of the --climo option
+
+    Return:
+    (times, bytes_read) - the metricsLib phase seconds and the bytes read on this task
+    """
+    times = dict((phase, 0.0) for phase in metricsLib.PHASES)
+    time_name = tseries_stream['time_dim'] or 'time'
+    periods = climoLib.stream_periods(climo_periods or list(), tseries_stream['tseries_tper'])
+    store_names = dict(zip(get_output_files(tseries_stream), sorted(tseries_stream['variables'])))
+
+    # count the records of the history slices on all the group tasks
+    start = time.time()
+    if agg_comm is None:
+        local_files = group_comm.partition(spec.input_file_list, func=partition.EqualStride(), involved=True)
+    elif node['aggregator']:
+        local_files = spec.input_file_list[node['color']::node['naggregators']]
+    else:
+        local_files = list()
+    local_counts = dict((f, zarrStoreLib.count_records(f, time_name)) for f in local_files)
+    all_counts = tseriesUtilsLib.gather(group_comm, local_counts)
+    times['open_seconds'] += time.time() - start
+
+    work = list()
+    stores = list()
+    if group_comm.is_manager():
+        start = time.time()
+        counts = dict()
+        for task_counts in all_counts:
+            counts.update(task_counts)
+        slices = [(f, counts[f]) for f in spec.input_file_list]
+        ntime = sum(count for f, count in slices)
+
+        for name, store in zip(sorted(tseries_stream['variables']), get_output_files(tseries_stream)):
+            if tseries_stream.get('skip_existing', False) and zarrStoreLib.is_complete(store):
+                continue
+            stores.append(store)
+            for array, tchunk in zarrStoreLib.create_store(store, spec.input_file_list[0], name, spec.time_variant_metadata,
+                                                            ntime, time_name):
+                digits = tseries_stream.get('least_significant_digit') if array == name else None
+                for index, first, last in zarrStoreLib.chunk_ranges(ntime, tchunk):
+                    work.append((store, array, index, zarrStoreLib.slice_ranges(slices, first, last), digits))
+
+        # the units of work are single time chunks, or every chunk of a store with --climo
+        if len(periods) > 0:
+            work = [[item for item in work if item[0] == store] for store in stores]
+        else:
+            work = [[item] for item in work]
+        times['write_seconds'] += time.time() - start
+
+    # the stores exist before the tasks write their chunks
+    start = time.time()
+    bytes_read = 0
+    months = dict()
+    if agg_comm is None:
+        local_work = group_comm.partition(work, func=partition.EqualStride(), involved=True)
+        for unit in local_work:
+            accumulator = climoLib.ClimoAccumulator() if len(periods) > 0 else None
+            for store, array, index, ranges, digits in unit:
+                blocks = zarrStoreLib.read_slices(array, ranges)
+                if accumulator is not None and store_names.get(store) == array:
+                    climoLib.accumulate_slices(accumulator, array, ranges, blocks, time_name, months)
+                bytes_read += zarrStoreLib.write_blocks(store, array, index, blocks, digits)
+            write_store_climo(unit, accumulator, periods, spec, store_names, time_name)
+    else:
+        work = group_comm.partition(work, func=partition.Duplicate(), involved=True)
+        if agg_comm.is_manager():
+            for unit in work[node['color']::node['naggregators']]:
+                accumulator = climoLib.ClimoAccumulator() if len(periods) > 0 else None
+                for store, array, index, ranges, digits in unit:
+                    blocks = zarrStoreLib.read_slices(array, ranges)
+                    if accumulator is not None and store_names.get(store) == array:
+                        climoLib.accumulate_slices(accumulator, array, ranges, blocks, time_name, months)
+                    if agg_comm.get_size() > 1:
+                        agg_comm.ration((store, array, index, blocks, digits))
+                    else:
+                        zarrStoreLib.write_blocks(store, array, index, blocks, digits)
+                    bytes_read += sum(block.nbytes for block in blocks)
+                write_store_climo(unit, accumulator, periods, spec, store_names, time_name)
+            # one end of work message per node task
+            for i in range(agg_comm.get_size() - 1):
+                agg_comm.ration(None)
+        else:
+            item = agg_comm.ration()
+            while item is not None:
+                zarrStoreLib.write_blocks(*item)
+                item = agg_comm.ration()
+    times['write_seconds'] += time.time() - start
+
+    group_comm.sync()
+    if group_comm.is_manager():
+        for store in stores:
+            zarrStoreLib.consolidate(store)
+
+    return (times, bytes_read)
+
+#==========================================================================
+# write_store_climo - write the climatology of a zarr store
+#==========================================================================
+def write_store_climo(unit, accumulator, periods, spec, store_names, time_name):
+    """ writes the climatology accumulated from the history slices read for the
+         chunks of a zarr store to the climo subdirectory, the dimensions and
+         coordinates are copied from the first history slice. Runs on the task
+         that read the slices of the store.
+
+    Arguments:
+    unit (list) - work items of the store from convert_store
+    accumulator (object) - climoLib.ClimoAccumulator of the store variable or None without --climo
+    periods (list) - climatology periods of the stream
+    spec (object) - pyReshaper specifier with the input files
+    store_names (dictionary) - store to time series variable name
+    time_name (string) - name of the time dimension
+    """
+    if accumulator is None or len(unit) == 0 or accumulator.records == 0:
+        return
+    store = unit[0][0]
+    climoLib.write_means(climoLib.climo_file(store), accumulator, periods, spec.input_file_list[0],
+                         store_names[store], time_name, source_name=store)
+
+#==========================================================================
+# read_output_time - read the time records of an output file
+#==========================================================================
+def read_output_time(output_file, time_name):
+    """ returns the ncHeaderLib.read_time summary of a time series variable file or
+         of a complete zarr store, the probe of the journal. Raises an exception for
+         a file that cannot be read or a store without its consolidated metadata.
+    """
+    if os.path.isdir(output_file):
+        if not zarrStoreLib.is_complete(output_file):
+            err_msg = 'cesm_tseries_generator.py ERROR: {0} is not a complete store'.format(output_file)
+            raise ValueError(err_msg)
+        return zarrStoreLib.read_time(output_file, time_name)
+    return ncHeaderLib.read_time(output_file, time_name)
+
+#==========================================================================
+# segment_end - return the end time of a converted specifier
+#==========================================================================
+def segment_end(tseries_stream):
+    """ returns the ncHeaderLib.read_time summary of the first output file of a
+         converted specifier, recorded as the end of its manifest segment, or None
+         if it cannot be read. Runs on the manager task.
+    """
+    output_files = get_output_files(tseries_stream)
+    if len(output_files) == 0:
+        return None
+    try:
+        return read_output_time(output_files[0], tseries_stream['time_dim'] or 'time')
+    except Exception as error:
+        print('cesm_tseries_generator.py WARNING - unable to read the end time of {0}: {1}'.format(output_files[0], error))
+        return None
+
+#==========================================================================
+# resume_streams - skip the specifiers finished by an interrupted job
+#==========================================================================
+def resume_streams(journal_dir, tseries_streams):
+    """ reads the journal left by an interrupted job, removes the specifiers whose
+         output files are all journaled and removes the partial output files of the
+         others. A file matching its journal entry must also read back its time records
+         up to the journaled last record. Specifiers with journaled output files are
+         converted again with pyReshaper skipping the existing files. Runs on the
+         manager task.
+
+    Arguments:
+    journal_dir (string) - directory of the journal
+    tseries_streams (list) - stream dictionaries after probe_streams
+
+    Return:
+    (remaining, finished) - lists of the stream dictionaries still to convert and
+                            of the ones completed by the interrupted job
+    """
+    journal = journalLib.read_journal(journal_dir)
+    journalLib.consolidate(journal_dir, journal)
+    if len(journal) == 0:
+        return (tseries_streams, list())
+
+    remaining = list()
+    finished = list()
+    for tseries_stream in tseries_streams:
+        output_files = get_output_files(tseries_stream)
+        time_name = tseries_stream['time_dim'] or 'time'
+        done, removed = journalLib.resume_files(output_files, journal, lambda filename: read_output_time(filename, time_name))
+        if len(output_files) > 0 and len(done) == len(output_files):
+            finished.append(tseries_stream)
+        else:
+            tseries_stream['skip_existing'] = len(done) > 0
+            remaining.append(tseries_stream)
+        for output_file in removed:
+            print('cesm_tseries_generator: removed partial output file {0}'.format(output_file))
+
+    print('cesm_tseries_generator: resuming from the journal, {0} specifiers finished, {1} to convert'.format(
+        len(finished), len(remaining)))
+    return (remaining, finished)
+
+#==================================================================
+# get_stream_name - return a name identifying a stream specifier
+#==================================================================
+def get_stream_name(tseries_stream):
+    """ returns the stream key and output date range naming a specifier, e.g.
+         case.cam.h0.000101-001012, followed by the split name of the specifiers of a
+         stream split by least_significant_digit, e.g. case.cam.h0.000101-001012.lsd2
+    """
+    name = tseries_stream['stream_key'] + tseries_stream['spec'].output_file_suffix[:-len('.nc')]
+    if tseries_stream.get('split_name'):
+        name += '.' + tseries_stream['split_name']
+    return name
+
+#==========================================================================
+# write_metrics - merge the task metrics records and write the metrics file
+#==========================================================================
+def write_metrics(metrics_file, tseries_streams, all_records, wall_seconds, size):
+    """ merges the per task metrics records into per stream records, adds the per
+         output variable records and writes the metrics file. Runs on the manager task.
+
+    Arguments:
+    metrics_file (string) - output metrics file name
+    tseries_streams (list) - stream dictionaries
+    all_records (list) - list of the task record lists gathered from every task
+    wall_seconds (float) - conversion wall time
+    size (integer) - number of tasks
+    """
+    merged = metricsLib.merge_task_records([record for task_records in all_records for record in task_records])
+
+    records = list()
+    for tseries_stream in tseries_streams:
+        stream_record = merged.get(get_stream_name(tseries_stream))
+        if stream_record is not None:
+            spec = tseries_stream['spec']
+            variable_records = metricsLib.variable_records(stream_record, spec.output_file_prefix, spec.output_file_suffix,
+                                                           tseries_stream['variables'], tseries_stream['nslices'],
+                                                           get_output_files(tseries_stream))
+            records.append(stream_record)
+            records.extend(variable_records)
+
+    metricsLib.write_metrics(metrics_file, records, wall_seconds, size)
+    print('cesm_tseries_generator: wrote throughput metrics to {0}'.format(metrics_file))
+
+#==========================================================================
+# get_node_layout - return the node topology entry of this task
+#==========================================================================
+def get_node_layout(options, rank, group_comm):
+    """ returns the nodeLib.node_layout entry of this task in its rank group. The task
+         with node_rank 0 moves the node-local files of the group on each node and the
+         aggregator tasks read the history slices with --io-aggregators. Must be called
+         on all the group tasks.
+
+    Arguments:
+    options (object) - command line options
+    rank (integer) - global rank of this task
+    group_comm (object) - simplecomm object of the rank group
+    """
+    host = nodeLib.get_host(rank, options.simulate_nodes[0] if options.simulate_nodes else None)
+    hosts = tseriesUtilsLib.gather(group_comm, (group_comm.get_rank(), host))
+    layout = dict()
+    if group_comm.is_manager():
+        layout = nodeLib.node_layout(hosts, options.io_aggregators[0] if options.io_aggregators else nodeLib.IO_AGGREGATORS)
+    layout = group_comm.partition(layout, func=partition.Duplicate(), involved=True)
+
+    return layout[group_comm.get_rank()]
+
+#==========================================================================
+# get_node_groups - count the rank groups sharing the node of this task
+#==========================================================================
+def get_node_groups(node, color, scomm):
+    """ returns the number of rank groups with tasks on the node of this task, which
+         share the node-local staging budget. Must be called on all tasks.
+
+    Arguments:
+    node (dictionary) - nodeLib.node_layout entry of this task
+    color (integer) - rank group of this task
+    scomm (object) - simplecomm object
+    """
+    tasks = tseriesUtilsLib.gather(scomm, (node['host'], color))
+    groups = dict()
+    if scomm.is_manager():
+        groups = stageLib.node_groups(tasks)
+    groups = scomm.partition(groups, func=partition.Duplicate(), involved=True)
+
+    return groups[node['host']]
+
+#==========================================================================
+# start_stager - stage the history files of a rank group on each node
+#==========================================================================
+def start_stager(options, stage_dir, tseries_streams, group_specs, node, node_groups):
+    """ starts the node-local staging of the uncompressed history files of the group
+         specifiers on the lowest group task of each node, with the group share of the
+         node --stage-budget.
+
+    Arguments:
+    options (object) - command line options
+    stage_dir (string) - staging directory of the group on the node
+    tseries_streams (list) - stream dictionaries
+    group_specs (list) - indices of the group specifiers in conversion order
+    node (dictionary) - nodeLib.node_layout entry of this task
+    node_groups (integer) - number of rank groups with tasks on the node
+
+    Return:
+    stager (object) - the stageLib.Stager on the staging tasks, None on the others
+    """
+    if node['node_rank'] != 0:
+        return None
+
+    stager = stageLib.Stager(stage_dir, options.stage_budget[0] * 1024 * 1024 // node_groups,
+                             [[f for f in tseries_streams[i]['spec'].input_file_list if not decompressLib.is_compressed(f)]
+                              for i in group_specs], options.stage_threads[0])
+    stager.start()
+    return stager
+
+#==========================================================================
+# reference_sidecar - reference the metadata sidecar from the variable files
+#==========================================================================
+def reference_sidecar(tseries_stream, spec, local, node, group_comm):
+    """ adds the time_invariant_file and external_variables global attributes to the
+         variable files of a converted metadata sidecar specifier where they were
+         written, before they are flushed from the write-behind directory. Must be
+         called on all the group tasks.
+
+    Arguments:
+    tseries_stream (dictionary) - stream dictionary of the specifier
+    spec (object) - pyReshaper specifier the files were written with
+    local (boolean) - True if the files were written to the node-local write-behind directory
+    node (dictionary) - nodeLib.node_layout entry of this task
+    group_comm (object) - simplecomm object of the rank group
+    """
+    if not tseries_stream.get('metadata_sidecar'):
+        return
+    if not sidecarLib.can_reference(spec.netcdf_format, local):
+        if group_comm.is_manager():
+            print('cesm_tseries_generator.py WARNING - the variable files of {0} do not reference the metadata sidecar, this needs the netCDF4 module and a netcdf4 format or --write-behind'.format(
+                get_stream_name(tseries_stream)))
+        return
+
+    # the sidecar names are read on the task that can see the sidecar file
+    sidecar = sidecarLib.sidecar_file(spec.output_file_prefix, spec.output_file_suffix)
+    names = None
+    if os.path.isfile(sidecar):
+        names = sidecarLib.time_invariant_names(ncHeaderLib.read_header(sidecar))
+    all_names = tseriesUtilsLib.gather(group_comm, names)
+    if group_comm.is_manager():
+        all_names = [task_names for task_names in all_names if task_names is not None][0:1]
+    all_names = group_comm.partition(all_names, func=partition.Duplicate(), involved=True)
+
+    # the node-local files are only visible on their node and are referenced by its lowest task
+    output_files = [spec.output_file_prefix + name + spec.output_file_suffix for name in sorted(tseries_stream['variables'])]
+    if local:
+        output_files = output_files if node['node_rank'] == 0 else list()
+    else:
+        output_files = output_files[group_comm.get_rank()::group_comm.get_size()]
+    if len(all_names) > 0:
+        for output_file in output_files:
+            if os.path.isfile(output_file):
+                sidecarLib.add_reference(output_file, sidecar, all_names[0])
+    group_comm.sync()
+
+#==========================================================================
+# create_reshaper - create the pyReshaper object of a specifier
+#==========================================================================
+def create_reshaper(tseries_stream, spec, debug, group_comm):
+    """ creates the pyReshaper object of a specifier with the keyword arguments the
+         installed pyReshaper version supports for the metadata sidecar and for the
+         output files kept from the journal of a resumed job. Must be called on all
+         the group tasks.
+
+    Arguments:
+    tseries_stream (dictionary) - stream dictionary of the specifier
+    spec (object) - pyReshaper specifier
+    debug (integer) - pyReshaper verbosity
+    group_comm (object) - simplecomm object of the rank group
+
+    Return:
+    reshpr (object) - pyReshaper object
+    """
+    sidecar_arguments = sidecarLib.reshaper_arguments(reshaper.create_reshaper, tseries_stream.get('metadata_sidecar'))
+    if tseries_stream.get('metadata_sidecar') and len(sidecar_arguments) == 0 and group_comm.is_manager():
+        print('cesm_tseries_generator.py WARNING - the installed pyReshaper cannot write a metadata sidecar, {0} repeats the time-invariant metadata'.format(
+            get_stream_name(tseries_stream)))
+
+    resume_arguments = journalLib.reshaper_arguments(reshaper.create_reshaper, tseries_stream.get('skip_existing', False))
+    if tseries_stream.get('skip_existing', False) and len(resume_arguments) == 0 and group_comm.is_manager():
+        print('cesm_tseries_generator.py WARNING - the installed pyReshaper cannot skip existing files, {0} rewrites the output files kept from the journal'.format(
+            get_stream_name(tseries_stream)))
+
+    arguments = dict(sidecar_arguments)
+    arguments.update(resume_arguments)
+    return reshaper.create_reshaper(spec, serial=False, verbosity=debug, simplecomm=group_comm, **arguments)
+
+#==========================================================================
+# complete_spec - compute the climatologies and journal a specifier
+#==========================================================================
+def complete_spec(tseries_stream, climo_periods, color, journal_files, group_comm):
+    """ computes the climatologies of the netCDF output files of a converted specifier
+         and records the output files in the journal of its case. The climatologies are
+         a post-pass that reads the variable files back, pyReshaper reads the history
+         slices itself, the zarr stores accumulate theirs in convert_store from the
+         slices as they are read. Must be called on all the group tasks once the output
+         files are in the tseries_output_dir.
+
+    Arguments:
+    tseries_stream (dictionary) - stream dictionary of the specifier
+    climo_periods (list) - climatology periods of the --climo option
+    color (integer) - rank group number naming the journal part
+    journal_files (dictionary) - journal entries of the group by postprocess case root
+    group_comm (object) - simplecomm object of the rank group
+    """
+    group_rank = group_comm.get_rank()
+    group_size = group_comm.get_size()
+
+    # compute the climatology means before the specifier is journaled as complete, the
+    # time series files just written are still in the page cache unless they were moved
+    # from the --write-behind directory to another file system
+    if len(climo_periods) > 0 and tseries_stream.get('output_format') != 'zarr':
+        periods = climoLib.stream_periods(climo_periods, tseries_stream['tseries_tper'])
+        for name in sorted(tseries_stream['variables'])[group_rank::group_size]:
+            output_file = tseries_stream['spec'].output_file_prefix + name + tseries_stream['spec'].output_file_suffix
+            if os.path.isfile(output_file):
+                climoLib.write_climo(output_file, name, periods)
+        group_comm.sync()
+
+    # stat and probe the output files on all the group tasks and journal them on the group
+    # manager in the journal of the specifier's case
+    time_name = tseries_stream['time_dim'] or 'time'
+    output_files = [f for f in get_output_files(tseries_stream)[group_rank::group_size] if os.path.exists(f)]
+    all_entries = tseriesUtilsLib.gather(group_comm, [(f, journalLib.file_entry(f, lambda filename: read_output_time(filename, time_name)))
+                                                      for f in output_files])
+    if group_comm.is_manager():
+        pp_caseroot = tseries_stream['pp_caseroot']
+        case_files = journal_files.setdefault(pp_caseroot, dict())
+        for task_entries in all_entries:
+            case_files.update(task_entries)
+        journalLib.write_part(pp_caseroot, color, case_files)
+
+#==========================================================================
+# verify_streams - check the converted time series files against the sources
+#==========================================================================
+def verify_streams(caseroot, standalone, tseries_streams, nsamples, scomm):
+    """ checks the record counts and time bounds of every output file of the streams
+         against the source history slices and compares nsamples records of each file
+         with the source records, within the quantization tolerance of the quantized
+         streams. The output files are divided
+         across all the tasks and the results written to the verification manifest
+         of each tseries_output_dir. Must be called on all tasks.
+
+    Arguments:
+    caseroot (string) - case root path
+    standalone (boolean) - logical to indicate if postprocessing case is stand-alone or not
+    tseries_streams (list) - converted stream dictionaries on the manager
+    nsamples (integer) - records compared with the source slices per output file
+    scomm (object) - simplecomm object
+
+    Return:
+    failed (list) - output files that failed verification, on all tasks
+    """
+    history_files = list()
+    if scomm.is_manager():
+        history_files = [f for tseries_stream in tseries_streams for f in tseries_stream['spec'].input_file_list]
+    entries = refresh_time_entries(caseroot, standalone, history_files, scomm)
+
+    # the expected records of each specifier are sent to every task once
+    expected = list()
+    work = list()
+    if scomm.is_manager():
+        for i, tseries_stream in enumerate(tseries_streams):
+            expected.append(verifyLib.expected_records(tseries_stream['spec'].input_file_list, entries))
+            for name, output_file in zip(sorted(tseries_stream['variables']), get_output_files(tseries_stream)):
+                work.append((i, name, output_file, tseries_stream.get('least_significant_digit')))
+    expected = scomm.partition(expected, func=partition.Duplicate(), involved=True)
+
+    local_work = scomm.partition(work, func=partition.EqualStride(), involved=True)
+    local_results = [(i, output_file, verifyLib.verify_file(output_file, name, expected[i], nsamples, digits))
+                     for i, name, output_file, digits in local_work]
+
+    all_results = tseriesUtilsLib.gather(scomm, local_results)
+    failed = list()
+    if scomm.is_manager():
+        dir_results = dict()
+        for task_results in all_results:
+            for i, output_file, result in task_results:
+                dir_results.setdefault(tseries_streams[i]['tseries_output_dir'], dict())[output_file] = result
+                if result['status'] != 'pass':
+                    failed.append(output_file)
+                    print('cesm_tseries_generator: verification failed for {0}: {1}'.format(output_file, '; '.join(result['problems'])))
+        for tseries_output_dir in sorted(dir_results):
+            verifyLib.write_results(tseries_output_dir, dir_results[tseries_output_dir])
+        print('cesm_tseries_generator: verified {0} output files, {1} failed'.format(len(work), len(failed)))
+
+    # every task needs the result to stop together
+    failed = scomm.partition(sorted(failed), func=partition.Duplicate(), involved=True)
+    return failed
+
+#==========================================================================
+# get_timeseries_pes - read the machine timeseries_pes for the plan report
+#==========================================================================
+def get_timeseries_pes(pp_caseroot):
+    """ returns the timeseries_pes settings of this machine from the
+         $POSTPROCESS_PATH/Machines/machine_postprocess.xml file or None if
+         the machine is not defined.
 
+    Arguments:
+    pp_caseroot (string) - postprocess case root path containing env_postprocess.xml
+    """
+    ppEnv = cesmEnvLib.readXML(pp_caseroot, ['env_postprocess.xml'])
+    machine_xml = '{0}/Machines/machine_postprocess.xml'.format(ppEnv['POSTPROCESS_PATH'])
+    machine = cesmEnvLib.get_machine_name(cesmEnvLib.get_hostname(), machine_xml)
+
+    return planLib.read_timeseries_pes(machine_xml, machine)
+
+#==================================================================
+# print_plan - print the dry-run planning report
+#==================================================================
+def print_plan(pp_caseroot, tseries_streams, size, debug):
+    """ prints the output files, estimated bytes and wall time of each stream
+         and the recommended timeseries_pes. Runs on the manager task.
+
+    Arguments:
+    pp_caseroot (string) - postprocess case root path
+    tseries_streams (list) - stream dictionaries after probe_streams
+    size (integer) - number of tasks
+    debug (integer) - debug level, > 0 lists the output file names
+    """
+    stream_plans = list()
+    for tseries_stream in tseries_streams:
+        spec = tseries_stream['spec']
+        stream_plans.append(planLib.stream_plan(get_stream_name(tseries_stream), spec.output_file_prefix,
+                                                spec.output_file_suffix, tseries_stream['variables'],
+                                                tseries_stream['nslices'], tseries_stream['input_bytes'],
+                                                tseries_stream['cost'], tseries_stream.get('split_bytes', 0)))
+
+    plan = planLib.make_plan(stream_plans, [tseries_stream['nvars'] for tseries_stream in tseries_streams],
+                             size, get_timeseries_pes(pp_caseroot))
+    planLib.print_plan(plan, debug)
+
+#==========================================================================
+# finish_streams - verify and record the converted streams
+#==========================================================================
+def finish_streams(options, cases, tseries_streams, scomm, invalid_streams=None):
+    """ optionally verifies the converted streams of each case, records the ones that
+         passed in the tseries_output_dir manifests, with the end time of each segment,
+         and removes the case journals. Must be called on all tasks after the conversion.
+
+    Arguments:
+    options (object) - command line options
+    cases (list) - case dictionaries returned by read_case
+    tseries_streams (list) - converted stream dictionaries on the manager
+    scomm (object) - simplecomm object
+    invalid_streams (list) - stream dictionaries on the manager that failed the validation
+                             of their decompressed history files and were not converted
+
+    Return:
+    status (integer) - 0 on success
+
+    Raises RuntimeError if any output file failed verification or any specifier failed
+    the validation of its decompressed history files.
+    """
+    invalid_streams = invalid_streams or list()
+    tseries_streams = [tseries_stream for tseries_stream in tseries_streams
+                       if not any(tseries_stream is invalid_stream for invalid_stream in invalid_streams)]
+    failed = list()
+    if options.verify:
+        for case, case_streams in zip(cases, tseriesUtilsLib.split_cases(tseries_streams, [case['pp_caseroot'] for case in cases])):
+            failed.extend(verify_streams(case['caseroot'], options.standalone, case_streams, options.verify_samples[0], scomm))
+
+    if scomm.is_manager():
+        # a segment split into several specifiers is only recorded if none of them failed
+        failed_files = set(failed)
+        failed_segments = set((tseries_stream['stream_key'], tseries_stream['spec'].output_file_suffix)
+                              for tseries_stream in tseries_streams
+                              if any(f in failed_files for f in get_output_files(tseries_stream)))
+        failed_segments.update((tseries_stream['stream_key'], tseries_stream['spec'].output_file_suffix)
+                               for tseries_stream in invalid_streams)
+        manifestLib.update_manifests([tseries_stream for tseries_stream in tseries_streams
+                                      if (tseries_stream['stream_key'], tseries_stream['spec'].output_file_suffix) not in failed_segments],
+                                     options.incremental, segment_end)
+        report_compression(tseries_streams)
+
+        # the job is complete so the journals are no longer needed, unless specifiers
+        # were not converted and a rerun resumes from them
+        if len(invalid_streams) == 0:
+            for case in cases:
+                journalLib.clear(case['pp_caseroot'])
+
+    if len(failed) > 0:
+        err_msg = 'cesm_tseries_generator.py ERROR: {0} time series files failed verification, see tseries_verify.json in the output directories'.format(len(failed))
+        raise RuntimeError(err_msg)
+
+    ninvalid = scomm.partition(len(invalid_streams), func=partition.Duplicate(), involved=True)
+    if ninvalid > 0:
+        err_msg = 'cesm_tseries_generator.py ERROR: {0} specifiers were not converted, their decompressed history files failed validation'.format(ninvalid)
+        raise RuntimeError(err_msg)
+
+    return 0
+
+#==========================================================================
+# read_case - build, validate and probe the specifiers of one case
+#==========================================================================
+def read_case(options, pp_caseroot, debug, scomm):
+    """ reads the env files of a case, scans its short term archive and builds,
+         validates and probes its specifiers. Must be called on all tasks.
+
+    Arguments:
+    options (object) - command line options
+    pp_caseroot (string) - postprocess case root path given with --caseroot
+    debug (integer) - debugging verbosity level
+    scomm (object) - simplecomm object
+
+    Return:
+    (case, tseries_streams) - case is a dictionary with keys caseroot, pp_caseroot and
+                              scratch_dir; tseries_streams the probed stream dictionaries
+                              with a pp_caseroot key, on the manager
+    """
     # set the caseroot based on standalone or not
-    pp_caseroot = caseroot
+    caseroot = pp_caseroot
     if not options.standalone:
-        caseroot, pp_subdir = os.path.split(caseroot)
-    if rank == 0:
+        caseroot, pp_subdir = os.path.split(pp_caseroot)
+    if scomm.is_manager():
         print('cesm_tseries_generator: caseroot = {0}'.format(caseroot))
 
-    # set the debug level 
-    debug = options.debug[0]
-
     # cesmEnv["id"] = "value" parsed from the CASEROOT/env_*.xml files
     env_file_list = ['env_case.xml', 'env_run.xml', 'env_build.xml', 'env_mach_pes.xml']
 
@@ -266,30 +1546,285 @@ def main(options, scomm, rank, size):
         env_file_list = ['env_postprocess.xml']
     cesmEnv = cesmEnvLib.readXML(caseroot, env_file_list)
 
-    # initialize the specifiers list to contain the list of specifier classes
-    specifiers = list()
-
-    # loading the specifiers from the env_timeseries.xml  only needs to run on the master task (rank=0) 
-    if rank == 0:
-        specifiers = readArchiveXML(caseroot, cesmEnv['DOUT_S_ROOT'], cesmEnv['CASE'], options.standalone, debug)
+    # gzipped history files are decompressed into the scratch directory
+    scratch_dir = os.path.join(cesmEnv['DOUT_S_ROOT'], 'tseries_scratch')
+    if options.scratch_dir:
+        scratch_dir = options.scratch_dir[0]
+    case = {'caseroot' : caseroot, 'pp_caseroot' : pp_caseroot, 'scratch_dir' : scratch_dir}
+
+    # initialize the tseries_streams list to contain the list of specifier classes
+    tseries_streams = list()
+
+    # the history directory listings are divided across all the tasks
+    archive_index = scan_archive(caseroot, cesmEnv['DOUT_S_ROOT'], cesmEnv['CASE'], options.standalone, scomm)
+
+    # building the specifiers from the env_timeseries.xml and the archive index only needs to run on the master task (rank=0) 
+    if scomm.is_manager():
+        pp_env = cesmEnvLib.readXML(pp_caseroot, ['env_postprocess.xml'])
+        tseries_streams = readArchiveXML(caseroot, cesmEnv['DOUT_S_ROOT'], cesmEnv['CASE'], options.standalone, debug,
+                                         archive_index, incremental=options.incremental, dry_run=options.plan,
+                                         pp_env=pp_env)
+        for tseries_stream in tseries_streams:
+            tseries_stream['pp_caseroot'] = pp_caseroot
+
+    # fail fast on missing, duplicate or truncated history files before any conversion
+    if not options.skip_validation:
+        problems = validate_streams(caseroot, options.standalone, tseries_streams, scomm, options.incremental)
+        if len(problems) > 0:
+            if scomm.is_manager():
+                print('cesm_tseries_generator: pre-flight validation found {0} problems'.format(len(problems)))
+                for problem in problems:
+                    print('    {0}'.format(problem))
+            err_msg = 'cesm_tseries_generator.py ERROR: history file validation failed, rerun with --skip-validation to convert anyway'
+            raise RuntimeError(err_msg)
+
+    # the history file header reads for the cost estimates are divided across all the tasks
+    probe_streams(tseries_streams, scratch_dir, scomm)
     scomm.sync()
 
-    # specifiers is a list of pyreshaper specification objects ready to pass to the reshaper
-    specifiers = scomm.partition(specifiers, func=partition.Duplicate(), involved=True)
+    return (case, tseries_streams)
+
+#======
+# main
+#======
+
+def main(options, scomm, rank, size):
+    """
+    """
+    # set the debug level 
+    debug = options.debug[0]
+
+    # climatology periods computed from the converted time series files
+    climo_periods = list()
+    if options.climo:
+        climo_periods = climoLib.parse_periods(options.climo[0])
+
+    # the specifiers of all the cases are converted together by one rank scheduler
+    cases = list()
+    tseries_streams = list()
+    finished_streams = list()
+    for pp_caseroot in options.caseroot:
+        case, case_streams = read_case(options, pp_caseroot, debug, scomm)
+        cases.append(case)
+
+        # tuning mode records the chunking and deflate settings without converting
+        if options.tune:
+            tune_streams(case['caseroot'], options.standalone, case_streams, case['scratch_dir'], scomm)
+            continue
+
+        if rank == 0:
+            apply_tuning(case_streams)
+            apply_quantization(case_streams)
+            if options.memory_budget:
+                apply_memory_budget(case_streams, options.memory_budget[0] * 1024 * 1024, debug)
+
+        # dry-run planning mode reports each case without converting
+        if options.plan:
+            if rank == 0:
+                print_plan(pp_caseroot, case_streams, size, debug)
+            continue
+
+        # skip the work completed by an interrupted job, the journal is kept with the env_timeseries.xml
+        if rank == 0:
+            case_streams, case_finished = resume_streams(pp_caseroot, case_streams)
+            tseries_streams.extend(case_streams)
+            finished_streams.extend(case_finished)
+
+    if options.tune or options.plan:
+        return 0
+
+    # the decompressed history files of all the cases share the first case scratch directory
+    scratch_dir = cases[0]['scratch_dir']
+
+    # tseries_streams is a list of stream dictionaries with the pyreshaper specification objects
+    tseries_streams = scomm.partition(tseries_streams, func=partition.Duplicate(), involved=True)
+    if len(tseries_streams) == 0:
+        if rank == 0:
+            print('cesm_tseries_generator: no history files to convert')
+        return finish_streams(options, cases, finished_streams, scomm)
 
-    # create the PyReshaper object - uncomment when multiple specifiers is allowed
-    reshpr = reshaper.create_reshaper(specifiers, serial=False, verbosity=debug)
+    # every task computes the same schedule of rank groups from the estimated stream costs
+    groups = scheduleLib.allocate_ranks([tseries_stream['cost'] for tseries_stream in tseries_streams], size)
+    if rank == 0:
+        print('cesm_tseries_generator: {0} specifiers of {1} cases scheduled on {2} rank groups'.format(len(tseries_streams), len(cases), len(groups)))
+        if debug:
+            for group in groups:
+                print('    {0} ranks, estimated cost {1:.1f} seconds: {2}'.format(group['ranks'], group['cost'],
+                      ', '.join(get_stream_name(tseries_streams[i]) for i in group['specs'])))
+
+    # split the tasks into a sub-communicator per rank group
+    color = scheduleLib.get_group(groups, rank)
+    group_comm, multi_comm = tseriesUtilsLib.divide(scomm, color)
+
+    # the gzipped history files of the group specifiers are divided across the group
+    # tasks and decompressed in the background ahead of their conversion
+    group_specs = groups[color]['specs']
+    group_rank = group_comm.get_rank()
+    group_size = group_comm.get_size()
+    node = get_node_layout(options, rank, group_comm)
+    compressed_files = [[f for f in tseries_streams[i]['spec'].input_file_list if decompressLib.is_compressed(f)]
+                        for i in group_specs]
+    pipeline = None
+    if any(len(files) > 0 for files in compressed_files):
+        pipeline = decompressLib.Pipeline(scratch_dir, options.scratch_budget[0] * 1024 * 1024 // size,
+                                          [files[group_rank::group_size] for files in compressed_files])
+        pipeline.start()
+
+    # the uncompressed history files are staged to a node-local directory, with a subdirectory
+    # per node and rank group as the groups on a node may stage the same history files
+    stage_dir = None
+    stager = None
+    if options.stage_dir:
+        stage_dir = nodeLib.group_dir(nodeLib.node_dir(stageLib.get_stage_dir(options.stage_dir[0]), node['host']), color)
+        stager = start_stager(options, stage_dir, tseries_streams, group_specs, node, get_node_groups(node, color, scomm))
+
+    # the aggregator tasks of each node read the zarr store records for the other node tasks
+    agg_comm = None
+    if options.io_aggregators:
+        agg_comm, agg_multi_comm = tseriesUtilsLib.divide(group_comm, node['color'])
+        if rank == 0 and not options.stage_dir and any(tseries_stream.get('output_format') != 'zarr' for tseries_stream in tseries_streams):
+            print('cesm_tseries_generator.py WARNING - without --stage-dir every task reads the history files of the pyReshaper specifiers')
+
+    # the netCDF output files are written to a node-local directory and moved by the flusher of each
+    # node, the zarr stores and the specifiers resumed with existing output files are written in place
+    write_behind_dir = None
+    flusher = None
+    write_behind = [False for i in group_specs]
+    if options.write_behind:
+        write_behind_dir = nodeLib.node_dir(stageLib.get_stage_dir(options.write_behind[0], stageLib.WRITE_BEHIND_SUBDIR), node['host'])
+        decompressLib.make_scratch_dir(write_behind_dir)
+        write_behind = [tseries_streams[i].get('output_format') != 'zarr' and not tseries_streams[i].get('skip_existing', False)
+                        for i in group_specs]
+        if node['node_rank'] == 0:
+            flusher = stageLib.Flusher(options.write_behind_threads[0])
+            flusher.start()
+
+    # convert the specifiers of this group largest first
+    pending = list()
+    invalid = list()
+    task_records = list()
+    journal_files = dict()
+    convert_start = time.time()
+    try:
+        for n, i in enumerate(group_specs):
+            spec_start = time.time()
+            spec = tseries_streams[i]['spec']
+
+            # wait for all the group tasks to decompress and stage this specifier's history files
+            if pipeline is not None or stage_dir is not None:
+                if pipeline is not None:
+                    pipeline.wait(n)
+                if stager is not None:
+                    stager.wait(n)
+                group_comm.sync()
+                spec = copy.copy(spec)
+                spec.input_file_list = [pipeline.scratch_name(f) if decompressLib.is_compressed(f) else
+                                        stageLib.stage_name(stage_dir, f) if stage_dir is not None else f
+                                        for f in spec.input_file_list]
+
+            if write_behind[n]:
+                if spec is tseries_streams[i]['spec']:
+                    spec = copy.copy(spec)
+                spec.output_file_prefix = os.path.join(write_behind_dir, os.path.basename(spec.output_file_prefix))
+
+            # the gzipped history files are validated once they are decompressed, a specifier
+            # with problems is not converted nor recorded in the manifest
+            problems = list()
+            if pipeline is not None and 'time_entries' in tseries_streams[i]:
+                problems = validate_decompressed(tseries_streams[i], spec, group_comm)
+            if len(problems) > 0:
+                if group_comm.is_manager():
+                    print('cesm_tseries_generator: validation of the decompressed history files found {0} problems, not converting {1}'.format(
+                        len(problems), get_stream_name(tseries_streams[i])))
+                    for problem in problems:
+                        print('    {0}'.format(problem))
+                invalid.append(i)
+                times = dict((phase, 0.0) for phase in metricsLib.PHASES)
+                bytes_read = 0
+            elif tseries_streams[i].get('output_format') == 'zarr':
+                # write the chunked directory stores
+                times, bytes_read = convert_store(tseries_streams[i], spec, group_comm, agg_comm, node, climo_periods)
+            else:
+                # create the PyReshaper object for this specifier on the group sub-communicator
+                reshpr = create_reshaper(tseries_streams[i], spec, debug, group_comm)
+
+                # Run the conversion (slice-to-series) process 
+                convert_arguments = tuneLib.convert_arguments(reshpr, tseries_streams[i].get('wchunks'), tseries_streams[i].get('rchunks'))
+                if tseries_streams[i].get('rchunks') and 'rchunks' not in convert_arguments and group_comm.is_manager():
+                    print('cesm_tseries_generator.py WARNING - the installed pyReshaper cannot read in chunks, {0} is converted without the memory budget'.format(
+                        get_stream_name(tseries_streams[i])))
+                reshpr.convert(**convert_arguments)
+
+                # Print timing diagnostics
+                reshpr.print_diagnostics()
+                times = metricsLib.reshaper_times(reshpr)
+                bytes_read = metricsLib.reshaper_bytes(reshpr)
+
+            # wait for every group task to finish writing before the output files are journaled
+            group_comm.sync()
+            if tseries_streams[i].get('output_format') != 'zarr':
+                reference_sidecar(tseries_streams[i], spec, write_behind[n], node, group_comm)
+
+            # remove the decompressed history files, the staged files are kept until their space is needed
+            if pipeline is not None:
+                pipeline.release(n)
+            if stager is not None:
+                stager.release(n)
+
+            # the node-local output files are moved to the tseries_output_dir in the background
+            if write_behind[n] and flusher is not None:
+                files = [(os.path.join(write_behind_dir, os.path.basename(f)), f) for f in get_output_files(tseries_streams[i])]
+                if tseries_streams[i].get('metadata_sidecar'):
+                    sidecar = get_sidecar_file(tseries_streams[i])
+                    files.append((os.path.join(write_behind_dir, os.path.basename(sidecar)), sidecar))
+                flusher.flush(n, [(src, dst) for src, dst in files if os.path.isfile(src)])
+
+            if options.metrics:
+                task_records.append(metricsLib.task_record(get_stream_name(tseries_streams[i]), rank, time.time() - spec_start,
+                                                           times, bytes_read))
+
+            # the previous specifier is completed once its files are flushed, overlapping
+            # the flush of this specifier with the conversion of the next one
+            pending.append(n)
+            while len(pending) > (1 if write_behind[n] and n < len(group_specs) - 1 else 0):
+                m = pending.pop(0)
+                if write_behind[m]:
+                    if flusher is not None:
+                        flusher.wait(m)
+                    group_comm.sync()
+                if group_specs[m] not in invalid:
+                    complete_spec(tseries_streams[group_specs[m]], climo_periods, color, journal_files, group_comm)
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+        if flusher is not None:
+            flusher.close()
+        if stager is not None:
+            if debug:
+                print('cesm_tseries_generator: staged {0:.1f} MB of history files on {1}'.format(stager.copied_bytes / 1.0e6, node['host']))
+            stager.close()
+
+    # merge the throughput metrics from all the tasks on the manager
+    if options.metrics:
+        all_records = tseriesUtilsLib.gather(scomm, task_records)
+        if rank == 0:
+            write_metrics(options.metrics[0], tseries_streams, all_records, time.time() - convert_start, size)
 
-    # Run the conversion (slice-to-series) process 
-    reshpr.convert()
+    # the specifiers that failed the validation of their decompressed history files
+    all_invalid = tseriesUtilsLib.gather(scomm, invalid)
+    invalid_streams = list()
+    if rank == 0:
+        invalid_streams = [tseries_streams[i] for task_invalid in all_invalid for i in task_invalid]
 
-    # Print timing diagnostics
-    reshpr.print_diagnostics()
+    # record the converted history files in the tseries_output_dir manifests
+    # once all the tasks have finished writing
+    scomm.sync()
+    status = finish_streams(options, cases, tseries_streams + finished_streams, scomm, invalid_streams)
 
 # TO-DO check if DOUT_S_SAVE_HISTORY_FILES is true or false and 
 # delete history files accordingly
 
-    return 0
+    return status
 
 #===================================
 
@@ -0,0 +1,375 @@
+#!/usr/bin/env python2
+"""
+This module provides the climatology means computed by the time-series
+generation with the --climo option. The records of each variable are
+accumulated into duration weighted monthly sums and the monthly,
+seasonal (DJF, MAM, JJA, SON) and annual means derived from them are
+written to a climatology file per variable so the averages stage does
+not read the history archive again.
+
+The netCDF time series files are written by pyReshaper, which reads the
+history slices itself, so their climatologies are a post-pass: after a
+specifier is converted the group tasks read the variable files they
+just wrote back, record block by record block, with accumulate_file.
+The zarr directory stores are written from the slices read by the
+generator, and accumulate_slices adds the records to the sums as they
+are read, so the climatology of a store costs no extra read.
+
+The means are climatological, DJF combines the December records with the
+January and February records of the same years. The days of data in
+each month are stored alongside the means so the climatologies of
+consecutive chunks can be combined with the correct weights.
+
+The twelve monthly sums of a variable, and the weights of masked
+variables, are held in double precision for the whole file, so a task
+needs up to 24 x 8 bytes per value of a time record whatever the
+--memory-budget, which only bounds the conversion.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import os
+
+#
+# installed dependencies
+#
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+CLIMO_PERIODS = ['ann', 'seasonal', 'monthly']
+SEASONS = [('DJF', [12, 1, 2]), ('MAM', [3, 4, 5]), ('JJA', [6, 7, 8]), ('SON', [9, 10, 11])]
+CLIMO_SUBDIR = 'climo'
+
+# time records read at once while accumulating
+BLOCK_RECORDS = 12
+
+# time periods with records longer than a month only have annual means
+ANNUAL_TPERS = ['annual', 'yearly']
+
+#==================================================================
+# parse_periods - parse the --climo periods
+#==================================================================
+def parse_periods(text):
+    """parse_periods - return the list of climatology periods in a comma
+    separated string such as ann,seasonal,monthly
+
+    Raises ValueError for an unknown period.
+    """
+    periods = [period.strip().lower() for period in text.split(',') if period.strip()]
+    for period in periods:
+        if period not in CLIMO_PERIODS:
+            err_msg = 'climoLib.parse_periods ERROR: unknown climatology period {0}, valid periods are {1}'.format(
+                period, ', '.join(CLIMO_PERIODS))
+            raise ValueError(err_msg)
+    return periods
+
+#==================================================================
+# stream_periods - return the periods available for a stream
+#==================================================================
+def stream_periods(periods, tseries_tper):
+    """stream_periods - return the periods that can be computed from a
+    stream with tseries_tper records, only annual means for annual streams
+    """
+    if tseries_tper in ANNUAL_TPERS:
+        return [period for period in periods if period == 'ann']
+    return list(periods)
+
+#==================================================================
+# climo_file - return the climatology file of a time series file
+#==================================================================
+def climo_file(output_file):
+    """climo_file - return the climatology file name of a time series
+    variable file or store, in the climo subdirectory of the time series
+    directory, e.g. proc/tseries/monthly/climo/case.cam.h0.TS.000101-001012.climo.nc
+    """
+    dirname, basename = os.path.split(output_file.rstrip(os.sep))
+    for suffix in ['.nc', '.zarr']:
+        if basename.endswith(suffix):
+            basename = basename[:-len(suffix)]
+    return os.path.join(dirname, CLIMO_SUBDIR, basename + '.climo.nc')
+
+#============================================================
+# ClimoAccumulator - streaming duration weighted monthly sums
+#============================================================
+class ClimoAccumulator(object):
+    """ClimoAccumulator - accumulate the duration weighted sums of the
+    records of a variable by calendar month. Records are numpy arrays,
+    masked arrays or scalars. Masked points get their own weights so
+    partially masked fields, e.g. sea ice, are averaged over the valid
+    records only.
+    """
+    def __init__(self):
+        self._sums = dict()
+        self._weights = dict()
+        self.days = dict((month, 0.0) for month in range(1, 13))
+        self.records = 0
+
+    def add(self, month, record, days):
+        """add - add a record of month with a duration of days
+        """
+        weight = days
+        if np is not None and np.ma.isMaskedArray(record):
+            weight = np.where(np.ma.getmaskarray(record), 0.0, days)
+            record = record.filled(0.0).astype('f8')
+        elif np is not None:
+            record = np.asarray(record, dtype='f8')
+
+        if month in self._sums:
+            self._sums[month] = self._sums[month] + record * days
+            self._weights[month] = self._weights[month] + weight
+        else:
+            self._sums[month] = record * days
+            self._weights[month] = weight * 1.0
+        self.days[month] += days
+        self.records += 1
+
+    def mean(self, months):
+        """mean - return the mean over months weighted by the record
+        durations, or None if there are no records. Points without any
+        valid records are masked.
+        """
+        months = [month for month in months if month in self._sums]
+        if len(months) == 0:
+            return None
+
+        total = self._sums[months[0]]
+        weight = self._weights[months[0]]
+        for month in months[1:]:
+            total = total + self._sums[month]
+            weight = weight + self._weights[month]
+
+        if np is not None and isinstance(weight, np.ndarray):
+            valid = weight > 0.0
+            return np.ma.masked_array(np.where(valid, total, 0.0) / np.where(valid, weight, 1.0), mask=~valid)
+        if weight == 0.0:
+            return None
+        return total / weight
+
+    def means(self, periods):
+        """means - return a dictionary of the climatology means of periods
+        with keys ann, seasonal (list of the DJF, MAM, JJA and SON means)
+        and monthly (list of the 12 monthly means), None where no records
+        were added
+        """
+        means = dict()
+        if 'ann' in periods:
+            means['ann'] = self.mean(range(1, 13))
+        if 'seasonal' in periods:
+            means['seasonal'] = [self.mean(months) for season, months in SEASONS]
+        if 'monthly' in periods:
+            means['monthly'] = [self.mean([month]) for month in range(1, 13)]
+        return means
+
+def _record_months(fh, time_name, ntime):
+    # month and duration in days of each record from the midpoint of its bounds
+    time = fh.variables[time_name]
+    units = time.units
+    calendar = getattr(time, 'calendar', 'standard')
+    bounds_name = getattr(time, 'bounds', None)
+    if bounds_name is not None and bounds_name in fh.variables:
+        bounds = fh.variables[bounds_name][:]
+        midpoints = (bounds[:, 0] + bounds[:, 1]) / 2.0
+        days = (bounds[:, 1] - bounds[:, 0]) * _units_days(units)
+    else:
+        midpoints = time[:]
+        days = np.ones(ntime)
+    dates = netCDF4.num2date(midpoints, units, calendar)
+    return [(date.month, float(d)) for date, d in zip(dates, days)]
+
+def _units_days(units):
+    scale = {'days' : 1.0, 'hours' : 1.0 / 24.0, 'minutes' : 1.0 / 1440.0, 'seconds' : 1.0 / 86400.0}
+    return scale.get(units.split()[0].lower(), 1.0)
+
+#==================================================================
+# accumulate_file - accumulate the records of a time series file
+#==================================================================
+def accumulate_file(tseries_file, name, time_name='time'):
+    """accumulate_file - read variable name of a time series file in blocks of
+    BLOCK_RECORDS records and return its ClimoAccumulator, the post-pass
+    over the netCDF files written by pyReshaper
+
+    Return:
+    accumulator (object) - ClimoAccumulator of the records of the file
+    """
+    _check_modules('accumulate_file')
+
+    accumulator = ClimoAccumulator()
+    fh = netCDF4.Dataset(tseries_file, 'r')
+    try:
+        var = fh.variables[name]
+        ntime = len(fh.dimensions[time_name])
+        record_months = _record_months(fh, time_name, ntime)
+        for start in range(0, ntime, BLOCK_RECORDS):
+            block = var[start:start + BLOCK_RECORDS]
+            for n in range(block.shape[0]):
+                month, days = record_months[start + n]
+                accumulator.add(month, block[n], days)
+    finally:
+        fh.close()
+
+    return accumulator
+
+def _check_modules(func):
+    if netCDF4 is None or np is None:
+        err_msg = 'climoLib.{0} ERROR: computing climatologies requires netCDF4 and numpy'.format(func)
+        raise ImportError(err_msg)
+
+#==================================================================
+# slice_months - return the record months of a history slice
+#==================================================================
+def slice_months(history_file, name, time_name='time'):
+    """slice_months - return the (month, days) of each record of a history
+    slice and the fill value of variable name, None if it has none
+    """
+    _check_modules('slice_months')
+
+    fh = netCDF4.Dataset(history_file, 'r')
+    try:
+        record_months = _record_months(fh, time_name, len(fh.dimensions[time_name]))
+        var = fh.variables[name]
+        fill_value = getattr(var, '_FillValue', getattr(var, 'missing_value', None))
+    finally:
+        fh.close()
+    return (record_months, fill_value)
+
+#==================================================================
+# accumulate_slices - accumulate the records read from history slices
+#==================================================================
+def accumulate_slices(accumulator, name, ranges, blocks, time_name='time', months=None):
+    """accumulate_slices - add the records of variable name read from the
+    history slices for a zarr store to accumulator, so the climatology is
+    computed from the slices as they are read instead of in a post-pass.
+    Values equal to the fill value of the variable are masked.
+
+    Arguments:
+    accumulator (object) - ClimoAccumulator of the variable
+    name (string) - time series variable name
+    ranges (list) - (history file, first record, last record + 1) from zarrStoreLib.slice_ranges
+    blocks (list) - record arrays of the ranges from zarrStoreLib.read_slices
+    time_name (string) - name of the time dimension
+    months (dictionary) - cache of the slice_months of the history files
+    """
+    if months is None:
+        months = dict()
+    for (history_file, first, last), block in zip(ranges, blocks):
+        if history_file not in months:
+            months[history_file] = slice_months(history_file, name, time_name)
+        record_months, fill_value = months[history_file]
+        data = np.ma.asarray(block)
+        if fill_value is not None:
+            data = np.ma.masked_where(np.ma.getdata(data) == fill_value, data)
+        for n in range(data.shape[0]):
+            month, days = record_months[first + n]
+            accumulator.add(month, data[n], days)
+
+#==================================================================
+# write_climo - compute and write the climatology of a variable
+#==================================================================
+def write_climo(tseries_file, name, periods, time_name='time'):
+    """write_climo - write the periods climatology means of variable name of
+    a time series file to its climo_file, reading the file back
+
+    Return:
+    filename (string) - the climatology file name
+    """
+    accumulator = accumulate_file(tseries_file, name, time_name)
+    return write_means(climo_file(tseries_file), accumulator, periods, tseries_file, name, time_name)
+
+#==================================================================
+# write_means - write the climatology means of an accumulator
+#==================================================================
+def write_means(filename, accumulator, periods, template_file, name, time_name='time', source_name=None):
+    """write_means - write the periods climatology means of accumulator to
+    filename. The file has the variable dimensions without time and the
+    variables name (annual mean), name_seasonal (season, ...) and
+    name_monthly (month, ...), with the days of data in each month. The
+    dimensions, coordinates and attributes are copied from variable name of
+    template_file, a time series file or a history slice, and the
+    source_file attribute is source_name or template_file. The file is
+    written to a temporary name and renamed so readers never see a partial
+    file, the temporary file is removed if writing fails.
+
+    Return:
+    filename (string) - the climatology file name
+    """
+    _check_modules('write_means')
+    means = accumulator.means(periods)
+
+    if not os.path.isdir(os.path.dirname(filename)):
+        try:
+            os.makedirs(os.path.dirname(filename))
+        except OSError:
+            if not os.path.isdir(os.path.dirname(filename)):
+                raise
+
+    tmp_name = '{0}.tmp.{1}'.format(filename, os.getpid())
+    src = netCDF4.Dataset(template_file, 'r')
+    try:
+        dst = netCDF4.Dataset(tmp_name, 'w', format='NETCDF4_CLASSIC')
+        try:
+            var = src.variables[name]
+            dims = [dim for dim in var.dimensions if dim != time_name]
+            fill_value = getattr(var, '_FillValue', netCDF4.default_fillvals['f4'])
+
+            for dim in dims:
+                dst.createDimension(dim, len(src.dimensions[dim]))
+                if dim in src.variables and src.variables[dim].dimensions == (dim,):
+                    coord = dst.createVariable(dim, src.variables[dim].dtype, (dim,))
+                    coord.setncatts(dict((att, src.variables[dim].getncattr(att)) for att in src.variables[dim].ncattrs()))
+                    coord[:] = src.variables[dim][:]
+
+            attrs = dict((att, var.getncattr(att)) for att in var.ncattrs() if att not in ['_FillValue', 'missing_value'])
+            attrs['cell_methods'] = '{0}: mean'.format(time_name)
+
+            dst.createDimension('month', 12)
+            days = dst.createVariable('days_monthly', 'f8', ('month',))
+            days.long_name = 'days of data in each calendar month'
+            days[:] = [accumulator.days[month] for month in range(1, 13)]
+
+            shapes = [('ann', name, ()),
+                      ('seasonal', name + '_seasonal', ('season',)),
+                      ('monthly', name + '_monthly', ('month',))]
+            for period, var_name, period_dims in shapes:
+                if period not in means:
+                    continue
+                if period == 'seasonal':
+                    dst.createDimension('season', len(SEASONS))
+                out = dst.createVariable(var_name, 'f4', period_dims + tuple(dims), fill_value=fill_value)
+                out.setncatts(attrs)
+                if period == 'seasonal':
+                    out.seasons = ' '.join(season for season, months in SEASONS)
+                if period == 'ann':
+                    out[:] = _filled(means[period], fill_value)
+                else:
+                    for n, mean in enumerate(means[period]):
+                        out[n] = _filled(mean, fill_value)
+
+            dst.source_file = os.path.basename(source_name or template_file)
+            dst.climo_records = accumulator.records
+        finally:
+            dst.close()
+        os.rename(tmp_name, filename)
+    except:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+    finally:
+        src.close()
+
+    return filename
+
+def _filled(mean, fill_value):
+    if mean is None:
+        return fill_value
+    return np.ma.filled(np.ma.asarray(mean, dtype='f4'), fill_value)
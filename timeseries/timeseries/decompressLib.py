@@ -0,0 +1,235 @@
+#!/usr/bin/env python2
+"""
+This module provides the decompression of gzipped (.nc.gz) history time
+slice files for the time-series generation. Each task decompresses its
+share of the compressed slices of the upcoming specifiers into a scratch
+directory in a background thread while the current specifier is being
+converted. The decompressed files of a specifier are removed once it
+has been converted and no more than a fixed number of bytes are held in
+scratch by each task.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import contextlib
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+GZIP_SUFFIX = '.gz'
+
+# default scratch disk budget in MB shared by all the tasks
+SCRATCH_BUDGET_MB = 20480
+
+# copy block size for decompression
+BLOCK_BYTES = 16 * 1024 * 1024
+
+#==================================================================
+# is_compressed - check for a gzipped history file name
+#==================================================================
+def is_compressed(filename):
+    """is_compressed - return True if filename is a gzipped file
+    """
+    return filename.endswith(GZIP_SUFFIX)
+
+#==================================================================
+# uncompressed_name - strip the .gz suffix from a file name
+#==================================================================
+def uncompressed_name(filename):
+    """uncompressed_name - return filename without the .gz suffix
+    """
+    if is_compressed(filename):
+        return filename[:-len(GZIP_SUFFIX)]
+    return filename
+
+#==================================================================
+# uncompressed_size - read the uncompressed size of a gzip file
+#==================================================================
+def uncompressed_size(filename):
+    """uncompressed_size - return the uncompressed size in bytes recorded in
+    the gzip trailer. The trailer stores the size modulo 2**32 so the
+    compressed size is used as a lower bound for files over 4 GB.
+    """
+    compressed_size = os.path.getsize(filename)
+    with open(filename, 'rb') as fh:
+        fh.seek(-4, os.SEEK_END)
+        size = struct.unpack('<I', fh.read(4))[0]
+
+    while size < compressed_size:
+        size += 2**32
+
+    return size
+
+#==================================================================
+# decompress - decompress a gzip file with an atomic rename
+#==================================================================
+def decompress(src, dst):
+    """decompress - decompress the gzip file src to dst. The data is written to
+    a temporary file in the dst directory and renamed into place so dst
+    is never seen partially written.
+    """
+    fd, tmpname = tempfile.mkstemp(prefix='.{0}.'.format(os.path.basename(dst)), dir=os.path.dirname(dst))
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+            fin = gzip.open(src, 'rb')
+            try:
+                shutil.copyfileobj(fin, fout, BLOCK_BYTES)
+            finally:
+                fin.close()
+        os.chmod(tmpname, 0o644)
+        os.rename(tmpname, dst)
+    except:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+#==================================================================
+# decompressed - context manager for a temporary decompressed copy
+#==================================================================
+@contextlib.contextmanager
+def decompressed(filename, scratch_dir):
+    """decompressed - yield the name of an uncompressed copy of filename in
+    scratch_dir that is removed on exit, or filename itself if it is not
+    compressed.
+    """
+    if not is_compressed(filename):
+        yield filename
+        return
+
+    make_scratch_dir(scratch_dir)
+    tmpdir = tempfile.mkdtemp(dir=scratch_dir)
+    try:
+        dst = os.path.join(tmpdir, os.path.basename(uncompressed_name(filename)))
+        decompress(filename, dst)
+        yield dst
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+#==================================================================
+# make_scratch_dir - create the scratch directory
+#==================================================================
+def make_scratch_dir(scratch_dir):
+    """make_scratch_dir - create scratch_dir if it does not exist, several
+    tasks may create it at the same time.
+    """
+    try:
+        os.makedirs(scratch_dir)
+    except OSError:
+        if not os.path.isdir(scratch_dir):
+            raise
+
+#============================================
+# Pipeline - background slice decompression
+#============================================
+class Pipeline(object):
+    """Pipeline - decompress the compressed history files of a sequence of
+    specifiers in a background thread, ahead of their conversion.
+
+    The files of the specifier currently waited on or being converted are
+    always decompressed, the files of later specifiers only while the
+    decompressed bytes held by this pipeline stay within budget_bytes.
+    Call wait(n) before converting specifier n and release(n) after.
+    """
+    def __init__(self, scratch_dir, budget_bytes, specs_files):
+        """
+        Arguments:
+        scratch_dir (string) - directory for the decompressed files
+        budget_bytes (integer) - bytes of decompressed files held at a time
+        specs_files (list) - list, in conversion order, of the lists of
+                             compressed files this task decompresses
+        """
+        self._scratch_dir = scratch_dir
+        self._budget_bytes = budget_bytes
+        self._specs_files = specs_files
+        self._cond = threading.Condition()
+        self._current = 0
+        self._used = 0
+        self._done = [dict() for files in specs_files]
+        self._errors = list()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def scratch_name(self, filename):
+        """scratch_name - return the decompressed file name of filename
+        """
+        return os.path.join(self._scratch_dir, os.path.basename(uncompressed_name(filename)))
+
+    def start(self):
+        """start - start the background decompression thread
+        """
+        make_scratch_dir(self._scratch_dir)
+        self._thread.start()
+
+    def _run(self):
+        for n, files in enumerate(self._specs_files):
+            for filename in files:
+                try:
+                    size = uncompressed_size(filename)
+                except Exception:
+                    size = 0
+                with self._cond:
+                    while (not self._stopped and n != self._current and
+                           self._used + size > self._budget_bytes):
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    self._used += size
+
+                try:
+                    decompress(filename, self.scratch_name(filename))
+                except Exception as error:
+                    with self._cond:
+                        self._errors.append('{0}: {1}'.format(filename, error))
+                        self._cond.notify_all()
+                    return
+
+                with self._cond:
+                    self._done[n][filename] = size
+                    self._cond.notify_all()
+
+    def wait(self, n):
+        """wait - block until all the files of specifier n are decompressed
+        """
+        with self._cond:
+            self._current = n
+            self._cond.notify_all()
+            while len(self._done[n]) < len(self._specs_files[n]) and len(self._errors) == 0:
+                self._cond.wait()
+            if len(self._errors) > 0:
+                err_msg = 'decompressLib.Pipeline ERROR: unable to decompress {0}'.format(self._errors[0])
+                raise RuntimeError(err_msg)
+
+    def release(self, n):
+        """release - remove the decompressed files of specifier n
+        """
+        with self._cond:
+            for filename, size in self._done[n].items():
+                scratch_file = self.scratch_name(filename)
+                if os.path.exists(scratch_file):
+                    os.remove(scratch_file)
+                self._used -= size
+            self._done[n] = dict()
+            self._current = n + 1
+            self._cond.notify_all()
+
+    def close(self):
+        """close - stop the background thread and remove any decompressed files
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+        for files in self._specs_files:
+            for filename in files:
+                scratch_file = self.scratch_name(filename)
+                if os.path.exists(scratch_file):
+                    os.remove(scratch_file)
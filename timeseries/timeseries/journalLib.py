@@ -0,0 +1,198 @@
+#!/usr/bin/env python2
+"""
+This module provides the checkpoint/resume journal of the time-series
+generation. After each specifier is converted the output variable files
+are recorded with their size, modification time and, when the generator
+passes a probe, the number and last value of their time records. Each rank group
+manager writes the entries of its group to a journal part file with an
+atomic rename, and the manager task merges the parts into the journal
+when the next job starts. Specifiers whose output files are all in the
+journal are skipped on restart, and output files that exist but are not
+in the journal, or differ from their entry, are partial and removed so
+they are written again. The size and modification time are compared
+first and a file that matches them is probed as well, so a file
+truncated after the job and touched back to its journaled modification
+time is not trusted: its time records must still read back and end on
+the journaled last time. The values are not read back, the --verify
+option checks their contents.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import glob
+import inspect
+import os
+import shutil
+
+from timeseries import tseriesUtilsLib
+
+JOURNAL_FILE = '.tseries_journal.json'
+JOURNAL_VERSION = 1
+
+# pyReshaper write mode that skips the existing output files
+SKIP_EXISTING = 's'
+
+def _part_path(dirname, part):
+    return os.path.join(dirname, '{0}.{1}'.format(JOURNAL_FILE, part))
+
+#==================================================================
+# file_entry - return the journal entry of an output file
+#==================================================================
+def file_entry(filename, probe=None):
+    """file_entry - return a dictionary with the size and modification time of
+    filename. The entry of a directory store has the total size and the
+    latest modification time of its files. With probe, a function returning
+    the ncHeaderLib.read_time summary of filename, the entry also has the
+    ntime and last time value.
+    """
+    paths = _store_files(filename)
+    entry = {'size' : sum(os.path.getsize(path) for path in paths),
+             'mtime' : max([os.path.getmtime(path) for path in paths] + [os.path.getmtime(filename)])}
+    if probe is not None:
+        time = probe(filename)
+        entry['ntime'] = time['ntime']
+        entry['last'] = time['last']
+    return entry
+
+def _store_files(filename):
+    # the file itself or the sorted files of a directory store
+    if not os.path.isdir(filename):
+        return [filename]
+    paths = list()
+    for dirpath, dirnames, filenames in os.walk(filename):
+        paths.extend(os.path.join(dirpath, name) for name in filenames)
+    return paths
+
+def _matches(filename, entry, probe=None):
+    # journal entries written before the mtime was recorded only have a size
+    current = file_entry(filename)
+    if current['size'] != entry['size'] or current['mtime'] != entry.get('mtime', current['mtime']):
+        return False
+    if probe is None:
+        return True
+
+    # the time records of a matching file must read back to the journaled last record
+    try:
+        time = probe(filename)
+    except Exception:
+        return False
+    if time['ntime'] == 0 or time['last'] is None:
+        return False
+    return time['ntime'] == entry.get('ntime', time['ntime']) and time['last'] == entry.get('last', time['last'])
+
+#==================================================================
+# read_journal - read the journal and any part files
+#==================================================================
+def read_journal(dirname):
+    """read_journal - read the journal in dirname merged with the part files
+    written by the rank groups of an interrupted job
+
+    Return:
+    files (dictionary) - output file name to journal entry
+    """
+    files = dict()
+    journal = tseriesUtilsLib.read_json(os.path.join(dirname, JOURNAL_FILE), default=dict())
+    if journal.get('version') == JOURNAL_VERSION:
+        files.update(journal.get('files', dict()))
+
+    for part in sorted(glob.glob(_part_path(dirname, '*'))):
+        journal = tseriesUtilsLib.read_json(part, default=dict())
+        if journal.get('version') == JOURNAL_VERSION:
+            files.update(journal.get('files', dict()))
+
+    return files
+
+#==================================================================
+# consolidate - merge the part files into the journal
+#==================================================================
+def consolidate(dirname, files):
+    """consolidate - write files as the journal in dirname and remove the part
+    files. Run by the manager before the rank groups write new parts.
+    """
+    tseriesUtilsLib.write_json_atomic(os.path.join(dirname, JOURNAL_FILE),
+                                      {'version' : JOURNAL_VERSION, 'files' : files})
+    for part in glob.glob(_part_path(dirname, '*')):
+        os.remove(part)
+
+#==================================================================
+# write_part - write the journal part file of a rank group
+#==================================================================
+def write_part(dirname, part, files):
+    """write_part - atomically write the entries completed by a rank group
+
+    Arguments:
+    dirname (string) - journal directory
+    part (integer) - rank group number
+    files (dictionary) - output file name to journal entry
+    """
+    tseriesUtilsLib.write_json_atomic(_part_path(dirname, part), {'version' : JOURNAL_VERSION, 'files' : files})
+
+#==================================================================
+# clear - remove the journal once the job has completed
+#==================================================================
+def clear(dirname):
+    """clear - remove the journal and part files in dirname
+    """
+    for filename in [os.path.join(dirname, JOURNAL_FILE)] + glob.glob(_part_path(dirname, '*')):
+        if os.path.exists(filename):
+            os.remove(filename)
+
+#==================================================================
+# resume_files - compare the output files with the journal
+#==================================================================
+def resume_files(output_files, files, probe=None):
+    """resume_files - check the output files of a specifier against the
+    journal. Journaled files that exist with the journaled size and
+    modification time, and whose time records read back with probe, are
+    done, other existing files are partial and are removed. Output files
+    may be directory stores.
+
+    Arguments:
+    output_files (list) - output variable files of a specifier
+    files (dictionary) - journal entries returned by read_journal
+    probe (function) - returns the ncHeaderLib.read_time summary of an output
+                       file and raises an exception for an unreadable file
+
+    Return:
+    (done, removed) - lists of the finished and the removed output files
+    """
+    done = list()
+    removed = list()
+    for output_file in output_files:
+        entry = files.get(output_file)
+        exists = os.path.exists(output_file)
+        if entry is not None and exists and _matches(output_file, entry, probe):
+            done.append(output_file)
+        elif exists:
+            if os.path.isdir(output_file):
+                shutil.rmtree(output_file)
+            else:
+                os.remove(output_file)
+            removed.append(output_file)
+
+    return (done, removed)
+
+#==================================================================
+# reshaper_arguments - return the pyReshaper resume keyword arguments
+#==================================================================
+def reshaper_arguments(create_reshaper, skip_existing):
+    """reshaper_arguments - return the keyword arguments of create_reshaper
+    that skip the output files kept from the journal, empty if skip_existing
+    is False or the installed pyReshaper version has no write mode
+    """
+    if not skip_existing:
+        return dict()
+
+    getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+    try:
+        args = getargspec(create_reshaper).args
+    except TypeError:
+        return dict()
+
+    if 'wmode' not in args:
+        return dict()
+    return {'wmode' : SKIP_EXISTING}
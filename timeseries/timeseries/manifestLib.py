@@ -0,0 +1,168 @@
+#!/usr/bin/env python2
+"""
+This module manages the per-directory time-series manifest that records
+which history time slice files have already been converted into each
+variable time-series output segment. The manifest allows
+cesm_tseries_generator.py to run incrementally, converting only the
+history files that were added to the short term archive since the last run.
+
+The manifest is a JSON file in each tseries_output_dir of the form:
+
+{ "version" : 1,
+  "streams" : { "<case>.<comp>.<stream>" :
+                  { "segments" : [ { "suffix" : ".000101-001012.nc",
+                                     "files" : [ "<case>.<comp>.<stream>.0001-01.nc", ... ],
+                                     "end" : { "units" : "days since 0001-01-01 00:00:00", ... } } ] } } }
+
+The optional end of a segment is the ncHeaderLib.read_time summary of
+its output, so an incremental run can check that the first new history
+file continues where the last segment ended.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import os
+
+from timeseries import tseriesUtilsLib
+
+MANIFEST_NAME = 'tseries_manifest.json'
+MANIFEST_VERSION = 1
+
+#==========================================================
+# manifest_path - return the manifest file name for a dir
+#==========================================================
+def manifest_path(tseries_output_dir):
+    """manifest_path - return the full path to the manifest file in the
+    tseries_output_dir
+    """
+    return os.path.join(tseries_output_dir, MANIFEST_NAME)
+
+#======================================================
+# read_manifest - read the manifest in a tseries dir
+#======================================================
+def read_manifest(tseries_output_dir):
+    """read_manifest - read the manifest from the tseries_output_dir. An
+    empty manifest is returned if one does not exist yet.
+
+    Arguments:
+    tseries_output_dir (string) - time series output directory
+
+    Return:
+    manifest (dictionary) - manifest contents
+    """
+    manifest = tseriesUtilsLib.read_json(manifest_path(tseries_output_dir))
+    if manifest is None:
+        manifest = {'version' : MANIFEST_VERSION, 'streams' : dict()}
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        err_msg = 'manifestLib.read_manifest ERROR: unsupported manifest version in {0}'.format(manifest_path(tseries_output_dir))
+        raise TypeError(err_msg)
+
+    return manifest
+
+#=================================================================
+# converted_files - return the set of history files in a stream
+#=================================================================
+def converted_files(manifest, stream_key):
+    """converted_files - return the set of history file basenames that have
+    already been converted for stream_key
+
+    Arguments:
+    manifest (dictionary) - manifest as returned by read_manifest
+    stream_key (string) - stream key <case>.<comp>.<stream>
+
+    Return:
+    files (set) - history file basenames
+    """
+    files = set()
+    stream = manifest['streams'].get(stream_key)
+    if stream is not None:
+        for segment in stream['segments']:
+            files.update(segment['files'])
+
+    return files
+
+#=====================================================
+# add_segment - record a converted output segment
+#=====================================================
+def add_segment(manifest, stream_key, suffix, history_files, replace=False, end=None):
+    """add_segment - record that the history_files were converted into the
+    output segment with the given suffix
+
+    Arguments:
+    manifest (dictionary) - manifest as returned by read_manifest
+    stream_key (string) - stream key <case>.<comp>.<stream>
+    suffix (string) - time series output file suffix for the segment
+    history_files (list) - history files converted into the segment
+    replace (boolean) - if True, discard any previously recorded segments
+    end (dictionary) - ncHeaderLib.read_time summary of the segment output or None
+    """
+    stream = manifest['streams'].setdefault(stream_key, {'segments' : list()})
+    if replace:
+        stream['segments'] = list()
+
+    # a segment that is regenerated with the same suffix replaces the old record
+    stream['segments'] = [seg for seg in stream['segments'] if seg['suffix'] != suffix]
+    segment = {'suffix' : suffix, 'files' : sorted(os.path.basename(f) for f in history_files)}
+    if end is not None:
+        segment['end'] = end
+    stream['segments'].append(segment)
+    stream['segments'].sort(key=lambda seg: seg['suffix'])
+
+#=============================================================
+# segment_end - return the end time of the last segment
+#=============================================================
+def segment_end(manifest, stream_key):
+    """segment_end - return the suffix and the end time summary of the last
+    converted segment of stream_key, or None if the stream has no segment
+    or its last segment was recorded without an end time
+    """
+    stream = manifest['streams'].get(stream_key)
+    if stream is None or len(stream['segments']) == 0:
+        return None
+    segment = stream['segments'][-1]
+    if segment.get('end') is None:
+        return None
+    return (segment['suffix'], segment['end'])
+
+#=============================================================
+# write_manifest - write the manifest in a tseries dir
+#=============================================================
+def write_manifest(tseries_output_dir, manifest):
+    """write_manifest - atomically write the manifest to the tseries_output_dir
+    """
+    tseriesUtilsLib.write_json_atomic(manifest_path(tseries_output_dir), manifest)
+
+#========================================================================
+# update_manifests - record a list of converted streams in their manifests
+#========================================================================
+def update_manifests(tseries_streams, incremental, probe=None):
+    """update_manifests - record the converted segments for each stream in the
+    manifest of its tseries_output_dir. Must only be called on the manager task.
+
+    Arguments:
+    tseries_streams (list) - stream dictionaries returned by readArchiveXML
+    incremental (boolean) - if False, each stream was converted in full and its
+                            previous segments are discarded
+    probe (function) - returns the end time summary of a stream dictionary's
+                       output or None, the segments have no end without it
+    """
+    by_dir = dict()
+    for tseries_stream in tseries_streams:
+        by_dir.setdefault(tseries_stream['tseries_output_dir'], list()).append(tseries_stream)
+
+    for tseries_output_dir, dir_streams in by_dir.items():
+        manifest = read_manifest(tseries_output_dir)
+        replaced = set()
+        for tseries_stream in dir_streams:
+            stream_key = tseries_stream['stream_key']
+            replace = not incremental and stream_key not in replaced
+            end = probe(tseries_stream) if probe is not None else None
+            add_segment(manifest, stream_key, tseries_stream['spec'].output_file_suffix,
+                        tseries_stream['spec'].input_file_list, replace=replace, end=end)
+            replaced.add(stream_key)
+        write_manifest(tseries_output_dir, manifest)
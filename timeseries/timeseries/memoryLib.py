@@ -0,0 +1,84 @@
+#!/usr/bin/env python2
+"""
+This module provides the memory budget of the time-series generation.
+pyReshaper reads each time series variable from the history slices in
+read chunks over the variable dimensions. With the --memory-budget
+option the read chunk sizes are chosen so the largest variable chunk of
+a specifier, with the copies made while it is written, fits in the
+per rank budget. Records that fit are read several at a time, larger
+records are split along their outermost non-time dimensions, e.g. the
+vertical levels of the 3-D fields of the high frequency streams.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+# copies of a read chunk held in memory while it is converted and written
+MEMORY_FACTOR = 3
+
+# largest number of time records read at once
+MAX_TIME_CHUNK = 64
+
+#==================================================================
+# read_chunks - choose the read chunk sizes for a memory budget
+#==================================================================
+def read_chunks(variables, var_dims, dimensions, time_dim, budget_bytes):
+    """read_chunks - return the pyReshaper read chunk sizes that keep the
+    largest variable chunk within budget_bytes
+
+    Arguments:
+    variables (dictionary) - time series variable name to record size in bytes
+    var_dims (dictionary) - time series variable name to list of dimension names
+    dimensions (dictionary) - dimension name to size
+    time_dim (string) - name of the unlimited time dimension
+    budget_bytes (integer) - per rank memory budget
+
+    Return:
+    chunks (dictionary) - dimension name to read chunk size, empty if there
+                          are no variables
+    """
+    if len(variables) == 0:
+        return dict()
+
+    usable = max(1, budget_bytes // MEMORY_FACTOR)
+    name = max(sorted(variables), key=lambda name: variables[name])
+    record = variables[name]
+
+    # whole records fit, read as many as the budget allows
+    if record <= usable:
+        return {time_dim : int(max(1, min(MAX_TIME_CHUNK, usable // max(1, record))))}
+
+    # split the outermost dimensions of the largest variable until a chunk fits
+    chunks = {time_dim : 1}
+    chunk = record
+    for dim in var_dims[name]:
+        if dim == time_dim:
+            continue
+        size = dimensions[dim]
+        per_index = chunk // size
+        if per_index <= usable:
+            chunks[dim] = int(max(1, usable // max(1, per_index)))
+            return chunks
+        chunks[dim] = 1
+        chunk = per_index
+
+    return chunks
+
+#==================================================================
+# chunk_bytes - estimate the largest read chunk of a specifier
+#==================================================================
+def chunk_bytes(variables, var_dims, dimensions, time_dim, chunks):
+    """chunk_bytes - return the bytes of the largest variable read chunk for
+    the read chunk sizes returned by read_chunks
+    """
+    largest = 0
+    for name, record in variables.items():
+        nbytes = record * chunks.get(time_dim, 1)
+        for dim in var_dims[name]:
+            if dim != time_dim and dim in chunks:
+                nbytes = nbytes * min(chunks[dim], dimensions[dim]) // dimensions[dim]
+        largest = max(largest, nbytes)
+    return largest
@@ -0,0 +1,216 @@
+#!/usr/bin/env python2
+"""
+This module collects machine readable throughput metrics for the
+time-series generation. Each task records the pyReshaper timers and byte
+counts for the specifiers it converted, the records are gathered and
+merged on the manager task into one record per stream and one record
+per output variable, and written as JSON or CSV.
+
+pyReshaper only times the conversion per task, so the per variable
+open/read/write/close seconds are the stream times apportioned by the
+variable's share of the stream bytes and are flagged as estimated, and
+the per variable wall_seconds is not measured and left empty.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import csv
+
+from timeseries import tseriesUtilsLib
+
+# pyReshaper timer names summed into each metrics phase
+TIMER_PHASES = [('open_seconds', ['Open Input Files', 'Open Output Files']),
+                ('read_seconds', ['Read Time-Invariant Metadata', 'Read Time-Variant Metadata',
+                                  'Read Time-Series Variables']),
+                ('write_seconds', ['Write Time-Invariant Metadata', 'Write Time-Variant Metadata',
+                                   'Write Time-Series Variables']),
+                ('close_seconds', ['Close Input Files', 'Close Output Files'])]
+
+PHASES = [phase for phase, names in TIMER_PHASES]
+
+CSV_FIELDS = ['record', 'stream', 'variable', 'output_file', 'ranks', 'bytes_read', 'bytes_written'] + \
+             PHASES + ['wall_seconds', 'read_mb_per_second', 'write_mb_per_second', 'estimated']
+
+#=====================================================================
+# reshaper_times - read the phase timers from a pyReshaper object
+#=====================================================================
+def reshaper_times(reshpr):
+    """reshaper_times - return the open/read/write/close seconds recorded by
+    the pyReshaper timer on this task. Timers that are not available in
+    the installed pyReshaper version count as zero.
+
+    Arguments:
+    reshpr (object) - pyReshaper object after convert()
+
+    Return:
+    times (dictionary) - phase name to seconds
+    """
+    times = dict((phase, 0.0) for phase in PHASES)
+    timer = getattr(reshpr, '_timer', None)
+    if timer is None:
+        return times
+
+    for phase, names in TIMER_PHASES:
+        for name in names:
+            try:
+                times[phase] += timer.get_time(name)
+            except Exception:
+                pass
+
+    return times
+
+#=====================================================================
+# reshaper_bytes - read the bytes read count from a pyReshaper object
+#=====================================================================
+def reshaper_bytes(reshpr):
+    """reshaper_bytes - return the number of data bytes pyReshaper read on this
+    task, or None if the installed version does not count them.
+    """
+    byte_counts = getattr(reshpr, '_byte_counts', None)
+    if isinstance(byte_counts, dict) and 'Actual Data' in byte_counts:
+        return byte_counts['Actual Data']
+
+    return None
+
+#========================================================================
+# task_record - create the per task metrics record for one specifier
+#========================================================================
+def task_record(stream_name, rank, wall_seconds, times, bytes_read):
+    """task_record - create the metrics of one task for one specifier
+
+    Arguments:
+    stream_name (string) - output prefix and suffix naming the specifier
+    rank (integer) - global task rank
+    wall_seconds (float) - wall time of the conversion on this task
+    times (dictionary) - phase seconds from reshaper_times
+    bytes_read (integer) - bytes read by this task or None
+    """
+    record = {'stream' : stream_name, 'rank' : rank, 'wall_seconds' : wall_seconds,
+              'bytes_read' : bytes_read}
+    record.update(times)
+    return record
+
+#=====================================================================
+# merge_task_records - merge the task records of each specifier
+#=====================================================================
+def merge_task_records(task_records):
+    """merge_task_records - merge the per task records into one record per
+    specifier. Phase seconds and bytes are summed over the tasks, the wall
+    time is the longest task wall time.
+
+    Arguments:
+    task_records (list) - task records from all the tasks
+
+    Return:
+    streams (dictionary) - stream name to merged record
+    """
+    streams = dict()
+    for task in task_records:
+        merged = streams.setdefault(task['stream'], dict([('record', 'stream'), ('stream', task['stream']),
+                                                          ('ranks', list()), ('bytes_read', 0),
+                                                          ('wall_seconds', 0.0), ('estimated', False)] +
+                                                         [(phase, 0.0) for phase in PHASES]))
+        merged['ranks'].append(task['rank'])
+        merged['wall_seconds'] = max(merged['wall_seconds'], task['wall_seconds'])
+        for phase in PHASES:
+            merged[phase] += task[phase]
+        if task['bytes_read'] is None or merged['bytes_read'] is None:
+            merged['bytes_read'] = None
+        else:
+            merged['bytes_read'] += task['bytes_read']
+
+    for merged in streams.values():
+        merged['ranks'].sort()
+
+    return streams
+
+#========================================================================
+# variable_records - create the per output variable metrics records
+#========================================================================
+def variable_records(stream_record, output_prefix, output_suffix, variables, nslices, output_files=None):
+    """variable_records - create one record per time series variable of a
+    specifier and set the bytes_written of the stream record from the
+    sizes of the output files.
+
+    Arguments:
+    stream_record (dictionary) - merged stream record
+    output_prefix (string) - specifier output_file_prefix
+    output_suffix (string) - specifier output_file_suffix
+    variables (dictionary) - variable name to record size in bytes
+    nslices (integer) - number of time records converted
+    output_files (list) - output file or store names in sorted variable order,
+                          default is output_prefix + name + output_suffix
+
+    Return:
+    records (list) - variable records
+    """
+    records = list()
+    if output_files is None:
+        output_files = [output_prefix + name + output_suffix for name in sorted(variables)]
+    for name, output_file in zip(sorted(variables), output_files):
+        bytes_written = tseriesUtilsLib.get_path_size(output_file)
+        records.append({'record' : 'variable', 'stream' : stream_record['stream'], 'variable' : name,
+                        'output_file' : output_file, 'ranks' : stream_record['ranks'],
+                        'bytes_read' : variables[name] * nslices, 'bytes_written' : bytes_written,
+                        'wall_seconds' : None, 'estimated' : True})
+
+    # apportion the stream phase times by the share of the bytes read
+    total = sum(record['bytes_read'] for record in records)
+    for record in records:
+        share = float(record['bytes_read']) / total if total > 0 else 1.0 / len(records)
+        for phase in PHASES:
+            record[phase] = stream_record[phase] * share
+
+    written = [record['bytes_written'] for record in records if record['bytes_written'] is not None]
+    stream_record['bytes_written'] = sum(written) if len(written) > 0 else None
+    if stream_record['bytes_read'] is None:
+        stream_record['bytes_read'] = total
+        stream_record['estimated'] = True
+
+    return records
+
+#===================================================================
+# add_throughput - add MB/s read and write rates to a record
+#===================================================================
+def add_throughput(record):
+    """add_throughput - set read_mb_per_second and write_mb_per_second from the
+    record bytes and the read and write phase seconds
+    """
+    for key, nbytes, seconds in [('read_mb_per_second', record.get('bytes_read'), record.get('read_seconds')),
+                                 ('write_mb_per_second', record.get('bytes_written'), record.get('write_seconds'))]:
+        record[key] = None
+        if nbytes is not None and seconds:
+            record[key] = nbytes / 1.0e6 / seconds
+
+#==========================================================
+# write_metrics - write the metrics records to a file
+#==========================================================
+def write_metrics(filename, records, wall_seconds, size):
+    """write_metrics - write the metrics records as CSV if filename ends in
+    .csv, otherwise as JSON.
+
+    Arguments:
+    filename (string) - output metrics file
+    records (list) - stream and variable records
+    wall_seconds (float) - total conversion wall time
+    size (integer) - number of tasks
+    """
+    for record in records:
+        add_throughput(record)
+
+    if filename.endswith('.csv'):
+        with open(filename, 'w') as fh:
+            writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for record in records:
+                row = dict(record)
+                row['ranks'] = ' '.join(str(r) for r in record['ranks'])
+                writer.writerow(row)
+    else:
+        tseriesUtilsLib.write_json_atomic(filename, {'tasks' : size,
+                                                     'wall_seconds' : wall_seconds,
+                                                     'records' : records})
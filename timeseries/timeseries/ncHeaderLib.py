@@ -0,0 +1,181 @@
+#!/usr/bin/env python2
+"""
+This module provides header-only access to netCDF history time slice
+files for the time-series generation tools. PyNIO is used when it is
+available, the same as pyReshaper, otherwise netCDF4-python.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+#
+# installed dependencies
+#
+try:
+    import Nio
+except ImportError:
+    Nio = None
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+#==================================================================
+# read_header - read the dimensions and variables of a netCDF file
+#==================================================================
+def read_header(filename):
+    """read_header - read the header of a netCDF file without reading any
+    variable data.
+
+    Arguments:
+    filename (string) - full path to the netCDF file
+
+    Return:
+    header (dictionary) - with keys
+        dimensions (dictionary) - dimension name to size
+        unlimited (string) - name of the unlimited dimension or None
+        variables (dictionary) - variable name to a dictionary with keys
+                                 dimensions (list of names) and itemsize (bytes)
+    """
+    if Nio is not None:
+        return _read_header_nio(filename)
+    elif netCDF4 is not None:
+        return _read_header_netcdf4(filename)
+
+    err_msg = 'ncHeaderLib.read_header ERROR: reading {0} requires PyNIO or netCDF4'.format(filename)
+    raise ImportError(err_msg)
+
+#==================================================================
+# time_variant_variables - return the time dependent variable names
+#==================================================================
+def time_variant_variables(header, exclude=None):
+    """time_variant_variables - return the sorted names of the variables in
+    header that depend on the unlimited (time) dimension and are not
+    listed in exclude. These are the variables that pyReshaper writes
+    to their own time series files.
+
+    Arguments:
+    header (dictionary) - as returned by read_header
+    exclude (list) - variable names to exclude, e.g. the tseries_time_variant_variables
+    """
+    unlimited = header['unlimited']
+    exclude = set(exclude or list())
+    names = list()
+    for name, var in header['variables'].items():
+        if (unlimited in var['dimensions'] and name != unlimited and name not in exclude):
+            names.append(name)
+
+    return sorted(names)
+
+#==================================================================
+# record_bytes - return the size of one time record of a variable
+#==================================================================
+def record_bytes(header, name):
+    """record_bytes - return the number of bytes in a single time record
+    of variable name
+    """
+    var = header['variables'][name]
+    nbytes = var['itemsize']
+    for dim in var['dimensions']:
+        if dim != header['unlimited']:
+            nbytes *= header['dimensions'][dim]
+
+    return nbytes
+
+def _read_header_nio(filename):
+    import numpy as np
+
+    f = Nio.open_file(filename, 'r')
+    try:
+        header = {'dimensions' : dict(f.dimensions), 'unlimited' : None, 'variables' : dict()}
+        for dim in f.dimensions:
+            if f.unlimited(dim):
+                header['unlimited'] = dim
+        for name, var in f.variables.items():
+            header['variables'][name] = {'dimensions' : list(var.dimensions),
+                                         'itemsize' : np.dtype(var.typecode()).itemsize}
+    finally:
+        f.close()
+
+    return header
+
+def _read_header_netcdf4(filename):
+    f = netCDF4.Dataset(filename, 'r')
+    try:
+        header = {'dimensions' : dict(), 'unlimited' : None, 'variables' : dict()}
+        for name, dim in f.dimensions.items():
+            header['dimensions'][name] = len(dim)
+            if dim.isunlimited():
+                header['unlimited'] = name
+        for name, var in f.variables.items():
+            itemsize = getattr(var.dtype, 'itemsize', 1)
+            header['variables'][name] = {'dimensions' : list(var.dimensions),
+                                         'itemsize' : itemsize}
+    finally:
+        f.close()
+
+    return header
+
+#==================================================================
+# read_time - read the time coordinate summary of a netCDF file
+#==================================================================
+def read_time(filename, time_name='time'):
+    """read_time - read the time coordinate of a netCDF file and the first and
+    last values of its CF bounds variable. Only the time and bounds variables
+    are read.
+
+    Arguments:
+    filename (string) - full path to the netCDF file
+    time_name (string) - name of the time coordinate variable
+
+    Return:
+    time (dictionary) - with keys
+        ntime (integer) - number of time records
+        units (string) - time units attribute or None
+        calendar (string) - time calendar attribute or None
+        first, last (float) - first and last time values or None if ntime is 0
+        min_step, max_step (float) - smallest and largest step between records or None
+        first_bound, last_bound (float) - lower bound of the first record and upper
+                                          bound of the last record or None
+    """
+    if Nio is not None:
+        f = Nio.open_file(filename, 'r')
+        attributes = lambda var: dict(var.attributes)
+    elif netCDF4 is not None:
+        f = netCDF4.Dataset(filename, 'r')
+        attributes = lambda var: dict((name, var.getncattr(name)) for name in var.ncattrs())
+    else:
+        err_msg = 'ncHeaderLib.read_time ERROR: reading {0} requires PyNIO or netCDF4'.format(filename)
+        raise ImportError(err_msg)
+
+    try:
+        if time_name not in f.variables:
+            err_msg = 'ncHeaderLib.read_time ERROR: {0} has no {1} variable'.format(filename, time_name)
+            raise KeyError(err_msg)
+        var = f.variables[time_name]
+        attrs = attributes(var)
+        values = [float(value) for value in var[:]]
+        time = {'ntime' : len(values), 'units' : attrs.get('units'), 'calendar' : attrs.get('calendar'),
+                'first' : None, 'last' : None, 'min_step' : None, 'max_step' : None,
+                'first_bound' : None, 'last_bound' : None}
+        if len(values) > 0:
+            time['first'] = values[0]
+            time['last'] = values[-1]
+        steps = [b - a for a, b in zip(values[:-1], values[1:])]
+        if len(steps) > 0:
+            time['min_step'] = min(steps)
+            time['max_step'] = max(steps)
+
+        bounds = attrs.get('bounds')
+        if bounds in f.variables and len(values) > 0:
+            bounds_var = f.variables[bounds]
+            time['first_bound'] = float(bounds_var[0, 0])
+            time['last_bound'] = float(bounds_var[-1, 1])
+    finally:
+        f.close()
+
+    return time
@@ -0,0 +1,116 @@
+#!/usr/bin/env python2
+"""
+This module provides the node topology of the time-series generation
+tasks used by the node-local staging and the I/O aggregation mode. The
+tasks of a rank group are grouped by node and, with the --io-aggregators
+option, the lowest tasks of each node are the I/O aggregators of the
+node. Each aggregator reads the history slices for a sub-communicator of
+the tasks on its node and passes the records to the other tasks of the
+sub-communicator, which compress and write them, so only the aggregators
+open the history files on the shared file system.
+
+The --simulate-nodes option names the node of each task from its rank
+so the topology can be exercised with several "nodes" on one machine.
+The node-local staging and write-behind directories have a subdirectory
+per node so the simulated nodes do not share their files, and the
+staging directory of a node has a subdirectory per rank group, since the
+specifiers of different groups, e.g. the least_significant_digit splits
+of one stream, can stage the same history files.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import os
+
+from timeseries import stageLib
+
+# default number of I/O aggregator tasks per node
+IO_AGGREGATORS = 1
+
+#==================================================================
+# get_host - return the node name of a task
+#==================================================================
+def get_host(rank, ranks_per_node=None):
+    """get_host - return the name of the node of the task with global rank,
+    the host name or, with ranks_per_node, a simulated node name such as
+    node0002 for consecutive blocks of ranks_per_node ranks
+    """
+    if ranks_per_node:
+        return simulated_host(rank, ranks_per_node)
+    return stageLib.get_host()
+
+#==================================================================
+# simulated_host - return the simulated node name of a task
+#==================================================================
+def simulated_host(rank, ranks_per_node):
+    """simulated_host - return the simulated node name of rank for nodes of
+    ranks_per_node consecutive ranks
+    """
+    return 'node{0:04d}'.format(rank // max(1, ranks_per_node))
+
+#==================================================================
+# node_dir - return the directory of a node under a node-local root
+#==================================================================
+def node_dir(root, host):
+    """node_dir - return the subdirectory of root for the files of the tasks
+    on node host, distinct for each simulated node of one machine
+    """
+    return os.path.join(root, host)
+
+#==================================================================
+# group_dir - return the directory of a rank group on a node
+#==================================================================
+def group_dir(node_root, color):
+    """group_dir - return the subdirectory of the node directory node_root
+    for the files of rank group color, so the groups on a node do not evict
+    or remove each other's files
+    """
+    return os.path.join(node_root, 'group{0}'.format(color))
+
+#==================================================================
+# node_layout - compute the node topology of a group of tasks
+#==================================================================
+def node_layout(hosts, aggregators=IO_AGGREGATORS):
+    """node_layout - group the tasks by node and choose the I/O aggregators
+    of each node. The aggregators are the lowest ranks of a node and the
+    other tasks of the node are assigned to them in turn, so every
+    aggregator is the lowest rank of its sub-communicator.
+
+    Arguments:
+    hosts (list) - (rank, host name) of every task
+    aggregators (integer) - aggregator tasks per node
+
+    Return:
+    layout (dictionary) - rank to a dictionary with keys
+        host (string) - host name
+        node (integer) - node number, nodes ordered by their lowest rank
+        node_rank (integer) - rank of the task on its node
+        aggregator (boolean) - True for an I/O aggregator
+        color (integer) - number of the aggregator sub-communicator of the task
+        naggregators (integer) - number of aggregators of all the nodes
+    """
+    node_ranks = dict()
+    for rank, host in hosts:
+        node_ranks.setdefault(host, list()).append(rank)
+
+    layout = dict()
+    color = 0
+    for node, host in enumerate(sorted(node_ranks, key=lambda host: min(node_ranks[host]))):
+        ranks = sorted(node_ranks[host])
+        naggs = max(1, min(aggregators, len(ranks)))
+        for node_rank, rank in enumerate(ranks):
+            if node_rank < naggs:
+                agg = node_rank
+            else:
+                agg = (node_rank - naggs) % naggs
+            layout[rank] = {'host' : host, 'node' : node, 'node_rank' : node_rank, 'aggregator' : node_rank < naggs,
+                            'color' : color + agg}
+        color += naggs
+
+    for entry in layout.values():
+        entry['naggregators'] = color
+    return layout
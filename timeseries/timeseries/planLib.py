@@ -0,0 +1,196 @@
+#!/usr/bin/env python2
+"""
+This module provides the dry-run planning report for the time-series
+generation. The report lists the output files of each stream specifier
+with the estimated input and output bytes and estimates the wall time
+of the conversion on the timeseries_pes configured for the machine in
+Machines/machine_postprocess.xml, recommending a task count that fits
+within the configured wallclock limit.
+
+All estimates come from the scheduleLib cost model and the history file
+headers, the output bytes are the uncompressed time series data.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import os
+import xml.etree.ElementTree as ET
+
+from timeseries import scheduleLib
+
+# fraction of the wallclock limit a recommended task count may use
+WALLCLOCK_SAFETY = 0.8
+
+#==================================================================
+# parse_wallclock - convert a batch wallclock string to seconds
+#==================================================================
+def parse_wallclock(wallclock):
+    """parse_wallclock - return the number of seconds in a batch wallclock
+    limit formatted as hh:mm or hh:mm:ss
+    """
+    parts = [int(part) for part in wallclock.strip().split(':')]
+    if len(parts) not in [2, 3]:
+        err_msg = 'planLib.parse_wallclock ERROR: invalid wallclock {0}'.format(wallclock)
+        raise ValueError(err_msg)
+
+    seconds = parts[0] * 3600 + parts[1] * 60
+    if len(parts) == 3:
+        seconds += parts[2]
+
+    return seconds
+
+#==========================================================================
+# read_timeseries_pes - read the timeseries_pes settings for a machine
+#==========================================================================
+def read_timeseries_pes(machine_xml, machine):
+    """read_timeseries_pes - read the timeseries_pes element of a machine
+    in the machine_postprocess.xml file
+
+    Arguments:
+    machine_xml (string) - full path to Machines/machine_postprocess.xml
+    machine (string) - machine name
+
+    Return:
+    pes (dictionary) - with keys pes, pes_per_node and wallclock_seconds,
+                       or None if the machine or element is not defined
+    """
+    if machine is None or not os.path.isfile(machine_xml):
+        return None
+
+    xml_tree = ET.ElementTree()
+    xml_tree.parse(machine_xml)
+    for xmlmachine in xml_tree.findall("machine"):
+        if xmlmachine.get("name").lower() == machine.lower():
+            timeseries_pes = xmlmachine.find("timeseries_pes")
+            if timeseries_pes is None:
+                return None
+            return {'pes' : int(timeseries_pes.text),
+                    'pes_per_node' : int(timeseries_pes.get("pes_per_node", 1)),
+                    'wallclock_seconds' : parse_wallclock(timeseries_pes.get("wallclock", "02:00"))}
+
+    return None
+
+#======================================================================
+# stream_plan - estimate the input and output of a stream specifier
+#======================================================================
+def stream_plan(name, output_prefix, output_suffix, variables, nslices, input_bytes, cost, split_bytes=0):
+    """stream_plan - create the plan record of one stream specifier
+
+    Arguments:
+    name (string) - stream name
+    output_prefix (string) - specifier output_file_prefix
+    output_suffix (string) - specifier output_file_suffix
+    variables (dictionary) - variable name to record size in bytes
+    nslices (integer) - number of time records in the specifier
+    input_bytes (integer) - total size of the history files
+    cost (float) - estimated serial cost in seconds
+    split_bytes (integer) - history file bytes read again by a least_significant_digit split
+
+    Return:
+    plan (dictionary) - with keys name, output_files, input_bytes, split_bytes, output_bytes and cost
+    """
+    return {'name' : name,
+            'output_files' : [output_prefix + var + output_suffix for var in sorted(variables)],
+            'input_bytes' : input_bytes,
+            'split_bytes' : split_bytes,
+            'output_bytes' : sum(variables.values()) * nslices,
+            'cost' : cost}
+
+#======================================================================
+# make_plan - estimate the wall time and recommend a task count
+#======================================================================
+def make_plan(stream_plans, nvars, size, timeseries_pes=None):
+    """make_plan - estimate the conversion wall time for the current number
+    of tasks and for the configured timeseries_pes and recommend the
+    smallest task count whose estimate is within WALLCLOCK_SAFETY of
+    the configured wallclock limit.
+
+    Arguments:
+    stream_plans (list) - plan records returned by stream_plan
+    nvars (list) - number of time series variables of each stream
+    size (integer) - current number of tasks
+    timeseries_pes (dictionary) - as returned by read_timeseries_pes or None
+
+    Return:
+    plan (dictionary) - with keys streams, input_bytes, split_bytes, output_bytes, size,
+                        wall_seconds, timeseries_pes, pes_wall_seconds,
+                        recommended_pes and recommended_wall_seconds
+    """
+    costs = [stream['cost'] for stream in stream_plans]
+    plan = {'streams' : stream_plans,
+            'input_bytes' : sum(stream['input_bytes'] for stream in stream_plans),
+            'split_bytes' : sum(stream.get('split_bytes', 0) for stream in stream_plans),
+            'output_bytes' : sum(stream['output_bytes'] for stream in stream_plans),
+            'size' : size,
+            'wall_seconds' : scheduleLib.estimate_wall_seconds(scheduleLib.allocate_ranks(costs, size), costs, nvars),
+            'timeseries_pes' : timeseries_pes,
+            'pes_wall_seconds' : None,
+            'recommended_pes' : None,
+            'recommended_wall_seconds' : None}
+
+    if timeseries_pes is not None:
+        pes = timeseries_pes['pes']
+        plan['pes_wall_seconds'] = scheduleLib.estimate_wall_seconds(scheduleLib.allocate_ranks(costs, pes), costs, nvars)
+
+        # search up to 4 times the configured task count
+        wall_limit = WALLCLOCK_SAFETY * timeseries_pes['wallclock_seconds']
+        plan['recommended_pes'], plan['recommended_wall_seconds'] = \
+            scheduleLib.recommend_pes(costs, nvars, wall_limit, 4 * pes, timeseries_pes['pes_per_node'])
+
+    return plan
+
+def _format_bytes(nbytes):
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if nbytes < 1024.0 or unit == 'TB':
+            return '{0:.1f} {1}'.format(nbytes, unit)
+        nbytes /= 1024.0
+
+def _format_seconds(seconds):
+    seconds = int(round(seconds))
+    return '{0:02d}:{1:02d}:{2:02d}'.format(seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+#==================================================================
+# print_plan - print the dry-run planning report
+#==================================================================
+def print_plan(plan, debug=0):
+    """print_plan - print the planning report returned by make_plan. The
+    output file names of each stream are listed with debug > 0.
+    """
+    print('cesm_tseries_generator: plan for {0} specifiers'.format(len(plan['streams'])))
+    for stream in plan['streams']:
+        print('    {0}: {1} output files, input {2}, output {3}, estimated cost {4:.1f} seconds'.format(
+            stream['name'], len(stream['output_files']), _format_bytes(stream['input_bytes']),
+            _format_bytes(stream['output_bytes']), stream['cost']))
+        if stream.get('split_bytes', 0) > 0:
+            print('        least_significant_digit split, reads {0} of the other variables again'.format(
+                _format_bytes(stream['split_bytes'])))
+        if debug:
+            for output_file in stream['output_files']:
+                print('        {0}'.format(output_file))
+
+    print('    total input {0}, total uncompressed output {1}'.format(_format_bytes(plan['input_bytes']),
+                                                                   _format_bytes(plan['output_bytes'])))
+    if plan.get('split_bytes', 0) > 0:
+        print('    the least_significant_digit splits read every history slice once per split, {0} read again'.format(
+            _format_bytes(plan['split_bytes'])))
+    print('    estimated wall time on {0} tasks: {1}'.format(plan['size'], _format_seconds(plan['wall_seconds'])))
+
+    timeseries_pes = plan['timeseries_pes']
+    if timeseries_pes is None:
+        print('    timeseries_pes is not defined for this machine, no task count recommendation')
+        return
+
+    print('    estimated wall time on timeseries_pes {0} tasks: {1}, wallclock limit {2}'.format(
+        timeseries_pes['pes'], _format_seconds(plan['pes_wall_seconds']),
+        _format_seconds(timeseries_pes['wallclock_seconds'])))
+    if plan['recommended_pes'] is None:
+        print('    no task count up to {0} fits within {1:.0f}% of the wallclock limit, '
+              'split the conversion with tseries_filecat_years or --incremental'.format(
+              4 * timeseries_pes['pes'], 100 * WALLCLOCK_SAFETY))
+    else:
+        print('    recommended timeseries_pes: {0} tasks, estimated wall time {1}'.format(
+            plan['recommended_pes'], _format_seconds(plan['recommended_wall_seconds'])))
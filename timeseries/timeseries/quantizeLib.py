@@ -0,0 +1,191 @@
+#!/usr/bin/env python2
+"""
+This module provides the precision trimming of the time-series
+generation. The optional tseries_quantize element of a history stream in
+env_timeseries.xml sets the netCDF4 least_significant_digit of the time
+series variables of the stream, with per variable overrides,
+
+    <tseries_quantize least_significant_digit="3">
+      <variable name="TS" least_significant_digit="2"/>
+      <variable name="PRECT" least_significant_digit="none"/>
+    </tseries_quantize>
+
+The values are rounded to the power of two scale that keeps the given
+number of decimal digits, so the trailing mantissa bits are zero and the
+deflate of the netcdf4c files compresses them. pyReshaper applies one
+setting per specifier so the variables of a stream are split into one
+specifier per setting, named with a .lsd<digits> suffix in the metrics
+and plan, e.g. case.cam.h0.000101-001012.lsd2. "none" keeps the full
+precision. pyReshaper writes the metadata sidecar of the first split
+only, the variable files of the other splits repeat the time-invariant
+metadata.
+
+Each split is a separate pyReshaper specifier that opens and reads every
+history slice of the stream, and the record variables of the slices are
+interleaved, so a stream with N settings reads its history files about N
+times. The rank scheduler charges each split for the whole history files
+and the --dry-run plan reports the bytes read again by the splits, so a
+per variable override is only worth it when the output savings outweigh
+the extra reads.
+
+The achieved compression ratio of each stream, the uncompressed bytes of
+the time series variables over the bytes of the output files, is
+reported after the conversion.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import math
+
+from timeseries import tseriesUtilsLib
+
+#
+# installed dependencies
+#
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#==================================================================
+# parse_digits - parse a least_significant_digit setting
+#==================================================================
+def parse_digits(text):
+    """parse_digits - return the integer least_significant_digit of a
+    setting, or None for none or an empty setting
+
+    Raises ValueError for any other value.
+    """
+    if text is None or text.strip().lower() in ['', 'none']:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        err_msg = 'quantizeLib.parse_digits ERROR: invalid least_significant_digit {0}'.format(text)
+        raise ValueError(err_msg)
+
+#==================================================================
+# read_quantize - read the quantization settings of a stream
+#==================================================================
+def read_quantize(file_spec):
+    """read_quantize - read the tseries_quantize element of an
+    env_timeseries.xml file_extension element
+
+    Return:
+    quantize (dictionary) - with keys default, the stream least_significant_digit
+                            or None, and variables, variable name to its
+                            least_significant_digit or None. Empty if the
+                            stream has no tseries_quantize element.
+    """
+    quantize_spec = file_spec.find("tseries_quantize")
+    if quantize_spec is None:
+        return dict()
+
+    variables = dict()
+    for variable in quantize_spec.findall("variable"):
+        variables[variable.get("name")] = parse_digits(variable.get("least_significant_digit"))
+
+    return {'default' : parse_digits(quantize_spec.get("least_significant_digit")), 'variables' : variables}
+
+#==================================================================
+# group_variables - group the variables of a stream by setting
+#==================================================================
+def group_variables(quantize, names):
+    """group_variables - return the list of (least_significant_digit, names)
+    of the variables sharing each setting, the full precision group first
+    and the others by increasing digits
+    """
+    groups = dict()
+    for name in names:
+        digits = quantize.get('variables', dict()).get(name, quantize.get('default'))
+        groups.setdefault(digits, list()).append(name)
+
+    return [(digits, sorted(groups[digits])) for digits in sorted(groups, key=lambda d: (d is not None, d))]
+
+#==================================================================
+# split_name - return the name suffix of a split specifier
+#==================================================================
+def split_name(digits):
+    """split_name - return the suffix naming the specifier of the variables
+    with least_significant_digit digits, e.g. lsd2 or lsdnone
+    """
+    return 'lsd{0}'.format('none' if digits is None else digits)
+
+#==================================================================
+# quantize_scale - return the rounding scale of a setting
+#==================================================================
+def quantize_scale(digits):
+    """quantize_scale - return the power of two scale the values are rounded
+    with, the same as the netCDF4 least_significant_digit
+    """
+    exp = -digits
+    bits = int(math.ceil(math.log(10.0 ** -exp, 2)))
+    return 2.0 ** bits
+
+#==================================================================
+# quantize - trim the precision of an array
+#==================================================================
+def quantize(data, digits):
+    """quantize - return the values of data rounded to keep digits decimal
+    digits, data itself if digits is None or data is not floating point.
+    Masked values stay masked.
+    """
+    if digits is None:
+        return data
+    if np is None:
+        err_msg = 'quantizeLib.quantize ERROR: quantizing requires numpy'
+        raise ImportError(err_msg)
+
+    # the scale is a power of two so values too large to round, such as the
+    # fill values, are unchanged when computed in double precision
+    scale = quantize_scale(digits)
+    if np.ma.isMaskedArray(data):
+        if data.dtype.kind != 'f':
+            return data
+        return np.ma.masked_array(np.around(scale * data.data.astype('f8')) / scale, mask=data.mask, dtype=data.dtype)
+    data = np.asarray(data)
+    if data.dtype.kind != 'f':
+        return data
+    return (np.around(scale * data.astype('f8')) / scale).astype(data.dtype)
+
+#==================================================================
+# set_digits - set the least_significant_digit of a specifier
+#==================================================================
+def set_digits(spec, digits):
+    """set_digits - set the least_significant_digit of a pyReshaper specifier.
+    Returns False if the installed pyReshaper specifier has no
+    least_significant_digit attribute.
+    """
+    if not hasattr(spec, 'least_significant_digit'):
+        return False
+    spec.least_significant_digit = digits
+    return True
+
+#==================================================================
+# compression_ratio - measure the compression of output files
+#==================================================================
+def compression_ratio(output_files, variables, nrecords):
+    """compression_ratio - return the uncompressed bytes of the time series
+    variables and the bytes of their output files
+
+    Arguments:
+    output_files (list) - output file or store names in sorted variable order
+    variables (dictionary) - variable name to record size in bytes
+    nrecords (integer) - number of time records of the output files
+
+    Return:
+    (raw_bytes, output_bytes) - totals over the output files that exist
+    """
+    raw_bytes = 0
+    output_bytes = 0
+    for name, output_file in zip(sorted(variables), output_files):
+        size = tseriesUtilsLib.get_path_size(output_file)
+        if size is None:
+            continue
+        raw_bytes += variables[name] * nrecords
+        output_bytes += size
+    return (raw_bytes, output_bytes)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python2
+"""
+This module provides the required variables mode of the time-series
+generation. The optional tseries_required_variables element of a
+comp_archive_spec in env_timeseries.xml lists the downstream consumers
+of the component history streams, e.g. the land diagnostics or the ILAMB
+CMIP conversion table, and any extra variables. When the mode is enabled
+only the union of the variables needed by the enabled consumers and the
+extras is converted to time series.
+
+    <tseries_required_variables enable="TRUE">
+      <consumer name="lnd_diags" enable="GENERATE_DIAGS_LND">
+        <variable>TSA</variable>
+      </consumer>
+      <consumer name="ilamb" enable="FALSE" table="ilamb/ilamb/clm_to_mip.py"/>
+      <variable>QRUNOFF</variable>
+    </tseries_required_variables>
+
+A consumer enable attribute is TRUE, FALSE or the id of an
+env_postprocess.xml entry such as GENERATE_DIAGS_LND. A consumer table
+is a clm_to_mip.py style variable table, relative to $POSTPROCESS_PATH.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import os
+import re
+
+# history variable names of a clm_to_mip.py variable table, combined variables are joined by --
+CLMVR_RE = re.compile(r"""['"]clmvr['"]\s*:\s*['"]([^'"]+)['"]""")
+
+def _is_true(value):
+    return value is not None and value.strip().upper() in ['T', 'TRUE']
+
+#==================================================================
+# read_table - read the history variables of a consumer table
+#==================================================================
+def read_table(table_file):
+    """read_table - return the set of history variable names used by a
+    clm_to_mip.py style variable table. The table is read as text so the
+    consumer does not need to be importable.
+    """
+    with open(table_file) as fh:
+        text = fh.read()
+
+    variables = set()
+    for clmvr in CLMVR_RE.findall(text):
+        variables.update(name for name in clmvr.split('--') if name)
+
+    return variables
+
+#==================================================================
+# consumer_enabled - check a consumer enable attribute
+#==================================================================
+def consumer_enabled(enable, env):
+    """consumer_enabled - return True if enable is TRUE or names an env
+    entry set to TRUE
+
+    Arguments:
+    enable (string) - consumer enable attribute
+    env (dictionary) - env_postprocess.xml entries
+    """
+    if enable is None:
+        return True
+    if enable.strip().upper() in ['T', 'TRUE', 'F', 'FALSE']:
+        return _is_true(enable)
+    return _is_true(env.get(enable.strip()))
+
+#==================================================================
+# read_required - read the required variables of a component
+#==================================================================
+def read_required(comp_archive_spec, env, postprocess_path):
+    """read_required - read the tseries_required_variables element of a
+    comp_archive_spec
+
+    Arguments:
+    comp_archive_spec (element) - env_timeseries.xml comp_archive_spec element
+    env (dictionary) - env_postprocess.xml entries
+    postprocess_path (string) - $POSTPROCESS_PATH for the relative consumer tables
+
+    Return:
+    (required, consumers) - required is the set of variable names, or None if the
+                            mode is not enabled and all variables are converted;
+                            consumers is the list of the enabled consumer names
+    """
+    required_spec = comp_archive_spec.find("tseries_required_variables")
+    if required_spec is None or not _is_true(required_spec.get("enable")):
+        return (None, list())
+
+    required = set(v.text.strip() for v in required_spec.findall("variable") if v.text)
+    consumers = list()
+    for consumer in required_spec.findall("consumer"):
+        if not consumer_enabled(consumer.get("enable"), env):
+            continue
+        consumers.append(consumer.get("name"))
+        required.update(v.text.strip() for v in consumer.findall("variable") if v.text)
+
+        table = consumer.get("table")
+        if table is not None:
+            table_file = os.path.join(postprocess_path, table)
+            if not os.path.isfile(table_file):
+                err_msg = 'requiredVarsLib.read_required ERROR: variable table {0} of consumer {1} does not exist'.format(
+                    table_file, consumer.get("name"))
+                raise OSError(err_msg)
+            required.update(read_table(table_file))
+
+    return (required, consumers)
+
+#==================================================================
+# subset_variables - apply the required variables to a stream
+#==================================================================
+def subset_variables(variables, required):
+    """subset_variables - split the time series variables of a history stream
+    into the ones to convert and the required ones not in the stream
+
+    Arguments:
+    variables (dictionary) - time series variable name to record size in bytes
+    required (set) - required variable names or None for all
+
+    Return:
+    (selected, missing) - selected is the variables dictionary restricted to the
+                          required names, missing the sorted required names
+                          that are not time series variables of the stream
+    """
+    if required is None:
+        return (variables, list())
+
+    selected = dict((name, size) for name, size in variables.items() if name in required)
+    missing = sorted(name for name in required if name not in variables)
+    return (selected, missing)
+
+#==================================================================
+# set_time_series - restrict a pyReshaper specifier to variables
+#==================================================================
+def set_time_series(spec, names):
+    """set_time_series - set the time series variables of a pyReshaper
+    specifier. Returns False if the installed pyReshaper specifier has no
+    time_series attribute, in which case every variable is converted.
+    """
+    if not hasattr(spec, 'time_series'):
+        return False
+    spec.time_series = sorted(names)
+    return True
@@ -0,0 +1,172 @@
+#!/usr/bin/env python2
+"""
+This module provides the cost model and rank allocation used to schedule
+the time-series specifiers across the MPI tasks. Each specifier is given
+an estimated cost from its input bytes, number of output variables and
+number of time slices, and the least_significant_digit splits of a
+stream are charged for reading the whole history slices again. The specifiers are packed into rank groups largest
+first and each group is given a share of the tasks proportional to its
+total cost, so small streams do not hold the same number of tasks as the
+largest ones and the largest streams start first.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+# cost model coefficients - rough estimates of the sustained read rate,
+# the per variable per time slice read overhead and the per output file
+# create/close overhead for a parallel filesystem
+READ_BYTES_PER_SECOND = 200.0e6
+SLICE_READ_SECONDS = 0.002
+OUTPUT_FILE_SECONDS = 0.5
+
+#===========================================================
+# estimate_cost - estimate the conversion time of a stream
+#===========================================================
+def estimate_cost(input_bytes, nvars, nslices, split_bytes=0):
+    """estimate_cost - estimate the serial conversion time, in seconds, of a
+    specifier
+
+    Arguments:
+    input_bytes (integer) - size of the history files in the specifier, the
+                            share of its variables for a split specifier
+    nvars (integer) - number of time series variables written
+    nslices (integer) - total number of time records in the history files
+    split_bytes (integer) - bytes of the history files outside the variables
+                            of a least_significant_digit split, which the split
+                            reads again as it converts every history slice
+
+    Return:
+    cost (float) - estimated seconds on a single task
+    """
+    return (float(input_bytes + split_bytes) / READ_BYTES_PER_SECOND +
+            SLICE_READ_SECONDS * nvars * nslices +
+            OUTPUT_FILE_SECONDS * nvars)
+
+#================================================================
+# allocate_ranks - assign specifiers and tasks to rank groups
+#================================================================
+def allocate_ranks(costs, size):
+    """allocate_ranks - pack specifiers into rank groups and give each group a
+    number of tasks proportional to its cost.
+
+    The number of groups is min(len(costs), size). Specifiers are assigned
+    largest first to the group with the smallest total cost (longest
+    processing time first) and every group gets at least one task. The
+    remaining tasks are distributed by the largest remainder method.
+
+    Arguments:
+    costs (list) - estimated cost of each specifier
+    size (integer) - number of tasks available
+
+    Return:
+    groups (list) - list of dictionaries, ordered by decreasing cost, with keys
+        ranks (integer) - number of tasks in the group
+        cost (float) - total cost of the specifiers in the group
+        specs (list) - specifier indices in decreasing cost order
+    """
+    if len(costs) == 0:
+        return list()
+
+    ngroups = min(len(costs), size)
+    groups = [{'ranks' : 1, 'cost' : 0.0, 'specs' : list()} for i in range(ngroups)]
+
+    # longest processing time first packing of specifiers into groups
+    order = sorted(range(len(costs)), key=lambda i: (-costs[i], i))
+    for i in order:
+        group = min(groups, key=lambda g: g['cost'])
+        group['specs'].append(i)
+        group['cost'] += costs[i]
+
+    # distribute the remaining tasks in proportion to the group costs
+    spare = size - ngroups
+    total = sum(g['cost'] for g in groups)
+    if spare > 0:
+        if total > 0.0:
+            shares = [spare * g['cost'] / total for g in groups]
+        else:
+            shares = [float(spare) / ngroups for g in groups]
+        extra = [int(share) for share in shares]
+        leftover = spare - sum(extra)
+        by_remainder = sorted(range(ngroups), key=lambda i: (extra[i] - shares[i], i))
+        for i in by_remainder[:leftover]:
+            extra[i] += 1
+        for group, n in zip(groups, extra):
+            group['ranks'] += n
+
+    groups.sort(key=lambda g: -g['cost'])
+    return groups
+
+#==================================================================
+# get_group - return the group index for a task rank
+#==================================================================
+def get_group(groups, rank):
+    """get_group - return the index into groups of the group that rank belongs
+    to. Groups are laid out over consecutive ranks in list order.
+    """
+    first = 0
+    for index, group in enumerate(groups):
+        if rank < first + group['ranks']:
+            return index
+        first += group['ranks']
+
+    err_msg = 'scheduleLib.get_group ERROR: rank {0} is not in any of the {1} rank groups'.format(rank, len(groups))
+    raise ValueError(err_msg)
+
+#===================================================================
+# estimate_wall_seconds - estimate the wall time of a rank schedule
+#===================================================================
+def estimate_wall_seconds(groups, costs, nvars):
+    """estimate_wall_seconds - estimate the wall time of a schedule returned by
+    allocate_ranks. pyReshaper divides the time series variables of a
+    specifier across the tasks of its group, so a specifier scales with
+    the group size up to its number of variables. The specifiers of a
+    group run one after another and the groups run concurrently.
+
+    Arguments:
+    groups (list) - rank groups returned by allocate_ranks
+    costs (list) - estimated serial cost of each specifier
+    nvars (list) - number of time series variables of each specifier
+
+    Return:
+    wall_seconds (float) - estimated wall time of the longest group
+    """
+    wall_seconds = 0.0
+    for group in groups:
+        group_seconds = 0.0
+        for i in group['specs']:
+            group_seconds += costs[i] / max(1, min(group['ranks'], nvars[i]))
+        wall_seconds = max(wall_seconds, group_seconds)
+
+    return wall_seconds
+
+#=====================================================================
+# recommend_pes - find the task count needed to meet a wall time limit
+#=====================================================================
+def recommend_pes(costs, nvars, wall_limit, max_pes, pes_per_node=1):
+    """recommend_pes - return the smallest multiple of pes_per_node, up to
+    max_pes, whose estimated wall time is within wall_limit.
+
+    Arguments:
+    costs (list) - estimated serial cost of each specifier
+    nvars (list) - number of time series variables of each specifier
+    wall_limit (float) - wall time limit in seconds
+    max_pes (integer) - largest task count to consider
+    pes_per_node (integer) - task counts are multiples of this value
+
+    Return:
+    (pes, wall_seconds) - recommended task count and its estimated wall time,
+                          pes is None if no task count up to max_pes fits
+    """
+    pes = pes_per_node
+    wall_seconds = None
+    while pes <= max_pes:
+        wall_seconds = estimate_wall_seconds(allocate_ranks(costs, pes), costs, nvars)
+        if wall_seconds <= wall_limit:
+            return (pes, wall_seconds)
+        pes += pes_per_node
+
+    return (None, wall_seconds)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python2
+"""
+This module provides the time-invariant metadata sidecar of the
+time-series generation. With the tseries_metadata_sidecar element of a
+history stream set to TRUE in env_timeseries.xml, pyReshaper writes the
+time-invariant metadata of each specifier, e.g. the POP grid metrics or
+the lat, lon and area of the atmosphere grid, once to a sidecar file
+named with "once" in place of the variable name,
+
+    case.pop.h.once.000101-001012.nc
+
+instead of repeating it in every time series variable file. Each
+variable file keeps a reference to its sidecar in the time_invariant_file
+global attribute and lists the sidecar variables in the CF
+external_variables global attribute. The references are added with the
+netCDF4 module before the files are flushed from the --write-behind
+directory. Adding them to a classic format file grows its header, which
+rewrites the whole file, so the classic format files written directly
+to the tseries_output_dir are not referenced.
+
+The reader helpers read_variable and reattach return the sidecar
+variables with the time series variable for the downstream tools.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import inspect
+import os
+
+#
+# installed dependencies
+#
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+# the variable name part of the pyReshaper sidecar file name
+SIDECAR_NAME = 'once'
+
+# global attribute of the variable files referencing the sidecar
+REFERENCE_ATTR = 'time_invariant_file'
+
+#==================================================================
+# sidecar_file - return the sidecar file name of a specifier
+#==================================================================
+def sidecar_file(output_file_prefix, output_file_suffix):
+    """sidecar_file - return the name of the time-invariant metadata file
+    pyReshaper writes for a specifier
+    """
+    return output_file_prefix + SIDECAR_NAME + output_file_suffix
+
+#==================================================================
+# reshaper_arguments - return the pyReshaper sidecar keyword arguments
+#==================================================================
+def reshaper_arguments(create_reshaper, sidecar):
+    """reshaper_arguments - return the keyword arguments of create_reshaper
+    that write the time-invariant metadata to the sidecar file, empty if
+    sidecar is False or the installed pyReshaper version has no once file
+    """
+    if not sidecar:
+        return dict()
+
+    getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+    try:
+        args = getargspec(create_reshaper).args
+    except TypeError:
+        return dict()
+
+    if 'once' not in args:
+        return dict()
+    return {'once' : True}
+
+#==================================================================
+# can_reference - check the variable files can reference the sidecar
+#==================================================================
+def can_reference(netcdf_format, local=False):
+    """can_reference - return True if the sidecar references can be added to
+    the variable files of a netcdf_format specifier, which requires the
+    netCDF4 module and, for the classic netcdf format, files written to the
+    node-local write-behind directory
+
+    Arguments:
+    netcdf_format (string) - specifier netcdf_format, netcdf, netcdf4 or netcdf4c
+    local (boolean) - True if the files are written to the write-behind directory
+    """
+    if netCDF4 is None:
+        return False
+    return local or netcdf_format != 'netcdf'
+
+#==================================================================
+# time_invariant_names - return the time-invariant variable names
+#==================================================================
+def time_invariant_names(header):
+    """time_invariant_names - return the sorted names of the variables of a
+    ncHeaderLib.read_header header that do not depend on the unlimited
+    dimension
+    """
+    return sorted(name for name, var in header['variables'].items()
+                  if header['unlimited'] not in var['dimensions'])
+
+def _open(filename, mode='r'):
+    if netCDF4 is None:
+        err_msg = 'sidecarLib ERROR: reading {0} requires netCDF4'.format(filename)
+        raise ImportError(err_msg)
+    return netCDF4.Dataset(filename, mode)
+
+#==================================================================
+# add_reference - reference the sidecar from a variable file
+#==================================================================
+def add_reference(series_file, sidecar, names):
+    """add_reference - set the time_invariant_file and external_variables
+    global attributes of a time series variable file
+
+    Arguments:
+    series_file (string) - time series variable file
+    sidecar (string) - sidecar file of its specifier
+    names (list) - time-invariant variable names of the sidecar
+    """
+    f = _open(series_file, 'a')
+    try:
+        f.setncattr(REFERENCE_ATTR, os.path.basename(sidecar))
+        external = [name for name in names if name not in f.variables]
+        if len(external) > 0:
+            f.setncattr('external_variables', ' '.join(external))
+    finally:
+        f.close()
+
+#==================================================================
+# get_sidecar - return the sidecar referenced by a variable file
+#==================================================================
+def get_sidecar(series_file):
+    """get_sidecar - return the full path of the sidecar file referenced by
+    a time series variable file, or None if it has no sidecar
+    """
+    f = _open(series_file)
+    try:
+        if REFERENCE_ATTR not in f.ncattrs():
+            return None
+        return os.path.join(os.path.dirname(os.path.abspath(series_file)), f.getncattr(REFERENCE_ATTR))
+    finally:
+        f.close()
+
+#==================================================================
+# read_variable - read a variable of a file or its sidecar
+#==================================================================
+def read_variable(series_file, name):
+    """read_variable - return the values of variable name read from a time
+    series variable file, or from its sidecar if it is a time-invariant
+    variable, e.g. the area or grid metrics
+
+    Raises KeyError if neither file has the variable.
+    """
+    for filename in [series_file, get_sidecar(series_file)]:
+        if filename is None:
+            continue
+        f = _open(filename)
+        try:
+            if name in f.variables:
+                return f.variables[name][:]
+        finally:
+            f.close()
+
+    err_msg = 'sidecarLib.read_variable ERROR: {0} and its sidecar have no variable {1}'.format(series_file, name)
+    raise KeyError(err_msg)
+
+#==================================================================
+# reattach - write a self-contained copy of a variable file
+#==================================================================
+def reattach(series_file, output_file):
+    """reattach - write a copy of a time series variable file with the
+    variables of its sidecar, for tools that need the time-invariant
+    metadata in the same file. The copy is written to a temporary name and
+    renamed so readers never see a partial file, the temporary file is
+    removed if writing fails.
+
+    Return:
+    names (list) - the sidecar variables added
+    """
+    sidecar = get_sidecar(series_file)
+    tmp_name = '{0}.tmp.{1}'.format(output_file, os.getpid())
+    src = _open(series_file)
+    sources = [src]
+    added = list()
+    try:
+        dst = netCDF4.Dataset(tmp_name, 'w', format=src.data_model)
+        try:
+            if sidecar is not None:
+                sources.append(_open(sidecar))
+
+            dst.setncatts(dict((att, src.getncattr(att)) for att in src.ncattrs()
+                               if att not in [REFERENCE_ATTR, 'external_variables']))
+
+            for f in sources:
+                for name, dim in f.dimensions.items():
+                    if name not in dst.dimensions:
+                        dst.createDimension(name, None if dim.isunlimited() else len(dim))
+                for name, var in f.variables.items():
+                    if name in dst.variables:
+                        continue
+                    fill_value = var.getncattr('_FillValue') if '_FillValue' in var.ncattrs() else None
+                    out = dst.createVariable(name, var.dtype, var.dimensions, fill_value=fill_value)
+                    out.setncatts(dict((att, var.getncattr(att)) for att in var.ncattrs() if att != '_FillValue'))
+                    out[...] = var[...]
+                    if f is not src:
+                        added.append(name)
+        finally:
+            dst.close()
+        os.rename(tmp_name, output_file)
+    except:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+    finally:
+        for f in sources:
+            f.close()
+
+    return sorted(added)
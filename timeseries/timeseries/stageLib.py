@@ -0,0 +1,384 @@
+#!/usr/bin/env python2
+"""
+This module provides the node-local staging of the history time slice
+files for the time-series generation. With the --stage-dir option the
+uncompressed input slices of each specifier are copied, in large
+sequential reads, from the shared short term archive to a node-local
+directory such as $TMPDIR or a local SSD ahead of their conversion, and
+the reshaper reads the staged copies instead of making small random
+reads on the shared file system.
+
+One task per node and rank group stages the files for all the group
+tasks on that node with a bounded number of copy threads. The staged
+files are kept in a least recently used cache within a disk budget, the
+files of the specifier being converted and of the prefetched ones are
+never evicted. The node budget is divided equally between the rank
+groups with tasks on the node.
+
+With the --write-behind option the output variable files are written
+the other way around, to a node-local directory first, and moved to
+the tseries_output_dir by background flusher threads while the next
+specifier is converted.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import collections
+import errno
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+# default node-local disk budget in MB per node
+STAGE_BUDGET_MB = 10240
+
+# default number of copy threads per node
+STAGE_THREADS = 2
+
+# copy block size of the sequential reads
+BLOCK_BYTES = 64 * 1024 * 1024
+
+# default number of flusher threads per node
+FLUSH_THREADS = 2
+
+STAGE_SUBDIR = 'tseries_stage'
+WRITE_BEHIND_SUBDIR = 'tseries_write_behind'
+
+#==================================================================
+# get_stage_dir - return the staging directory of a --stage-dir
+#==================================================================
+def get_stage_dir(stage_root, subdir=STAGE_SUBDIR):
+    """get_stage_dir - return the staging directory subdir under stage_root,
+    with environment variables such as $TMPDIR expanded
+    """
+    return os.path.join(os.path.expandvars(os.path.expanduser(stage_root)), subdir)
+
+#==================================================================
+# get_host - return the node name of this task
+#==================================================================
+def get_host():
+    """get_host - return the host name identifying the node of this task
+    """
+    return socket.gethostname()
+
+#==================================================================
+# node_leaders - choose the staging task of each node
+#==================================================================
+def node_leaders(hosts):
+    """node_leaders - return the set of ranks that stage the files of their
+    node, the lowest rank on each host
+
+    Arguments:
+    hosts (list) - (rank, host name) of every task
+    """
+    leaders = dict()
+    for rank, host in hosts:
+        if host not in leaders or rank < leaders[host]:
+            leaders[host] = rank
+    return set(leaders.values())
+
+#==================================================================
+# node_groups - count the rank groups with tasks on each node
+#==================================================================
+def node_groups(tasks):
+    """node_groups - return a dictionary of host name to the number of rank
+    groups with tasks on that host, which share its staging budget
+
+    Arguments:
+    tasks (list) - (host name, rank group) of every task
+    """
+    groups = dict()
+    for host, group in tasks:
+        groups.setdefault(host, set()).add(group)
+    return dict((host, len(host_groups)) for host, host_groups in groups.items())
+
+#==================================================================
+# stage_name - return the staged file name of an input file
+#==================================================================
+def stage_name(stage_dir, filename):
+    """stage_name - return the name of the staged copy of filename in
+    stage_dir, the same on every task of the node
+    """
+    return os.path.join(stage_dir, os.path.basename(filename))
+
+#==================================================================
+# copy_file - copy a file with an atomic rename
+#==================================================================
+def copy_file(src, dst):
+    """copy_file - copy src to dst in BLOCK_BYTES sequential reads. The data is
+    written to a temporary file in the dst directory and renamed into
+    place so dst is never seen partially written.
+    """
+    fd, tmpname = tempfile.mkstemp(prefix='.{0}.'.format(os.path.basename(dst)), dir=os.path.dirname(dst))
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+            with open(src, 'rb') as fin:
+                shutil.copyfileobj(fin, fout, BLOCK_BYTES)
+        os.chmod(tmpname, 0o644)
+        os.rename(tmpname, dst)
+    except:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+#==================================================================
+# move_file - move a file to another directory with an atomic rename
+#==================================================================
+def move_file(src, dst):
+    """move_file - move src to dst. The file is renamed if both are on the same
+    file system and otherwise copied with copy_file and removed, so dst is
+    never seen partially written.
+    """
+    try:
+        os.rename(src, dst)
+    except OSError as error:
+        if error.errno != errno.EXDEV:
+            raise
+        copy_file(src, dst)
+        os.remove(src)
+
+#============================================
+# Stager - background node-local staging
+#============================================
+class Stager(object):
+    """Stager - copy the input files of a sequence of specifiers to a
+    node-local directory in background threads, ahead of their conversion.
+
+    The staged files are kept in a least recently used cache of at most
+    budget_bytes. A file is pinned from when it is staged until all the
+    specifiers using it are released, and only unpinned files are evicted.
+    The files of the specifier currently waited on are always staged, the
+    files of later specifiers only while they fit in the budget. Call
+    wait(n) before converting specifier n and release(n) after.
+    """
+    def __init__(self, stage_dir, budget_bytes, specs_files, threads=STAGE_THREADS):
+        """
+        Arguments:
+        stage_dir (string) - node-local directory for the staged files
+        budget_bytes (integer) - bytes of staged files held at a time
+        specs_files (list) - list, in conversion order, of the lists of files
+                             of each specifier
+        threads (integer) - number of concurrent copies
+        """
+        self._stage_dir = stage_dir
+        self._budget_bytes = budget_bytes
+        self._specs_files = specs_files
+        self._work = [(n, filename) for n, files in enumerate(specs_files) for filename in files]
+        self._next = 0
+        self._cond = threading.Condition()
+        self._current = 0
+        self._used = 0
+        self._cache = collections.OrderedDict()
+        self._refs = dict()
+        self._done = [set() for files in specs_files]
+        self._errors = list()
+        self._stopped = False
+        self.copied_bytes = 0
+        self._threads = [threading.Thread(target=self._run) for i in range(max(1, threads))]
+        for thread in self._threads:
+            thread.daemon = True
+
+    def stage_name(self, filename):
+        """stage_name - return the staged file name of filename
+        """
+        return stage_name(self._stage_dir, filename)
+
+    def start(self):
+        """start - start the background copy threads
+        """
+        try:
+            os.makedirs(self._stage_dir)
+        except OSError:
+            if not os.path.isdir(self._stage_dir):
+                raise
+        for thread in self._threads:
+            thread.start()
+
+    def _evict(self, size):
+        # remove the least recently used unpinned files until size bytes fit
+        for filename in list(self._cache):
+            if self._used + size <= self._budget_bytes:
+                break
+            if self._refs.get(filename, 0) == 0:
+                staged = self.stage_name(filename)
+                if os.path.exists(staged):
+                    os.remove(staged)
+                self._used -= self._cache.pop(filename)
+        return self._used + size <= self._budget_bytes
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped or self._next >= len(self._work) or len(self._errors) > 0:
+                    return
+                n, filename = self._work[self._next]
+                self._next += 1
+
+                # a file already staged for an earlier specifier is reused
+                if filename in self._cache:
+                    self._cache[filename] = self._cache.pop(filename)
+                    self._refs[filename] = self._refs.get(filename, 0) + 1
+                    self._done[n].add(filename)
+                    self._cond.notify_all()
+                    continue
+
+            try:
+                size = os.path.getsize(filename)
+            except OSError:
+                size = 0
+
+            with self._cond:
+                while (not self._stopped and n != self._current and not self._evict(size)):
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                self._evict(size)
+                self._used += size
+
+            try:
+                copy_file(filename, self.stage_name(filename))
+            except Exception as error:
+                with self._cond:
+                    self._used -= size
+                    self._errors.append('{0}: {1}'.format(filename, error))
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                self._cache[filename] = size
+                self._refs[filename] = self._refs.get(filename, 0) + 1
+                self._done[n].add(filename)
+                self.copied_bytes += size
+                self._cond.notify_all()
+
+    def wait(self, n):
+        """wait - block until all the files of specifier n are staged
+        """
+        with self._cond:
+            self._current = n
+            self._cond.notify_all()
+            while len(self._done[n]) < len(set(self._specs_files[n])) and len(self._errors) == 0:
+                self._cond.wait()
+            if len(self._errors) > 0:
+                err_msg = 'stageLib.Stager ERROR: unable to stage {0}'.format(self._errors[0])
+                raise RuntimeError(err_msg)
+
+    def release(self, n):
+        """release - unpin the staged files of specifier n, they stay in the
+        cache until their space is needed
+        """
+        with self._cond:
+            for filename in self._done[n]:
+                self._refs[filename] -= 1
+                if filename in self._cache:
+                    self._cache[filename] = self._cache.pop(filename)
+            self._done[n] = set()
+            self._current = n + 1
+            self._cond.notify_all()
+
+    def close(self):
+        """close - stop the copy threads and remove all the staged files
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+        for filename in list(self._cache):
+            staged = self.stage_name(filename)
+            if os.path.exists(staged):
+                os.remove(staged)
+        self._cache.clear()
+        self._used = 0
+
+#============================================
+# Flusher - background write-behind of outputs
+#============================================
+class Flusher(object):
+    """Flusher - move the output files written to a node-local directory to
+    their final names in background threads. The files of each specifier
+    are queued with flush(n) and wait(n) blocks until they are all in place.
+    """
+    def __init__(self, threads=FLUSH_THREADS):
+        """
+        Arguments:
+        threads (integer) - number of concurrent moves
+        """
+        self._queue = collections.deque()
+        self._pending = dict()
+        self._cond = threading.Condition()
+        self._errors = list()
+        self._stopped = False
+        self.flushed_bytes = 0
+        self._threads = [threading.Thread(target=self._run) for i in range(max(1, threads))]
+        for thread in self._threads:
+            thread.daemon = True
+
+    def start(self):
+        """start - start the background flusher threads
+        """
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and len(self._queue) == 0:
+                    self._cond.wait()
+                if len(self._queue) == 0:
+                    return
+                n, src, dst = self._queue.popleft()
+
+            try:
+                size = os.path.getsize(src)
+                move_file(src, dst)
+            except Exception as error:
+                with self._cond:
+                    self._errors.append('{0}: {1}'.format(src, error))
+                    self._pending[n] -= 1
+                    self._cond.notify_all()
+                continue
+
+            with self._cond:
+                self.flushed_bytes += size
+                self._pending[n] -= 1
+                self._cond.notify_all()
+
+    def flush(self, n, files):
+        """flush - queue the files of specifier n
+
+        Arguments:
+        n (integer) - specifier number
+        files (list) - (node-local file, final file name) of the output files
+        """
+        with self._cond:
+            self._pending[n] = self._pending.get(n, 0) + len(files)
+            self._queue.extend((n, src, dst) for src, dst in files)
+            self._cond.notify_all()
+
+    def wait(self, n):
+        """wait - block until all the files of specifier n are in place
+        """
+        with self._cond:
+            while self._pending.get(n, 0) > 0:
+                self._cond.wait()
+            if len(self._errors) > 0:
+                err_msg = 'stageLib.Flusher ERROR: unable to move {0}'.format(self._errors[0])
+                raise RuntimeError(err_msg)
+
+    def close(self):
+        """close - move the queued files and stop the flusher threads
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
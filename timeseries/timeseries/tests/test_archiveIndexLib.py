@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the short term archive index
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import archiveIndexLib
+
+class test_classify(unittest.TestCase):
+    def setUp(self):
+        self.casename = 'b.e11.B1850C5CN.f09_g16.005'
+
+    def tearDown(self):
+        pass
+
+    def test_monthly(self):
+        """ test a single instance monthly history file name
+        """
+        fields = archiveIndexLib.classify('{0}.cam.h0.0001-01.nc'.format(self.casename), self.casename)
+        self.assertEqual(fields, ('cam', '', 'h0', '0001-01'))
+
+    def test_instance(self):
+        """ test a multi-instance daily history file name
+        """
+        fields = archiveIndexLib.classify('{0}.clm2_0003.h1.0001-01-01.nc'.format(self.casename), self.casename)
+        self.assertEqual(fields, ('clm2', '0003', 'h1', '0001-01-01'))
+
+    def test_popStream(self):
+        """ test the pop nday1 history stream names
+        """
+        fields = archiveIndexLib.classify('{0}.pop.h.nday1.0001-01-01.nc'.format(self.casename), self.casename)
+        self.assertEqual(fields, ('pop', '', 'h.nday1', '0001-01-01'))
+
+    def test_compressed(self):
+        """ test that gzipped history files are classified
+        """
+        fields = archiveIndexLib.classify('{0}.pop.h.0001-01.nc.gz'.format(self.casename), self.casename)
+        self.assertEqual(fields, ('pop', '', 'h', '0001-01'))
+
+    def test_notHistory(self):
+        """ test that log, tar and other case files are not classified
+        """
+        self.assertEqual(archiveIndexLib.classify('{0}.cam.r.0001-01-01-00000.nc.tar'.format(self.casename), self.casename), None)
+        self.assertEqual(archiveIndexLib.classify('{0}.cam.log.0001-01-01.gz'.format(self.casename), self.casename), None)
+        self.assertEqual(archiveIndexLib.classify('other.cam.h0.0001-01.nc', self.casename), None)
+
+class test_groupInstances(unittest.TestCase):
+    def setUp(self):
+        self.casename = 'testcase'
+        self.names = ['{0}.clm2_{1:04d}.h0.0001-{2:02d}.nc'.format(self.casename, instance, month)
+                      for month in [2, 1] for instance in [2, 1]]
+        self.records = list()
+        for name in self.names:
+            comp, instance, stream, date = archiveIndexLib.classify(name, self.casename)
+            self.records.append({'name' : name, 'size' : 0, 'comp' : comp, 'instance' : instance,
+                                 'stream' : stream, 'date' : date})
+
+    def tearDown(self):
+        pass
+
+    def test_multiInstance(self):
+        """ test that the history files are grouped by instance
+        """
+        instances = archiveIndexLib.group_instances(self.records)
+        self.assertEqual(sorted(instances), ['0001', '0002'])
+        self.assertEqual(instances['0001'], ['testcase.clm2_0001.h0.0001-01.nc', 'testcase.clm2_0001.h0.0001-02.nc'])
+        self.assertEqual(instances['0002'], ['testcase.clm2_0002.h0.0001-01.nc', 'testcase.clm2_0002.h0.0001-02.nc'])
+
+    def test_singleInstance(self):
+        """ test that the files of a component without multi_instance are one group
+        """
+        instances = archiveIndexLib.group_instances(self.records, multi_instance=False)
+        self.assertEqual(list(instances), [''])
+        self.assertEqual(instances[''], sorted(self.names))
+
+        cam = {'name' : 'testcase.cam.h0.0001-01.nc', 'size' : 0, 'comp' : 'cam', 'instance' : '', 'stream' : 'h0', 'date' : '0001-01'}
+        self.assertEqual(archiveIndexLib.group_instances([cam]), {'' : ['testcase.cam.h0.0001-01.nc']})
+
+class test_ArchiveIndex(unittest.TestCase):
+    def setUp(self):
+        self.casename = 'testcase'
+        self.tmpdir = tempfile.mkdtemp()
+        self.histdir = os.path.join(self.tmpdir, 'hist')
+        os.mkdir(self.histdir)
+        for m in range(1,4):
+            open(os.path.join(self.histdir, '{0}.cam.h0.0001-{1:02d}.nc'.format(self.casename, m)), 'w').close()
+        self.cache = os.path.join(self.tmpdir, 'index.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cachedScan(self):
+        """ test that an unchanged directory is read from the cache
+        """
+        index = archiveIndexLib.ArchiveIndex(self.cache, self.casename)
+        self.assertEqual(len(index.scan(self.histdir)), 3)
+        index.save()
+
+        index = archiveIndexLib.ArchiveIndex(self.cache, self.casename)
+        entry, rescanned = archiveIndexLib.refresh_dir(self.histdir, index.cached_dir(self.histdir), self.casename)
+        self.assertFalse(rescanned)
+        records = index.scan(self.histdir)
+        self.assertEqual([r['date'] for r in records], ['0001-01', '0001-02', '0001-03'])
+
+    def test_modifiedScan(self):
+        """ test that a directory is rescanned when its mtime changes
+        """
+        index = archiveIndexLib.ArchiveIndex(self.cache, self.casename)
+        index.scan(self.histdir)
+        index.save()
+
+        open(os.path.join(self.histdir, '{0}.cam.h0.0001-04.nc'.format(self.casename)), 'w').close()
+        st = os.stat(self.histdir)
+        os.utime(self.histdir, (st.st_atime, st.st_mtime + 10))
+
+        index = archiveIndexLib.ArchiveIndex(self.cache, self.casename)
+        entry, rescanned = archiveIndexLib.refresh_dir(self.histdir, index.cached_dir(self.histdir), self.casename)
+        self.assertTrue(rescanned)
+        self.assertEqual(len(index.scan(self.histdir)), 4)
+
+if __name__ == '__main__':
+    unittest.main()
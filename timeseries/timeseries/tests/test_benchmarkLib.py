@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the synthetic archive and scaling benchmark
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from timeseries import benchmarkLib
+
+CONFIG_XML = """<config_definition>
+  <components>
+    <comp_archive_spec name="cam">
+      <rootdir>atm</rootdir>
+      <files>
+        <file_extension suffix=".h0\\.+">
+          <subdir>hist</subdir>
+          <tseries_create>TRUE</tseries_create>
+          <tseries_tper>monthly</tseries_tper>
+        </file_extension>
+        <file_extension suffix=".r\\.+">
+          <subdir>rest</subdir>
+        </file_extension>
+      </files>
+      <tseries_time_variant_variables>
+        <variable>time</variable>
+        <variable>time_bnds</variable>
+      </tseries_time_variant_variables>
+    </comp_archive_spec>
+    <comp_archive_spec name="pop">
+      <rootdir>ocn</rootdir>
+      <files>
+        <file_extension suffix=".h.nday1\\.+">
+          <subdir>hist</subdir>
+          <tseries_create>TRUE</tseries_create>
+          <tseries_tper>daily</tseries_tper>
+        </file_extension>
+      </files>
+    </comp_archive_spec>
+  </components>
+</config_definition>
+"""
+
+class test_benchmark(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.config_xml = os.path.join(self.tmpdir, 'config_timeseries.xml')
+        with open(self.config_xml, 'w') as fh:
+            fh.write(CONFIG_XML)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_streamName(self):
+        """ test the stream name of the file_extension suffix patterns
+        """
+        self.assertEqual(benchmarkLib.get_stream_name('.h0\\.+'), 'h0')
+        self.assertEqual(benchmarkLib.get_stream_name('.h.nday1\\.+'), 'h.nday1')
+        self.assertEqual(benchmarkLib.get_stream_name('.h1\\.+'), 'h1')
+
+    def test_layout(self):
+        """ test that only the time series streams are read and can be selected
+        """
+        layout = benchmarkLib.read_layout(self.config_xml)
+        self.assertEqual([stream['key'] for stream in layout], ['cam.h0', 'pop.h.nday1'])
+        self.assertEqual(layout[0]['time_variant_variables'], ['time', 'time_bnds'])
+        selected = benchmarkLib.select_streams(layout, ['pop.h.nday1'])
+        self.assertEqual(selected[0]['rootdir'], 'ocn')
+        self.assertRaises(ValueError, benchmarkLib.select_streams, layout, ['clm2.h0'])
+
+    def test_historyFiles(self):
+        """ test the number of files and the continuity of the time bounds
+        """
+        for tper, nfiles, nrecords in [('annual', 2, 2), ('monthly', 24, 24), ('daily', 24, 730), ('hourly6', 730, 2920)]:
+            files = benchmarkLib.history_files(tper, 2)
+            self.assertEqual(len(files), nfiles)
+            bounds = [bound for date, file_bounds in files for bound in file_bounds]
+            self.assertEqual(len(bounds), nrecords)
+            self.assertEqual(bounds[0][0], 0.0)
+            self.assertAlmostEqual(bounds[-1][1], 730.0)
+            for previous, bound in zip(bounds[:-1], bounds[1:]):
+                self.assertAlmostEqual(previous[1], bound[0])
+        self.assertEqual(benchmarkLib.history_files('daily', 1)[1][0], '0001-02-01-00000')
+        self.assertRaises(ValueError, benchmarkLib.history_files, 'weekly', 1)
+
+    def test_envFiles(self):
+        """ test that tseries_create is only set for the selected streams
+        """
+        caseroot = os.path.join(self.tmpdir, 'postprocess')
+        streams = benchmarkLib.select_streams(benchmarkLib.read_layout(self.config_xml), ['pop.h.nday1'])
+        benchmarkLib.write_env_files(caseroot, self.config_xml, 'bench', '/archive/bench', streams)
+        creates = [e.text for e in ET.parse(os.path.join(caseroot, 'env_timeseries.xml')).iter('tseries_create')]
+        self.assertEqual(creates, ['FALSE', 'TRUE'])
+        entries = dict((e.get('id'), e.get('value')) for e in ET.parse(os.path.join(caseroot, 'env_postprocess.xml')).iter('entry'))
+        self.assertEqual(entries, {'CASE' : 'bench', 'DOUT_S_ROOT' : '/archive/bench'})
+
+    def test_summarizeMetrics(self):
+        """ test that the stream records are totalled and variable records ignored
+        """
+        records = [{'record' : 'stream', 'bytes_read' : 4.0e6, 'bytes_written' : 2.0e6, 'read_seconds' : 2.0, 'write_seconds' : 4.0},
+                   {'record' : 'stream', 'bytes_read' : 4.0e6, 'bytes_written' : None, 'read_seconds' : 2.0, 'write_seconds' : 0.0},
+                   {'record' : 'variable', 'bytes_read' : 1.0e9, 'read_seconds' : 1.0}]
+        summary = benchmarkLib.summarize_metrics({'records' : records})
+        self.assertEqual(summary['bytes_read'], 8.0e6)
+        self.assertAlmostEqual(summary['read_mb_per_second'], 2.0)
+        self.assertAlmostEqual(summary['write_mb_per_second'], 0.5)
+        self.assertEqual(benchmarkLib.summarize_metrics(dict())['read_mb_per_second'], None)
+
+    def test_scaling(self):
+        """ test the strong and weak scaling speedup and efficiency
+        """
+        strong = benchmarkLib.scaling([{'ranks' : 4, 'wall_seconds' : 40.0}, {'ranks' : 1, 'wall_seconds' : 100.0}])
+        self.assertEqual([run['ranks'] for run in strong], [1, 4])
+        self.assertAlmostEqual(strong[1]['speedup'], 2.5)
+        self.assertAlmostEqual(strong[1]['efficiency'], 0.625)
+
+        weak = benchmarkLib.scaling([{'ranks' : 1, 'wall_seconds' : 100.0}, {'ranks' : 4, 'wall_seconds' : 125.0}], weak=True)
+        self.assertAlmostEqual(weak[1]['efficiency'], 0.8)
+        self.assertAlmostEqual(weak[1]['speedup'], 3.2)
+
+if __name__ == '__main__':
+    unittest.main()
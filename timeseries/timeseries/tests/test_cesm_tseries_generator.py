@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series generator orchestration
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+try:
+    from timeseries import cesm_tseries_generator
+except ImportError:
+    cesm_tseries_generator = None
+
+from timeseries import benchmarkLib, climoLib, manifestLib, nodeLib, validateLib, zarrStoreLib
+
+CONFIG_XML = """<config_definition>
+  <components>
+    <comp_archive_spec name="cam">
+      <rootdir>atm</rootdir>
+      <files>
+        <file_extension suffix=".h0\\.+">
+          <subdir>hist</subdir>
+          <tseries_create>TRUE</tseries_create>
+          <tseries_output_format>{0}</tseries_output_format>
+          <tseries_output_subdir>proc/tseries/month_1</tseries_output_subdir>
+          <tseries_tper>monthly</tseries_tper>
+        </file_extension>
+      </files>
+      <tseries_time_variant_variables>
+        <variable>time</variable>
+        <variable>time_bnds</variable>
+      </tseries_time_variant_variables>
+    </comp_archive_spec>
+  </components>
+</config_definition>
+"""
+
+def create_reshaper(specifier, serial=False, verbosity=1, wmode='w', once=False, simplecomm=None):
+    """ stand-in with the pyReshaper 1.x create_reshaper signature
+    """
+    return {'specifier' : specifier, 'serial' : serial, 'verbosity' : verbosity, 'wmode' : wmode,
+            'once' : once, 'simplecomm' : simplecomm}
+
+def create_reshaper_without_wmode(specifier, serial=False, verbosity=1, simplecomm=None):
+    """ stand-in for a pyReshaper version without write modes
+    """
+    return {'specifier' : specifier, 'serial' : serial, 'verbosity' : verbosity, 'simplecomm' : simplecomm}
+
+class stub_reshaper(object):
+    """ stand-in for the pyreshaper.reshaper module
+    """
+    def __init__(self, func):
+        self.create_reshaper = func
+
+class manager_comm(object):
+    """ serial stand-in for the simplecomm manager interface
+    """
+    def is_manager(self):
+        return True
+
+class time_reshaper(object):
+    """ stand-in for a pyReshaper object that writes the time records of every
+        time series variable of the specifier
+    """
+    def __init__(self, specifier):
+        self.specifier = specifier
+        self.converted = False
+
+    def convert(self, output_limit=0, rchunks=None, wchunks=None):
+        spec = self.specifier
+        fh = netCDF4.Dataset(spec.input_file_list[0])
+        names = [name for name, var in fh.variables.items()
+                 if 'time' in var.dimensions and name not in spec.time_variant_metadata]
+        fh.close()
+        for name in names:
+            bounds = list()
+            for filename in spec.input_file_list:
+                fh = netCDF4.Dataset(filename)
+                bounds.extend(fh.variables['time_bnds'][:].tolist())
+                fh.close()
+            write_records(spec.output_file_prefix + name + spec.output_file_suffix, bounds)
+        self.converted = True
+
+    def print_diagnostics(self):
+        pass
+
+class time_reshaper_module(object):
+    """ stand-in for the pyreshaper.reshaper module recording its reshapers
+    """
+    def __init__(self):
+        self.reshapers = list()
+
+    def create_reshaper(self, specifier, serial=False, verbosity=1, wmode='w', once=False, simplecomm=None):
+        self.reshapers.append(time_reshaper(specifier))
+        return self.reshapers[-1]
+
+class node_comm(object):
+    """ stand-in for the simplecomm of an aggregator and one node task, the node
+        task writes each rationed item as it is received
+    """
+    def __init__(self):
+        self.items = list()
+
+    def is_manager(self):
+        return True
+
+    def get_size(self):
+        return 2
+
+    def ration(self, data=None):
+        self.items.append(data)
+        if data is not None:
+            zarrStoreLib.write_blocks(*data)
+
+class capture_stdout(object):
+    """ collects the printed output
+    """
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+        return sys.stdout
+
+    def __exit__(self, *args):
+        sys.stdout = self.stdout
+
+@unittest.skipIf(cesm_tseries_generator is None, 'the generator needs asaptools, pyreshaper and cesm_utils')
+class test_createReshaper(unittest.TestCase):
+    def setUp(self):
+        self.reshaper = cesm_tseries_generator.reshaper
+        self.comm = manager_comm()
+        self.spec = cesm_tseries_generator.specification.Specifier(prefix='case.cam.h0.', suffix='.000101-001012.nc')
+        self.stream = {'stream_key' : 'case.cam.h0', 'spec' : self.spec, 'metadata_sidecar' : False}
+
+    def tearDown(self):
+        cesm_tseries_generator.reshaper = self.reshaper
+
+    def test_resumeWriteMode(self):
+        """ test that a resumed specifier skips the existing files with the write mode
+        """
+        cesm_tseries_generator.reshaper = stub_reshaper(create_reshaper)
+        self.stream['skip_existing'] = True
+        with capture_stdout() as output:
+            reshpr = cesm_tseries_generator.create_reshaper(self.stream, self.spec, 2, self.comm)
+        self.assertEqual(reshpr['wmode'], 's')
+        self.assertEqual(reshpr['verbosity'], 2)
+        self.assertFalse(reshpr['serial'])
+        self.assertTrue(reshpr['specifier'] is self.spec)
+        self.assertTrue(reshpr['simplecomm'] is self.comm)
+        self.assertEqual(output.getvalue(), '')
+
+        self.stream['skip_existing'] = False
+        reshpr = cesm_tseries_generator.create_reshaper(self.stream, self.spec, 0, self.comm)
+        self.assertEqual(reshpr['wmode'], 'w')
+
+    def test_resumeWithoutWriteMode(self):
+        """ test that the write mode is dropped with a warning when pyReshaper has none
+        """
+        cesm_tseries_generator.reshaper = stub_reshaper(create_reshaper_without_wmode)
+        self.stream['skip_existing'] = True
+        with capture_stdout() as output:
+            reshpr = cesm_tseries_generator.create_reshaper(self.stream, self.spec, 0, self.comm)
+        self.assertFalse('wmode' in reshpr)
+        self.assertTrue('cannot skip existing files' in output.getvalue())
+
+    def test_sidecarAndResume(self):
+        """ test that the sidecar and the write mode are passed together
+        """
+        cesm_tseries_generator.reshaper = stub_reshaper(create_reshaper)
+        self.stream['skip_existing'] = True
+        self.stream['metadata_sidecar'] = True
+        reshpr = cesm_tseries_generator.create_reshaper(self.stream, self.spec, 0, self.comm)
+        self.assertEqual((reshpr['wmode'], reshpr['once']), ('s', True))
+
+def write_records(filename, bounds):
+    """ write a file with the time records of the (lower, upper) bounds
+    """
+    fh = netCDF4.Dataset(filename, 'w')
+    fh.createDimension('time', None)
+    fh.createDimension('nbnd', 2)
+    time = fh.createVariable('time', 'f8', ('time',))
+    time.units = 'days since 0001-01-01 00:00:00'
+    time.calendar = 'noleap'
+    time.bounds = 'time_bnds'
+    time[:] = [upper for lower, upper in bounds]
+    fh.createVariable('time_bnds', 'f8', ('time', 'nbnd'))[:] = bounds
+    fh.close()
+
+def write_slice(filename, first_bound, last_bound):
+    """ write a monthly history slice with one time record
+    """
+    write_records(filename, [[first_bound, last_bound]])
+
+@unittest.skipIf(cesm_tseries_generator is None or netCDF4 is None, 'the generator needs asaptools, pyreshaper, cesm_utils and netCDF4')
+class test_validateDecompressed(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.comm = cesm_tseries_generator.simplecomm.create_comm(serial=True)
+        self.files = [os.path.join(self.tmpdir, 'case.cam.h0.0001-{0:02d}.nc'.format(month)) for month in range(1, 4)]
+        self.files[1] += '.gz'
+        self.scratch_file = os.path.join(self.tmpdir, 'scratch', 'case.cam.h0.0001-02.nc')
+        os.makedirs(os.path.dirname(self.scratch_file))
+        write_slice(self.files[0], 0.0, 31.0)
+        write_slice(self.files[2], 59.0, 90.0)
+
+        history_spec = cesm_tseries_generator.specification.Specifier(infiles=self.files)
+        self.spec = cesm_tseries_generator.specification.Specifier(infiles=[self.files[0], self.scratch_file, self.files[2]])
+        self.stream = {'stream_key' : 'case.cam.h0', 'spec' : history_spec, 'tseries_tper' : 'monthly',
+                       'time_entries' : dict((f, validateLib.refresh_file(f, None)[0]) for f in self.files if os.path.isfile(f))}
+        self.stream['time_entries'][self.files[1]] = {'size' : 0, 'mtime' : 0.0}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_decompressedSlice(self):
+        """ test that a decompressed slice is checked against its neighbours
+        """
+        write_slice(self.scratch_file, 31.0, 59.0)
+        self.assertEqual(cesm_tseries_generator.validate_decompressed(self.stream, self.spec, self.comm), [])
+
+        write_slice(self.scratch_file, 0.0, 31.0)
+        problems = cesm_tseries_generator.validate_decompressed(self.stream, self.spec, self.comm)
+        self.assertEqual(len(problems), 2)
+        self.assertTrue('duplicate slices' in problems[0])
+
+    def test_previousSegment(self):
+        """ test that the first specifier of an incremental stream continues the manifest segment
+        """
+        write_slice(self.scratch_file, 31.0, 59.0)
+        end = validateLib.refresh_file(self.files[2], None)[0]['time']
+        self.stream['previous_segment'] = ('the converted segment .000101-000112.nc', end)
+        problems = cesm_tseries_generator.validate_decompressed(self.stream, self.spec, self.comm)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue('the converted segment .000101-000112.nc' in problems[0])
+
+@unittest.skipIf(cesm_tseries_generator is None or netCDF4 is None, 'the generator needs asaptools, pyreshaper, cesm_utils and netCDF4')
+class test_convertStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.comm = cesm_tseries_generator.simplecomm.create_comm(serial=True)
+        self.node = nodeLib.node_layout([(0, nodeLib.get_host(0, 1))])[0]
+        stream = {'rootdir' : 'atm', 'subdir' : 'hist', 'file_comp' : 'cam', 'stream' : 'h0', 'tseries_tper' : 'monthly',
+                  'time_variant_variables' : ['time', 'time_bnds']}
+        benchmarkLib.create_archive(self.tmpdir, 'bench', [stream], 1, 3, 4, 2, 2)
+        hist_dir = os.path.join(self.tmpdir, 'atm', 'hist')
+        self.files = sorted(os.path.join(hist_dir, f) for f in os.listdir(hist_dir))
+
+        output_dir = os.path.join(self.tmpdir, 'atm', 'proc', 'tseries', 'month_1')
+        os.makedirs(output_dir)
+        spec = cesm_tseries_generator.specification.Specifier(infiles=self.files, prefix=os.path.join(output_dir, 'bench.cam.h0.'),
+                                                              suffix='.000101-000112.nc', metadata=['time', 'time_bnds'])
+        self.stream = {'stream_key' : 'bench.cam.h0', 'spec' : spec, 'tseries_tper' : 'monthly', 'time_dim' : 'time',
+                       'output_format' : 'zarr', 'variables' : ['VAR2D_000', 'VAR3D_001']}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def history_values(self, name):
+        values = list()
+        for filename in self.files:
+            fh = netCDF4.Dataset(filename)
+            values.extend(fh.variables[name][:].ravel().tolist())
+            fh.close()
+        return values
+
+    def check_stores(self):
+        """ check that every store is complete with the records of all the history slices
+        """
+        for name, store in zip(sorted(self.stream['variables']), cesm_tseries_generator.get_output_files(self.stream)):
+            self.assertTrue(zarrStoreLib.is_complete(store))
+            self.assertEqual(zarrStoreLib.read_values(store, name), self.history_values(name))
+            self.assertEqual(zarrStoreLib.read_time(store)['ntime'], 12)
+
+    def test_localRead(self):
+        """ test that every task reads its own slices without aggregators
+        """
+        times, bytes_read = cesm_tseries_generator.convert_store(self.stream, self.stream['spec'], self.comm)
+        self.check_stores()
+        self.assertTrue(bytes_read > 0)
+
+    def test_aggregator(self):
+        """ test that the aggregator rations the records to its node task
+        """
+        agg_comm = node_comm()
+        times, bytes_read = cesm_tseries_generator.convert_store(self.stream, self.stream['spec'], self.comm, agg_comm, self.node)
+        self.check_stores()
+        self.assertEqual(agg_comm.items[-1], None)
+        # the time-invariant coordinates are written with the stores
+        self.assertEqual(sorted(set(item[1] for item in agg_comm.items[:-1])), ['VAR2D_000', 'VAR3D_001', 'time', 'time_bnds'])
+        variable_bytes = sum(len(self.history_values(name)) * 4 for name in self.stream['variables'])
+        self.assertEqual(bytes_read, variable_bytes + 2 * (12 * 8 + 12 * 2 * 8))
+
+    def test_singleTaskAggregator(self):
+        """ test that an aggregator without node tasks writes the records itself
+        """
+        agg_comm, multi_comm = cesm_tseries_generator.tseriesUtilsLib.divide(self.comm, self.node['color'])
+        cesm_tseries_generator.convert_store(self.stream, self.stream['spec'], self.comm, agg_comm, self.node)
+        self.check_stores()
+
+    def test_climo(self):
+        """ test that the aggregator accumulates the climatology of each store
+        """
+        cesm_tseries_generator.convert_store(self.stream, self.stream['spec'], self.comm, node_comm(), self.node, ['ann'])
+        self.check_stores()
+        for name, store in zip(sorted(self.stream['variables']), cesm_tseries_generator.get_output_files(self.stream)):
+            fh = netCDF4.Dataset(climoLib.climo_file(store))
+            self.assertTrue(name in fh.variables)
+            fh.close()
+
+@unittest.skipIf(cesm_tseries_generator is None or netCDF4 is None, 'the generator needs asaptools, pyreshaper, cesm_utils and netCDF4')
+class test_main(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.reshaper = cesm_tseries_generator.reshaper
+        self.argv = sys.argv
+        self.archive = os.path.join(self.tmpdir, 'archive')
+        self.caseroot = os.path.join(self.tmpdir, 'postprocess')
+        self.output_dir = os.path.join(self.archive, 'atm', 'proc', 'tseries', 'month_1')
+
+    def tearDown(self):
+        cesm_tseries_generator.reshaper = self.reshaper
+        sys.argv = self.argv
+        shutil.rmtree(self.tmpdir)
+
+    def run_main(self, output_format, arguments):
+        """ write the synthetic archive and caseroot of one monthly stream and run
+            the generator on one task
+        """
+        config_xml = os.path.join(self.tmpdir, 'config_timeseries.xml')
+        with open(config_xml, 'w') as fh:
+            fh.write(CONFIG_XML.format(output_format))
+        streams = benchmarkLib.read_layout(config_xml)
+        benchmarkLib.create_archive(self.archive, 'bench', streams, 1, 3, 4, 2, 2)
+        benchmarkLib.write_env_files(self.caseroot, config_xml, 'bench', self.archive, streams)
+
+        sys.argv = ['cesm_tseries_generator.py', '--caseroot', self.caseroot, '--standalone', '--debug', '0',
+                    '--metrics', os.path.join(self.caseroot, 'metrics.json')] + arguments
+        options = cesm_tseries_generator.commandline_options()
+        scomm = cesm_tseries_generator.simplecomm.create_comm(serial=True)
+        with capture_stdout() as output:
+            status = cesm_tseries_generator.main(options, scomm, 0, 1)
+        self.assertEqual(status, 0)
+        return output.getvalue()
+
+    def check_manifest(self):
+        """ check that the twelve history slices are recorded in one segment
+        """
+        manifest = manifestLib.read_manifest(self.output_dir)
+        self.assertEqual(len(manifestLib.converted_files(manifest, 'bench.cam.h0')), 12)
+        suffix, end = manifestLib.segment_end(manifest, 'bench.cam.h0')
+        self.assertEqual(suffix, '.000101-000112.nc')
+        self.assertEqual(end['last_bound'], 365.0)
+        self.assertTrue(os.path.isfile(os.path.join(self.caseroot, 'metrics.json')))
+
+    def test_reshaperStream(self):
+        """ test a serial run converting a netCDF stream with a stand-in reshaper
+        """
+        module = time_reshaper_module()
+        cesm_tseries_generator.reshaper = module
+        output = self.run_main('netcdf4c', [])
+        self.assertTrue('1 specifiers of 1 cases scheduled on 1 rank groups' in output)
+        self.assertEqual(len(module.reshapers), 1)
+        self.assertTrue(module.reshapers[0].converted)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ['bench.cam.h0.VAR2D_000.000101-000112.nc',
+                         'bench.cam.h0.VAR3D_001.000101-000112.nc', manifestLib.MANIFEST_NAME])
+        self.check_manifest()
+
+    def test_storeStream(self):
+        """ test a serial run converting a zarr stream with an I/O aggregator and climatologies
+        """
+        self.run_main('zarr', ['--io-aggregators', '1', '--climo', 'ann'])
+        for name in ['VAR2D_000', 'VAR3D_001']:
+            store = os.path.join(self.output_dir, 'bench.cam.h0.{0}.000101-000112.zarr'.format(name))
+            self.assertTrue(zarrStoreLib.is_complete(store))
+            self.assertTrue(os.path.isfile(climoLib.climo_file(store)))
+        self.check_manifest()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the climatology means of the time series files
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import netCDF4
+    import numpy as np
+except ImportError:
+    netCDF4 = None
+
+from timeseries import climoLib
+
+DAYS_PER_MONTH = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+class test_climo(unittest.TestCase):
+
+    def test_parsePeriods(self):
+        """ test the --climo periods option
+        """
+        self.assertEqual(climoLib.parse_periods('ann, Monthly'), ['ann', 'monthly'])
+        self.assertRaises(ValueError, climoLib.parse_periods, 'ann,djf')
+
+    def test_streamPeriods(self):
+        """ test that annual streams only have annual means
+        """
+        self.assertEqual(climoLib.stream_periods(['ann', 'seasonal', 'monthly'], 'annual'), ['ann'])
+        self.assertEqual(climoLib.stream_periods(['seasonal', 'monthly'], 'yearly'), [])
+        self.assertEqual(climoLib.stream_periods(['ann', 'seasonal'], 'daily'), ['ann', 'seasonal'])
+
+    def test_climoFile(self):
+        """ test the climatology file name of a time series file
+        """
+        self.assertEqual(climoLib.climo_file('/archive/atm/proc/tseries/monthly/case.cam.h0.TS.000101-001012.nc'),
+                         '/archive/atm/proc/tseries/monthly/climo/case.cam.h0.TS.000101-001012.climo.nc')
+        self.assertEqual(climoLib.climo_file('/archive/atm/proc/tseries/monthly/case.cam.h0.TS.000101-001012.zarr/'),
+                         '/archive/atm/proc/tseries/monthly/climo/case.cam.h0.TS.000101-001012.climo.nc')
+
+    def test_monthlyRecords(self):
+        """ test the duration weighted annual, seasonal and monthly means of two years of monthly records
+        """
+        accumulator = climoLib.ClimoAccumulator()
+        for year in range(2):
+            for month, days in enumerate(DAYS_PER_MONTH, 1):
+                accumulator.add(month, float(month + 10 * year), days)
+
+        means = accumulator.means(['ann', 'seasonal', 'monthly'])
+        self.assertAlmostEqual(float(means['monthly'][0]), 6.0)
+        self.assertAlmostEqual(float(means['monthly'][11]), 17.0)
+        djf = (17.0 * 31 + 6.0 * 31 + 7.0 * 28) / (31 + 31 + 28)
+        self.assertAlmostEqual(float(means['seasonal'][0]), djf)
+        ann = sum((m + 5.0) * d for m, d in enumerate(DAYS_PER_MONTH, 1)) / 365.0
+        self.assertAlmostEqual(float(means['ann']), ann)
+        self.assertEqual(accumulator.days[2], 56.0)
+
+    def test_dailyRecords(self):
+        """ test that sub-monthly records are weighted by their duration
+        """
+        accumulator = climoLib.ClimoAccumulator()
+        accumulator.add(1, 1.0, 0.25)
+        accumulator.add(1, 3.0, 0.75)
+        means = accumulator.means(['ann', 'monthly'])
+        self.assertAlmostEqual(float(means['monthly'][0]), 2.5)
+        self.assertAlmostEqual(float(means['ann']), 2.5)
+        self.assertEqual(means['monthly'][1], None)
+        self.assertFalse('seasonal' in means)
+
+@unittest.skipIf(netCDF4 is None, 'reading the history slices requires netCDF4 and numpy')
+class test_slices(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fill_value = 1.0e20
+        self.slices = list()
+        start = 0
+        for month, days in enumerate(DAYS_PER_MONTH, 1):
+            filename = os.path.join(self.tmpdir, 'case.cam.h0.0001-{0:02d}.nc'.format(month))
+            fh = netCDF4.Dataset(filename, 'w')
+            fh.createDimension('time', None)
+            fh.createDimension('nbnd', 2)
+            fh.createDimension('lat', 2)
+            time = fh.createVariable('time', 'f8', ('time',))
+            time.units = 'days since 0001-01-01 00:00:00'
+            time.calendar = 'noleap'
+            time.bounds = 'time_bnds'
+            fh.createVariable('time_bnds', 'f8', ('time', 'nbnd'))[:] = [[start, start + days]]
+            time[:] = [start + days]
+            lat = fh.createVariable('lat', 'f8', ('lat',))
+            lat[:] = [-45.0, 45.0]
+            ts = fh.createVariable('TS', 'f4', ('time', 'lat'), fill_value=self.fill_value)
+            # the second point is only valid in January
+            ts[0] = np.ma.masked_array([month, 100.0], mask=[False, month != 1])
+            fh.close()
+            self.slices.append(filename)
+            start += days
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_raw(self, filename):
+        fh = netCDF4.Dataset(filename, 'r')
+        fh.set_auto_maskandscale(False)
+        try:
+            return fh.variables['TS'][0:1]
+        finally:
+            fh.close()
+
+    def test_accumulateSlices(self):
+        """ test the climatology accumulated from the slices as they are read
+        """
+        accumulator = climoLib.ClimoAccumulator()
+        months = dict()
+        for filename in self.slices:
+            climoLib.accumulate_slices(accumulator, 'TS', [(filename, 0, 1)], [self.read_raw(filename)], 'time', months)
+        self.assertEqual(accumulator.records, 12)
+        self.assertEqual(sorted(months), sorted(self.slices))
+
+        means = accumulator.means(['ann', 'monthly'])
+        self.assertAlmostEqual(float(means['monthly'][1][0]), 2.0)
+        ann = sum(m * d for m, d in enumerate(DAYS_PER_MONTH, 1)) / 365.0
+        self.assertAlmostEqual(float(means['ann'][0]), ann, places=5)
+        # the fill values are masked, not averaged
+        self.assertAlmostEqual(float(means['ann'][1]), 100.0)
+
+    def test_writeMeans(self):
+        """ test the climatology file of a store written from a history slice template
+        """
+        accumulator = climoLib.ClimoAccumulator()
+        for filename in self.slices:
+            climoLib.accumulate_slices(accumulator, 'TS', [(filename, 0, 1)], [self.read_raw(filename)])
+        store = os.path.join(self.tmpdir, 'case.cam.h0.TS.000101-000112.zarr')
+        filename = climoLib.write_means(climoLib.climo_file(store), accumulator, ['ann', 'seasonal'],
+                                        self.slices[0], 'TS', source_name=store)
+
+        fh = netCDF4.Dataset(filename, 'r')
+        try:
+            self.assertEqual(fh.source_file, os.path.basename(store))
+            self.assertEqual(fh.climo_records, 12)
+            self.assertEqual(fh.variables['TS'].dimensions, ('lat',))
+            self.assertEqual(fh.variables['TS_seasonal'].shape, (4, 2))
+            self.assertEqual(list(fh.variables['lat'][:]), [-45.0, 45.0])
+            self.assertFalse('TS_monthly' in fh.variables)
+        finally:
+            fh.close()
+        self.assertEqual(os.listdir(os.path.dirname(filename)), [os.path.basename(filename)])
+
+if __name__ == '__main__':
+    unittest.main()
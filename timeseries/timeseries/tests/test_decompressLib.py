@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series history file decompression
+"""
+from __future__ import print_function
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import decompressLib
+
+class test_decompressLib(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.scratch_dir = os.path.join(self.tmpdir, 'scratch')
+        self.files = list()
+        for month in range(1, 5):
+            filename = os.path.join(self.tmpdir, 'case.pop.h.0001-{0:02d}.nc.gz'.format(month))
+            fh = gzip.open(filename, 'wb')
+            fh.write(b'x' * 1000 * month)
+            fh.close()
+            self.files.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_names(self):
+        """ test the compressed file name helpers
+        """
+        self.assertTrue(decompressLib.is_compressed(self.files[0]))
+        self.assertFalse(decompressLib.is_compressed('case.pop.h.0001-01.nc'))
+        self.assertEqual(decompressLib.uncompressed_name('/a/case.pop.h.0001-01.nc.gz'), '/a/case.pop.h.0001-01.nc')
+        self.assertEqual(decompressLib.uncompressed_size(self.files[2]), 3000)
+
+    def test_decompressed(self):
+        """ test that the temporary decompressed copy is removed on exit
+        """
+        with decompressLib.decompressed(self.files[1], self.scratch_dir) as filename:
+            self.assertEqual(os.path.getsize(filename), 2000)
+            self.assertTrue(filename.endswith('case.pop.h.0001-02.nc'))
+        self.assertFalse(os.path.exists(filename))
+        self.assertEqual(os.listdir(self.scratch_dir), [])
+
+    def test_pipeline(self):
+        """ test that the specifier files are available after wait and removed after release
+        """
+        pipeline = decompressLib.Pipeline(self.scratch_dir, 2500, [self.files[0:2], [], self.files[2:4]])
+        pipeline.start()
+        try:
+            pipeline.wait(0)
+            for filename in self.files[0:2]:
+                self.assertTrue(os.path.isfile(pipeline.scratch_name(filename)))
+            pipeline.release(0)
+            self.assertFalse(os.path.exists(pipeline.scratch_name(self.files[0])))
+            pipeline.wait(1)
+            pipeline.release(1)
+            # the last specifier is over the budget but is always decompressed once it is current
+            pipeline.wait(2)
+            self.assertEqual(os.path.getsize(pipeline.scratch_name(self.files[3])), 4000)
+            pipeline.release(2)
+        finally:
+            pipeline.close()
+        self.assertEqual(os.listdir(self.scratch_dir), [])
+
+    def test_pipelineError(self):
+        """ test that a decompression error is raised by wait
+        """
+        with open(self.files[0], 'wb') as fh:
+            fh.write(b'not gzip data')
+        pipeline = decompressLib.Pipeline(self.scratch_dir, 10000, [self.files[0:1]])
+        pipeline.start()
+        try:
+            self.assertRaises(RuntimeError, pipeline.wait, 0)
+        finally:
+            pipeline.close()
+
+if __name__ == '__main__':
+    unittest.main()
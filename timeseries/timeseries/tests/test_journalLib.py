@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series checkpoint/resume journal
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+from timeseries import journalLib, ncHeaderLib
+
+def create_reshaper(specifier, serial=False, verbosity=1, wmode='w', once=False, simplecomm=None):
+    pass
+
+def create_reshaper_without_wmode(specifier, serial=False, verbosity=1, simplecomm=None):
+    pass
+
+class test_journalLib(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.outputs = list()
+        for name in ['PS', 'T', 'U']:
+            filename = os.path.join(self.tmpdir, 'case.cam.h0.{0}.000101-001012.nc'.format(name))
+            with open(filename, 'wb') as fh:
+                fh.write(name.encode('ascii') * 100)
+            self.outputs.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fileEntry(self):
+        """ test the size and modification time of a journal entry
+        """
+        entry = journalLib.file_entry(self.outputs[0])
+        self.assertEqual(entry['size'], 200)
+        self.assertEqual(entry['mtime'], os.path.getmtime(self.outputs[0]))
+
+    def test_parts(self):
+        """ test that the rank group parts are merged and consolidated
+        """
+        journalLib.write_part(self.tmpdir, 0, {self.outputs[0] : journalLib.file_entry(self.outputs[0])})
+        journalLib.write_part(self.tmpdir, 1, {self.outputs[1] : journalLib.file_entry(self.outputs[1])})
+        files = journalLib.read_journal(self.tmpdir)
+        self.assertEqual(sorted(files), self.outputs[0:2])
+
+        journalLib.consolidate(self.tmpdir, files)
+        self.assertEqual([f for f in os.listdir(self.tmpdir) if f.startswith(journalLib.JOURNAL_FILE)],
+                         [journalLib.JOURNAL_FILE])
+        self.assertEqual(journalLib.read_journal(self.tmpdir), files)
+
+        journalLib.clear(self.tmpdir)
+        self.assertEqual(journalLib.read_journal(self.tmpdir), dict())
+
+    def test_resumeFiles(self):
+        """ test that journaled files are kept and partial files are removed
+        """
+        files = {self.outputs[0] : journalLib.file_entry(self.outputs[0]),
+                 self.outputs[1] : journalLib.file_entry(self.outputs[1])}
+        # the second file was rewritten after it was journaled
+        with open(self.outputs[1], 'ab') as fh:
+            fh.write(b'partial')
+
+        missing = os.path.join(self.tmpdir, 'case.cam.h0.V.000101-001012.nc')
+        done, removed = journalLib.resume_files(self.outputs + [missing], files)
+        self.assertEqual(done, self.outputs[0:1])
+        self.assertEqual(removed, self.outputs[1:3])
+        self.assertTrue(os.path.isfile(self.outputs[0]))
+        self.assertFalse(os.path.exists(self.outputs[2]))
+
+    def test_resumeRewritten(self):
+        """ test that a file rewritten with the journaled size is removed
+        """
+        files = {self.outputs[0] : journalLib.file_entry(self.outputs[0]),
+                 self.outputs[1] : {'size' : 100}}
+        mtime = files[self.outputs[0]]['mtime']
+        os.utime(self.outputs[0], (mtime + 10, mtime + 10))
+
+        done, removed = journalLib.resume_files(self.outputs[0:2], files)
+        self.assertEqual(done, self.outputs[1:2])
+        self.assertEqual(removed, self.outputs[0:1])
+
+    def test_resumeProbe(self):
+        """ test that a file matching its entry is probed before it is trusted
+        """
+        times = dict((output, {'ntime' : 12, 'last' : 334.0}) for output in self.outputs)
+        times[self.outputs[1]] = {'ntime' : 6, 'last' : 151.0}
+        def probe(filename):
+            if filename == self.outputs[2]:
+                raise RuntimeError('NetCDF: HDF error')
+            return times[filename]
+
+        files = dict((output, journalLib.file_entry(output)) for output in self.outputs)
+        files[self.outputs[0]].update({'ntime' : 12, 'last' : 334.0})
+        files[self.outputs[1]].update({'ntime' : 12, 'last' : 334.0})
+        done, removed = journalLib.resume_files(self.outputs, files, probe)
+        self.assertEqual(done, self.outputs[0:1])
+        self.assertEqual(removed, self.outputs[1:3])
+
+    @unittest.skipIf(netCDF4 is None, 'probing the time records requires netCDF4')
+    def test_resumeTouched(self):
+        """ test that a file damaged after the job and touched back to its journaled mtime is removed
+        """
+        filename = os.path.join(self.tmpdir, 'case.cam.h0.TS.000101-000112.nc')
+        fh = netCDF4.Dataset(filename, 'w', format='NETCDF3_64BIT_OFFSET')
+        fh.createDimension('time', None)
+        fh.createDimension('lat', 2)
+        fh.createVariable('time', 'f8', ('time',))[:] = range(1, 13)
+        fh.createVariable('TS', 'f4', ('time', 'lat'))[:] = [[280.0, 290.0]] * 12
+        fh.close()
+
+        entry = journalLib.file_entry(filename, ncHeaderLib.read_time)
+        self.assertEqual((entry['ntime'], entry['last']), (12, 12.0))
+        self.assertEqual(journalLib.resume_files([filename], {filename : entry}, ncHeaderLib.read_time), ([filename], []))
+
+        # the last record is zeroed with the size kept and the mtime restored
+        with open(filename, 'r+b') as fh:
+            fh.seek(-16, os.SEEK_END)
+            fh.write(b'\0' * 16)
+        os.utime(filename, (entry['mtime'], entry['mtime']))
+        self.assertEqual(journalLib.resume_files([filename], {filename : entry}), ([filename], []))
+        self.assertEqual(journalLib.resume_files([filename], {filename : entry}, ncHeaderLib.read_time), ([], [filename]))
+        self.assertFalse(os.path.exists(filename))
+
+    def test_resumeStores(self):
+        """ test that a journaled directory store is kept and a partial store is removed
+        """
+        stores = list()
+        for name in ['PS', 'T']:
+            store = os.path.join(self.tmpdir, 'case.cam.h0.{0}.000101-001012.zarr'.format(name))
+            os.makedirs(os.path.join(store, name))
+            for key in ['0.0.0', '1.0.0']:
+                with open(os.path.join(store, name, key), 'wb') as fh:
+                    fh.write(name.encode('ascii') * 10)
+            stores.append(store)
+
+        files = {stores[0] : journalLib.file_entry(stores[0])}
+        self.assertEqual(files[stores[0]]['size'], 40)
+
+        done, removed = journalLib.resume_files(stores, files)
+        self.assertEqual(done, [stores[0]])
+        self.assertEqual(removed, [stores[1]])
+        self.assertFalse(os.path.exists(stores[1]))
+
+    def test_reshaperArguments(self):
+        """ test that the existing files are only skipped by a pyReshaper with write modes
+        """
+        self.assertEqual(journalLib.reshaper_arguments(create_reshaper, True), {'wmode' : 's'})
+        self.assertEqual(journalLib.reshaper_arguments(create_reshaper, False), dict())
+        self.assertEqual(journalLib.reshaper_arguments(create_reshaper_without_wmode, True), dict())
+
+if __name__ == '__main__':
+    unittest.main()
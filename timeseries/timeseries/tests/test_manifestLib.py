@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series manifest utilities
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import manifestLib
+
+class test_manifest(unittest.TestCase):
+    def setUp(self):
+        self.tseries_dir = tempfile.mkdtemp()
+        self.stream_key = 'b.e11.B1850C5CN.f09_g16.005.cam.h0'
+        self.files = ['/archive/atm/hist/{0}.0001-{1:02d}.nc'.format(self.stream_key, m) for m in range(1,13)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tseries_dir)
+
+    def test_emptyManifest(self):
+        """ test that a missing manifest reads as empty
+        """
+        manifest = manifestLib.read_manifest(self.tseries_dir)
+        self.assertEqual(manifestLib.converted_files(manifest, self.stream_key), set())
+
+    def test_roundTrip(self):
+        """ test that recorded segments are read back as converted basenames
+        """
+        manifest = manifestLib.read_manifest(self.tseries_dir)
+        manifestLib.add_segment(manifest, self.stream_key, '.000101-000106.nc', self.files[:6])
+        manifestLib.write_manifest(self.tseries_dir, manifest)
+
+        manifest = manifestLib.read_manifest(self.tseries_dir)
+        done = manifestLib.converted_files(manifest, self.stream_key)
+        self.assertEqual(done, set(os.path.basename(f) for f in self.files[:6]))
+
+    def test_incrementalSegments(self):
+        """ test that incremental segments accumulate and a full run replaces them
+        """
+        manifest = manifestLib.read_manifest(self.tseries_dir)
+        manifestLib.add_segment(manifest, self.stream_key, '.000101-000106.nc', self.files[:6])
+        manifestLib.add_segment(manifest, self.stream_key, '.000107-000112.nc', self.files[6:])
+        self.assertEqual(len(manifest['streams'][self.stream_key]['segments']), 2)
+        self.assertEqual(len(manifestLib.converted_files(manifest, self.stream_key)), 12)
+
+        manifestLib.add_segment(manifest, self.stream_key, '.000101-000112.nc', self.files, replace=True)
+        self.assertEqual(len(manifest['streams'][self.stream_key]['segments']), 1)
+
+    def test_segmentEnd(self):
+        """ test the end time of the last segment of an incremental stream
+        """
+        manifest = manifestLib.read_manifest(self.tseries_dir)
+        self.assertEqual(manifestLib.segment_end(manifest, self.stream_key), None)
+        manifestLib.add_segment(manifest, self.stream_key, '.000101-000106.nc', self.files[:6])
+        self.assertEqual(manifestLib.segment_end(manifest, self.stream_key), None)
+
+        end = {'units' : 'days since 0001-01-01 00:00:00', 'calendar' : 'noleap', 'last' : 365.0, 'last_bound' : 365.0}
+        manifestLib.add_segment(manifest, self.stream_key, '.000107-000112.nc', self.files[6:], end=end)
+        manifestLib.write_manifest(self.tseries_dir, manifest)
+        manifest = manifestLib.read_manifest(self.tseries_dir)
+        self.assertEqual(manifestLib.segment_end(manifest, self.stream_key), ('.000107-000112.nc', end))
+
+    def test_updateManifestsProbe(self):
+        """ test that the probed end time of each converted stream is recorded
+        """
+        class spec(object):
+            output_file_suffix = '.000101-001212.nc'
+            input_file_list = self.files
+        stream = {'tseries_output_dir' : self.tseries_dir, 'stream_key' : self.stream_key, 'spec' : spec}
+        manifestLib.update_manifests([stream], True, lambda tseries_stream: {'last' : 365.0})
+        manifest = manifestLib.read_manifest(self.tseries_dir)
+        self.assertEqual(manifestLib.segment_end(manifest, self.stream_key), ('.000101-001212.nc', {'last' : 365.0}))
+
+if __name__ == '__main__':
+    unittest.main()
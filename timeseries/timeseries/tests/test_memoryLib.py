@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the memory bounded read chunks
+"""
+from __future__ import print_function
+
+import unittest
+
+from timeseries import memoryLib
+
+MB = 1024 * 1024
+
+class test_memory(unittest.TestCase):
+    def setUp(self):
+        # a 30 minute CAM stream with 3-D fields of 30 levels on a 192x288 grid
+        self.dimensions = {'time' : 48, 'lev' : 30, 'lat' : 192, 'lon' : 288}
+        self.var_dims = {'T' : ['time', 'lev', 'lat', 'lon'], 'PS' : ['time', 'lat', 'lon']}
+        self.variables = {'T' : 30 * 192 * 288 * 4, 'PS' : 192 * 288 * 4}
+
+    def tearDown(self):
+        pass
+
+    def test_wholeRecords(self):
+        """ test that several records are read at once when they fit
+        """
+        chunks = memoryLib.read_chunks(self.variables, self.var_dims, self.dimensions, 'time', 200 * MB)
+        self.assertEqual(chunks, {'time' : 10})
+        self.assertTrue(memoryLib.chunk_bytes(self.variables, self.var_dims, self.dimensions, 'time', chunks) * memoryLib.MEMORY_FACTOR <= 200 * MB)
+
+    def test_splitLevels(self):
+        """ test that the levels are split when a record does not fit
+        """
+        chunks = memoryLib.read_chunks(self.variables, self.var_dims, self.dimensions, 'time', 8 * MB)
+        self.assertEqual(chunks, {'time' : 1, 'lev' : 12})
+        self.assertTrue(memoryLib.chunk_bytes(self.variables, self.var_dims, self.dimensions, 'time', chunks) * memoryLib.MEMORY_FACTOR <= 8 * MB)
+
+    def test_splitLatitudes(self):
+        """ test that the next dimension is split when a level does not fit
+        """
+        chunks = memoryLib.read_chunks(self.variables, self.var_dims, self.dimensions, 'time', MB // 4)
+        self.assertEqual(chunks['lev'], 1)
+        self.assertTrue(chunks['lat'] < 192)
+        self.assertTrue(memoryLib.chunk_bytes(self.variables, self.var_dims, self.dimensions, 'time', chunks) * memoryLib.MEMORY_FACTOR <= MB // 4)
+
+    def test_noVariables(self):
+        """ test a stream without variables
+        """
+        self.assertEqual(memoryLib.read_chunks(dict(), dict(), self.dimensions, 'time', MB), dict())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series throughput metrics
+"""
+from __future__ import print_function
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import metricsLib
+
+class test_metrics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        times = {'open_seconds' : 1.0, 'read_seconds' : 4.0, 'write_seconds' : 2.0, 'close_seconds' : 1.0}
+        self.task_records = [metricsLib.task_record('case.cam.h0.000101-000112', 1, 10.0, times, 1000),
+                             metricsLib.task_record('case.cam.h0.000101-000112', 0, 12.0, times, 3000)]
+        self.prefix = os.path.join(self.tmpdir, 'case.cam.h0.')
+        self.suffix = '.000101-000112.nc'
+        with open(self.prefix + 'T' + self.suffix, 'w') as fh:
+            fh.write('x' * 300)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_mergeTasks(self):
+        """ test that task records are summed per stream with the longest wall time
+        """
+        merged = metricsLib.merge_task_records(self.task_records)['case.cam.h0.000101-000112']
+        self.assertEqual(merged['ranks'], [0, 1])
+        self.assertEqual(merged['bytes_read'], 4000)
+        self.assertEqual(merged['wall_seconds'], 12.0)
+        self.assertEqual(merged['read_seconds'], 8.0)
+
+    def test_variableRecords(self):
+        """ test that variable times are apportioned by bytes read
+        """
+        merged = metricsLib.merge_task_records(self.task_records)['case.cam.h0.000101-000112']
+        records = metricsLib.variable_records(merged, self.prefix, self.suffix, {'T' : 30, 'PS' : 10}, 12)
+        by_name = dict((r['variable'], r) for r in records)
+        self.assertEqual(by_name['T']['bytes_read'], 360)
+        self.assertEqual(by_name['T']['bytes_written'], 300)
+        self.assertEqual(by_name['PS']['bytes_written'], None)
+        self.assertAlmostEqual(by_name['T']['read_seconds'], 6.0)
+        self.assertEqual(merged['bytes_written'], 300)
+
+    def test_storeBytesWritten(self):
+        """ test that the bytes written of a directory store are its total file size
+        """
+        store = os.path.join(self.tmpdir, 'case.cam.h0.T.000101-000112.zarr')
+        os.makedirs(os.path.join(store, 'T'))
+        for name, size in [('.zgroup', 20), ('T/0', 100), ('T/1', 80)]:
+            with open(os.path.join(store, name), 'w') as fh:
+                fh.write('x' * size)
+
+        merged = metricsLib.merge_task_records(self.task_records)['case.cam.h0.000101-000112']
+        records = metricsLib.variable_records(merged, self.prefix, self.suffix, {'T' : 30}, 12, [store])
+        self.assertEqual(records[0]['output_file'], store)
+        self.assertEqual(records[0]['bytes_written'], 200)
+        self.assertEqual(records[0]['wall_seconds'], None)
+        self.assertEqual(merged['bytes_written'], 200)
+
+    def test_writeFormats(self):
+        """ test that the metrics are written as JSON and CSV
+        """
+        merged = metricsLib.merge_task_records(self.task_records)['case.cam.h0.000101-000112']
+        records = [merged] + metricsLib.variable_records(merged, self.prefix, self.suffix, {'T' : 30}, 12)
+
+        json_file = os.path.join(self.tmpdir, 'metrics.json')
+        metricsLib.write_metrics(json_file, records, 12.0, 2)
+        with open(json_file) as fh:
+            self.assertEqual(len(json.load(fh)['records']), 2)
+
+        csv_file = os.path.join(self.tmpdir, 'metrics.csv')
+        metricsLib.write_metrics(csv_file, records, 12.0, 2)
+        with open(csv_file) as fh:
+            rows = list(csv.DictReader(fh))
+        self.assertEqual([row['record'] for row in rows], ['stream', 'variable'])
+        self.assertEqual(rows[0]['ranks'], '0 1')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the node topology of the I/O aggregation
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import nodeLib, stageLib
+
+class test_nodeLib(unittest.TestCase):
+    def simulate(self, size, ranks_per_node):
+        return [(rank, nodeLib.get_host(rank, ranks_per_node)) for rank in range(size)]
+
+    def test_simulatedHosts(self):
+        """ test the simulated node names of consecutive ranks
+        """
+        self.assertEqual([host for rank, host in self.simulate(5, 2)],
+                         ['node0000', 'node0000', 'node0001', 'node0001', 'node0002'])
+        self.assertEqual(nodeLib.get_host(7), stageLib.get_host())
+
+    def test_nodeLayout(self):
+        """ test the aggregators and sub-communicators of simulated nodes
+        """
+        layout = nodeLib.node_layout(self.simulate(10, 4), 2)
+        self.assertEqual(sorted(layout), list(range(10)))
+        self.assertEqual([layout[rank]['node'] for rank in range(10)], [0, 0, 0, 0, 1, 1, 1, 1, 2, 2])
+        self.assertEqual([rank for rank in range(10) if layout[rank]['aggregator']], [0, 1, 4, 5, 8, 9])
+        self.assertEqual([layout[rank]['color'] for rank in range(10)], [0, 1, 0, 1, 2, 3, 2, 3, 4, 5])
+        self.assertTrue(all(layout[rank]['naggregators'] == 6 for rank in layout))
+
+        # every aggregator is the lowest rank, the manager, of its sub-communicator
+        for rank, entry in layout.items():
+            manager = min(r for r in layout if layout[r]['color'] == entry['color'])
+            self.assertTrue(layout[manager]['aggregator'])
+            self.assertEqual(layout[manager]['node'], entry['node'])
+
+    def test_nodeLeaders(self):
+        """ test that node rank 0 is the staging task of each node
+        """
+        hosts = [(3, 'node1'), (0, 'node0'), (2, 'node1'), (1, 'node0'), (4, 'node2')]
+        layout = nodeLib.node_layout(hosts)
+        self.assertEqual(set(rank for rank in layout if layout[rank]['node_rank'] == 0), stageLib.node_leaders(hosts))
+        self.assertEqual([layout[rank]['color'] for rank in range(5)], [0, 0, 1, 1, 2])
+
+    def test_moreAggregatorsThanTasks(self):
+        """ test a node with fewer tasks than aggregators
+        """
+        layout = nodeLib.node_layout([(0, 'a'), (1, 'b'), (2, 'b'), (3, 'b')], 4)
+        self.assertTrue(all(entry['aggregator'] for entry in layout.values()))
+        self.assertEqual(sorted(entry['color'] for entry in layout.values()), [0, 1, 2, 3])
+
+class test_simulatedWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = stageLib.get_stage_dir(self.tmpdir, stageLib.WRITE_BEHIND_SUBDIR)
+        self.output_dir = os.path.join(self.tmpdir, 'tseries')
+        os.makedirs(self.output_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_twoNodes(self):
+        """ test that the flushers of two simulated nodes only move the files of their node
+        """
+        layout = nodeLib.node_layout([(rank, nodeLib.get_host(rank, 2)) for rank in range(4)])
+        names = ['PS', 'T', 'U', 'V']
+        output_files = [os.path.join(self.output_dir, 'case.cam.h0.{0}.000101-000112.nc'.format(name)) for name in names]
+
+        # each task writes one variable file to the write-behind directory of its node
+        node_dirs = set()
+        for rank, output_file in enumerate(output_files):
+            write_behind_dir = nodeLib.node_dir(self.root, layout[rank]['host'])
+            node_dirs.add(write_behind_dir)
+            if not os.path.isdir(write_behind_dir):
+                os.makedirs(write_behind_dir)
+            with open(os.path.join(write_behind_dir, os.path.basename(output_file)), 'w') as fh:
+                fh.write('x' * 10 * (rank + 1))
+        self.assertEqual(len(node_dirs), 2)
+
+        # the lowest task of each node flushes the files found in its node directory
+        flushers = list()
+        for rank in sorted(layout):
+            if layout[rank]['node_rank'] != 0:
+                continue
+            write_behind_dir = nodeLib.node_dir(self.root, layout[rank]['host'])
+            files = [(os.path.join(write_behind_dir, os.path.basename(f)), f) for f in output_files]
+            flusher = stageLib.Flusher(2)
+            flusher.start()
+            flusher.flush(0, [(src, dst) for src, dst in files if os.path.isfile(src)])
+            flushers.append(flusher)
+
+        for flusher in flushers:
+            flusher.wait(0)
+            flusher.close()
+        self.assertEqual([flusher.flushed_bytes for flusher in flushers], [30, 70])
+        self.assertEqual([os.path.getsize(f) for f in output_files], [10, 20, 30, 40])
+
+class test_groupStaging(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.node_root = nodeLib.node_dir(stageLib.get_stage_dir(self.tmpdir), nodeLib.get_host(0, 2))
+        archive = os.path.join(self.tmpdir, 'archive')
+        os.makedirs(archive)
+        self.files = list()
+        for month in range(1, 4):
+            filename = os.path.join(archive, 'case.cam.h0.0001-{0:02d}.nc'.format(month))
+            with open(filename, 'wb') as fh:
+                fh.write(bytes(bytearray([month])) * 1000)
+            self.files.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sharedInputFiles(self):
+        """ test that two rank groups on a node staging the same files keep their own copies
+        """
+        # the least_significant_digit splits of a stream read the same history files
+        stagers = [stageLib.Stager(nodeLib.group_dir(self.node_root, color), 1500, [self.files[0:2], self.files[2:3]])
+                   for color in range(2)]
+        self.assertNotEqual(stagers[0].stage_name(self.files[0]), stagers[1].stage_name(self.files[0]))
+        for stager in stagers:
+            stager.start()
+        try:
+            for stager in stagers:
+                stager.wait(0)
+
+            # the first group moves on, evicting its first specifier files, and finishes
+            stagers[0].release(0)
+            stagers[0].wait(1)
+            self.assertFalse(os.path.exists(stagers[0].stage_name(self.files[0])))
+            stagers[0].close()
+
+            # the staged files of the second group are untouched
+            for filename in self.files[0:2]:
+                with open(stagers[1].stage_name(filename), 'rb') as fh:
+                    self.assertEqual(fh.read(), open(filename, 'rb').read())
+        finally:
+            for stager in stagers:
+                stager.close()
+        self.assertEqual(sorted(os.listdir(self.node_root)), ['group0', 'group1'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series dry-run planning report
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from timeseries import planLib
+
+MACHINE_XML = """<?xml version="1.0"?>
+<machine_postprocess>
+  <machine name="yellowstone" hostname="yslogin">
+    <timeseries_pes queue="regular" pes_per_node="4" wallclock="02:00">128</timeseries_pes>
+  </machine>
+  <machine name="edison" hostname="edison">
+    <timeseries_pes queue="regular" wallclock="00:30">144</timeseries_pes>
+  </machine>
+  <machine name="cheyenne" hostname="cheyenne">
+  </machine>
+</machine_postprocess>
+"""
+
+class capture_stdout(object):
+    """ collects the printed output
+    """
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+        return sys.stdout
+
+    def __exit__(self, *args):
+        sys.stdout = self.stdout
+
+class test_planLib(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.machine_xml = os.path.join(self.tmpdir, 'machine_postprocess.xml')
+        with open(self.machine_xml, 'w') as fh:
+            fh.write(MACHINE_XML)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parseWallclock(self):
+        """ test the hh:mm and hh:mm:ss wallclock formats
+        """
+        self.assertEqual(planLib.parse_wallclock('02:00'), 7200)
+        self.assertEqual(planLib.parse_wallclock('00:30:15'), 1815)
+        self.assertRaises(ValueError, planLib.parse_wallclock, '120')
+
+    def test_readTimeseriesPes(self):
+        """ test reading the machine timeseries_pes element
+        """
+        pes = planLib.read_timeseries_pes(self.machine_xml, 'yellowstone')
+        self.assertEqual(pes, {'pes' : 128, 'pes_per_node' : 4, 'wallclock_seconds' : 7200})
+        pes = planLib.read_timeseries_pes(self.machine_xml, 'edison')
+        self.assertEqual(pes['pes_per_node'], 1)
+        self.assertEqual(planLib.read_timeseries_pes(self.machine_xml, 'cheyenne'), None)
+        self.assertEqual(planLib.read_timeseries_pes(self.machine_xml, None), None)
+
+    def test_streamPlan(self):
+        """ test the output file names and uncompressed output bytes of a stream
+        """
+        plan = planLib.stream_plan('case.cam.h0.000101-000112', '/ts/case.cam.h0.', '.000101-000112.nc',
+                                   {'T' : 400, 'PS' : 40}, 12, 10000, 5.0)
+        self.assertEqual(plan['output_files'], ['/ts/case.cam.h0.PS.000101-000112.nc',
+                                                '/ts/case.cam.h0.T.000101-000112.nc'])
+        self.assertEqual(plan['output_bytes'], 440 * 12)
+        self.assertEqual(plan['split_bytes'], 0)
+
+    def test_makePlan(self):
+        """ test the totals and the task count recommendation
+        """
+        streams = [planLib.stream_plan('a', 'a.', '.nc', {'T' : 100}, 10, 1000, 1000.0),
+                   planLib.stream_plan('b', 'b.', '.nc', {'T' : 100}, 10, 3000, 3000.0, 2048)]
+        timeseries_pes = {'pes' : 4, 'pes_per_node' : 1, 'wallclock_seconds' : 3600}
+        plan = planLib.make_plan(streams, [4, 4], 2, timeseries_pes)
+        self.assertEqual(plan['input_bytes'], 4000)
+        self.assertEqual(plan['split_bytes'], 2048)
+        self.assertAlmostEqual(plan['wall_seconds'], 3000.0)
+        self.assertEqual(plan['recommended_pes'], 3)
+
+        with capture_stdout() as output:
+            planLib.print_plan(plan)
+        lines = output.getvalue().splitlines()
+        self.assertTrue('        least_significant_digit split, reads 2.0 KB of the other variables again' in lines)
+        self.assertTrue('    the least_significant_digit splits read every history slice once per split, 2.0 KB read again' in lines)
+        self.assertTrue('    estimated wall time on 2 tasks: 00:50:00' in lines)
+        self.assertTrue('    estimated wall time on timeseries_pes 4 tasks: 00:16:40, wallclock limit 01:00:00' in lines)
+        self.assertEqual(lines[-1], '    recommended timeseries_pes: 3 tasks, estimated wall time 00:25:00')
+
+    def test_printPlanWithoutPes(self):
+        """ test the report of a machine without timeseries_pes
+        """
+        plan = planLib.make_plan([planLib.stream_plan('a', 'a.', '.nc', {'T' : 100}, 10, 1000, 1000.0)], [1], 1, None)
+        with capture_stdout() as output:
+            planLib.print_plan(plan)
+        lines = output.getvalue().splitlines()
+        self.assertFalse(any('least_significant_digit' in line for line in lines))
+        self.assertEqual(lines[-1], '    timeseries_pes is not defined for this machine, no task count recommendation')
+
+if __name__ == '__main__':
+    unittest.main()
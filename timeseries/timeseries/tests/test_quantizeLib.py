@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the precision trimming of the time series variables
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from timeseries import quantizeLib
+
+FILE_SPEC = """
+<file_extension suffix=".h0.+">
+  <subdir>hist</subdir>
+  <tseries_create>TRUE</tseries_create>
+  <tseries_output_format>netcdf4c</tseries_output_format>
+  <tseries_quantize least_significant_digit="3">
+    <variable name="TS" least_significant_digit="2"/>
+    <variable name="PRECT" least_significant_digit="none"/>
+  </tseries_quantize>
+</file_extension>
+"""
+
+class test_quantize(unittest.TestCase):
+
+    def test_parseDigits(self):
+        """ test the least_significant_digit settings
+        """
+        self.assertEqual(quantizeLib.parse_digits('2'), 2)
+        self.assertEqual(quantizeLib.parse_digits('None'), None)
+        self.assertEqual(quantizeLib.parse_digits(None), None)
+        self.assertRaises(ValueError, quantizeLib.parse_digits, 'two')
+
+    def test_readQuantize(self):
+        """ test the stream and variable settings of a stream
+        """
+        quantize = quantizeLib.read_quantize(ET.fromstring(FILE_SPEC))
+        self.assertEqual(quantize, {'default' : 3, 'variables' : {'TS' : 2, 'PRECT' : None}})
+        self.assertEqual(quantizeLib.read_quantize(ET.fromstring('<file_extension suffix=".h1.+"/>')), dict())
+
+    def test_groupVariables(self):
+        """ test that the variables are grouped by setting with the full precision group first
+        """
+        quantize = quantizeLib.read_quantize(ET.fromstring(FILE_SPEC))
+        self.assertEqual(quantizeLib.group_variables(quantize, ['U', 'TS', 'PRECT', 'V']),
+                         [(None, ['PRECT']), (2, ['TS']), (3, ['U', 'V'])])
+        self.assertEqual(quantizeLib.group_variables({'default' : 1, 'variables' : dict()}, ['U', 'V']),
+                         [(1, ['U', 'V'])])
+
+    def test_splitName(self):
+        """ test that the splits of a stream get distinct names
+        """
+        quantize = quantizeLib.read_quantize(ET.fromstring(FILE_SPEC))
+        names = [quantizeLib.split_name(digits) for digits, variables in quantizeLib.group_variables(quantize, ['U', 'TS', 'PRECT'])]
+        self.assertEqual(names, ['lsdnone', 'lsd2', 'lsd3'])
+
+    def test_quantizeScale(self):
+        """ test the power of two rounding scale of the netCDF4 least_significant_digit
+        """
+        self.assertEqual(quantizeLib.quantize_scale(0), 1.0)
+        self.assertEqual(quantizeLib.quantize_scale(1), 16.0)
+        self.assertEqual(quantizeLib.quantize_scale(3), 1024.0)
+        self.assertEqual(quantizeLib.quantize_scale(-2), 2.0 ** -6)
+        self.assertEqual(quantizeLib.quantize(None, None), None)
+
+    def test_compressionRatio(self):
+        """ test the uncompressed and written bytes of the output files
+        """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            output_files = list()
+            for name, size in [('PS', 1000), ('T', 4000)]:
+                output_file = os.path.join(tmpdir, 'case.cam.h0.{0}.000101-000112.nc'.format(name))
+                with open(output_file, 'wb') as fh:
+                    fh.write(b'\0' * size)
+                output_files.append(output_file)
+            output_files.append(os.path.join(tmpdir, 'case.cam.h0.U.000101-000112.nc'))
+
+            variables = {'PS' : 400, 'T' : 1200, 'U' : 1200}
+            self.assertEqual(quantizeLib.compression_ratio(output_files, variables, 12), (12 * 1600, 5000))
+        finally:
+            shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
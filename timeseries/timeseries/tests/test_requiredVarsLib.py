@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the required variables mode
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from timeseries import requiredVarsLib
+
+COMP_XML = """<comp_archive_spec name="clm[0-9]+">
+  <rootdir>lnd</rootdir>
+  <tseries_required_variables enable="{0}">
+    <consumer name="lnd_diags" enable="GENERATE_DIAGS_LND">
+      <variable>TSA</variable>
+      <variable>RAIN</variable>
+    </consumer>
+    <consumer name="ilamb" enable="{1}" table="clm_to_mip.py"/>
+    <variable>QRUNOFF</variable>
+  </tseries_required_variables>
+</comp_archive_spec>
+"""
+
+TABLE = """variables = {
+    "gpp":{'sname': 'gross_primary_productivity_of_carbon', 'units': 'kg--m-2--s-1', 'clmvr': 'GPP', 't':1 },
+    "pr":{'sname': 'precipitation_flux', 'units': 'kg--m-2--s-1', 'clmvr': 'RAIN--SNOW', 't':2 },
+}
+"""
+
+class test_requiredVars(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        with open(os.path.join(self.tmpdir, 'clm_to_mip.py'), 'w') as fh:
+            fh.write(TABLE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_readTable(self):
+        """ test that the combined table variables are split and the units ignored
+        """
+        self.assertEqual(requiredVarsLib.read_table(os.path.join(self.tmpdir, 'clm_to_mip.py')), set(['GPP', 'RAIN', 'SNOW']))
+
+    def test_ilambTable(self):
+        """ test reading the ILAMB variable table shipped with the postprocessing
+        """
+        table_file = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'ilamb', 'ilamb', 'clm_to_mip.py')
+        if not os.path.isfile(table_file):
+            self.skipTest('ilamb clm_to_mip.py not found')
+        variables = requiredVarsLib.read_table(table_file)
+        self.assertTrue('GPP' in variables)
+        self.assertTrue('LITR1C_TO_SOIL1C' in variables)
+        self.assertFalse(any('--' in name for name in variables))
+
+    def test_consumerEnabled(self):
+        """ test the TRUE, FALSE and env entry consumer switches
+        """
+        env = {'GENERATE_DIAGS_LND' : 'TRUE', 'GENERATE_DIAGS_ATM' : 'FALSE'}
+        self.assertTrue(requiredVarsLib.consumer_enabled('TRUE', env))
+        self.assertFalse(requiredVarsLib.consumer_enabled('false', env))
+        self.assertTrue(requiredVarsLib.consumer_enabled('GENERATE_DIAGS_LND', env))
+        self.assertFalse(requiredVarsLib.consumer_enabled('GENERATE_DIAGS_ATM', env))
+        self.assertFalse(requiredVarsLib.consumer_enabled('GENERATE_DIAGS_OCN', env))
+        self.assertTrue(requiredVarsLib.consumer_enabled(None, env))
+
+    def test_readRequired(self):
+        """ test the union of the enabled consumers and the extras
+        """
+        env = {'GENERATE_DIAGS_LND' : 'TRUE'}
+        required, consumers = requiredVarsLib.read_required(ET.fromstring(COMP_XML.format('TRUE', 'TRUE')), env, self.tmpdir)
+        self.assertEqual(required, set(['TSA', 'RAIN', 'SNOW', 'GPP', 'QRUNOFF']))
+        self.assertEqual(consumers, ['lnd_diags', 'ilamb'])
+
+        required, consumers = requiredVarsLib.read_required(ET.fromstring(COMP_XML.format('TRUE', 'FALSE')), dict(), self.tmpdir)
+        self.assertEqual(required, set(['QRUNOFF']))
+        self.assertEqual(consumers, [])
+
+    def test_modeDisabled(self):
+        """ test that all variables are converted unless the mode is enabled
+        """
+        required, consumers = requiredVarsLib.read_required(ET.fromstring(COMP_XML.format('FALSE', 'TRUE')), dict(), self.tmpdir)
+        self.assertEqual(required, None)
+        required, consumers = requiredVarsLib.read_required(ET.fromstring('<comp_archive_spec name="cam"/>'), dict(), self.tmpdir)
+        self.assertEqual(required, None)
+
+    def test_missingTable(self):
+        """ test that a missing consumer table of an enabled consumer is an error
+        """
+        self.assertRaises(OSError, requiredVarsLib.read_required, ET.fromstring(COMP_XML.format('TRUE', 'TRUE')),
+                          dict(), os.path.join(self.tmpdir, 'missing'))
+
+    def test_subset(self):
+        """ test the selected and missing variables of a stream
+        """
+        variables = {'TSA' : 100, 'RAIN' : 100, 'FSH' : 100}
+        selected, missing = requiredVarsLib.subset_variables(variables, set(['TSA', 'GPP']))
+        self.assertEqual(selected, {'TSA' : 100})
+        self.assertEqual(missing, ['GPP'])
+        self.assertEqual(requiredVarsLib.subset_variables(variables, None), (variables, []))
+
+    def test_setTimeSeries(self):
+        """ test setting the specifier time series variables
+        """
+        class Spec(object):
+            time_series = None
+        spec = Spec()
+        self.assertTrue(requiredVarsLib.set_time_series(spec, {'TSA' : 100, 'RAIN' : 100}))
+        self.assertEqual(spec.time_series, ['RAIN', 'TSA'])
+        self.assertFalse(requiredVarsLib.set_time_series(object(), ['TSA']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series rank scheduler
+"""
+from __future__ import print_function
+
+import unittest
+
+from timeseries import scheduleLib
+
+class test_allocate_ranks(unittest.TestCase):
+    def setUp(self):
+        self.costs = [100.0, 10.0, 50.0, 40.0]
+
+    def tearDown(self):
+        pass
+
+    def test_allRanksUsed(self):
+        """ test that every task is assigned to exactly one group
+        """
+        for size in [1, 3, 4, 16, 128]:
+            groups = scheduleLib.allocate_ranks(self.costs, size)
+            self.assertEqual(sum(g['ranks'] for g in groups), size)
+            self.assertEqual(sorted(i for g in groups for i in g['specs']), [0, 1, 2, 3])
+
+    def test_proportionalRanks(self):
+        """ test that the largest stream gets the largest rank share and runs first
+        """
+        groups = scheduleLib.allocate_ranks(self.costs, 20)
+        self.assertEqual(groups[0]['specs'], [0])
+        self.assertEqual([g['ranks'] for g in groups], [9, 5, 4, 2])
+
+    def test_moreSpecsThanRanks(self):
+        """ test longest processing time first packing with fewer tasks than specifiers
+        """
+        groups = scheduleLib.allocate_ranks(self.costs, 2)
+        self.assertEqual(groups[0]['specs'], [0])
+        self.assertEqual(groups[1]['specs'], [2, 3, 1])
+
+    def test_instances(self):
+        """ test that equal cost instance streams run concurrently on equal rank groups
+        """
+        groups = scheduleLib.allocate_ranks([10.0] * 30, 120)
+        self.assertEqual(len(groups), 30)
+        self.assertEqual(set(g['ranks'] for g in groups), set([4]))
+        self.assertAlmostEqual(scheduleLib.estimate_wall_seconds(groups, [10.0] * 30, [20] * 30), 2.5)
+
+    def test_getGroup(self):
+        """ test the rank to group lookup
+        """
+        groups = scheduleLib.allocate_ranks(self.costs, 20)
+        self.assertEqual(scheduleLib.get_group(groups, 0), 0)
+        self.assertEqual(scheduleLib.get_group(groups, 10), 1)
+        self.assertEqual(scheduleLib.get_group(groups, 19), 3)
+        self.assertRaises(ValueError, scheduleLib.get_group, groups, 20)
+
+class test_estimate_cost(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_splitReads(self):
+        """ test that least_significant_digit splits are charged for reading every slice
+        """
+        whole = scheduleLib.estimate_cost(400.0e6, 10, 120)
+        splits = [scheduleLib.estimate_cost(300.0e6, 6, 120, 100.0e6), scheduleLib.estimate_cost(100.0e6, 4, 120, 300.0e6)]
+        self.assertAlmostEqual(sum(splits) - whole, 400.0e6 / scheduleLib.READ_BYTES_PER_SECOND)
+        self.assertAlmostEqual(scheduleLib.estimate_cost(400.0e6, 10, 120, 0), whole)
+
+class test_estimate_wall_seconds(unittest.TestCase):
+    def setUp(self):
+        self.costs = [100.0, 10.0, 50.0, 40.0]
+        self.nvars = [10, 10, 2, 10]
+
+    def tearDown(self):
+        pass
+
+    def test_serial(self):
+        """ test that a single task runs every specifier in turn
+        """
+        groups = scheduleLib.allocate_ranks(self.costs, 1)
+        self.assertAlmostEqual(scheduleLib.estimate_wall_seconds(groups, self.costs, self.nvars), 200.0)
+
+    def test_variableLimit(self):
+        """ test that a specifier does not scale past its number of variables
+        """
+        groups = scheduleLib.allocate_ranks(self.costs, 200)
+        self.assertAlmostEqual(scheduleLib.estimate_wall_seconds(groups, self.costs, self.nvars), 25.0)
+
+    def test_recommendPes(self):
+        """ test the smallest task count within the wall time limit
+        """
+        pes, wall_seconds = scheduleLib.recommend_pes(self.costs, self.nvars, 60.0, 128, 4)
+        self.assertEqual(pes % 4, 0)
+        self.assertTrue(wall_seconds <= 60.0)
+        groups = scheduleLib.allocate_ranks(self.costs, pes - 4)
+        self.assertTrue(scheduleLib.estimate_wall_seconds(groups, self.costs, self.nvars) > 60.0)
+
+    def test_recommendPesNoFit(self):
+        """ test that no task count is recommended when the limit cannot be met
+        """
+        pes, wall_seconds = scheduleLib.recommend_pes(self.costs, self.nvars, 1.0, 64)
+        self.assertEqual(pes, None)
+        self.assertTrue(wall_seconds > 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
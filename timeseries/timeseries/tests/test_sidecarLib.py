@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-invariant metadata sidecar
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import sidecarLib
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+def create_reshaper(specifier, serial=False, verbosity=1, wmode='w', once=False, simplecomm=None):
+    pass
+
+def create_reshaper_without_once(specifier, serial=False, verbosity=1, wmode='w', simplecomm=None):
+    pass
+
+class test_sidecar(unittest.TestCase):
+
+    def test_sidecarFile(self):
+        """ test the sidecar file name of a specifier
+        """
+        self.assertEqual(sidecarLib.sidecar_file('/archive/ocn/proc/tseries/monthly/case.pop.h.', '.000101-001012.nc'),
+                         '/archive/ocn/proc/tseries/monthly/case.pop.h.once.000101-001012.nc')
+
+    def test_reshaperArguments(self):
+        """ test that the once file is only requested from a pyReshaper that supports it
+        """
+        self.assertEqual(sidecarLib.reshaper_arguments(create_reshaper, True), {'once' : True})
+        self.assertEqual(sidecarLib.reshaper_arguments(create_reshaper, False), dict())
+        self.assertEqual(sidecarLib.reshaper_arguments(create_reshaper_without_once, True), dict())
+
+    def test_timeInvariantNames(self):
+        """ test the time-invariant variables of a sidecar header
+        """
+        header = {'unlimited' : 'time', 'dimensions' : {'time' : 1, 'nlat' : 384, 'nlon' : 320},
+                  'variables' : {'TAREA' : {'dimensions' : ['nlat', 'nlon'], 'itemsize' : 8},
+                                 'TLAT' : {'dimensions' : ['nlat', 'nlon'], 'itemsize' : 8},
+                                 'time' : {'dimensions' : ['time'], 'itemsize' : 8},
+                                 'days_in_norm_year' : {'dimensions' : [], 'itemsize' : 8}}}
+        self.assertEqual(sidecarLib.time_invariant_names(header), ['TAREA', 'TLAT', 'days_in_norm_year'])
+
+    def test_canReference(self):
+        """ test that classic format files are only referenced in the write-behind directory
+        """
+        saved = sidecarLib.netCDF4
+        try:
+            sidecarLib.netCDF4 = object()
+            self.assertTrue(sidecarLib.can_reference('netcdf4c'))
+            self.assertTrue(sidecarLib.can_reference('netcdf4'))
+            self.assertFalse(sidecarLib.can_reference('netcdf'))
+            self.assertTrue(sidecarLib.can_reference('netcdf', local=True))
+
+            sidecarLib.netCDF4 = None
+            self.assertFalse(sidecarLib.can_reference('netcdf4c', local=True))
+        finally:
+            sidecarLib.netCDF4 = saved
+
+@unittest.skipIf(netCDF4 is None, 'netCDF4 is not installed')
+class test_sidecarFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        prefix = os.path.join(self.tmpdir, 'case.pop.h.')
+        suffix = '.000101-000102.nc'
+        self.sidecar = sidecarLib.sidecar_file(prefix, suffix)
+        self.series = prefix + 'SST' + suffix
+
+        f = netCDF4.Dataset(self.sidecar, 'w', format='NETCDF4_CLASSIC')
+        f.createDimension('nlat', 2)
+        f.createDimension('nlon', 3)
+        f.createVariable('TAREA', 'f8', ('nlat', 'nlon'))[:] = [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+        f.createVariable('TLAT', 'f8', ('nlat', 'nlon'))[:] = [[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]]
+        f.close()
+
+        f = netCDF4.Dataset(self.series, 'w', format='NETCDF4_CLASSIC')
+        f.title = 'SST time series'
+        f.createDimension('time', None)
+        f.createDimension('nlat', 2)
+        f.createDimension('nlon', 3)
+        f.createVariable('time', 'f8', ('time',))[:] = [31.0, 59.0]
+        f.createVariable('SST', 'f4', ('time', 'nlat', 'nlon'))[:] = [[[1.0] * 3] * 2, [[2.0] * 3] * 2]
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_addReference(self):
+        """ test the reference and the external variables of a variable file
+        """
+        sidecarLib.add_reference(self.series, self.sidecar, ['TAREA', 'TLAT', 'time'])
+        f = netCDF4.Dataset(self.series)
+        try:
+            self.assertEqual(f.getncattr(sidecarLib.REFERENCE_ATTR), os.path.basename(self.sidecar))
+            self.assertEqual(f.getncattr('external_variables'), 'TAREA TLAT')
+        finally:
+            f.close()
+        self.assertEqual(sidecarLib.get_sidecar(self.series), self.sidecar)
+
+    def test_readVariable(self):
+        """ test that the time-invariant variables are read from the sidecar
+        """
+        self.assertEqual(sidecarLib.get_sidecar(self.series), None)
+        sidecarLib.add_reference(self.series, self.sidecar, ['TAREA', 'TLAT'])
+        self.assertEqual(sidecarLib.read_variable(self.series, 'TAREA').tolist(), [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+        self.assertEqual(sidecarLib.read_variable(self.series, 'SST').shape, (2, 2, 3))
+        self.assertRaises(KeyError, sidecarLib.read_variable, self.series, 'UVEL')
+
+    def test_reattach(self):
+        """ test a self-contained copy of a variable file
+        """
+        sidecarLib.add_reference(self.series, self.sidecar, ['TAREA', 'TLAT'])
+        output_file = os.path.join(self.tmpdir, 'SST.nc')
+        self.assertEqual(sidecarLib.reattach(self.series, output_file), ['TAREA', 'TLAT'])
+
+        f = netCDF4.Dataset(output_file)
+        try:
+            self.assertEqual(sorted(f.variables), ['SST', 'TAREA', 'TLAT', 'time'])
+            self.assertEqual(f.title, 'SST time series')
+            self.assertFalse(sidecarLib.REFERENCE_ATTR in f.ncattrs())
+            self.assertEqual(f.variables['TLAT'][1, 0], 1.0)
+        finally:
+            f.close()
+
+    def test_reattachError(self):
+        """ test that a failed copy leaves no partial output file
+        """
+        sidecarLib.add_reference(self.series, os.path.join(self.tmpdir, 'missing.once.nc'), ['TAREA', 'TLAT'])
+        output_file = os.path.join(self.tmpdir, 'SST.nc')
+        self.assertRaises(Exception, sidecarLib.reattach, self.series, output_file)
+        self.assertFalse(os.path.exists(output_file))
+        self.assertEqual([f for f in os.listdir(self.tmpdir) if f.startswith('SST.nc')], [])
+
+if __name__ == '__main__':
+    unittest.main()
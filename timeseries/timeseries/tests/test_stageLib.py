@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the node-local staging of the history files
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import stageLib
+
+class test_stageLib(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.archive = os.path.join(self.tmpdir, 'archive')
+        self.stage_dir = os.path.join(self.tmpdir, 'local', stageLib.STAGE_SUBDIR)
+        os.makedirs(self.archive)
+        self.files = list()
+        for month in range(1, 7):
+            filename = os.path.join(self.archive, 'case.cam.h0.0001-{0:02d}.nc'.format(month))
+            with open(filename, 'wb') as fh:
+                fh.write(bytes(bytearray([month])) * 1000)
+            self.files.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_nodeLeaders(self):
+        """ test that the lowest rank of each node stages its files
+        """
+        hosts = [(3, 'node1'), (0, 'node0'), (2, 'node1'), (1, 'node0'), (4, 'node2')]
+        self.assertEqual(stageLib.node_leaders(hosts), set([0, 2, 4]))
+
+    def test_nodeGroups(self):
+        """ test the number of rank groups sharing the budget of each node
+        """
+        tasks = [('node0', 0), ('node0', 0), ('node0', 1), ('node1', 1), ('node1', 2), ('node2', 2)]
+        self.assertEqual(stageLib.node_groups(tasks), {'node0' : 2, 'node1' : 2, 'node2' : 1})
+
+    def test_stageDir(self):
+        """ test the environment variables of the staging directory
+        """
+        os.environ['TSERIES_TEST_TMPDIR'] = self.tmpdir
+        self.assertEqual(stageLib.get_stage_dir('$TSERIES_TEST_TMPDIR'), os.path.join(self.tmpdir, stageLib.STAGE_SUBDIR))
+        del os.environ['TSERIES_TEST_TMPDIR']
+        self.assertEqual(stageLib.stage_name(self.stage_dir, self.files[0]),
+                         os.path.join(self.stage_dir, 'case.cam.h0.0001-01.nc'))
+
+    def test_stager(self):
+        """ test that the specifier files are staged in order within the budget
+        """
+        stager = stageLib.Stager(self.stage_dir, 2500, [self.files[0:2], self.files[2:4], self.files[4:6]], threads=2)
+        stager.start()
+        try:
+            for n in range(3):
+                stager.wait(n)
+                for filename in self.files[2 * n:2 * n + 2]:
+                    with open(stager.stage_name(filename), 'rb') as fh:
+                        self.assertEqual(fh.read(), open(filename, 'rb').read())
+                stager.release(n)
+            # the least recently used files were evicted to stay in the budget
+            self.assertFalse(os.path.exists(stager.stage_name(self.files[0])))
+            self.assertTrue(len(os.listdir(self.stage_dir)) <= 3)
+            self.assertEqual(stager.copied_bytes, 6000)
+        finally:
+            stager.close()
+        self.assertEqual(os.listdir(self.stage_dir), list())
+
+    def test_reuse(self):
+        """ test that a staged file used again is not copied again
+        """
+        stager = stageLib.Stager(self.stage_dir, 10000, [self.files[0:2], self.files[1:3]], threads=1)
+        stager.start()
+        try:
+            stager.wait(0)
+            stager.release(0)
+            stager.wait(1)
+            stager.release(1)
+            self.assertEqual(stager.copied_bytes, 3000)
+        finally:
+            stager.close()
+
+    def test_overBudget(self):
+        """ test that the current specifier is staged even over the budget
+        """
+        stager = stageLib.Stager(self.stage_dir, 500, [self.files[0:3]])
+        stager.start()
+        try:
+            stager.wait(0)
+            self.assertEqual(sorted(os.listdir(self.stage_dir)), [os.path.basename(f) for f in self.files[0:3]])
+        finally:
+            stager.close()
+
+    def test_flusher(self):
+        """ test that the output files are moved to their final names
+        """
+        local_dir = os.path.join(self.tmpdir, 'local', stageLib.WRITE_BEHIND_SUBDIR)
+        output_dir = os.path.join(self.tmpdir, 'proc')
+        os.makedirs(local_dir)
+        os.makedirs(output_dir)
+        files = list()
+        for name in ['PS', 'T', 'U']:
+            src = os.path.join(local_dir, 'case.cam.h0.{0}.000101-000112.nc'.format(name))
+            with open(src, 'wb') as fh:
+                fh.write(name.encode('ascii') * 100)
+            files.append((src, os.path.join(output_dir, os.path.basename(src))))
+
+        flusher = stageLib.Flusher(threads=2)
+        flusher.start()
+        try:
+            flusher.flush(0, files[0:2])
+            flusher.flush(1, files[2:3])
+            flusher.wait(0)
+            flusher.wait(1)
+            flusher.wait(2)
+        finally:
+            flusher.close()
+        self.assertEqual(os.listdir(local_dir), list())
+        self.assertEqual(sorted(os.listdir(output_dir)), sorted(os.path.basename(dst) for src, dst in files))
+        self.assertEqual(flusher.flushed_bytes, 200 + 100 + 100)
+
+    def test_flusherError(self):
+        """ test that a failed move is reported
+        """
+        flusher = stageLib.Flusher(threads=1)
+        flusher.start()
+        try:
+            flusher.flush(0, [(os.path.join(self.tmpdir, 'missing.nc'), os.path.join(self.tmpdir, 'proc.nc'))])
+            self.assertRaises(RuntimeError, flusher.wait, 0)
+        finally:
+            flusher.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series utilities
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import tseriesUtilsLib
+
+class test_tseries_suffix(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_monthlySuffix(self):
+        """ test the monthly output suffix
+        """
+        suffix = tseriesUtilsLib.get_tseries_suffix('monthly', '0001-01', '0010-12')
+        self.assertEqual(suffix, '.000101-001012.nc')
+
+    def test_dailySuffix(self):
+        """ test the daily output suffix
+        """
+        suffix = tseriesUtilsLib.get_tseries_suffix('daily', '0001-01-01', '0001-12-31')
+        self.assertEqual(suffix, '.00010101-00011231.nc')
+
+    def test_invalidTper(self):
+        """ test that an undefined tseries_tper raises an error
+        """
+        self.assertRaises(TypeError, tseriesUtilsLib.get_tseries_suffix, 'undefined', '0001', '0002')
+
+class test_chunk_history_files(unittest.TestCase):
+    def setUp(self):
+        self.files = ['/hist/case.cam.h0.{0:04d}-{1:02d}.nc'.format(y, m) for y in range(1,26) for m in range(1,13)]
+
+    def tearDown(self):
+        pass
+
+    def test_singleChunk(self):
+        """ test that filecat_years of 0 returns one chunk
+        """
+        chunks = tseriesUtilsLib.chunk_history_files(self.files, 0)
+        self.assertEqual(chunks, [self.files])
+
+    def test_tenYearChunks(self):
+        """ test 10 year chunks with a partial last chunk
+        """
+        chunks = tseriesUtilsLib.chunk_history_files(self.files, 10)
+        self.assertEqual([len(c) for c in chunks], [120, 120, 60])
+        self.assertEqual(tseriesUtilsLib.get_file_time(chunks[1][0]), '0011-01')
+        self.assertEqual(tseriesUtilsLib.get_file_time(chunks[1][-1]), '0020-12')
+        self.assertEqual(tseriesUtilsLib.get_file_time('/hist/case.pop.h.0011-01.nc.gz'), '0011-01')
+
+    def test_alignedChunks(self):
+        """ test that chunks stay aligned on first_year for a partial file list
+        """
+        chunks = tseriesUtilsLib.chunk_history_files(self.files[60:], 10, first_year=1)
+        self.assertEqual([len(c) for c in chunks], [60, 120, 60])
+
+class test_year_window(unittest.TestCase):
+    def setUp(self):
+        self.files = ['/hist/case.cam.h0.{0:04d}-{1:02d}.nc'.format(y, m) for y in range(1,501) for m in range(1,13)]
+
+    def tearDown(self):
+        pass
+
+    def test_filterYears(self):
+        """ test that only the history files in the year window are kept
+        """
+        files = tseriesUtilsLib.filter_years(self.files, 101, 150)
+        self.assertEqual(len(files), 600)
+        self.assertEqual(tseriesUtilsLib.get_file_time(files[0]), '0101-01')
+        self.assertEqual(tseriesUtilsLib.get_file_time(files[-1]), '0150-12')
+        self.assertEqual(tseriesUtilsLib.get_tseries_suffix('monthly', tseriesUtilsLib.get_file_time(files[0]),
+                                                            tseriesUtilsLib.get_file_time(files[-1])), '.010101-015012.nc')
+
+    def test_openWindow(self):
+        """ test that a start or stop year of None leaves that end open
+        """
+        self.assertEqual(len(tseriesUtilsLib.filter_years(self.files, 451, None)), 600)
+        self.assertEqual(len(tseriesUtilsLib.filter_years(self.files, None, 10)), 120)
+        self.assertEqual(tseriesUtilsLib.filter_years(self.files), self.files)
+
+    def test_parseYear(self):
+        """ test the start and stop year settings
+        """
+        self.assertEqual(tseriesUtilsLib.parse_year(' 0101 '), 101)
+        self.assertEqual(tseriesUtilsLib.parse_year(''), None)
+        self.assertEqual(tseriesUtilsLib.parse_year(None), None)
+        self.assertRaises(ValueError, tseriesUtilsLib.parse_year, 'year 1')
+
+class fake_comm(object):
+    """ serial stand-in for the simplecomm collect interface
+    """
+    def __init__(self, manager, worker_data):
+        self._manager = manager
+        self._worker_data = list(worker_data)
+        self.sent = list()
+
+    def is_manager(self):
+        return self._manager
+
+    def get_size(self):
+        return len(self._worker_data) + 1
+
+    def collect(self, data=None):
+        if self._manager:
+            return self._worker_data.pop(0)
+        self.sent.append(data)
+
+class test_gather(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_managerGather(self):
+        """ test that the manager receives its own data first then the workers data
+        """
+        scomm = fake_comm(True, [(2, 'b'), (1, 'a')])
+        self.assertEqual(tseriesUtilsLib.gather(scomm, 'm'), ['m', 'b', 'a'])
+
+    def test_workerGather(self):
+        """ test that a worker sends its data and gets None back
+        """
+        scomm = fake_comm(False, [])
+        self.assertEqual(tseriesUtilsLib.gather(scomm, 'w'), None)
+        self.assertEqual(scomm.sent, ['w'])
+
+class test_divide(unittest.TestCase):
+    def test_singleTask(self):
+        """ test that a one task communicator is its own group
+        """
+        scomm = fake_comm(True, [])
+        self.assertEqual(tseriesUtilsLib.divide(scomm, 3), (scomm, scomm))
+
+class test_cases(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.members = list()
+        for member in ['002', '001', '003']:
+            caseroot = os.path.join(self.tmpdir, 'b.e11.{0}'.format(member), 'postprocess')
+            os.makedirs(caseroot)
+            self.members.append(caseroot)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_ensembleCaseroots(self):
+        """ test that the ensemble members follow the --caseroot cases in sorted order
+        """
+        pattern = os.path.join(self.tmpdir, 'b.e11.*', 'postprocess')
+        caseroots = tseriesUtilsLib.get_caseroots([self.members[0]], pattern)
+        self.assertEqual(caseroots, [os.path.realpath(c) for c in [self.members[0], self.members[1], self.members[2]]])
+        self.assertEqual(tseriesUtilsLib.get_caseroots(self.members[1:]), [os.path.realpath(c) for c in self.members[1:]])
+
+    def test_duplicateCaseroots(self):
+        """ test that a case given twice, with another spelling of its path, is listed once
+        """
+        other = os.path.join(self.tmpdir, 'b.e11.001', '..', 'b.e11.001', 'postprocess') + os.sep
+        caseroots = tseriesUtilsLib.get_caseroots([self.members[1], other, self.members[1]])
+        self.assertEqual(caseroots, [os.path.realpath(self.members[1])])
+
+    def test_splitCases(self):
+        """ test that the streams are split by case in the case order
+        """
+        streams = [{'pp_caseroot' : 'b', 'stream_key' : 'b.cam.h0'}, {'pp_caseroot' : 'a', 'stream_key' : 'a.cam.h0'},
+                   {'pp_caseroot' : 'b', 'stream_key' : 'b.pop.h'}]
+        cases = tseriesUtilsLib.split_cases(streams, ['a', 'b', 'c'])
+        self.assertEqual([[s['stream_key'] for s in case] for case in cases], [['a.cam.h0'], ['b.cam.h0', 'b.pop.h'], []])
+
+if __name__ == '__main__':
+    unittest.main()
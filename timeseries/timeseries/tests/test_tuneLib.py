@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series chunking and deflate tuner
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from timeseries import tuneLib
+
+ENV_TIMESERIES = """<?xml version="1.0"?>
+<config_definition version="1.0">
+<!-- env_timeseries.xml -->
+<components>
+  <comp_archive_spec name="pop">
+    <rootdir>ocn</rootdir>
+    <multi_instance>n</multi_instance>
+    <files>
+      <file_extension suffix=".h\\.[0-9]">
+        <subdir>hist</subdir>
+        <tseries_create>TRUE</tseries_create>
+        <tseries_output_format>netcdf4c</tseries_output_format>
+      </file_extension>
+    </files>
+  </comp_archive_spec>
+</components>
+</config_definition>
+"""
+
+class fake_reshaper(object):
+    def convert(self, output_limit=0, rchunks=None, wchunks=None):
+        pass
+
+class fake_old_reshaper(object):
+    def convert(self):
+        pass
+
+class test_tuneLib(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.env_timeseries = os.path.join(self.tmpdir, 'env_timeseries.xml')
+        with open(self.env_timeseries, 'w') as fh:
+            fh.write(ENV_TIMESERIES)
+        self.dims = ['time', 'z_t', 'nlat', 'nlon']
+        self.shape = [12, 60, 384, 320]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_chunkSizes(self):
+        """ test the candidate chunk shapes of a 3d ocean variable
+        """
+        self.assertEqual(tuneLib.get_var_class(self.dims, 'time'), '3d')
+        self.assertEqual(tuneLib.chunk_sizes('slice', self.dims, self.shape, 'time'),
+                         {'time' : 1, 'z_t' : 60, 'nlat' : 384, 'nlon' : 320})
+        self.assertEqual(tuneLib.chunk_sizes('level', self.dims, self.shape, 'time'),
+                         {'time' : 1, 'z_t' : 1, 'nlat' : 384, 'nlon' : 320})
+        self.assertEqual(tuneLib.chunk_sizes('block', self.dims, self.shape, 'time'),
+                         {'time' : 12, 'z_t' : 60, 'nlat' : 96, 'nlon' : 80})
+        self.assertRaises(ValueError, tuneLib.chunk_sizes, 'cube', self.dims, self.shape, 'time')
+
+    def test_candidates(self):
+        """ test that the level chunking of a 2d variable is not benchmarked twice
+        """
+        self.assertEqual(len(tuneLib.candidates(self.dims, self.shape, 'time')), 6)
+        self.assertEqual(len(tuneLib.candidates(['time', 'lat', 'lon'], [12, 192, 288], 'time')), 4)
+
+    def test_selectBest(self):
+        """ test the weighted write and read score
+        """
+        results = [{'chunking' : 'slice', 'deflate' : 1, 'chunks' : {}, 'write_seconds' : 1.0, 'read_seconds' : 10.0, 'bytes' : 100},
+                   {'chunking' : 'block', 'deflate' : 1, 'chunks' : {}, 'write_seconds' : 2.0, 'read_seconds' : 1.0, 'bytes' : 100},
+                   {'chunking' : 'block', 'deflate' : 4, 'chunks' : {}, 'write_seconds' : 2.0, 'read_seconds' : 1.0, 'bytes' : 80}]
+        best = tuneLib.select_best(results)
+        self.assertEqual((best['chunking'], best['deflate']), ('block', 4))
+
+    def test_writeTuning(self):
+        """ test that the tuned settings are recorded, replaced and read back
+        """
+        best = {'chunking' : 'block', 'deflate' : 1, 'chunks' : {'time' : 12, 'nlat' : 96}}
+        key = ('pop', '.h\\.[0-9]')
+        tuneLib.write_tuning(self.env_timeseries, {key : {'3d' : best, '2d' : best}})
+        tuneLib.write_tuning(self.env_timeseries, {key : {'3d' : dict(best, deflate=4)}})
+
+        with open(self.env_timeseries) as fh:
+            text = fh.read()
+        self.assertTrue('<!-- env_timeseries.xml -->' in text)
+        self.assertEqual(text.count('tseries_tuning>'), 2)
+
+        file_spec = ET.parse(self.env_timeseries).find('components/comp_archive_spec/files/file_extension')
+        tuning = tuneLib.read_tuning(file_spec)
+        self.assertEqual(tuning, {'3d' : {'chunking' : 'block', 'deflate' : 4, 'chunks' : {'time' : 12, 'nlat' : 96}}})
+
+    def test_dominantClass(self):
+        """ test the class with the most bytes per record
+        """
+        variables = {'TEMP' : 100, 'SALT' : 100, 'SSH' : 10, 'HMXL' : 10}
+        var_classes = {'TEMP' : '3d', 'SALT' : '3d', 'SSH' : '2d', 'HMXL' : '2d'}
+        self.assertEqual(tuneLib.dominant_class(variables, var_classes), '3d')
+        self.assertEqual(tuneLib.dominant_class(dict(), dict()), None)
+
+    def test_convertArguments(self):
+        """ test that the write chunks are only passed to a pyReshaper that takes them
+        """
+        chunks = {'time' : 12}
+        self.assertEqual(tuneLib.convert_arguments(fake_reshaper(), chunks), {'wchunks' : chunks})
+        self.assertEqual(tuneLib.convert_arguments(fake_old_reshaper(), chunks), dict())
+        self.assertEqual(tuneLib.convert_arguments(fake_reshaper(), None), dict())
+
+    def test_readChunkArguments(self):
+        """ test that the memory bounded read chunks are passed with or without write chunks
+        """
+        rchunks = {'time' : 1, 'z_t' : 10}
+        self.assertEqual(tuneLib.convert_arguments(fake_reshaper(), None, rchunks), {'rchunks' : rchunks})
+        self.assertEqual(tuneLib.convert_arguments(fake_reshaper(), {'time' : 12}, rchunks),
+                         {'wchunks' : {'time' : 12}, 'rchunks' : rchunks})
+        self.assertEqual(tuneLib.convert_arguments(fake_old_reshaper(), None, rchunks), dict())
+
+if __name__ == '__main__':
+    unittest.main()
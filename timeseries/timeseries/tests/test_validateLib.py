@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the time-series pre-flight validation
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import validateLib
+
+def monthly_entry(first_bound, last_bound, ntime=1):
+    """ return a cached entry for a monthly history file
+    """
+    return {'size' : 100, 'mtime' : 1.0,
+            'time' : {'ntime' : ntime, 'units' : 'days since 0001-01-01 00:00:00', 'calendar' : 'noleap',
+                      'first' : last_bound, 'last' : last_bound, 'min_step' : None, 'max_step' : None,
+                      'first_bound' : first_bound, 'last_bound' : last_bound}}
+
+class test_check_stream(unittest.TestCase):
+    def setUp(self):
+        self.files = ['/hist/case.cam.h0.0001-01.nc', '/hist/case.cam.h0.0001-02.nc', '/hist/case.cam.h0.0001-03.nc']
+        self.entries = {self.files[0] : monthly_entry(0.0, 31.0),
+                        self.files[1] : monthly_entry(31.0, 59.0),
+                        self.files[2] : monthly_entry(59.0, 90.0)}
+
+    def tearDown(self):
+        pass
+
+    def test_continuous(self):
+        """ test that contiguous monthly slices pass
+        """
+        self.assertEqual(validateLib.check_stream('monthly', self.files, self.entries), [])
+
+    def test_missingSlice(self):
+        """ test that a missing month is reported as a gap
+        """
+        files = [self.files[0], self.files[2]]
+        problems = validateLib.check_stream('monthly', files, self.entries)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue('missing slices' in problems[0])
+
+    def test_duplicateSlice(self):
+        """ test that overlapping bounds are reported as duplicate slices
+        """
+        self.entries[self.files[2]] = monthly_entry(31.0, 59.0)
+        problems = validateLib.check_stream('monthly', self.files, self.entries)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue('duplicate slices' in problems[0])
+
+    def test_truncatedFile(self):
+        """ test that unreadable files and empty files are reported
+        """
+        self.entries[self.files[1]] = {'size' : 10, 'mtime' : 1.0, 'error' : 'NetCDF: HDF error'}
+        self.entries[self.files[2]] = monthly_entry(59.0, 90.0, ntime=0)
+        problems = validateLib.check_stream('monthly', self.files, self.entries)
+        self.assertEqual(len(problems), 2)
+        self.assertTrue('truncated' in problems[0])
+
+    def test_noBounds(self):
+        """ test the continuity check on the time values of daily slices without bounds
+        """
+        entries = dict()
+        for i, f in enumerate(self.files):
+            entries[f] = {'size' : 100, 'mtime' : 1.0,
+                          'time' : {'ntime' : 31, 'units' : 'days since 0001-01-01', 'calendar' : 'noleap',
+                                    'first' : 31.0 * i + 1.0, 'last' : 31.0 * i + 31.0, 'min_step' : 1.0, 'max_step' : 1.0,
+                                    'first_bound' : None, 'last_bound' : None}}
+        self.assertEqual(validateLib.check_stream('daily', self.files, entries), [])
+        entries[self.files[1]]['time']['max_step'] = 2.0
+        entries[self.files[2]]['time']['first'] = 64.0
+        self.assertEqual(len(validateLib.check_stream('daily', self.files, entries)), 2)
+
+    def test_previousSegment(self):
+        """ test that the first new slice must continue the last converted segment
+        """
+        previous = ('the converted segment .000101-000112.nc', monthly_entry(334.0, 365.0)['time'])
+        entries = {self.files[0] : monthly_entry(365.0, 396.0)}
+        self.assertEqual(validateLib.check_stream('monthly', self.files[0:1], entries, previous), [])
+
+        entries[self.files[0]] = monthly_entry(396.0, 424.0)
+        problems = validateLib.check_stream('monthly', self.files[0:1], entries, previous)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue('after the converted segment .000101-000112.nc, missing slices' in problems[0])
+
+        entries[self.files[0]] = monthly_entry(334.0, 365.0)
+        problems = validateLib.check_stream('monthly', self.files[0:1], entries, previous)
+        self.assertTrue('duplicate slices' in problems[0])
+
+    def test_decompressedEntries(self):
+        """ test that gzipped slices are checked once their decompressed entries are added
+        """
+        files = [self.files[0], self.files[1] + '.gz', self.files[2]]
+        entries = {files[0] : self.entries[self.files[0]], files[1] : {'size' : 100, 'mtime' : 1.0},
+                   files[2] : self.entries[self.files[2]]}
+        self.assertEqual(validateLib.check_stream('monthly', files, entries), [])
+
+        # the decompressed slice turns out to duplicate January
+        entries[files[1]] = monthly_entry(0.0, 31.0)
+        problems = validateLib.check_stream('monthly', files, entries)
+        self.assertEqual(len(problems), 2)
+        self.assertTrue('duplicate slices' in problems[0])
+        self.assertTrue('missing slices' in problems[1])
+
+        # files without any entry are skipped
+        self.assertEqual(validateLib.check_stream('monthly', files, {files[0] : entries[files[0]]}), [])
+
+class test_ValidationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmpdir, 'cache.json')
+        self.hist_file = os.path.join(self.tmpdir, 'case.cam.h0.0001-01.nc')
+        with open(self.hist_file, 'w') as fh:
+            fh.write('not a netcdf file')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cachedEntryReused(self):
+        """ test that an unchanged file is not read again
+        """
+        st = os.stat(self.hist_file)
+        cached = monthly_entry(0.0, 31.0)
+        cached['size'] = st.st_size
+        cached['mtime'] = st.st_mtime
+        entry, reread = validateLib.refresh_file(self.hist_file, cached)
+        self.assertFalse(reread)
+        self.assertEqual(entry, cached)
+
+    def test_errorsNotCached(self):
+        """ test that unreadable files are reported and not saved in the cache
+        """
+        entry, reread = validateLib.refresh_file(self.hist_file, None)
+        self.assertTrue(reread)
+        self.assertTrue('error' in entry)
+
+        cache = validateLib.ValidationCache(self.cache_file)
+        cache.set_file(self.hist_file, entry, reread)
+        cache.set_file('/hist/good.nc', monthly_entry(0.0, 31.0), True)
+        cache.save()
+
+        cache = validateLib.ValidationCache(self.cache_file)
+        self.assertEqual(cache.cached_file(self.hist_file), None)
+        self.assertEqual(cache.cached_file('/hist/good.nc')['time']['last_bound'], 31.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the post-conversion verification
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from timeseries import quantizeLib, verifyLib
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def _entry(ntime, first_bound):
+    time = {'ntime' : ntime, 'units' : 'days since 0001-01-01', 'calendar' : 'noleap',
+            'first' : first_bound + 1.0, 'last' : first_bound + ntime,
+            'first_bound' : first_bound, 'last_bound' : first_bound + ntime}
+    return {'size' : 100, 'mtime' : 1.0, 'time' : time}
+
+class test_verify(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = ['/hist/case.cam.h1.0001-0{0}-01-00000.nc'.format(m) for m in range(1, 4)]
+        self.entries = {self.files[0] : _entry(31, 0.0), self.files[1] : _entry(28, 31.0), self.files[2] : _entry(31, 59.0)}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_expectedRecords(self):
+        """ test the expected records of a specifier from its slices
+        """
+        expected = verifyLib.expected_records(self.files, self.entries)
+        self.assertEqual(expected['ntime'], 90)
+        self.assertEqual(expected['first_bound'], 0.0)
+        self.assertEqual(expected['last_bound'], 90.0)
+        self.assertEqual(expected['slices'][1], (self.files[1], 28))
+
+    def test_unknownRecords(self):
+        """ test that compressed or unreadable slices leave the records unknown
+        """
+        self.entries[self.files[1]] = {'size' : 100, 'mtime' : 1.0}
+        self.assertEqual(verifyLib.expected_records(self.files, self.entries), None)
+        self.assertEqual(verifyLib.expected_records([], self.entries), None)
+
+    def test_sampleRecords(self):
+        """ test that the samples are evenly spaced and include the first and last records
+        """
+        self.assertEqual(verifyLib.sample_records(90, 3), [0, 44, 89])
+        self.assertEqual(verifyLib.sample_records(2, 3), [0, 1])
+        self.assertEqual(verifyLib.sample_records(90, 1), [0])
+        self.assertEqual(verifyLib.sample_records(90, 0), [])
+
+    def test_locateRecord(self):
+        """ test finding the source slice and record of an output record
+        """
+        slices = verifyLib.expected_records(self.files, self.entries)['slices']
+        self.assertEqual(verifyLib.locate_record(slices, 0), (self.files[0], 0))
+        self.assertEqual(verifyLib.locate_record(slices, 31), (self.files[1], 0))
+        self.assertEqual(verifyLib.locate_record(slices, 89), (self.files[2], 30))
+        self.assertRaises(IndexError, verifyLib.locate_record, slices, 90)
+
+    def test_missingOutput(self):
+        """ test that a missing output file fails
+        """
+        result = verifyLib.verify_file(os.path.join(self.tmpdir, 'case.cam.h1.T.nc'), 'T',
+                                       verifyLib.expected_records(self.files, self.entries), 3)
+        self.assertEqual(result['status'], 'fail')
+        self.assertEqual(result['problems'], ['missing output file'])
+
+    def test_writeResults(self):
+        """ test that the results are merged into the verification manifest
+        """
+        verifyLib.write_results(self.tmpdir, {'a.nc' : {'status' : 'fail'}, 'b.nc' : {'status' : 'pass'}})
+        verifyLib.write_results(self.tmpdir, {'a.nc' : {'status' : 'pass'}})
+        with open(os.path.join(self.tmpdir, verifyLib.VERIFY_NAME)) as fh:
+            manifest = json.load(fh)
+        self.assertEqual(manifest['version'], verifyLib.VERIFY_VERSION)
+        self.assertEqual(manifest['files'], {'a.nc' : {'status' : 'pass'}, 'b.nc' : {'status' : 'pass'}})
+
+@unittest.skipIf(netCDF4 is None or np is None, 'netCDF4 and numpy are not installed')
+class test_verifyQuantized(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.history = os.path.join(self.tmpdir, 'case.cam.h0.0001-01.nc')
+        self.values = np.array([[[287.123456, 0.000123], [-12.987654, 1.0e36]],
+                                [[300.555555, 45.67891], [-0.004321, 7.777777]]], dtype='f4')
+        self._write(self.history, self.values, None)
+        self.expected = {'ntime' : 2, 'first' : 15.5, 'last' : 45.0, 'first_bound' : None, 'last_bound' : None,
+                         'slices' : [(self.history, 2)]}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, filename, values, digits):
+        f = netCDF4.Dataset(filename, 'w', format='NETCDF4_CLASSIC')
+        f.createDimension('time', None)
+        f.createDimension('lat', 2)
+        f.createDimension('lon', 2)
+        time = f.createVariable('time', 'f8', ('time',))
+        time.units = 'days since 0001-01-01 00:00:00'
+        time[:] = [15.5, 45.0]
+        f.createVariable('TS', 'f4', ('time', 'lat', 'lon'), fill_value=1.0e36, least_significant_digit=digits)[:] = values
+        f.close()
+
+    def test_quantizedOutput(self):
+        """ test that a file written with a least_significant_digit passes within the quantization tolerance
+        """
+        output_file = os.path.join(self.tmpdir, 'case.cam.h0.TS.000101-000101.nc')
+        self._write(output_file, self.values, 2)
+
+        self.assertEqual(verifyLib.verify_file(output_file, 'TS', self.expected, 2, 2)['status'], 'pass')
+        result = verifyLib.verify_file(output_file, 'TS', self.expected, 2)
+        self.assertEqual(result['status'], 'fail')
+        self.assertEqual(len(result['problems']), 2)
+
+    def test_quantizedEqual(self):
+        """ test the quantization tolerance of the record comparison
+        """
+        source = self.values[0]
+        self.assertTrue(verifyLib.quantized_equal(quantizeLib.quantize(source, 3), source, 3))
+        self.assertTrue(verifyLib.quantized_equal(source, source, 3))
+        self.assertFalse(verifyLib.quantized_equal(quantizeLib.quantize(source, 1), source, 3))
+        self.assertFalse(verifyLib.quantized_equal(source[0], source, 3))
+        self.assertFalse(verifyLib.quantized_equal(np.array([1, 2]), np.array([1, 3]), 3))
+
+if __name__ == '__main__':
+    unittest.main()
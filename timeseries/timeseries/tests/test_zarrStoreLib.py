@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Unit test suite for the chunked directory store output format
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from timeseries import zarrStoreLib
+
+class test_zarrStoreLib(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = os.path.join(self.tmpdir, 'case.cam.h0.TS.000101-000112.zarr')
+
+        # 12 monthly records of a 2x3 field in chunks of 5 records
+        zarrStoreLib.create_group(self.store, {'title' : 'test case'})
+        zarrStoreLib.create_array(self.store, 'TS', [12, 2, 3], [5, 2, 3], '<f4', 1.0e36,
+                                  ['time', 'lat', 'lon'], {'units' : 'K'})
+        zarrStoreLib.create_array(self.store, 'time', [12], [12], '<f8', None, ['time'],
+                                  {'units' : 'days since 0001-01-01 00:00:00', 'bounds' : 'time_bnds'})
+        zarrStoreLib.create_array(self.store, 'time_bnds', [12, 2], [12, 2], '<f8', None, ['time', 'nbnd'], dict())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def records(self, start, stop):
+        return struct.pack('<{0}f'.format((stop - start) * 6), *[float(n) for n in range(start * 6, stop * 6)])
+
+    def test_names(self):
+        """ test the store names, chunk keys and chunk ranges
+        """
+        self.assertEqual(zarrStoreLib.store_path('/proc/case.cam.h0.TS.000101-001012.nc'),
+                         '/proc/case.cam.h0.TS.000101-001012.zarr')
+        self.assertEqual(zarrStoreLib.chunk_key(3, 3), '3.0.0')
+        self.assertEqual(zarrStoreLib.chunk_key(0, 0), '0')
+        self.assertEqual(zarrStoreLib.chunk_ranges(12, 5), [(0, 0, 5), (1, 5, 10), (2, 10, 12)])
+        self.assertEqual(zarrStoreLib.time_chunk(zarrStoreLib.CHUNK_BYTES * 2), 1)
+        self.assertEqual(zarrStoreLib.time_chunk(1024, 4096), 4)
+
+    def test_sliceRanges(self):
+        """ test that a chunk is located in the history slices
+        """
+        slices = [('h0.0001-01.nc', 4), ('h0.0001-05.nc', 4), ('h0.0001-09.nc', 4)]
+        self.assertEqual(zarrStoreLib.slice_ranges(slices, 0, 5), [('h0.0001-01.nc', 0, 4), ('h0.0001-05.nc', 0, 1)])
+        self.assertEqual(zarrStoreLib.slice_ranges(slices, 10, 12), [('h0.0001-09.nc', 2, 4)])
+
+    def test_metadata(self):
+        """ test the zarr array metadata
+        """
+        meta = zarrStoreLib.read_array_metadata(self.store, 'TS')
+        self.assertEqual(meta['zarr_format'], 2)
+        self.assertEqual(meta['chunks'], [5, 2, 3])
+        self.assertEqual(meta['compressor']['id'], 'zlib')
+        with open(os.path.join(self.store, 'TS', '.zattrs')) as fh:
+            self.assertEqual(json.load(fh)['_ARRAY_DIMENSIONS'], ['time', 'lat', 'lon'])
+
+        zarrStoreLib.create_array(self.store, 'SST', [12], [12], '<f4', float('nan'), ['time'], dict())
+        self.assertEqual(zarrStoreLib.read_array_metadata(self.store, 'SST')['fill_value'], 'NaN')
+
+    def test_records(self):
+        """ test that chunks written out of order read back as records, with
+            the chunks not written read as fill values
+        """
+        zarrStoreLib.write_time_chunk(self.store, 'TS', 2, self.records(10, 12), 2)
+        zarrStoreLib.write_time_chunk(self.store, 'TS', 0, self.records(0, 5), 5)
+        self.assertEqual(zarrStoreLib.read_records(self.store, 'TS', 3, 5), self.records(3, 5))
+        self.assertEqual(zarrStoreLib.read_records(self.store, 'TS', 10, 12), self.records(10, 12))
+
+        # the last chunk is padded to the full chunk size
+        self.assertEqual(len(zarrStoreLib.read_chunk(self.store, 'TS', '2.0.0')), 5 * 6 * 4)
+        missing = zarrStoreLib.read_records(self.store, 'TS', 5, 6)
+        self.assertEqual(struct.unpack('<6f', missing)[0], struct.unpack('<f', struct.pack('<f', 1.0e36))[0])
+
+        # a record range over several chunks
+        zarrStoreLib.write_time_chunk(self.store, 'TS', 1, self.records(5, 10), 5)
+        self.assertEqual(zarrStoreLib.read_records(self.store, 'TS', 0, 12), self.records(0, 12))
+
+    def test_readTime(self):
+        """ test the time summary and the consolidated metadata of a store
+        """
+        days = [31.0, 28.0, 31.0, 30.0, 31.0, 30.0, 31.0, 31.0, 30.0, 31.0, 30.0, 31.0]
+        bounds = list()
+        for n in range(12):
+            bounds.extend([sum(days[:n]), sum(days[:n + 1])])
+        zarrStoreLib.write_time_chunk(self.store, 'time', 0, struct.pack('<12d', *bounds[1::2]), 12)
+        zarrStoreLib.write_time_chunk(self.store, 'time_bnds', 0, struct.pack('<24d', *bounds), 12)
+
+        time = zarrStoreLib.read_time(self.store)
+        self.assertEqual(time['ntime'], 12)
+        self.assertEqual(time['first'], 31.0)
+        self.assertEqual(time['last'], 365.0)
+        self.assertEqual(time['min_step'], 28.0)
+        self.assertEqual(time['first_bound'], 0.0)
+        self.assertEqual(time['last_bound'], 365.0)
+
+        self.assertFalse(zarrStoreLib.is_complete(self.store))
+        zarrStoreLib.consolidate(self.store)
+        self.assertTrue(zarrStoreLib.is_complete(self.store))
+        with open(os.path.join(self.store, zarrStoreLib.METADATA_NAME)) as fh:
+            metadata = json.load(fh)['metadata']
+        self.assertEqual(sorted(metadata), ['.zattrs', '.zgroup', 'TS/.zarray', 'TS/.zattrs', 'time/.zarray',
+                                            'time/.zattrs', 'time_bnds/.zarray', 'time_bnds/.zattrs'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python2
+"""
+This module provides utility functions shared by the time-series generation
+tools in the timeseries package.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import glob
+import json
+import os
+import tempfile
+
+#==================================================================
+# read_json - read a JSON state file, returning a default if missing
+#==================================================================
+def read_json(filename, default=None):
+    """read_json - read a JSON file written by write_json_atomic
+
+    Arguments:
+    filename (string) - full path to the JSON file
+    default (object) - value returned if the file does not exist
+
+    Return:
+    data (object) - decoded JSON contents or the default
+    """
+    if not os.path.isfile(filename):
+        return default
+
+    with open(filename, 'r') as fh:
+        data = json.load(fh)
+
+    return data
+
+#=====================================================================
+# write_json_atomic - write a JSON state file with an atomic rename
+#=====================================================================
+def write_json_atomic(filename, data):
+    """write_json_atomic - write data to a temporary file in the same
+    directory as filename and then rename it into place so that readers
+    never see a partially written file.
+
+    Arguments:
+    filename (string) - full path to the JSON file
+    data (object) - JSON serializable object
+    """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(prefix='.{0}.'.format(os.path.basename(filename)), dir=dirname)
+    try:
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(data, fh, indent=1, sort_keys=True)
+            fh.flush()
+            os.fsync(fh.fileno())
+        # mkstemp creates the file as user read-only
+        os.chmod(tmpname, 0o644)
+        os.rename(tmpname, filename)
+    except:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+#====================================================================
+# get_file_time - return the date string from a history file name
+#====================================================================
+def get_file_time(filename):
+    """get_file_time - return the date string field of a history file name,
+    e.g. 0001-01 for case.cam.h0.0001-01.nc or case.pop.h.0001-01.nc.gz
+    """
+    basename = os.path.basename(filename)
+    if basename.endswith('.gz'):
+        basename = basename[:-len('.gz')]
+    return basename.split('.')[-2]
+
+#==================================================================
+# get_path_size - return the bytes of a file or directory store
+#==================================================================
+def get_path_size(path):
+    """get_path_size - return the size in bytes of a file, or the total size of
+    the files of a directory such as a zarr store, None if path does not exist
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(dirpath, filename))
+                   for dirpath, dirnames, filenames in os.walk(path) for filename in filenames)
+    return None
+
+#==================================================================
+# get_file_year - return the model year from a history file name
+#==================================================================
+def get_file_year(filename):
+    """get_file_year - return the integer model year of a history file name
+    """
+    return int(get_file_time(filename).split('-')[0])
+
+#==================================================================
+# parse_year - parse an optional start or stop year setting
+#==================================================================
+def parse_year(text):
+    """parse_year - return the integer model year of an env setting, or None
+    if the setting is unset or empty
+
+    Raises ValueError if the setting is not an integer.
+    """
+    if text is None or text.strip() == '':
+        return None
+    try:
+        return int(text.strip())
+    except ValueError:
+        err_msg = 'tseriesUtilsLib.parse_year ERROR: invalid model year {0}'.format(text)
+        raise ValueError(err_msg)
+
+#==================================================================
+# filter_years - keep the history files in a window of model years
+#==================================================================
+def filter_years(history_files, start_year=None, stop_year=None):
+    """filter_years - return the history files with model years from
+    start_year to stop_year inclusive. A start or stop year of None leaves
+    that end of the window open.
+    """
+    selected = list()
+    for history_file in history_files:
+        year = get_file_year(history_file)
+        if start_year is not None and year < start_year:
+            continue
+        if stop_year is not None and year > stop_year:
+            continue
+        selected.append(history_file)
+
+    return selected
+
+#=======================================================================
+# get_tseries_suffix - format the time series output file suffix
+#=======================================================================
+def get_tseries_suffix(tseries_tper, start_file_time, last_file_time):
+    """get_tseries_suffix - format the time series variable output suffix based
+    on the tseries_tper setting. The suffix starts with a "." and ends in ".nc".
+
+    Arguments:
+    tseries_tper (string) - time period of the history stream
+    start_file_time (string) - date string of the first history file
+    last_file_time (string) - date string of the last history file
+
+    Return:
+    tseries_output_suffix (string)
+    """
+    start_time_parts = start_file_time.split( "-" )
+    last_time_parts = last_file_time.split( "-" )
+
+    if tseries_tper in ["annual","yearly"]:
+        tseries_output_suffix = "."+start_file_time+"-"+last_file_time+".nc"
+    elif tseries_tper == "monthly":
+        tseries_output_suffix = "."+"".join(start_time_parts[0:2])+"-"+"".join(last_time_parts[0:2])+".nc"
+    elif tseries_tper in ["weekly","daily","hourly6","hourly3","hourly1","min30"]:
+        tseries_output_suffix = "."+"".join(start_time_parts[0:3])+"-"+"".join(last_time_parts[0:3])+".nc"
+    else:
+        err_msg = "tseriesUtilsLib.get_tseries_suffix ERROR: invalid tseries_tper {0}".format(tseries_tper)
+        raise TypeError(err_msg)
+
+    return tseries_output_suffix
+
+#=========================================================================
+# chunk_history_files - split history files into tseries_filecat_years chunks
+#=========================================================================
+def chunk_history_files(history_files, filecat_years, first_year=None):
+    """chunk_history_files - split a sorted list of history files into chunks
+    of filecat_years model years. Chunk boundaries are aligned on first_year
+    so that the same years always fall in the same chunk regardless of which
+    files are currently in the list.
+
+    Arguments:
+    history_files (list) - sorted list of history file names
+    filecat_years (integer) - number of years per chunk, <= 0 for a single chunk
+    first_year (integer) - year the first chunk starts on, defaults to the
+                           year of the first history file
+
+    Return:
+    chunks (list) - list of non-empty lists of history files
+    """
+    if len(history_files) == 0:
+        return list()
+    if filecat_years is None or filecat_years <= 0:
+        return [list(history_files)]
+
+    if first_year is None:
+        first_year = get_file_year(history_files[0])
+
+    chunks = list()
+    chunk_index = None
+    for history_file in history_files:
+        index = (get_file_year(history_file) - first_year) // filecat_years
+        if index != chunk_index:
+            chunks.append(list())
+            chunk_index = index
+        chunks[-1].append(history_file)
+
+    return chunks
+
+#======================================================================
+# get_caseroots - expand the --caseroot and --ensemble case roots
+#======================================================================
+def get_caseroots(caseroots, ensemble=None):
+    """get_caseroots - return the case root directories of --caseroot followed
+    by the sorted matches of the --ensemble glob pattern. The paths are
+    normalized with os.path.realpath and each case is listed once, in the
+    order it is first given, so no case is converted by two rank groups.
+    """
+    if ensemble is not None:
+        caseroots = list(caseroots) + sorted(glob.glob(ensemble))
+
+    unique = list()
+    for caseroot in caseroots:
+        caseroot = os.path.realpath(caseroot)
+        if caseroot not in unique:
+            unique.append(caseroot)
+    return unique
+
+#======================================================================
+# split_cases - split the stream dictionaries by case
+#======================================================================
+def split_cases(tseries_streams, pp_caseroots):
+    """split_cases - return the list of the stream dictionaries of each case,
+    in the order of pp_caseroots, selected by their pp_caseroot key
+    """
+    return [[tseries_stream for tseries_stream in tseries_streams if tseries_stream['pp_caseroot'] == pp_caseroot]
+            for pp_caseroot in pp_caseroots]
+
+#======================================================================
+# gather - collect a python object from every task on the manager
+#======================================================================
+def gather(scomm, data):
+    """gather - collect data from every task of the simplecomm on the manager
+    task. Must be called on all tasks of scomm.
+
+    Arguments:
+    scomm (object) - asaptools simplecomm object
+    data (object) - picklable data from this task
+
+    Return:
+    results (list) - on the manager, the data from every task with the manager
+                     data first, None on the other tasks
+    """
+    if scomm.is_manager():
+        results = [data]
+        for i in range(scomm.get_size() - 1):
+            worker_rank, worker_data = scomm.collect()
+            results.append(worker_data)
+        return results
+
+    scomm.collect(data)
+    return None
+
+#======================================================================
+# divide - split a simplecomm into sub-communicators by group
+#======================================================================
+def divide(scomm, group):
+    """divide - return the simplecomm divide of scomm into the tasks of the
+    same group and the tasks of the same group rank. asaptools cannot divide
+    a serial or one task communicator, so scomm is returned as both
+    sub-communicators of a single task. Must be called on all tasks of scomm.
+
+    Arguments:
+    scomm (object) - asaptools simplecomm object
+    group (object) - group of this task
+
+    Return:
+    (group_comm, multi_comm) - the simplecomm objects of the group and of the group rank
+    """
+    if scomm.get_size() == 1:
+        return (scomm, scomm)
+
+    return scomm.divide(group)
@@ -0,0 +1,402 @@
+#!/usr/bin/env python2
+"""
+This module provides the chunking and deflate tuning of the netcdf4c
+time-series output files. A sample of the largest variable of each
+variable class of a stream is written with a few candidate chunk shapes
+and deflate levels, timing the write and a downstream read of point
+time series and a full time slice. The candidate with the best weighted
+write and read time is recorded per variable class in the stream's
+file_extension element of env_timeseries.xml and applied by the
+generator to the pyReshaper specifiers.
+
+Variables are classified by the number of their non-time dimensions,
+e.g. 2d for (time, lat, lon) and 3d for (time, z_t, nlat, nlon).
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import inspect
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+from timeseries import ncHeaderLib
+
+#
+# installed dependencies, only needed to run the benchmarks
+#
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+# candidate chunk shapes
+#   slice - one time record and all the other dimensions
+#   level - one time record, one level and the horizontal dimensions
+#   block - BLOCK_TIME records and 1/BLOCK_SPLIT of each horizontal dimension
+CHUNKINGS = ['slice', 'level', 'block']
+DEFLATE_LEVELS = [1, 4]
+BLOCK_TIME = 12
+BLOCK_SPLIT = 4
+
+# weight of the write time in the score, the read time has 1 - WRITE_WEIGHT
+WRITE_WEIGHT = 0.5
+
+# number of time records sampled and of point time series read per candidate
+SAMPLE_RECORDS = 12
+READ_POINTS = 8
+
+#==================================================================
+# get_var_class - return the variable class of a variable
+#==================================================================
+def get_var_class(dimensions, time_dim):
+    """get_var_class - return the class name of a variable with dimensions,
+    the number of non-time dimensions followed by d, e.g. 3d
+    """
+    return '{0}d'.format(len([dim for dim in dimensions if dim != time_dim]))
+
+#==================================================================
+# chunk_sizes - return the chunk sizes of a candidate chunk shape
+#==================================================================
+def chunk_sizes(chunking, dimensions, shape, time_dim):
+    """chunk_sizes - return the chunk size of each dimension of a variable for
+    one of the CHUNKINGS. The last two non-time dimensions are the
+    horizontal dimensions.
+
+    Arguments:
+    chunking (string) - one of CHUNKINGS
+    dimensions (list) - variable dimension names
+    shape (list) - dimension sizes, the time size is ignored
+    time_dim (string) - name of the time dimension
+
+    Return:
+    chunks (dictionary) - dimension name to chunk size
+    """
+    if chunking not in CHUNKINGS:
+        err_msg = 'tuneLib.chunk_sizes ERROR: invalid chunking {0}'.format(chunking)
+        raise ValueError(err_msg)
+
+    horizontal = [dim for dim in dimensions if dim != time_dim][-2:]
+    chunks = dict()
+    for dim, size in zip(dimensions, shape):
+        if dim == time_dim:
+            chunks[dim] = BLOCK_TIME if chunking == 'block' else 1
+        elif dim in horizontal:
+            chunks[dim] = size if chunking != 'block' else max(1, -(-size // BLOCK_SPLIT))
+        else:
+            chunks[dim] = 1 if chunking == 'level' else size
+
+    return chunks
+
+#==================================================================
+# candidates - return the distinct chunking and deflate candidates
+#==================================================================
+def candidates(dimensions, shape, time_dim):
+    """candidates - return the list of (chunking, deflate, chunks) tuples to
+    benchmark, skipping chunk shapes that are the same as an earlier one
+    """
+    result = list()
+    seen = list()
+    for chunking in CHUNKINGS:
+        chunks = chunk_sizes(chunking, dimensions, shape, time_dim)
+        if chunks in seen:
+            continue
+        seen.append(chunks)
+        for deflate in DEFLATE_LEVELS:
+            result.append((chunking, deflate, chunks))
+
+    return result
+
+#==================================================================
+# select_best - pick the best benchmark result
+#==================================================================
+def select_best(results):
+    """select_best - return the benchmark result with the lowest score, the
+    write and read seconds relative to the fastest candidate weighted by
+    WRITE_WEIGHT. Ties go to the smaller output.
+
+    Arguments:
+    results (list) - dictionaries with keys chunking, deflate, chunks,
+                     write_seconds, read_seconds and bytes
+
+    Return:
+    best (dictionary) - the best result with a score key added
+    """
+    best_write = max(min(r['write_seconds'] for r in results), 1.0e-9)
+    best_read = max(min(r['read_seconds'] for r in results), 1.0e-9)
+    for r in results:
+        r['score'] = (WRITE_WEIGHT * r['write_seconds'] / best_write +
+                      (1.0 - WRITE_WEIGHT) * r['read_seconds'] / best_read)
+
+    return min(results, key=lambda r: (round(r['score'], 6), r['bytes']))
+
+#==================================================================
+# format_chunks, parse_chunks - chunk sizes as an XML attribute
+#==================================================================
+def format_chunks(chunks):
+    """format_chunks - format chunk sizes as dim:size,dim:size
+    """
+    return ','.join('{0}:{1}'.format(dim, chunks[dim]) for dim in sorted(chunks))
+
+def parse_chunks(text):
+    """parse_chunks - parse chunk sizes formatted by format_chunks
+    """
+    chunks = dict()
+    for item in text.split(','):
+        if item.strip():
+            dim, size = item.split(':')
+            chunks[dim.strip()] = int(size)
+    return chunks
+
+#==================================================================
+# read_tuning - read the tuned settings of a file_extension element
+#==================================================================
+def read_tuning(file_spec):
+    """read_tuning - read the tseries_tuning element of an env_timeseries.xml
+    file_extension element
+
+    Return:
+    tuning (dictionary) - variable class to a dictionary with keys
+                          chunking, deflate and chunks
+    """
+    tuning = dict()
+    for var_class in file_spec.findall("tseries_tuning/var_class"):
+        tuning[var_class.get("name")] = {'chunking' : var_class.get("chunking"),
+                                         'deflate' : int(var_class.get("deflate")),
+                                         'chunks' : parse_chunks(var_class.get("chunks", ""))}
+    return tuning
+
+class _CommentedTreeBuilder(ET.TreeBuilder):
+    # keep the comments of the env xml file when it is rewritten
+    def comment(self, data):
+        self.start(ET.Comment, {})
+        self.data(data)
+        self.end(ET.Comment)
+
+#==================================================================
+# write_tuning - record the tuned settings in env_timeseries.xml
+#==================================================================
+def write_tuning(env_timeseries, tuning):
+    """write_tuning - replace the tseries_tuning elements of the tuned streams
+    in env_timeseries.xml. The file is written to a temporary file and
+    renamed into place.
+
+    Arguments:
+    env_timeseries (string) - full path to env_timeseries.xml
+    tuning (dictionary) - (comp, file_extension suffix) to the best benchmark
+                          result of each variable class
+    """
+    parser = ET.XMLParser(target=_CommentedTreeBuilder())
+    xml_tree = ET.parse(env_timeseries, parser=parser)
+
+    for comp_archive_spec in xml_tree.findall("components/comp_archive_spec"):
+        comp = comp_archive_spec.get("name")
+        for file_spec in comp_archive_spec.findall("files/file_extension"):
+            stream_tuning = tuning.get((comp, file_spec.get("suffix")))
+            if stream_tuning is None:
+                continue
+
+            for element in file_spec.findall("tseries_tuning"):
+                index = list(file_spec).index(element)
+                if index > 0:
+                    file_spec[index - 1].tail = element.tail
+                file_spec.remove(element)
+
+            # indent the new element like the other file_extension children
+            indent = (file_spec.text or '\n')
+            last = file_spec[-1]
+            element = ET.SubElement(file_spec, "tseries_tuning")
+            element.tail = last.tail
+            last.tail = indent
+            element.text = indent + '  '
+            for name in sorted(stream_tuning):
+                best = stream_tuning[name]
+                var_class = ET.SubElement(element, "var_class", {'name' : name, 'chunking' : best['chunking'],
+                                                                 'deflate' : str(best['deflate']),
+                                                                 'chunks' : format_chunks(best['chunks'])})
+                var_class.tail = indent + '  '
+            var_class.tail = indent
+
+    fd, tmpname = tempfile.mkstemp(prefix='.env_timeseries.', dir=os.path.dirname(os.path.abspath(env_timeseries)))
+    os.close(fd)
+    try:
+        xml_tree.write(tmpname, encoding='UTF-8', xml_declaration=True)
+        os.chmod(tmpname, 0o644)
+        os.rename(tmpname, env_timeseries)
+    except:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+#==================================================================
+# dominant_class - return the class with the most bytes per record
+#==================================================================
+def dominant_class(variables, var_classes):
+    """dominant_class - return the variable class with the largest total
+    record size. pyReshaper applies one compression level and one set of
+    chunk sizes to every variable of a specifier.
+
+    Arguments:
+    variables (dictionary) - variable name to record size in bytes
+    var_classes (dictionary) - variable name to variable class
+    """
+    totals = dict()
+    for name, nbytes in variables.items():
+        cls = var_classes.get(name)
+        if cls is not None:
+            totals[cls] = totals.get(cls, 0) + nbytes
+    if len(totals) == 0:
+        return None
+
+    return max(sorted(totals), key=lambda cls: totals[cls])
+
+#==================================================================
+# convert_arguments - return the pyReshaper convert keyword arguments
+#==================================================================
+def convert_arguments(reshpr, chunks, rchunks=None):
+    """convert_arguments - return the keyword arguments for reshpr.convert()
+    that set the output write chunk sizes and the memory bounded read chunk
+    sizes, if the installed pyReshaper version supports them
+    """
+    if not chunks and not rchunks:
+        return dict()
+
+    getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+    try:
+        args = getargspec(reshpr.convert).args
+    except TypeError:
+        return dict()
+
+    arguments = dict()
+    for name, value in [('wchunks', chunks), ('rchunks', rchunks)]:
+        if value and name in args:
+            arguments[name] = dict(value)
+    return arguments
+
+#==================================================================
+# benchmark_variable - time the candidates on a data sample
+#==================================================================
+def benchmark_variable(sample, dimensions, time_dim, tmpdir):
+    """benchmark_variable - write sample with every candidate chunk shape and
+    deflate level and time the write and a downstream read of READ_POINTS
+    point time series and one full time slice
+
+    Arguments:
+    sample (numpy array) - sampled records of the variable
+    dimensions (list) - variable dimension names
+    time_dim (string) - name of the time dimension
+    tmpdir (string) - directory for the benchmark files
+
+    Return:
+    results (list) - dictionaries with keys chunking, deflate, chunks,
+                     write_seconds, read_seconds and bytes
+    """
+    if netCDF4 is None or np is None:
+        err_msg = 'tuneLib.benchmark_variable ERROR: benchmarks require netCDF4 and numpy'
+        raise ImportError(err_msg)
+
+    shape = sample.shape
+    horizontal = [i for i, dim in enumerate(dimensions) if dim != time_dim][-2:]
+    rng = np.random.RandomState(0)
+    points = list()
+    for n in range(READ_POINTS):
+        index = [0] * len(shape)
+        index[dimensions.index(time_dim)] = slice(None)
+        for i in horizontal:
+            index[i] = rng.randint(shape[i])
+        points.append(tuple(index))
+
+    results = list()
+    for chunking, deflate, chunks in candidates(dimensions, shape, time_dim):
+        filename = os.path.join(tmpdir, 'tune.{0}.{1}.nc'.format(chunking, deflate))
+        chunksizes = [min(chunks[dim], size) for dim, size in zip(dimensions, shape)]
+
+        start = time.time()
+        f = netCDF4.Dataset(filename, 'w', format='NETCDF4_CLASSIC')
+        for dim, size in zip(dimensions, shape):
+            f.createDimension(dim, None if dim == time_dim else size)
+        var = f.createVariable('sample', sample.dtype, dimensions, zlib=True, complevel=deflate,
+                               chunksizes=chunksizes)
+        var[:] = sample
+        f.close()
+        write_seconds = time.time() - start
+        nbytes = os.path.getsize(filename)
+
+        start = time.time()
+        f = netCDF4.Dataset(filename, 'r')
+        var = f.variables['sample']
+        for index in points:
+            var[index]
+        var[0]
+        f.close()
+        read_seconds = time.time() - start
+        os.remove(filename)
+
+        results.append({'chunking' : chunking, 'deflate' : deflate, 'chunks' : chunks,
+                        'write_seconds' : write_seconds, 'read_seconds' : read_seconds,
+                        'bytes' : nbytes})
+
+    return results
+
+#==================================================================
+# tune_stream - benchmark each variable class of a stream
+#==================================================================
+def tune_stream(history_files, exclude, tmpdir):
+    """tune_stream - benchmark the largest variable of each variable class of
+    a stream on the first SAMPLE_RECORDS time records of history_files
+
+    Arguments:
+    history_files (list) - sorted history files of the stream
+    exclude (list) - time variant metadata variables that are not written
+    tmpdir (string) - directory for the benchmark files
+
+    Return:
+    tuning (dictionary) - variable class to the best benchmark result with
+                          the benchmarked variable and the sample size added
+    """
+    if netCDF4 is None or np is None:
+        err_msg = 'tuneLib.tune_stream ERROR: benchmarks require netCDF4 and numpy'
+        raise ImportError(err_msg)
+
+    header = ncHeaderLib.read_header(history_files[0])
+    time_dim = header['unlimited']
+    largest = dict()
+    for name in ncHeaderLib.time_variant_variables(header, exclude):
+        cls = get_var_class(header['variables'][name]['dimensions'], time_dim)
+        nbytes = ncHeaderLib.record_bytes(header, name)
+        if cls not in largest or nbytes > largest[cls][1]:
+            largest[cls] = (name, nbytes)
+
+    tuning = dict()
+    for cls, (name, nbytes) in sorted(largest.items()):
+        records = list()
+        nrecords = 0
+        for history_file in history_files:
+            f = netCDF4.Dataset(history_file, 'r')
+            try:
+                data = f.variables[name][:SAMPLE_RECORDS - nrecords]
+                dimensions = list(f.variables[name].dimensions)
+            finally:
+                f.close()
+            records.append(np.ma.filled(data))
+            nrecords += data.shape[dimensions.index(time_dim)]
+            if nrecords >= SAMPLE_RECORDS:
+                break
+
+        sample = np.concatenate(records, axis=dimensions.index(time_dim))
+        best = select_best(benchmark_variable(sample, dimensions, time_dim, tmpdir))
+        best['variable'] = name
+        best['sample_bytes'] = sample.nbytes
+        tuning[cls] = best
+
+    return tuning
@@ -0,0 +1,201 @@
+#!/usr/bin/env python2
+"""
+This module provides the pre-flight validation of the history time slice
+files of each time-series stream. The time coordinate and bounds of
+every slice are read, divided across the tasks, and checked for
+unreadable or truncated files, irregular time steps within a slice and
+gaps (missing slices) or overlaps (duplicate slices) between consecutive
+slices for the stream tseries_tper. Gzipped slices are decompressed
+during the conversion, the generator reads the time records of the
+decompressed files once the decompression of a specifier finishes and
+checks the specifier again with them. In incremental runs the first new
+slice of a stream is also checked against the end time of the last
+segment recorded in the manifest.
+
+The time summaries are saved to a JSON cache file keyed on the file size
+and modification time so repeat runs only read the slices that changed.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import os
+
+from timeseries import decompressLib, ncHeaderLib, tseriesUtilsLib
+
+CACHE_VERSION = 1
+
+# allowed range of the time step in days for each tseries_tper
+TPER_STEP_DAYS = {'annual' : (365.0, 366.0),
+                  'yearly' : (365.0, 366.0),
+                  'monthly' : (28.0, 31.0),
+                  'weekly' : (7.0, 7.0),
+                  'daily' : (1.0, 1.0),
+                  'hourly6' : (6.0 / 24.0, 6.0 / 24.0),
+                  'hourly3' : (3.0 / 24.0, 3.0 / 24.0),
+                  'hourly1' : (1.0 / 24.0, 1.0 / 24.0),
+                  'min30' : (1.0 / 48.0, 1.0 / 48.0)}
+
+# time units supported by the continuity checks and their length in days
+UNITS_DAYS = {'days' : 1.0, 'hours' : 1.0 / 24.0, 'minutes' : 1.0 / 1440.0, 'seconds' : 1.0 / 86400.0}
+
+# tolerance in days when comparing time values
+TOLERANCE_DAYS = 1.0e-3
+
+#============================================================
+# ValidationCache - cached time summaries of history files
+#============================================================
+class ValidationCache(object):
+    """ValidationCache - cache of the ncHeaderLib.read_time summaries of
+    history files keyed on the file path, size and modification time.
+    """
+    def __init__(self, cache_file):
+        self._cache_file = cache_file
+        self._files = dict()
+        self._changed = False
+
+        cache = tseriesUtilsLib.read_json(cache_file, default=dict())
+        if cache.get('version') == CACHE_VERSION:
+            self._files = cache.get('files', dict())
+
+    def cached_file(self, filename):
+        """cached_file - return the cache entry of filename or None
+        """
+        return self._files.get(filename)
+
+    def set_file(self, filename, entry, reread):
+        """set_file - store the entry returned by refresh_file. Entries of
+        unreadable files are not cached so they are read again next run.
+        """
+        if 'error' in entry:
+            if self._files.pop(filename, None) is not None:
+                self._changed = True
+        elif reread:
+            self._files[filename] = entry
+            self._changed = True
+
+    def save(self):
+        """save - write the cache file if any entries changed
+        """
+        if self._changed:
+            tseriesUtilsLib.write_json_atomic(self._cache_file, {'version' : CACHE_VERSION,
+                                                                 'files' : self._files})
+            self._changed = False
+
+#====================================================================
+# refresh_file - read the time summary of a file unless it is cached
+#====================================================================
+def refresh_file(filename, entry):
+    """refresh_file - return the time summary entry of filename, reusing the
+    cached entry if the file size and modification time are unchanged.
+
+    Arguments:
+    filename (string) - full path to the history file
+    entry (dictionary) - cached entry or None
+
+    Return:
+    (entry, reread) - entry is a dictionary with keys size, mtime and time,
+                      or size, mtime and error if the file could not be read,
+                      or size and mtime only for a gzipped file;
+                      reread is True if the file was read
+    """
+    try:
+        st = os.stat(filename)
+    except OSError as error:
+        return ({'size' : None, 'mtime' : None, 'error' : str(error)}, True)
+
+    if entry is not None and entry.get('size') == st.st_size and entry.get('mtime') == st.st_mtime:
+        return (entry, False)
+
+    entry = {'size' : st.st_size, 'mtime' : st.st_mtime}
+    if decompressLib.is_compressed(filename):
+        return (entry, True)
+
+    try:
+        entry['time'] = ncHeaderLib.read_time(filename)
+    except Exception as error:
+        entry['error'] = str(error)
+
+    return (entry, True)
+
+def _units_days(units):
+    if units is None:
+        return None
+    return UNITS_DAYS.get(units.split()[0].lower())
+
+#==================================================================
+# check_stream - check the continuity of a stream's history files
+#==================================================================
+def check_stream(tseries_tper, history_files, entries, previous=None):
+    """check_stream - check the time records of the history files of a stream
+
+    Arguments:
+    tseries_tper (string) - time period of the history stream
+    history_files (list) - sorted list of history file names
+    entries (dictionary) - history file name to refresh_file entry, files
+                           without an entry are not checked
+    previous (tuple) - (name, time summary) of the data preceding the first
+                       file, e.g. the last segment converted by an earlier run
+
+    Return:
+    problems (list) - problem description strings, empty if the stream is valid
+    """
+    problems = list()
+    low, high = TPER_STEP_DAYS[tseries_tper]
+
+    for history_file in history_files:
+        name = os.path.basename(history_file)
+        entry = entries.get(history_file)
+        if entry is None:
+            previous = None
+            continue
+        if 'error' in entry:
+            problems.append('{0}: unreadable or truncated file: {1}'.format(name, entry['error']))
+            previous = None
+            continue
+
+        # gzipped files are not checked, restart the continuity checks after them
+        if 'time' not in entry:
+            previous = None
+            continue
+
+        time = entry['time']
+        if time['ntime'] == 0:
+            problems.append('{0}: no time records'.format(name))
+            previous = None
+            continue
+
+        scale = _units_days(time['units'])
+        if scale is None:
+            problems.append('{0}: unsupported time units {1}'.format(name, time['units']))
+            previous = None
+            continue
+
+        if time['min_step'] is not None:
+            if time['min_step'] * scale < low - TOLERANCE_DAYS or time['max_step'] * scale > high + TOLERANCE_DAYS:
+                problems.append('{0}: time steps of {1:g} to {2:g} days do not match tseries_tper {3}'.format(
+                    name, time['min_step'] * scale, time['max_step'] * scale, tseries_tper))
+
+        if previous is not None:
+            prev_name, prev_time = previous
+            if prev_time['units'] != time['units'] or prev_time['calendar'] != time['calendar']:
+                problems.append('{0}: time units or calendar differ from {1}'.format(name, prev_name))
+            elif prev_time['last_bound'] is not None and time['first_bound'] is not None:
+                gap = (time['first_bound'] - prev_time['last_bound']) * scale
+                if gap > TOLERANCE_DAYS:
+                    problems.append('{0}: gap of {1:g} days after {2}, missing slices'.format(name, gap, prev_name))
+                elif gap < -TOLERANCE_DAYS:
+                    problems.append('{0}: overlaps {1} by {2:g} days, duplicate slices'.format(name, prev_name, -gap))
+            else:
+                step = (time['first'] - prev_time['last']) * scale
+                if step > high + TOLERANCE_DAYS:
+                    problems.append('{0}: gap of {1:g} days after {2}, missing slices'.format(name, step, prev_name))
+                elif step < low - TOLERANCE_DAYS:
+                    problems.append('{0}: time step of {1:g} days after {2}, duplicate slices'.format(name, step, prev_name))
+
+        previous = (name, time)
+
+    return problems
@@ -0,0 +1,295 @@
+#!/usr/bin/env python2
+"""
+This module provides the post-conversion verification of the time series
+variable files. Each output file is checked for the number of time
+records and the time bounds expected from its source history slices,
+and the checksums of a sample of its records are compared with the same
+records of the source slices. The source slice time summaries come from
+the pre-flight validation cache so only the output files and the sampled
+records are read. The records of a variable written with a
+least_significant_digit are compared with the source records within the
+quantization tolerance instead of by checksum.
+
+The results are recorded in a JSON pass/fail manifest in each
+tseries_output_dir of the form:
+
+{ "version" : 1,
+  "files" : { "<output file>" : { "variable" : "TS", "status" : "pass",
+                                  "checks" : ["exists", "records", "bounds", "samples"],
+                                  "problems" : [] } } }
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import os
+import zlib
+
+from timeseries import ncHeaderLib, quantizeLib, tseriesUtilsLib, zarrStoreLib
+
+#
+# installed dependencies
+#
+try:
+    import Nio
+except ImportError:
+    Nio = None
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VERIFY_NAME = 'tseries_verify.json'
+VERIFY_VERSION = 1
+
+# default number of records compared with the source slices per output file
+SAMPLE_RECORDS = 3
+
+# tolerance when comparing time values
+TOLERANCE = 1.0e-6
+
+#==================================================================
+# expected_records - summarize the source slices of a specifier
+#==================================================================
+def expected_records(history_files, entries):
+    """expected_records - return the expected time records of the output files
+    of a specifier from the validateLib.refresh_file entries of its slices
+
+    Arguments:
+    history_files (list) - sorted source history slice files
+    entries (dictionary) - history file name to refresh_file entry
+
+    Return:
+    expected (dictionary) - with keys ntime, first, last, first_bound, last_bound
+                            and slices, the list of (history file, ntime), or
+                            None if a slice is compressed or could not be read
+    """
+    slices = list()
+    times = list()
+    for history_file in history_files:
+        entry = entries.get(history_file)
+        if entry is None or 'time' not in entry:
+            return None
+        times.append(entry['time'])
+        slices.append((history_file, entry['time']['ntime']))
+
+    if len(times) == 0:
+        return None
+
+    return {'ntime' : sum(ntime for history_file, ntime in slices),
+            'first' : times[0]['first'], 'last' : times[-1]['last'],
+            'first_bound' : times[0]['first_bound'], 'last_bound' : times[-1]['last_bound'],
+            'slices' : slices}
+
+#==================================================================
+# sample_records - choose the records compared with the sources
+#==================================================================
+def sample_records(ntime, nsamples):
+    """sample_records - return nsamples record indices evenly spaced from the
+    first to the last record of ntime records
+    """
+    if nsamples <= 0 or ntime <= 0:
+        return list()
+    if nsamples >= ntime:
+        return list(range(ntime))
+    if nsamples == 1:
+        return [0]
+    return sorted(set(k * (ntime - 1) // (nsamples - 1) for k in range(nsamples)))
+
+#==================================================================
+# locate_record - find the source slice of an output record
+#==================================================================
+def locate_record(slices, index):
+    """locate_record - return the (history file, record index) of output
+    record index within the (history file, ntime) slices
+
+    Raises IndexError if index is past the last slice.
+    """
+    for history_file, ntime in slices:
+        if index < ntime:
+            return (history_file, index)
+        index -= ntime
+
+    err_msg = 'verifyLib.locate_record ERROR: record is past the last source slice'
+    raise IndexError(err_msg)
+
+#==================================================================
+# record_values - read one time record of a variable
+#==================================================================
+def record_values(filename, name, index):
+    """record_values - return the raw values of record index of variable
+    name, in native byte order so files of different netCDF formats
+    compare equal
+    """
+    if np is None:
+        err_msg = 'verifyLib.record_values ERROR: reading {0} requires numpy'.format(filename)
+        raise ImportError(err_msg)
+
+    if Nio is not None:
+        f = Nio.open_file(filename, 'r')
+    elif netCDF4 is not None:
+        f = netCDF4.Dataset(filename, 'r')
+    else:
+        err_msg = 'verifyLib.record_values ERROR: reading {0} requires PyNIO or netCDF4'.format(filename)
+        raise ImportError(err_msg)
+
+    try:
+        var = f.variables[name]
+        if hasattr(var, 'set_auto_maskandscale'):
+            var.set_auto_maskandscale(False)
+        data = np.asarray(var[index])
+        data = np.ascontiguousarray(data, dtype=data.dtype.newbyteorder('='))
+    finally:
+        f.close()
+
+    return data
+
+#==================================================================
+# record_checksum - checksum one time record of a variable
+#==================================================================
+def record_checksum(filename, name, index):
+    """record_checksum - return the adler32 checksum of the raw values of
+    record index of variable name
+    """
+    return zlib.adler32(record_values(filename, name, index).tobytes()) & 0xffffffff
+
+def _output_checksum(output_file, name, index):
+    # the records of a directory store are already in native byte order
+    if os.path.isdir(output_file):
+        return zlib.adler32(zarrStoreLib.read_records(output_file, name, index, index + 1)) & 0xffffffff
+    return record_checksum(output_file, name, index)
+
+def _output_values(output_file, name, index):
+    if os.path.isdir(output_file):
+        meta = zarrStoreLib.read_array_metadata(output_file, name)
+        return np.frombuffer(zarrStoreLib.read_records(output_file, name, index, index + 1), dtype=np.dtype(meta['dtype']))
+    return record_values(output_file, name, index)
+
+#==================================================================
+# quantized_equal - compare a record with its quantized source
+#==================================================================
+def quantized_equal(output, source, digits):
+    """quantized_equal - return True if the values of an output record are
+    the source values rounded to digits decimal digits, within half the
+    quantization step and the rounding of the output precision. Values
+    that are not floating point must be equal.
+    """
+    output = np.asarray(output).ravel()
+    source = np.asarray(source).ravel()
+    if output.shape != source.shape:
+        return False
+    if source.dtype.kind != 'f' or output.dtype.kind != 'f':
+        return bool(np.array_equal(output, source))
+
+    eps = max(np.finfo(output.dtype).eps, np.finfo(source.dtype).eps)
+    tolerance = 0.5 / quantizeLib.quantize_scale(digits) + np.abs(source.astype('f8')) * eps
+    with np.errstate(invalid='ignore'):
+        close = np.abs(output.astype('f8') - source.astype('f8')) <= tolerance
+    return bool(np.all(close | (np.isnan(output) & np.isnan(source))))
+
+def _differs(a, b):
+    return a is not None and b is not None and abs(a - b) > TOLERANCE * max(1.0, abs(a), abs(b))
+
+#==================================================================
+# verify_file - verify one time series variable file
+#==================================================================
+def verify_file(output_file, name, expected, nsamples, digits=None):
+    """verify_file - check an output file against the expected records of its
+    source slices
+
+    Arguments:
+    output_file (string) - time series variable file or directory store
+    name (string) - time series variable name
+    expected (dictionary) - expected_records of the specifier or None
+    nsamples (integer) - number of records compared with the source slices
+    digits (integer) - least_significant_digit the variable was written with, None for full precision
+
+    Return:
+    result (dictionary) - with keys variable, status (pass or fail), checks
+                          (the checks made) and problems
+    """
+    result = {'variable' : name, 'status' : 'pass', 'checks' : list(), 'problems' : list()}
+    problems = result['problems']
+
+    is_store = os.path.isdir(output_file)
+    if not os.path.isfile(output_file) and not (is_store and zarrStoreLib.is_complete(output_file)):
+        problems.append('missing output file')
+        result['status'] = 'fail'
+        return result
+    result['checks'].append('exists')
+
+    try:
+        if is_store:
+            time = zarrStoreLib.read_time(output_file)
+        else:
+            time = ncHeaderLib.read_time(output_file)
+    except Exception as error:
+        problems.append('unreadable output file: {0}'.format(error))
+        result['status'] = 'fail'
+        return result
+
+    # the counts of gzipped or unreadable sources are unknown
+    if expected is not None:
+        result['checks'].append('records')
+        if time['ntime'] != expected['ntime']:
+            problems.append('{0} time records, expected {1}'.format(time['ntime'], expected['ntime']))
+
+        result['checks'].append('bounds')
+        if expected['first_bound'] is not None and time['first_bound'] is not None:
+            if _differs(time['first_bound'], expected['first_bound']) or _differs(time['last_bound'], expected['last_bound']):
+                problems.append('time bounds {0:g} to {1:g}, expected {2:g} to {3:g}'.format(
+                    time['first_bound'], time['last_bound'], expected['first_bound'], expected['last_bound']))
+        elif _differs(time['first'], expected['first']) or _differs(time['last'], expected['last']):
+            problems.append('time {0} to {1}, expected {2} to {3}'.format(time['first'], time['last'],
+                                                                           expected['first'], expected['last']))
+
+        # only compare records when the output has the expected records
+        if len(problems) == 0 and nsamples > 0:
+            result['checks'].append('samples')
+            for index in sample_records(time['ntime'], nsamples):
+                history_file, source_index = locate_record(expected['slices'], index)
+                try:
+                    if digits is not None:
+                        same = quantized_equal(_output_values(output_file, name, index),
+                                               record_values(history_file, name, source_index), digits)
+                    else:
+                        same = _output_checksum(output_file, name, index) == record_checksum(history_file, name, source_index)
+                    if not same:
+                        problems.append('record {0} differs from record {1} of {2}'.format(
+                            index, source_index, os.path.basename(history_file)))
+                except Exception as error:
+                    problems.append('record {0} could not be compared: {1}'.format(index, error))
+
+    if len(problems) > 0:
+        result['status'] = 'fail'
+    return result
+
+#==================================================================
+# write_results - record the verification results of a directory
+#==================================================================
+def write_results(tseries_output_dir, results):
+    """write_results - merge results into the verification manifest of the
+    tseries_output_dir. Entries of files that were not verified again are
+    kept.
+
+    Arguments:
+    tseries_output_dir (string) - time series output directory
+    results (dictionary) - output file name to verify_file result
+    """
+    filename = os.path.join(tseries_output_dir, VERIFY_NAME)
+    manifest = tseriesUtilsLib.read_json(filename, default=dict())
+    files = dict()
+    if manifest.get('version') == VERIFY_VERSION:
+        files = manifest.get('files', dict())
+    files.update(results)
+
+    tseriesUtilsLib.write_json_atomic(filename, {'version' : VERIFY_VERSION, 'files' : files})
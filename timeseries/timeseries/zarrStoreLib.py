@@ -0,0 +1,540 @@
+#!/usr/bin/env python2
+"""
+This module provides the chunked directory store output format of the
+time-series generation, tseries_output_format zarr. Each time series
+variable is written to a Zarr version 2 directory store instead of a
+netCDF file, e.g. proc/tseries/month_1/case.cam.h0.TS.000101-001012.zarr,
+with the same arrays pyReshaper writes to the netCDF file: the time
+series variable, the tseries_time_variant_variables and the time
+invariant metadata.
+
+The arrays that depend on time are chunked along time only and each
+chunk is a separate zlib compressed file, so the tasks of a rank group
+write disjoint time blocks of the same variable concurrently without
+any locks, and readers such as ILAMB or the averages can read the
+chunks in parallel. The group manager creates the store metadata before
+the chunks are written and the consolidated .zmetadata file after, the
+store is complete once .zmetadata exists. The arrays carry the xarray
+_ARRAY_DIMENSIONS attribute so xarray.open_zarr reads the stores.
+
+The metadata, chunk and reader functions only use the standard library,
+writing the records of the history slices requires numpy and PyNIO or
+netCDF4.
+__________________________
+Created on Oct, 2016
+
+@author: NCAR - CSEG
+"""
+
+from __future__ import print_function
+
+import json
+import math
+import os
+import struct
+import tempfile
+import zlib
+
+from timeseries import quantizeLib, tseriesUtilsLib
+
+#
+# installed dependencies
+#
+try:
+    import Nio
+except ImportError:
+    Nio = None
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ZARR_FORMAT = 2
+STORE_SUFFIX = '.zarr'
+METADATA_NAME = '.zmetadata'
+
+# target size of the time chunks of the record arrays
+CHUNK_BYTES = 16 * 1024 * 1024
+
+# zlib level of the chunk files
+COMPRESSION_LEVEL = 1
+
+# struct codes of the zarr numeric dtypes
+STRUCT_CODES = {'f4' : 'f', 'f8' : 'd', 'i1' : 'b', 'i2' : 'h', 'i4' : 'i', 'i8' : 'q',
+                'u1' : 'B', 'u2' : 'H', 'u4' : 'I', 'u8' : 'Q'}
+
+#==================================================================
+# store_path - return the store name of a time series file
+#==================================================================
+def store_path(output_file):
+    """store_path - return the directory store name of a time series
+    variable file name, the .nc extension is replaced by .zarr
+    """
+    if output_file.endswith('.nc'):
+        output_file = output_file[:-len('.nc')]
+    return output_file + STORE_SUFFIX
+
+#==================================================================
+# is_complete - check that a store was completely written
+#==================================================================
+def is_complete(store):
+    """is_complete - return True if the consolidated metadata of the store,
+    written after all its chunks, exists
+    """
+    return os.path.isfile(os.path.join(store, METADATA_NAME))
+
+#==================================================================
+# time_chunk - choose the time chunk size of a record array
+#==================================================================
+def time_chunk(record_bytes, chunk_bytes=CHUNK_BYTES):
+    """time_chunk - return the number of time records per chunk of an array
+    with record_bytes bytes per record
+    """
+    return int(max(1, chunk_bytes // max(1, record_bytes)))
+
+#==================================================================
+# chunk_key - return the file name of a chunk
+#==================================================================
+def chunk_key(index, ndim):
+    """chunk_key - return the key of chunk index along the first dimension
+    of an array of ndim dimensions, the other dimensions have one chunk
+    """
+    if ndim == 0:
+        return '0'
+    return '.'.join([str(index)] + ['0'] * (ndim - 1))
+
+#==================================================================
+# chunk_ranges - split the time records into chunks
+#==================================================================
+def chunk_ranges(ntime, tchunk):
+    """chunk_ranges - return the list of (chunk index, first record, last
+    record + 1) of ntime records in chunks of tchunk records
+    """
+    return [(n, start, min(start + tchunk, ntime)) for n, start in enumerate(range(0, ntime, tchunk))]
+
+#==================================================================
+# slice_ranges - locate a range of records in the history slices
+#==================================================================
+def slice_ranges(slices, start, stop):
+    """slice_ranges - return the (history file, first record, last record + 1)
+    of each history slice overlapping the records start to stop - 1 of the
+    time series
+
+    Arguments:
+    slices (list) - (history file, number of records) of the sorted history slices
+    start, stop (integer) - time series record range
+    """
+    ranges = list()
+    offset = 0
+    for history_file, ntime in slices:
+        first = max(start, offset)
+        last = min(stop, offset + ntime)
+        if first < last:
+            ranges.append((history_file, first - offset, last - offset))
+        offset += ntime
+    return ranges
+
+def _fill_json(fill_value):
+    # the JSON encoding of a fill value, non finite floats are strings
+    if fill_value is None:
+        return None
+    if hasattr(fill_value, 'item'):
+        fill_value = fill_value.item()
+    if isinstance(fill_value, bytes):
+        return None
+    if isinstance(fill_value, float):
+        if math.isnan(fill_value):
+            return 'NaN'
+        if math.isinf(fill_value):
+            return 'Infinity' if fill_value > 0 else '-Infinity'
+    return fill_value
+
+def _fill_value(fill_json):
+    if fill_json in ['NaN', 'Infinity', '-Infinity']:
+        return float(fill_json.lower().replace('infinity', 'inf'))
+    return fill_json
+
+def _attr_json(value):
+    # netCDF attribute values as JSON values
+    if hasattr(value, 'tolist'):
+        value = value.tolist()
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return _fill_json(value)
+    return value
+
+#==================================================================
+# create_group - write the group metadata of a store
+#==================================================================
+def create_group(store, attrs):
+    """create_group - create the store directory with its .zgroup and the
+    global attributes in .zattrs
+    """
+    if not os.path.isdir(store):
+        os.makedirs(store)
+    tseriesUtilsLib.write_json_atomic(os.path.join(store, '.zgroup'), {'zarr_format' : ZARR_FORMAT})
+    tseriesUtilsLib.write_json_atomic(os.path.join(store, '.zattrs'),
+                                      dict((name, _attr_json(value)) for name, value in attrs.items()))
+
+#==================================================================
+# create_array - write the metadata of an array of a store
+#==================================================================
+def create_array(store, name, shape, chunks, dtype, fill_value, dimensions, attrs):
+    """create_array - write the .zarray and .zattrs of array name
+
+    Arguments:
+    store (string) - store directory
+    name (string) - array name
+    shape, chunks (list) - array and chunk sizes
+    dtype (string) - zarr dtype, e.g. <f4
+    fill_value (number) - fill value or None
+    dimensions (list) - dimension names, the xarray _ARRAY_DIMENSIONS
+    attrs (dictionary) - variable attributes
+    """
+    array_dir = os.path.join(store, name)
+    if not os.path.isdir(array_dir):
+        os.makedirs(array_dir)
+
+    tseriesUtilsLib.write_json_atomic(os.path.join(array_dir, '.zarray'),
+                                      {'zarr_format' : ZARR_FORMAT, 'shape' : list(shape), 'chunks' : list(chunks),
+                                       'dtype' : dtype, 'fill_value' : _fill_json(fill_value), 'order' : 'C',
+                                       'compressor' : {'id' : 'zlib', 'level' : COMPRESSION_LEVEL}, 'filters' : None})
+    zattrs = dict((attr, _attr_json(value)) for attr, value in attrs.items())
+    zattrs['_ARRAY_DIMENSIONS'] = list(dimensions)
+    tseriesUtilsLib.write_json_atomic(os.path.join(array_dir, '.zattrs'), zattrs)
+
+#==================================================================
+# read_array_metadata - read the .zarray of an array
+#==================================================================
+def read_array_metadata(store, name):
+    """read_array_metadata - return the decoded .zarray of array name
+    """
+    with open(os.path.join(store, name, '.zarray')) as fh:
+        return json.load(fh)
+
+#==================================================================
+# fill_bytes - return the raw bytes of fill values
+#==================================================================
+def fill_bytes(dtype, fill_value, count):
+    """fill_bytes - return count values of fill_value in the raw encoding of
+    dtype, zeros if there is no fill value
+    """
+    itemsize = int(dtype[2:])
+    code = STRUCT_CODES.get(dtype[1:])
+    if fill_value is None or code is None:
+        return b'\0' * (itemsize * count)
+    return struct.pack(dtype[0].replace('|', '=') + code, _fill_value(fill_value)) * count
+
+#==================================================================
+# write_chunk - write one chunk of an array
+#==================================================================
+def write_chunk(store, name, key, data):
+    """write_chunk - compress the raw C order bytes of a full chunk and write
+    them to chunk file key of array name. The chunk is written to a
+    temporary name and renamed so readers never see a partial chunk.
+    """
+    array_dir = os.path.join(store, name)
+    fd, tmpname = tempfile.mkstemp(prefix='.{0}.'.format(key), dir=array_dir)
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(zlib.compress(data, COMPRESSION_LEVEL))
+        os.chmod(tmpname, 0o644)
+        os.rename(tmpname, os.path.join(array_dir, key))
+    except:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+#==================================================================
+# read_chunk - read one chunk of an array
+#==================================================================
+def read_chunk(store, name, key):
+    """read_chunk - return the raw bytes of chunk file key of array name or
+    None if the chunk was not written
+    """
+    filename = os.path.join(store, name, key)
+    if not os.path.isfile(filename):
+        return None
+    with open(filename, 'rb') as fh:
+        return zlib.decompress(fh.read())
+
+#==================================================================
+# write_time_chunk - write a block of time records of an array
+#==================================================================
+def write_time_chunk(store, name, index, data, nrecords):
+    """write_time_chunk - write the raw bytes of nrecords time records as
+    chunk index of a record array. The last chunk of an array is padded
+    with fill values to the full chunk size.
+    """
+    meta = read_array_metadata(store, name)
+    tchunk = meta['chunks'][0]
+    if nrecords < tchunk:
+        record_values = 1
+        for size in meta['chunks'][1:]:
+            record_values *= size
+        data = data + fill_bytes(meta['dtype'], meta['fill_value'], (tchunk - nrecords) * record_values)
+    write_chunk(store, name, chunk_key(index, len(meta['shape'])), data)
+
+#==================================================================
+# read_records - read a range of time records of an array
+#==================================================================
+def read_records(store, name, start, stop):
+    """read_records - return the raw bytes of records start to stop - 1 of
+    a record array, read from the chunks that hold them. Chunks that were
+    not written read as fill values.
+    """
+    meta = read_array_metadata(store, name)
+    tchunk = meta['chunks'][0]
+    stop = min(stop, meta['shape'][0])
+    record_values = 1
+    for size in meta['shape'][1:]:
+        record_values *= size
+    record_bytes = record_values * int(meta['dtype'][2:])
+
+    data = list()
+    for index in range(start // tchunk, (max(stop, start + 1) - 1) // tchunk + 1):
+        chunk = read_chunk(store, name, chunk_key(index, len(meta['shape'])))
+        if chunk is None:
+            chunk = fill_bytes(meta['dtype'], meta['fill_value'], tchunk * record_values)
+        first = max(start, index * tchunk) - index * tchunk
+        last = min(stop, (index + 1) * tchunk) - index * tchunk
+        data.append(chunk[first * record_bytes:last * record_bytes])
+    return b''.join(data)
+
+#==================================================================
+# read_values - read the values of a numeric array
+#==================================================================
+def read_values(store, name):
+    """read_values - return the values of a numeric array as a flat list,
+    used for the small coordinate arrays such as time
+    """
+    meta = read_array_metadata(store, name)
+    code = STRUCT_CODES[meta['dtype'][1:]]
+    if len(meta['shape']) == 0:
+        data = read_chunk(store, name, chunk_key(0, 0))
+    else:
+        data = read_records(store, name, 0, meta['shape'][0])
+    count = len(data) // int(meta['dtype'][2:])
+    return list(struct.unpack('{0}{1}{2}'.format(meta['dtype'][0].replace('|', '='), count, code), data))
+
+#==================================================================
+# read_time - read the time coordinate summary of a store
+#==================================================================
+def read_time(store, time_name='time'):
+    """read_time - read the time coordinate of a store and the first and last
+    values of its CF bounds array, the same summary ncHeaderLib.read_time
+    returns for a netCDF file
+    """
+    if not os.path.isfile(os.path.join(store, time_name, '.zarray')):
+        err_msg = 'zarrStoreLib.read_time ERROR: {0} has no {1} array'.format(store, time_name)
+        raise KeyError(err_msg)
+
+    with open(os.path.join(store, time_name, '.zattrs')) as fh:
+        attrs = json.load(fh)
+    values = read_values(store, time_name)
+    time = {'ntime' : len(values), 'units' : attrs.get('units'), 'calendar' : attrs.get('calendar'),
+            'first' : None, 'last' : None, 'min_step' : None, 'max_step' : None,
+            'first_bound' : None, 'last_bound' : None}
+    if len(values) > 0:
+        time['first'] = values[0]
+        time['last'] = values[-1]
+    steps = [b - a for a, b in zip(values[:-1], values[1:])]
+    if len(steps) > 0:
+        time['min_step'] = min(steps)
+        time['max_step'] = max(steps)
+
+    bounds = attrs.get('bounds')
+    if bounds is not None and os.path.isfile(os.path.join(store, bounds, '.zarray')) and len(values) > 0:
+        bound_values = read_values(store, bounds)
+        time['first_bound'] = bound_values[0]
+        time['last_bound'] = bound_values[-1]
+
+    return time
+
+#==================================================================
+# consolidate - write the consolidated metadata of a store
+#==================================================================
+def consolidate(store):
+    """consolidate - write the metadata of all the arrays of the store to
+    .zmetadata, the zarr consolidated metadata. It is written last and
+    marks the store as complete.
+    """
+    metadata = dict()
+    for dirpath, dirnames, filenames in os.walk(store):
+        for filename in filenames:
+            if filename in ['.zgroup', '.zattrs', '.zarray']:
+                path = os.path.join(dirpath, filename)
+                with open(path) as fh:
+                    metadata[os.path.relpath(path, store).replace(os.sep, '/')] = json.load(fh)
+
+    tseriesUtilsLib.write_json_atomic(os.path.join(store, METADATA_NAME),
+                                      {'zarr_consolidated_format' : 1, 'metadata' : metadata})
+
+def _open(filename):
+    # open a netCDF file and return it with its attribute reader
+    if Nio is not None:
+        return (Nio.open_file(filename, 'r'), lambda obj: dict(obj.attributes))
+    elif netCDF4 is not None:
+        f = netCDF4.Dataset(filename, 'r')
+        f.set_auto_maskandscale(False)
+        return (f, lambda obj: dict((name, obj.getncattr(name)) for name in obj.ncattrs()))
+
+    err_msg = 'zarrStoreLib ERROR: reading {0} requires PyNIO or netCDF4'.format(filename)
+    raise ImportError(err_msg)
+
+def _dtype(f, var):
+    if Nio is not None:
+        return np.dtype(var.typecode())
+    return np.dtype(var.dtype)
+
+def _read_all(var, ndim):
+    if ndim == 0:
+        return var.get_value() if Nio is not None else var[...]
+    return var[:]
+
+def _native(data):
+    data = np.asarray(data)
+    return np.ascontiguousarray(data, dtype=data.dtype.newbyteorder('='))
+
+#==================================================================
+# count_records - return the number of time records of a slice
+#==================================================================
+def count_records(filename, time_name='time'):
+    """count_records - return the number of records of the time dimension
+    of a history slice
+    """
+    f, attributes = _open(filename)
+    try:
+        return int(f.dimensions[time_name]) if Nio is not None else len(f.dimensions[time_name])
+    finally:
+        f.close()
+
+#==================================================================
+# create_store - create the store of one time series variable
+#==================================================================
+def create_store(store, source_file, name, time_variant_metadata, ntime, time_name='time', tchunk=None):
+    """create_store - create the store of time series variable name with the
+    metadata of its record arrays, sized for ntime records, and write the
+    time invariant arrays read from the first history slice
+
+    Arguments:
+    store (string) - store directory
+    source_file (string) - first history slice of the specifier
+    name (string) - time series variable name
+    time_variant_metadata (list) - tseries_time_variant_variables
+    ntime (integer) - number of time records of the time series
+    time_name (string) - name of the time dimension
+    tchunk (integer) - records per chunk of the variable or None for CHUNK_BYTES chunks
+
+    Return:
+    record_arrays (list) - (array name, records per chunk) of the arrays that depend on time
+    """
+    if np is None:
+        err_msg = 'zarrStoreLib.create_store ERROR: writing {0} requires numpy'.format(store)
+        raise ImportError(err_msg)
+
+    f, attributes = _open(source_file)
+    try:
+        create_group(store, attributes(f))
+
+        record_arrays = list()
+        seen = set()
+        names = [name, time_name] + sorted(time_variant_metadata)
+        names += sorted(v for v in f.variables if time_name not in f.variables[v].dimensions)
+        for array in names:
+            if array not in f.variables or array in seen:
+                continue
+            seen.add(array)
+            var = f.variables[array]
+            dtype = _dtype(f, var).newbyteorder('=')
+            attrs = attributes(var)
+            fill_value = attrs.pop('_FillValue', None)
+            dims = list(var.dimensions)
+            shape = [len(f.dimensions[dim]) if Nio is None else int(f.dimensions[dim]) for dim in dims]
+
+            if time_name in dims:
+                if dims[0] != time_name:
+                    print('zarrStoreLib WARNING - {0} is not written to {1}, time is not its first dimension'.format(array, store))
+                    continue
+                shape[0] = ntime
+                record_bytes = dtype.itemsize
+                for size in shape[1:]:
+                    record_bytes *= size
+                array_chunk = tchunk if (array == name and tchunk) else time_chunk(record_bytes)
+                create_array(store, array, shape, [array_chunk] + shape[1:], dtype.str, fill_value, dims, attrs)
+                record_arrays.append((array, array_chunk))
+            else:
+                create_array(store, array, shape, shape, dtype.str, fill_value, dims, attrs)
+                write_chunk(store, array, chunk_key(0, len(shape)), _native(_read_all(var, len(shape))).tobytes())
+    finally:
+        f.close()
+
+    return record_arrays
+
+#==================================================================
+# read_slices - read the records of one time chunk of a record array
+#==================================================================
+def read_slices(name, ranges):
+    """read_slices - read the records of a time chunk of array name from the
+    history slices, the I/O part of write_records done by the I/O
+    aggregator tasks
+
+    Arguments:
+    name (string) - array name
+    ranges (list) - (history file, first record, last record + 1) from slice_ranges
+
+    Return:
+    blocks (list) - the record arrays read from each history slice
+    """
+    if np is None:
+        err_msg = 'zarrStoreLib.read_slices ERROR: reading {0} requires numpy'.format(name)
+        raise ImportError(err_msg)
+
+    blocks = list()
+    for history_file, first, last in ranges:
+        f, attributes = _open(history_file)
+        try:
+            blocks.append(f.variables[name][first:last])
+        finally:
+            f.close()
+    return blocks
+
+#==================================================================
+# write_blocks - write the records of one time chunk of a record array
+#==================================================================
+def write_blocks(store, name, index, blocks, digits=None):
+    """write_blocks - write the record arrays read by read_slices as chunk
+    index of array name, quantized to digits
+
+    Return:
+    nbytes (integer) - bytes of the records
+    """
+    data = b''.join(_native(quantizeLib.quantize(block, digits)).tobytes() for block in blocks)
+    write_time_chunk(store, name, index, data, sum(len(block) for block in blocks))
+    return len(data)
+
+#==================================================================
+# write_records - write one time chunk of a record array
+#==================================================================
+def write_records(store, name, index, ranges, digits=None):
+    """write_records - read the records of chunk index of array name from the
+    history slices and write the chunk
+
+    Arguments:
+    store (string) - store directory
+    name (string) - array name
+    index (integer) - chunk index
+    ranges (list) - (history file, first record, last record + 1) from slice_ranges
+    digits (integer) - least_significant_digit of the values or None for full precision
+
+    Return:
+    nbytes (integer) - bytes of the records read
+    """
+    return write_blocks(store, name, index, read_slices(name, ranges), digits)